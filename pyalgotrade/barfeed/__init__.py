@@ -174,6 +174,10 @@ class OptimizerBarFeed(BaseBarFeed):
     def barsHaveAdjClose(self):
         return self.__barsHaveAdjClose
 
+    # Returns the bars held in memory, used to keep them out of checkpoints.
+    def _getBars(self):
+        return self.__bars
+
     def start(self):
         super(OptimizerBarFeed, self).start()
 
@@ -49,6 +49,10 @@ class BarFeed(barfeed.BaseBarFeed):
     def getCurrentDateTime(self):
         return self.__currDateTime
 
+    # Returns the bars held in memory, used to keep them out of checkpoints.
+    def _getBars(self):
+        return self.__bars
+
     def start(self):
         super(BarFeed, self).start()
         self.__started = True
@@ -0,0 +1,442 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import bisect
+import csv
+import datetime
+import os
+import re
+
+from pyalgotrade import bar
+from pyalgotrade import barfeed
+from pyalgotrade import utils
+from pyalgotrade.barfeed import ibfeed
+from pyalgotrade.broker import optbroker
+from pyalgotrade.tools import filename
+from pyalgotrade.utils import csvutils
+from pyalgotrade.utils import dt
+
+# Option contract files are named like bac_2000-p20160308.csv: symbol, strike in cents, right and expiry.
+CONTRACT_FILE_REGEX = re.compile(r"^([a-z]{1,4})_([0-9]{2,4})-(p|c)([0-9]{8})\.csv$", re.IGNORECASE)
+INDEX_FILE_NAME = "optchain-index.csv"
+
+_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+_DATE_FORMAT = "%Y-%m-%d"
+_INDEX_FIELD_NAMES = [
+    "filename", "instrument", "symbol", "strike", "right", "expiry", "rows", "first", "last", "size", "mtime"
+]
+
+
+def _datetime_to_str(dateTime):
+    return dateTime.strftime(_DATETIME_FORMAT)
+
+
+def _str_to_datetime(dateTime):
+    return datetime.datetime.strptime(dateTime, _DATETIME_FORMAT)
+
+
+def _date_to_str(date):
+    return date.strftime(_DATE_FORMAT)
+
+
+def _str_to_date(date):
+    # Indexes saved by previous versions have the expiry as a datetime at midnight.
+    return datetime.datetime.strptime(date[:10], _DATE_FORMAT).date()
+
+
+class Contract(object):
+    """An option contract available in an :class:`ContractIndex`."""
+
+    def __init__(self, instrument, symbol, strike, right, expiry, path, rowCount, firstDateTime, lastDateTime):
+        self.__instrument = instrument
+        self.__symbol = symbol
+        self.__strike = strike
+        self.__right = right
+        self.__expiry = expiry
+        self.__path = path
+        self.__rowCount = rowCount
+        self.__firstDateTime = firstDateTime
+        self.__lastDateTime = lastDateTime
+
+    def getInstrument(self):
+        """Returns the instrument identifier used for the contract bars."""
+        return self.__instrument
+
+    def getSymbol(self):
+        """Returns the underlying symbol."""
+        return self.__symbol
+
+    def getStrike(self):
+        return self.__strike
+
+    def getRight(self):
+        """Returns optbroker.OptionOrder.Right.PUT or optbroker.OptionOrder.Right.CALL."""
+        return self.__right
+
+    def getExpiry(self):
+        """Returns the expiry date. The contract expires at the end of that day."""
+        return self.__expiry
+
+    def getPath(self):
+        return self.__path
+
+    def getRowCount(self):
+        return self.__rowCount
+
+    def getFirstDateTime(self):
+        return self.__firstDateTime
+
+    def getLastDateTime(self):
+        return self.__lastDateTime
+
+
+class ContractIndex(object):
+    """An index of the option contracts available in a directory.
+
+    :param contracts: The contracts.
+    :type contracts: list of :class:`Contract`.
+
+    .. note::
+        Use :func:`build_index` to build an index.
+    """
+
+    def __init__(self, contracts):
+        self.__contracts = sorted(contracts, key=lambda contract: contract.getInstrument())
+
+    def getContracts(self, symbol=None):
+        """Returns the contracts for a given underlying symbol, or all of them if symbol is None."""
+        if symbol is None:
+            ret = list(self.__contracts)
+        else:
+            ret = [contract for contract in self.__contracts if contract.getSymbol() == symbol]
+        return ret
+
+    def getSymbols(self):
+        """Returns the underlying symbols."""
+        return sorted(set(contract.getSymbol() for contract in self.__contracts))
+
+    def __len__(self):
+        return len(self.__contracts)
+
+
+def _scan_contract_file(path):
+    # Returns the number of rows and the datetimes for the first and last rows.
+    rowCount = 0
+    firstDateTime = None
+    lastDateTime = None
+    with open(path, "r") as f:
+        # Only the datetime column is parsed.
+        reader = csv.reader(f, delimiter=";")
+        reader.next()
+        lastRow = None
+        for row in reader:
+            if row == []:
+                continue
+            if rowCount == 0:
+                firstDateTime = ibfeed.parse_datetime(row[0])
+            rowCount += 1
+            lastRow = row
+        if lastRow is not None:
+            lastDateTime = ibfeed.parse_datetime(lastRow[0])
+    return rowCount, firstDateTime, lastDateTime
+
+
+def _load_index_rows(indexPath):
+    ret = {}
+    if os.path.exists(indexPath):
+        with open(indexPath, "r") as f:
+            for row in csv.DictReader(f):
+                ret[row["filename"]] = dict(row)
+    return ret
+
+
+def build_index(path, save=True):
+    """Builds an index of the option contracts available in a directory.
+    The index is persisted in the directory and only new or updated contract files are scanned the next time.
+
+    :param path: The directory where the contract files are.
+    :type path: string.
+    :param save: True if the index should be persisted.
+    :type save: boolean.
+    :rtype: :class:`ContractIndex`.
+    """
+    indexPath = os.path.join(path, INDEX_FILE_NAME)
+    prevRows = _load_index_rows(indexPath)
+    parser = filename.Parser()
+
+    rows = []
+    for fileName in sorted(os.listdir(path)):
+        if CONTRACT_FILE_REGEX.match(fileName) is None:
+            continue
+
+        filePath = os.path.join(path, fileName)
+        stat = os.stat(filePath)
+        row = prevRows.get(fileName)
+        if row is None or int(row["size"]) != stat.st_size or float(row["mtime"]) != stat.st_mtime:
+            instrument = parser.parse(fileName.lower())
+            rowCount, firstDateTime, lastDateTime = _scan_contract_file(filePath)
+            if rowCount == 0:
+                continue
+            row = {
+                "filename": fileName,
+                "instrument": instrument.id,
+                "symbol": instrument.symbol,
+                "strike": repr(instrument.strike),
+                "right": instrument.right,
+                "expiry": _date_to_str(instrument.expiry.date()),
+                "rows": str(rowCount),
+                "first": _datetime_to_str(firstDateTime),
+                "last": _datetime_to_str(lastDateTime),
+                "size": str(stat.st_size),
+                "mtime": repr(stat.st_mtime),
+            }
+        rows.append(row)
+
+    if save:
+        with open(indexPath, "w") as f:
+            writer = csv.DictWriter(f, _INDEX_FIELD_NAMES)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    contracts = []
+    for row in rows:
+        if row["right"] == "CALL":
+            right = optbroker.OptionOrder.Right.CALL
+        else:
+            right = optbroker.OptionOrder.Right.PUT
+        contracts.append(Contract(
+            row["instrument"], row["symbol"], float(row["strike"]), right, _str_to_date(row["expiry"]),
+            os.path.join(path, row["filename"]), int(row["rows"]), _str_to_datetime(row["first"]),
+            _str_to_datetime(row["last"])
+        ))
+    return ContractIndex(contracts)
+
+
+# Streams the bars from a CSV file, one at a time.
+class _BarCursor(object):
+    def __init__(self, path, rowParser):
+        self.__file = open(path, "r")
+        self.__reader = csvutils.FastDictReader(
+            self.__file, fieldnames=rowParser.getFieldNames(), delimiter=rowParser.getDelimiter()
+        )
+        self.__rowParser = rowParser
+        self.__next = None
+        self.__advance()
+
+    def __advance(self):
+        self.__next = None
+        if self.__reader is not None:
+            try:
+                self.__next = self.__rowParser.parseBar(self.__reader.next())
+            except StopIteration:
+                self.close()
+
+    def close(self):
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+            self.__reader = None
+
+    def peekDateTime(self):
+        ret = None
+        if self.__next is not None:
+            ret = self.__next.getDateTime()
+        return ret
+
+    def skipUntil(self, dateTime):
+        while self.__next is not None and self.__next.getDateTime() < dateTime:
+            self.__advance()
+
+    def pop(self):
+        ret = self.__next
+        self.__advance()
+        return ret
+
+
+class OptionChainFeed(barfeed.BaseBarFeed):
+    """A :class:`pyalgotrade.barfeed.BaseBarFeed` that loads the bars for an option chain from the files in a
+    :class:`ContractIndex`.
+
+    Contract files are opened only while the contract is alive and its strike is within a band around the last
+    underlying price. Bars are streamed from the files, so they are not held in memory.
+
+    :param index: The contracts available.
+    :type index: :class:`ContractIndex`.
+    :param frequency: The frequency of the bars.
+    :param strikeBand: The maximum distance between the strike and the underlying price, as a fraction of the
+        underlying price. If None, every contract that is alive is loaded. Contracts whose underlying wasn't added are
+        always loaded while alive.
+    :type strikeBand: float.
+    :param timezone: The timezone to use to localize bars. Check :mod:`pyalgotrade.marketsession`.
+    :type timezone: A pytz timezone.
+    :param maxLen: The maximum number of values that the :class:`pyalgotrade.dataseries.bards.BarDataSeries` will hold.
+        If None then dataseries.DEFAULT_MAX_LEN is used.
+    :type maxLen: int.
+
+    .. note::
+        Once a contract is opened it is not closed until it has no more bars, even if its strike leaves the band.
+    """
+
+    def __init__(self, index, frequency=bar.Frequency.MINUTE, strikeBand=None, timezone=None, maxLen=None):
+        super(OptionChainFeed, self).__init__(frequency, maxLen)
+        self.__strikeBand = strikeBand
+        self.__timezone = timezone
+        self.__rowParser = ibfeed.RowParser(frequency, None, timezone)
+        self.__contracts = {}
+        self.__underlyings = {}
+        self.__currDateTime = None
+        # Contracts that were not opened yet, sorted by the datetime of the first bar.
+        self.__pending = sorted(index.getContracts(), key=lambda contract: self.__localize(contract.getFirstDateTime()))
+        self.__nextPending = 0
+        # Contracts that are alive but were not opened yet, sorted by strike for every symbol.
+        self.__alive = {}
+        self.__open = {}
+
+        for contract in self.__pending:
+            self.__contracts[contract.getInstrument()] = contract
+
+    def __localize(self, dateTime):
+        if self.__timezone:
+            dateTime = dt.localize(dateTime, self.__timezone)
+        return dateTime
+
+    def addUnderlyingFromCSV(self, symbol, path):
+        """Adds the bars for an underlying from a CSV file exported from Interactive Brokers.
+        The underlying price is used to pick the contracts to load.
+
+        :param symbol: The underlying symbol. This is also used as the instrument identifier.
+        :type symbol: string.
+        :param path: The path to the file.
+        :type path: string.
+        """
+        self.__underlyings[symbol] = _BarCursor(path, self.__rowParser)
+        self.registerInstrument(symbol)
+
+    def getContract(self, instrument):
+        """Returns the :class:`Contract` for an instrument, or None."""
+        return self.__contracts.get(instrument)
+
+    def getOpenContracts(self):
+        """Returns the contracts currently opened."""
+        return [self.__contracts[instrument] for instrument in self.__open.keys()]
+
+    def getCurrentDateTime(self):
+        return self.__currDateTime
+
+    def barsHaveAdjClose(self):
+        return False
+
+    def start(self):
+        super(OptionChainFeed, self).start()
+
+    def stop(self):
+        for cursor in self.__open.values():
+            cursor.close()
+        for cursor in self.__underlyings.values():
+            cursor.close()
+
+    def join(self):
+        pass
+
+    def __getBandLimits(self, symbol):
+        ret = None
+        if self.__strikeBand is not None and symbol in self.__underlyings:
+            lastBar = self.getLastBar(symbol)
+            if lastBar is not None:
+                price = lastBar.getClose()
+                ret = (price * (1 - self.__strikeBand), price * (1 + self.__strikeBand))
+        return ret
+
+    def __openContract(self, contract, dateTime):
+        cursor = _BarCursor(contract.getPath(), self.__rowParser)
+        cursor.skipUntil(dateTime)
+        if cursor.peekDateTime() is not None:
+            self.__open[contract.getInstrument()] = cursor
+            self.registerInstrument(contract.getInstrument())
+        else:
+            cursor.close()
+
+    def __updateContracts(self, dateTime):
+        # Contracts that start trading at or before dateTime become alive.
+        while self.__nextPending < len(self.__pending) and \
+                self.__localize(self.__pending[self.__nextPending].getFirstDateTime()) <= dateTime:
+            contract = self.__pending[self.__nextPending]
+            self.__nextPending += 1
+            alive = self.__alive.setdefault(contract.getSymbol(), [])
+            bisect.insort(alive, (contract.getStrike(), contract.getInstrument()))
+
+        # Open the alive contracts that are within the strike band.
+        for symbol, alive in self.__alive.iteritems():
+            limits = self.__getBandLimits(symbol)
+            if limits is None:
+                begin, end = 0, len(alive)
+            else:
+                begin = bisect.bisect_left(alive, (limits[0],))
+                end = bisect.bisect_right(alive, (limits[1], chr(255)))
+            if begin == end:
+                continue
+
+            for strike, instrument in alive[begin:end]:
+                contract = self.__contracts[instrument]
+                if self.__localize(contract.getLastDateTime()) >= dateTime:
+                    self.__openContract(contract, dateTime)
+            del alive[begin:end]
+
+    def __getNextCursorDateTime(self):
+        ret = None
+        for cursor in self.__underlyings.values():
+            ret = utils.safe_min(ret, cursor.peekDateTime())
+        for cursor in self.__open.values():
+            ret = utils.safe_min(ret, cursor.peekDateTime())
+        return ret
+
+    def peekDateTime(self):
+        ret = self.__getNextCursorDateTime()
+        if self.__nextPending < len(self.__pending):
+            ret = utils.safe_min(ret, self.__localize(self.__pending[self.__nextPending].getFirstDateTime()))
+        return ret
+
+    def eof(self):
+        return self.peekDateTime() is None
+
+    def getNextBars(self):
+        ret = None
+        while ret is None:
+            dateTime = self.peekDateTime()
+            if dateTime is None:
+                break
+
+            self.__updateContracts(dateTime)
+            if self.__getNextCursorDateTime() != dateTime:
+                continue
+
+            bars = {}
+            for instrument, cursor in self.__underlyings.items() + self.__open.items():
+                if cursor.peekDateTime() == dateTime:
+                    bars[instrument] = cursor.pop()
+            # Contracts that have no more bars get closed.
+            for instrument, cursor in self.__open.items():
+                if cursor.peekDateTime() is None:
+                    cursor.close()
+                    del self.__open[instrument]
+
+            self.__currDateTime = dateTime
+            ret = bar.Bars(bars)
+        return ret
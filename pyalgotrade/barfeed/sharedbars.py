@@ -0,0 +1,213 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import datetime
+import os
+import pickle
+
+import numpy as np
+
+from pyalgotrade import bar
+from pyalgotrade.utils import dt
+
+# Every column is saved to its own .npy file so it can be memory-mapped. The rest goes into this file.
+METADATA_FILE = "metadata.pickle"
+PRICE_COLUMNS = ("open", "high", "low", "close", "volume", "adjClose")
+
+_epoch = datetime.datetime(1970, 1, 1)
+
+
+def _to_microseconds(dateTime):
+    if not dt.datetime_is_naive(dateTime):
+        dateTime = dt.unlocalize(dt.as_utc(dateTime))
+    delta = dateTime - _epoch
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _from_microseconds(microseconds, timeZone):
+    ret = _epoch + datetime.timedelta(microseconds=microseconds)
+    if timeZone is not None:
+        ret = dt.localize(dt.as_utc(ret), timeZone)
+    return ret
+
+
+def write(path, instruments, bars):
+    """Saves a sequence of :class:`pyalgotrade.bar.Bars` in columnar format, so it can be loaded using
+    :class:`SharedBars`.
+
+    :param path: The folder where the files will be written. It gets created if it doesn't exist.
+    :type path: string.
+    :param instruments: The instruments.
+    :type instruments: list.
+    :param bars: The bars. They should be sorted by datetime.
+    :type bars: An iterable of :class:`pyalgotrade.bar.Bars`.
+
+    .. note::
+        * Extra columns, if any, must be numeric.
+        * Datetimes must be either all naive or all timezone aware.
+    """
+
+    instruments = list(instruments)
+    instrumentIds = dict((instrument, i) for i, instrument in enumerate(instruments))
+    timeZone = None
+    dateTimes = []
+    offsets = [0]
+    rowInstruments = []
+    frequencies = []
+    columns = dict((name, []) for name in PRICE_COLUMNS)
+    extraColumns = {}
+
+    for bars_ in bars:
+        dateTime = bars_.getDateTime()
+        if len(dateTimes) == 0:
+            timeZone = None if dt.datetime_is_naive(dateTime) else dateTime.tzinfo
+        elif (timeZone is None) != dt.datetime_is_naive(dateTime):
+            raise Exception("Naive and timezone aware datetimes can't be mixed")
+        dateTimes.append(_to_microseconds(dateTime))
+
+        for instrument in sorted(bars_.getInstruments(), key=lambda instrument: instrumentIds[instrument]):
+            bar_ = bars_[instrument]
+            row = len(rowInstruments)
+            rowInstruments.append(instrumentIds[instrument])
+            frequencies.append(bar_.getFrequency())
+            columns["open"].append(bar_.getOpen())
+            columns["high"].append(bar_.getHigh())
+            columns["low"].append(bar_.getLow())
+            columns["close"].append(bar_.getClose())
+            columns["volume"].append(bar_.getVolume())
+            adjClose = bar_.getAdjClose()
+            columns["adjClose"].append(np.nan if adjClose is None else adjClose)
+            for name, value in bar_.getExtraColumns().iteritems():
+                # Missing values are saved as NaN.
+                extraColumns.setdefault(name, [np.nan] * row).append(value)
+            for values in extraColumns.itervalues():
+                if len(values) == row:
+                    values.append(np.nan)
+        offsets.append(len(rowInstruments))
+
+    if not os.path.exists(path):
+        os.makedirs(path)
+    np.save(os.path.join(path, "dateTimes.npy"), np.array(dateTimes, dtype=np.int64))
+    np.save(os.path.join(path, "offsets.npy"), np.array(offsets, dtype=np.int64))
+    np.save(os.path.join(path, "instruments.npy"), np.array(rowInstruments, dtype=np.int32))
+    np.save(os.path.join(path, "frequencies.npy"), np.array(frequencies, dtype=np.int32))
+    for name, values in columns.iteritems():
+        np.save(os.path.join(path, "%s.npy" % name), np.array(values, dtype=np.float64))
+    extraNames = sorted(extraColumns.keys())
+    for i, name in enumerate(extraNames):
+        np.save(os.path.join(path, "extra%d.npy" % i), np.array(extraColumns[name], dtype=np.float64))
+
+    metadata = {"instruments": instruments, "timeZone": timeZone, "extraColumns": extraNames}
+    with open(os.path.join(path, METADATA_FILE), "wb") as f:
+        pickle.dump(metadata, f, pickle.HIGHEST_PROTOCOL)
+
+
+class SharedBars(object):
+    """A read-only sequence of :class:`pyalgotrade.bar.Bars` backed by memory-mapped files written with
+    :func:`write`. It can be used with :class:`pyalgotrade.barfeed.OptimizerBarFeed`.
+
+    Many processes can attach to the same files and the operating system will share the pages among them, instead of
+    every process holding its own copy of the bars. Bars are built when accessed.
+
+    :param path: The folder where the files were written.
+    :type path: string.
+    """
+
+    # The number of positions to build bars for at a time.
+    windowSize = 256
+
+    def __init__(self, path):
+        self.__path = path
+        with open(os.path.join(path, METADATA_FILE), "rb") as f:
+            metadata = pickle.load(f)
+        self.__instruments = metadata["instruments"]
+        self.__timeZone = metadata["timeZone"]
+        self.__extraNames = metadata["extraColumns"]
+
+        # Plain ndarray views on the memory-mapped files are much cheaper to slice than np.memmap instances.
+        def load(name):
+            return np.asarray(np.load(os.path.join(path, "%s.npy" % name), mmap_mode="r"))
+
+        self.__dateTimes = load("dateTimes")
+        self.__offsets = load("offsets")
+        self.__rowInstruments = load("instruments")
+        self.__frequencies = load("frequencies")
+        self.__columns = [load(name) for name in PRICE_COLUMNS]
+        self.__extraColumns = [load("extra%d" % i) for i in range(len(self.__extraNames))]
+        # Bars are built a window at a time, to amortize the cost of slicing the columns.
+        self.__windowBegin = 0
+        self.__window = []
+
+    # Memory-mapped arrays are not copied when pickling. The files are loaded again instead.
+    def __reduce__(self):
+        return (SharedBars, (self.__path,))
+
+    def getPath(self):
+        return self.__path
+
+    def getInstruments(self):
+        """Returns the instruments."""
+        return self.__instruments
+
+    def getDateTime(self, pos):
+        """Returns the datetime for the bars at a given position, without building them."""
+        return _from_microseconds(int(self.__dateTimes[pos]), self.__timeZone)
+
+    def __len__(self):
+        return len(self.__dateTimes)
+
+    def __iter__(self):
+        for pos in xrange(len(self)):
+            yield self[pos]
+
+    def __getitem__(self, pos):
+        if pos < 0:
+            pos += len(self)
+        if pos < 0 or pos >= len(self):
+            raise IndexError("Invalid position %d" % (pos))
+        if pos < self.__windowBegin or pos >= self.__windowBegin + len(self.__window):
+            self.__window = self.__buildBars(pos, min(pos + self.windowSize, len(self)))
+            self.__windowBegin = pos
+        return self.__window[pos - self.__windowBegin]
+
+    def __buildBars(self, beginPos, endPos):
+        offsets = self.__offsets[beginPos:endPos + 1].tolist()
+        begin = offsets[0]
+        end = offsets[-1]
+        prices = zip(*[column[begin:end].tolist() for column in self.__columns])
+        extras = zip(*[column[begin:end].tolist() for column in self.__extraColumns])
+        instruments = self.__rowInstruments[begin:end].tolist()
+        frequencies = self.__frequencies[begin:end].tolist()
+
+        ret = []
+        for pos in xrange(beginPos, endPos):
+            dateTime = self.getDateTime(pos)
+            barDict = {}
+            for i in xrange(offsets[pos - beginPos] - begin, offsets[pos - beginPos + 1] - begin):
+                open_, high, low, close, volume, adjClose = prices[i]
+                extra = {}
+                if len(extras):
+                    extra = dict((name, value) for name, value in zip(self.__extraNames, extras[i]) if value == value)
+                barDict[self.__instruments[instruments[i]]] = bar.BasicBar(
+                    dateTime, open_, high, low, close, volume, None if adjClose != adjClose else adjClose,
+                    frequencies[i], extra
+                )
+            ret.append(bar.Bars(barDict))
+        return ret
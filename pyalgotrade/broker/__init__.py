@@ -514,6 +514,19 @@ class Broker(observer.Subject):
     def getOrderUpdatedEvent(self):
         return self.__orderEvent
 
+    def isOrderExpired(self, order, bar_):
+        """Returns True if a non-GTC order expired before a bar, in which case it gets canceled instead of being
+        filled.
+
+        :param order: An active backtesting order.
+        :type order: :class:`pyalgotrade.broker.Order`.
+        :param bar_: The current bar for the order's instrument.
+        :type bar_: :class:`pyalgotrade.bar.Bar`.
+        """
+        # Orders that were not accepted yet get accepted with this bar.
+        return not order.getGoodTillCanceled() and not order.isSubmitted() and \
+            bar_.getDateTime().date() > order.getAcceptedDateTime().date()
+
     @abc.abstractmethod
     def getInstrumentTraits(self, instrument):
         raise NotImplementedError()
@@ -20,6 +20,8 @@
 
 import abc
 
+import numpy as np
+
 from pyalgotrade import broker
 from pyalgotrade.broker import fillstrategy
 from pyalgotrade import logger
@@ -52,6 +54,24 @@ class Commission(object):
         """
         raise NotImplementedError()
 
+    def calculateBatch(self, orders, prices, quantities):
+        """Calculates the commissions for many order executions at once.
+        Override to provide a vectorized implementation. The default implementation calls :meth:`calculate` for each
+        execution.
+
+        :param orders: The orders being executed.
+        :type orders: list of :class:`pyalgotrade.broker.Order`.
+        :param prices: The price for each share, one per order.
+        :type prices: sequence of floats.
+        :param quantities: The size of each execution, one per order.
+        :type quantities: sequence of floats.
+        :rtype: numpy.array with one commission per order.
+        """
+        return np.array(
+            [self.calculate(order, price, quantity) for order, price, quantity in zip(orders, prices, quantities)],
+            dtype=float
+        )
+
 
 class NoCommission(Commission):
     """A :class:`Commission` class that always returns 0."""
@@ -59,6 +79,9 @@ class NoCommission(Commission):
     def calculate(self, order, price, quantity):
         return 0
 
+    def calculateBatch(self, orders, prices, quantities):
+        return np.zeros(len(orders))
+
 
 class FixedPerTrade(Commission):
     """A :class:`Commission` class that charges a fixed amount for the whole trade.
@@ -77,6 +100,10 @@ class FixedPerTrade(Commission):
             ret = self.__amount
         return ret
 
+    def calculateBatch(self, orders, prices, quantities):
+        firstFill = np.array([order.getExecutionInfo() is None for order in orders], dtype=bool)
+        return np.where(firstFill, float(self.__amount), 0.0)
+
 
 class TradePercentage(Commission):
     """A :class:`Commission` class that charges a percentage of the whole trade.
@@ -92,6 +119,9 @@ class TradePercentage(Commission):
     def calculate(self, order, price, quantity):
         return price * quantity * self.__percentage
 
+    def calculateBatch(self, orders, prices, quantities):
+        return np.asarray(prices, dtype=float) * np.asarray(quantities, dtype=float) * self.__percentage
+
 
 ######################################################################
 # Orders
@@ -382,7 +412,7 @@ class Broker(broker.Broker):
 
         # For non-GTC orders we need to check if the order has expired.
         if not order.getGoodTillCanceled():
-            expired = bar_.getDateTime().date() > order.getAcceptedDateTime().date()
+            expired = self.isOrderExpired(order, bar_)
 
             # Cancel the order if it is expired.
             if expired:
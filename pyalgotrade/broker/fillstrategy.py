@@ -287,6 +287,9 @@ class DefaultStrategy(FillStrategy):
             assert volumeLimit > 0 and volumeLimit <= 1, "Invalid volume limit"
         self.__volumeLimit = volumeLimit
 
+    def getVolumeLimit(self):
+        return self.__volumeLimit
+
     def setSlippageModel(self, slippageModel):
         """
         Set the slippage model to use.
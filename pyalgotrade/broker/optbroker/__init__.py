@@ -46,6 +46,7 @@ class OptionOrder(Order):
     *OptionOrder.OptionType.OPTION_LIMIT
     *OptionOrder.OptionType.OPTION_STOP
     *OptionOrder.OptionType.OPTION_STOP_LIMIT
+    *OptionOrder.OptionType.OPTION_COMBO
     """
 
     class OptionType(Order.Type):
@@ -53,6 +54,7 @@ class OptionOrder(Order):
         OPTION_LIMIT = 6
         OPTION_STOP = 7
         OPTION_STOP_LIMIT = 8
+        OPTION_COMBO = 9
 
     class Right(object):
         PUT = 1
@@ -157,6 +159,85 @@ class OptionStopLimitOrder(OptionOrder):
         return self.__limitPrice
 
 
+class ComboLeg(object):
+    """A leg for a :class:`OptionComboOrder`.
+
+    :param instrument: Instrument identifier.
+    :type instrument: string.
+    :param right: PUT or CALL.
+    :type right: Right.
+    :param strike: strike price.
+    :type strike: float.
+    :param expiry: expiry date.
+    :type expiry: date.
+    :param ratio: The number of contracts per combo unit. Positive means buy, negative means sell.
+    :type ratio: int.
+    """
+
+    def __init__(self, instrument, right, strike, expiry, ratio):
+        assert(ratio != 0)
+        self.__instrument = instrument
+        self.__right = right
+        self.__strike = strike
+        self.__expiry = expiry
+        self.__ratio = ratio
+
+    def getInstrument(self):
+        return self.__instrument
+
+    def getRight(self):
+        return self.__right
+
+    def getStrike(self):
+        return self.__strike
+
+    def getExpiry(self):
+        return self.__expiry
+
+    def getRatio(self):
+        return self.__ratio
+
+
+class OptionComboOrder(Order):
+    """Base class for combo orders, like spreads or straddles.
+    All the legs get filled at once, for the same number of combo units, and a single stream of order events is
+    generated for the combo.
+
+    The net price for one combo unit is the sum of each leg price multiplied by its ratio, so it is positive for a
+    debit and negative for a credit. Buying the combo trades the legs as specified, and selling it trades them in the
+    opposite direction.
+
+    .. note::
+
+        This is a base class and should not be used directly.
+    """
+
+    def __init__(self, action, legs, quantity, limitPrice, instrumentTraits):
+        assert(len(legs) > 0)
+        instrument = "/".join(leg.getInstrument() for leg in legs)
+        super(OptionComboOrder, self).__init__(OptionOrder.OptionType.OPTION_COMBO, action, instrument, quantity,
+                                               instrumentTraits)
+        self.__legs = legs
+        self.__limitPrice = limitPrice
+        self.__legExecutionInfo = None
+
+    def getLegs(self):
+        """Returns the list of :class:`ComboLeg`."""
+        return self.__legs
+
+    def getLimitPrice(self):
+        """Returns the net limit price, or None if this is a market order."""
+        return self.__limitPrice
+
+    def getLegExecutionInfo(self):
+        """Returns a list with the :class:`pyalgotrade.broker.OrderExecutionInfo` for each leg in the last execution,
+        or None if the order was not filled."""
+        return self.__legExecutionInfo
+
+    def setLegExecutionInfo(self, legExecutionInfo):
+        self.__legExecutionInfo = legExecutionInfo
+
+
 class AbstractOptionBroker(broker.Broker):
     """Base class for brokers.
 
@@ -250,6 +331,22 @@ class AbstractOptionBroker(broker.Broker):
         """
         raise NotImplementedError()
 
+    def createOptionComboOrder(self, action, legs, quantity, limitPrice=None):
+        """Creates a combo order.
+        Check :class:`OptionComboOrder` for details.
+
+        :param action: The order action.
+        :type action: Order.Action.BUY or Order.Action.SELL.
+        :param legs: The legs.
+        :type legs: list of :class:`ComboLeg`.
+        :param quantity: The number of combo units.
+        :type quantity: int/float.
+        :param limitPrice: The net limit price for one combo unit, or None for a market order.
+        :type limitPrice: float.
+        :rtype: A :class:`OptionComboOrder` subclass.
+        """
+        raise NotImplementedError()
+
     #This is because the base class Broker needs those methods but we don't want them in the class OptionBroker
     def createMarketOrder(self, action, instrument, quantity, onClose=False):
         raise NotImplementedError()
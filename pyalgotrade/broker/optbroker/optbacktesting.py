@@ -18,11 +18,17 @@
 .. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
 """
 
+import datetime
+import heapq
+
 from pyalgotrade.broker import optbroker
 from pyalgotrade.broker import backtesting
 from pyalgotrade import broker
 from pyalgotrade.broker.backtesting import NoCommission
 from pyalgotrade import logger
+from pyalgotrade import options
+from pyalgotrade.options import risk
+from pyalgotrade.options import surface
 from . import optfillstrategy
 import pyalgotrade.bar
 
@@ -82,6 +88,21 @@ class OptionStopLimitOrder(optbroker.OptionStopLimitOrder, backtesting.Backtesti
     def process(self, broker_, bar_):
         return broker_.getFillStrategy().fillOptionStopLimitOrder(broker_, self, bar_)
 
+class OptionComboOrder(optbroker.OptionComboOrder, backtesting.BacktestingOrder):
+    def __init__(self, action, legs, quantity, limitPrice, instrumentTraits):
+        super(OptionComboOrder, self).__init__(action, legs, quantity, limitPrice, instrumentTraits)
+
+    # Combo orders get all the current bars, since they need the bars for every leg.
+    def process(self, broker_, bars):
+        return broker_.getFillStrategy().fillComboOrder(broker_, self, bars)
+
+
+class OptionSettlementOrder(OptionMarketOrder):
+    """Order filled by the broker itself to close the shares held on an expired contract."""
+    def __init__(self, action, instrument, quantity, right, strike, expiry, instrumentTraits):
+        super(OptionSettlementOrder, self).__init__(action, instrument, quantity, right, strike, expiry, False,
+                                                    instrumentTraits)
+
 ######################################################################
 # OptionBroker
 
@@ -95,10 +116,19 @@ class OptionBroker(optbroker.AbstractOptionBroker):
     :type barFeed: :class:`pyalgotrade.barfeed.BarFeed`
     :param commission: An object responsible for calculating order commissions.
     :type commission: :class:`Commission`
+
+    Option contracts are registered using the right, strike and expiry of the option orders submitted. If the expiry is
+    a date, the contract expires at the end of that day. Once a contract expires its active orders get canceled. By
+    default the shares held are left untouched. Check :meth:`setSettlementType` to settle them.
     """
 
     LOGGER_NAME = "optbroker.optbacktesting"
 
+    class SettlementType(object):
+        NONE = 0  # Expired contracts are left untouched.
+        CASH = 1  # Positions are closed at the intrinsic value.
+        EXERCISE = 2  # In the money positions are exercised/assigned into the underlying at the strike price.
+
     def __init__(self, cash, barFeed, commission=None):
         #optbroker.AbstractOptionBroker.__init__(self)
         #backtesting.Broker.__init__(self, cash, barFeed, commission)
@@ -122,6 +152,221 @@ class OptionBroker(optbroker.AbstractOptionBroker):
         self.__barFeed = barFeed
         self.__allowNegativeCash = False
         self.__nextOrderId = 1
+        self.__settlementType = OptionBroker.SettlementType.NONE
+        self.__underlyings = {}
+        # Contract details and a heap of (expiry, instrument) tuples, so only the contracts that expire get processed.
+        self.__contracts = {}
+        self.__expirySchedule = []
+        self.__surfaces = {}
+        self.__riskAggregator = None
+
+    def setSettlementType(self, settlementType):
+        """Sets how contracts get settled once they expire. Contracts that expire within a bar are settled once the
+        orders for that bar were processed. The default is OptionBroker.SettlementType.NONE.
+
+        Settled shares are closed with :class:`OptionSettlementOrder` orders (and market orders for the underlying
+        when exercising) that get filled without commissions, notifying the usual order events.
+
+        :param settlementType: The settlement type.
+        :type settlementType: OptionBroker.SettlementType.NONE, OptionBroker.SettlementType.CASH or
+            OptionBroker.SettlementType.EXERCISE.
+        """
+        self.__settlementType = settlementType
+
+    def getSettlementType(self):
+        return self.__settlementType
+
+    def setUnderlying(self, instrument, underlying):
+        """Sets the underlying instrument for an option instrument.
+        The underlying price is used to calculate the intrinsic value upon expiry. If no underlying is set, cash
+        settlement takes place at the last option price and exercise is not possible.
+
+        :param instrument: Option instrument identifier.
+        :type instrument: string.
+        :param underlying: Underlying instrument identifier.
+        :type underlying: string.
+        """
+        self.__underlyings[instrument] = underlying
+        self.__addToSurface(instrument)
+
+    def getUnderlying(self, instrument):
+        return self.__underlyings.get(instrument)
+
+    def getExpiry(self, instrument):
+        """Returns the expiry registered for an option instrument, or None."""
+        ret = self.__contracts.get(instrument)
+        if ret is not None:
+            ret = ret[2]
+        return ret
+
+    def __registerContract(self, instrument, right, strike, expiry):
+        if instrument in self.__contracts or not isinstance(expiry, datetime.date):
+            return
+
+        expiry = options.expiry_datetime(expiry)
+        self.__contracts[instrument] = (right, strike, expiry)
+        heapq.heappush(self.__expirySchedule, (expiry, instrument))
+        self.__addToSurface(instrument)
+
+    def __addToSurface(self, instrument):
+        contract = self.__contracts.get(instrument)
+        surface_ = self.__surfaces.get(self.__underlyings.get(instrument))
+        if contract is not None and surface_ is not None:
+            surface_.addContract(instrument, *contract)
+
+    def getVolatilitySurface(self, underlying):
+        """Returns the :class:`pyalgotrade.options.surface.VolatilitySurface` for an underlying instrument.
+        The surface is created the first time it is requested, and it includes the contracts registered for that
+        underlying. Check :meth:`setUnderlying`.
+
+        :param underlying: Underlying instrument identifier.
+        :type underlying: string.
+        """
+        ret = self.__surfaces.get(underlying)
+        if ret is None:
+            ret = surface.VolatilitySurface(self.__barFeed, underlying)
+            self.__surfaces[underlying] = ret
+            for instrument in self.__contracts:
+                if self.__underlyings.get(instrument) == underlying:
+                    self.__addToSurface(instrument)
+        return ret
+
+    def __getBarEnd(self, dateTime):
+        # Daily (or greater) bars cover the whole day.
+        if self.__barFeed.getFrequency() >= pyalgotrade.bar.Frequency.DAY:
+            ret = options.expiry_datetime(dateTime.date(), dateTime.tzinfo)
+        else:
+            ret = dateTime
+        return ret
+
+    def __getSettlementBar(self, bars, instrument, expiry):
+        # Use the last bar at or before expiry, even if the instrument is missing from the current bars.
+        ret = self._getBar(bars, instrument)
+        if ret is not None and ret.getDateTime() > options.expiry_datetime(expiry, ret.getDateTime().tzinfo):
+            ret = None
+            if instrument in self.__barFeed.getRegisteredInstruments():
+                barDS = self.__barFeed.getDataSeries(instrument)
+                dateTimes = barDS.getDateTimes()
+                for i in xrange(len(barDS) - 1, -1, -1):
+                    if dateTimes[i] <= options.expiry_datetime(expiry, dateTimes[i].tzinfo):
+                        ret = barDS[i]
+                        break
+        return ret
+
+    def __getIntrinsicValue(self, instrument, bars):
+        right, strike, expiry = self.__contracts[instrument]
+        underlying = self.__underlyings.get(instrument)
+        if underlying is not None:
+            bar_ = self.__getSettlementBar(bars, underlying, expiry)
+            if bar_ is None:
+                ret = None
+            elif right == optbroker.OptionOrder.Right.CALL:
+                ret = max(bar_.getClose(self.getUseAdjustedValues()) - strike, 0)
+            else:
+                ret = max(strike - bar_.getClose(self.getUseAdjustedValues()), 0)
+        else:
+            bar_ = self.__getSettlementBar(bars, instrument, expiry)
+            ret = None if bar_ is None else bar_.getClose(self.getUseAdjustedValues())
+        return ret
+
+    def __fillSettlementOrder(self, order, price, dateTime):
+        order.setSubmitted(self._getNextOrderId(), dateTime)
+        order.switchState(broker.Order.State.SUBMITTED)
+        order.setAcceptedDateTime(dateTime)
+        order.switchState(broker.Order.State.ACCEPTED)
+
+        quantity = order.getQuantity()
+        if order.isBuy():
+            cost = price * quantity * -1
+            sharesDelta = quantity
+        else:
+            cost = price * quantity
+            sharesDelta = quantity * -1
+
+        # Settlements are not charged commissions and don't go through the fill strategy.
+        orderExecutionInfo = broker.OrderExecutionInfo(price, quantity, 0, dateTime)
+        order.addExecutionInfo(orderExecutionInfo)
+        self.__cash += cost
+        self.__updateShares(order.getInstrument(), sharesDelta, order.getInstrumentTraits())
+        self.notifyOrderEvent(broker.OrderEvent(order, broker.OrderEvent.Type.FILLED, orderExecutionInfo))
+
+    def __settle(self, instrument, bars):
+        # Orders for the contract, and combos with a leg on it, can't be filled anymore.
+        for order in self.__getActiveOrdersForContract(instrument):
+            self._unregisterOrder(order)
+            order.switchState(broker.Order.State.CANCELED)
+            self.notifyOrderEvent(broker.OrderEvent(order, broker.OrderEvent.Type.CANCELED, "Option expired"))
+
+        shares = self.__shares.get(instrument, 0)
+        if self.__settlementType == OptionBroker.SettlementType.NONE or shares == 0:
+            return
+
+        right, strike, expiry = self.__contracts[instrument]
+        underlying = self.__underlyings.get(instrument)
+        intrinsicValue = self.__getIntrinsicValue(instrument, bars)
+        if intrinsicValue is None:
+            self.__logger.warning("No price available to settle %s. Expiring it worthless" % (instrument))
+            intrinsicValue = 0
+
+        # The contract is closed at the intrinsic value.
+        dateTime = bars.getDateTime()
+        if shares > 0:
+            action = broker.Order.Action.SELL
+        else:
+            action = broker.Order.Action.BUY_TO_COVER
+        order = OptionSettlementOrder(action, instrument, abs(shares), right, strike, expiry,
+                                      self.getInstrumentTraits(instrument))
+        self.__fillSettlementOrder(order, intrinsicValue, dateTime)
+        self.__logger.debug("%s expired. %s share/s settled at %s" % (instrument, shares, intrinsicValue))
+
+        if self.__settlementType == OptionBroker.SettlementType.EXERCISE and underlying is not None and intrinsicValue > 0:
+            # Long calls and short puts end up buying the underlying at the strike price. Together with the intrinsic
+            # value collected when closing the contract, that's the same as trading the underlying at its price.
+            if right == optbroker.OptionOrder.Right.CALL:
+                underlyingDelta = shares
+                underlyingPrice = strike + intrinsicValue
+            else:
+                underlyingDelta = -shares
+                underlyingPrice = strike - intrinsicValue
+            if underlyingDelta > 0:
+                action = broker.Order.Action.BUY
+            else:
+                action = broker.Order.Action.SELL
+            order = backtesting.MarketOrder(action, underlying, abs(underlyingDelta), False,
+                                            self.getInstrumentTraits(underlying))
+            self.__fillSettlementOrder(order, underlyingPrice, dateTime)
+            self.__logger.debug("%s expired. %s share/s of %s exercised at %s" % (
+                instrument, underlyingDelta, underlying, strike
+            ))
+
+    def __getActiveOrdersForContract(self, instrument):
+        ret = []
+        for order in self.__activeOrders.values():
+            if isinstance(order, optbroker.OptionComboOrder):
+                if instrument in [leg.getInstrument() for leg in order.getLegs()]:
+                    ret.append(order)
+            elif order.getInstrument() == instrument:
+                ret.append(order)
+        return ret
+
+    def __settleExpired(self, bars, dateTime, inclusive):
+        while len(self.__expirySchedule):
+            expiry = options.expiry_datetime(self.__expirySchedule[0][0], dateTime.tzinfo)
+            if expiry > dateTime or (expiry == dateTime and not inclusive):
+                break
+            expiry, instrument = heapq.heappop(self.__expirySchedule)
+            self.__settle(instrument, bars)
+            del self.__contracts[instrument]
+            surface_ = self.__surfaces.get(self.__underlyings.get(instrument))
+            if surface_ is not None:
+                surface_.removeContract(instrument)
+
+    def getRiskAggregator(self):
+        """Returns the :class:`pyalgotrade.options.risk.RiskAggregator` that keeps the net greeks for the positions
+        held. It is created the first time it is requested, and from then on it gets updated on every fill and bar."""
+        if self.__riskAggregator is None:
+            self.__riskAggregator = risk.RiskAggregator(self)
+        return self.__riskAggregator
 
     def resetShares(self, instrument):
         self.__shares[instrument] = 0
@@ -149,6 +394,11 @@ class OptionBroker(optbroker.AbstractOptionBroker):
         return OptionStopLimitOrder(action, instrument, stopPrice, limitPrice, quantity, right, strike, expiry,
                                     self.getInstrumentTraits(instrument))
 
+    def createOptionComboOrder(self, action, legs, quantity, limitPrice=None):
+        if action not in [broker.Order.Action.BUY, broker.Order.Action.SELL]:
+            raise Exception("Only BUY/SELL orders are supported for combos")
+        return OptionComboOrder(action, legs, quantity, limitPrice, self.getInstrumentTraits(legs[0].getInstrument()))
+
     def cancelOption(self, order):
         self._unregisterOrder(order)
 
@@ -267,6 +517,77 @@ class OptionBroker(optbroker.AbstractOptionBroker):
         """Returns the portfolio value (cash + shares)."""
         return self.__getEquityWithBars(self.__barFeed.getCurrentBars())
 
+    def __updateShares(self, instrument, sharesDelta, instrumentTraits):
+        updatedShares = instrumentTraits.roundQuantity(self.getShares(instrument) + sharesDelta)
+        if updatedShares == 0:
+            del self.__shares[instrument]
+        else:
+            self.__shares[instrument] = updatedShares
+        if self.__riskAggregator is not None:
+            self.__riskAggregator.update(instrument)
+
+    def __notifyOrderExecution(self, order, orderExecutionInfo):
+        # Let the strategy know that the order was filled.
+        self.__fillStrategy.onOrderFilled(self, order)
+
+        # Notify the order update
+        if order.isFilled():
+            self._unregisterOrder(order)
+            self.notifyOrderEvent(broker.OrderEvent(order, broker.OrderEvent.Type.FILLED, orderExecutionInfo))
+        elif order.isPartiallyFilled():
+            self.notifyOrderEvent(
+                broker.OrderEvent(order, broker.OrderEvent.Type.PARTIALLY_FILLED, orderExecutionInfo)
+            )
+        else:
+            assert(False)
+
+    def commitComboExecution(self, order, dateTime, fillInfo):
+        """Tries to commit the execution of all the legs of a combo order at once.
+
+        :param order: The combo order.
+        :type order: :class:`OptionComboOrder`.
+        :param dateTime: The execution datetime.
+        :type dateTime: datetime.datetime.
+        :param fillInfo: The fill prices and quantity.
+        :type fillInfo: :class:`pyalgotrade.broker.optbroker.optfillstrategy.ComboFillInfo`.
+        """
+        quantity = fillInfo.getQuantity()
+        direction = 1 if order.isBuy() else -1
+        legs = order.getLegs()
+        legPrices = fillInfo.getLegPrices()
+        legQuantities = [abs(leg.getRatio()) * quantity for leg in legs]
+        legCommissions = self.getCommission().calculateBatch([order] * len(legs), legPrices, legQuantities)
+        cost = 0
+        commission = 0
+        legExecutionInfo = []
+        for leg, price, legQuantity, legCommission in zip(legs, legPrices, legQuantities, legCommissions):
+            legCommission = float(legCommission)
+            cost -= direction * leg.getRatio() * quantity * price
+            commission += legCommission
+            legExecutionInfo.append(broker.OrderExecutionInfo(price, legQuantity, legCommission, dateTime))
+        cost -= commission
+        resultingCash = self.getCash() + cost
+
+        # Check that we're ok on cash after the commission.
+        if resultingCash >= 0 or self.__allowNegativeCash:
+            orderExecutionInfo = broker.OrderExecutionInfo(fillInfo.getPrice(), quantity, commission, dateTime)
+            order.addExecutionInfo(orderExecutionInfo)
+            order.setLegExecutionInfo(legExecutionInfo)
+
+            # Commit the executions for all the legs.
+            self.__cash = resultingCash
+            for leg in order.getLegs():
+                self.__updateShares(
+                    leg.getInstrument(), direction * leg.getRatio() * quantity, order.getInstrumentTraits()
+                )
+            self.__notifyOrderExecution(order, orderExecutionInfo)
+        else:
+            self.__logger.debug("Not enough cash to fill %s combo order [%s] for %s unit/s" % (
+                order.getInstrument(),
+                order.getId(),
+                order.getRemaining()
+            ))
+
     # Tries to commit an order execution.
     def commitOrderExecution(self, order, dateTime, fillInfo):
         price = fillInfo.getPrice()
@@ -297,27 +618,8 @@ class OptionBroker(optbroker.AbstractOptionBroker):
 
             # Commit the order execution.
             self.__cash = resultingCash
-            updatedShares = order.getInstrumentTraits().roundQuantity(
-                self.getShares(order.getInstrument()) + sharesDelta
-            )
-            if updatedShares == 0:
-                del self.__shares[order.getInstrument()]
-            else:
-                self.__shares[order.getInstrument()] = updatedShares
-
-            # Let the strategy know that the order was filled.
-            self.__fillStrategy.onOrderFilled(self, order)
-
-            # Notify the order update
-            if order.isFilled():
-                self._unregisterOrder(order)
-                self.notifyOrderEvent(broker.OrderEvent(order, broker.OrderEvent.Type.FILLED, orderExecutionInfo))
-            elif order.isPartiallyFilled():
-                self.notifyOrderEvent(
-                    broker.OrderEvent(order, broker.OrderEvent.Type.PARTIALLY_FILLED, orderExecutionInfo)
-                )
-            else:
-                assert(False)
+            self.__updateShares(order.getInstrument(), sharesDelta, order.getInstrumentTraits())
+            self.__notifyOrderExecution(order, orderExecutionInfo)
         else:
             self.__logger.debug("Not enough cash to fill %s order [%s] for %s share/s" % (
                 order.getInstrument(),
@@ -329,6 +631,11 @@ class OptionBroker(optbroker.AbstractOptionBroker):
         if order.isInitial():
             order.setSubmitted(self._getNextOrderId(), self._getCurrentDateTime())
             self._registerOrder(order)
+            if isinstance(order, optbroker.OptionOrder):
+                self.__registerContract(order.getInstrument(), order.getRight(), order.getStrike(), order.getExpiry())
+            elif isinstance(order, optbroker.OptionComboOrder):
+                for leg in order.getLegs():
+                    self.__registerContract(leg.getInstrument(), leg.getRight(), leg.getStrike(), leg.getExpiry())
             # Switch from INITIAL -> SUBMITTED
             order.switchState(broker.Order.State.SUBMITTED)
             self.notifyOrderEvent(broker.OrderEvent(order, broker.OrderEvent.Type.SUBMITTED, None))
@@ -341,7 +648,7 @@ class OptionBroker(optbroker.AbstractOptionBroker):
 
         # For non-GTC orders we need to check if the order has expired.
         if not order.getGoodTillCanceled():
-            expired = bar_.getDateTime().date() > order.getAcceptedDateTime().date()
+            expired = self.isOrderExpired(order, bar_)
 
             # Cancel the order if it is expired.
             if expired:
@@ -366,14 +673,19 @@ class OptionBroker(optbroker.AbstractOptionBroker):
                 order.switchState(broker.Order.State.CANCELED)
                 self.notifyOrderEvent(broker.OrderEvent(order, broker.OrderEvent.Type.CANCELED, "Expired"))
 
-    def __processOrder(self, order, bar_):
+    def __processOrder(self, order, bar_, bars):
         if not self.__preProcessOrder(order, bar_):
             return
 
         # Double dispatch to the fill strategy using the concrete order type.
-        fillInfo = order.process(self, bar_)
-        if fillInfo is not None:
-            self.commitOrderExecution(order, bar_.getDateTime(), fillInfo)
+        if isinstance(order, optbroker.OptionComboOrder):
+            fillInfo = order.process(self, bars)
+            if fillInfo is not None:
+                self.commitComboExecution(order, bar_.getDateTime(), fillInfo)
+        else:
+            fillInfo = order.process(self, bar_)
+            if fillInfo is not None:
+                self.commitOrderExecution(order, bar_.getDateTime(), fillInfo)
 
         if order.isActive():
             self.__postProcessOrder(order, bar_)
@@ -381,7 +693,12 @@ class OptionBroker(optbroker.AbstractOptionBroker):
     def __onBarsImpl(self, order, bars):
         # IF WE'RE DEALING WITH MULTIPLE INSTRUMENTS WE SKIP ORDER PROCESSING IF THERE IS NO BAR FOR THE ORDER'S
         # INSTRUMENT TO GET THE SAME BEHAVIOUR AS IF WERE BE PROCESSING ONLY ONE INSTRUMENT.
-        bar_ = bars.getBar(order.getInstrument())
+        # Combo orders get processed only if there are bars for all the legs.
+        if isinstance(order, optbroker.OptionComboOrder):
+            legBars = [bars.getBar(leg.getInstrument()) for leg in order.getLegs()]
+            bar_ = None if None in legBars else legBars[0]
+        else:
+            bar_ = bars.getBar(order.getInstrument())
         if bar_ is not None:
             # Switch from SUBMITTED -> ACCEPTED
             if order.isSubmitted():
@@ -391,7 +708,7 @@ class OptionBroker(optbroker.AbstractOptionBroker):
 
             if order.isActive():
                 # This may trigger orders to be added/removed from __activeOrders.
-                self.__processOrder(order, bar_)
+                self.__processOrder(order, bar_, bars)
             else:
                 # If an order is not active it should be because it was canceled in this same loop and it should
                 # have been removed.
@@ -399,6 +716,9 @@ class OptionBroker(optbroker.AbstractOptionBroker):
                 assert(order not in self.__activeOrders)
 
     def onBars(self, dateTime, bars):
+        # Contracts that expired before these bars can't be traded anymore.
+        self.__settleExpired(bars, dateTime, False)
+
         # Let the fill strategy know that new bars are being processed.
         self.__fillStrategy.onBars(self, bars)
 
@@ -410,6 +730,12 @@ class OptionBroker(optbroker.AbstractOptionBroker):
             # This may trigger orders to be added/removed from __activeOrders.
             self.__onBarsImpl(order, bars)
 
+        # Contracts that expire within these bars are settled once the orders were processed.
+        self.__settleExpired(bars, self.__getBarEnd(dateTime), True)
+
+        if self.__riskAggregator is not None:
+            self.__riskAggregator.refresh()
+
     def start(self):
         super(OptionBroker, self).start()
 
@@ -21,9 +21,29 @@
 import abc
 
 from pyalgotrade.broker import fillstrategy
+from pyalgotrade.broker import optbroker
 import pyalgotrade.bar
 
 
+class ComboFillInfo(fillstrategy.FillInfo):
+    """The fill for a combo order.
+
+    :param price: The net price for one combo unit.
+    :type price: float.
+    :param quantity: The number of combo units.
+    :type quantity: int/float.
+    :param legPrices: The price for each leg, in the same order as the legs.
+    :type legPrices: list.
+    """
+
+    def __init__(self, price, quantity, legPrices):
+        super(ComboFillInfo, self).__init__(price, quantity)
+        self.__legPrices = legPrices
+
+    def getLegPrices(self):
+        return self.__legPrices
+
+
 class OptionFillStrategy(fillstrategy.FillStrategy):
     def __init__(self):
         super(OptionFillStrategy, self).__init__()
@@ -88,6 +108,21 @@ class OptionFillStrategy(fillstrategy.FillStrategy):
         """
         raise NotImplementedError()
 
+    @abc.abstractmethod
+    def fillComboOrder(self, broker_, order, bars):
+        """Override to return the fill prices and quantity for a combo order or None if the order can't be filled
+        at the given time. All the legs must be filled at once.
+
+        :param broker_: The broker.
+        :type broker_: :class:`Broker`
+        :param order: The order.
+        :type order: :class:`pyalgotrade.broker.optbroker.OptionComboOrder`
+        :param bars: The current bars, with a bar for every leg.
+        :type bars: :class:`pyalgotrade.bar.Bars`
+        :rtype: A :class:`ComboFillInfo` or None if the order should not be filled.
+        """
+        raise NotImplementedError()
+
 
 class OptionDefaultStrategy(OptionFillStrategy, fillstrategy.DefaultStrategy):
     """
@@ -103,6 +138,89 @@ class OptionDefaultStrategy(OptionFillStrategy, fillstrategy.DefaultStrategy):
         OptionFillStrategy.__init__(self)
         fillstrategy.DefaultStrategy.__init__(self, volumeLimit)
 
+    def onOrderFilled(self, broker_, order):
+        if not isinstance(order, optbroker.OptionComboOrder):
+            fillstrategy.DefaultStrategy.onOrderFilled(self, broker_, order)
+            return
+
+        # Update the volume left and used for every leg.
+        traits = order.getInstrumentTraits()
+        for leg, legExecutionInfo in zip(order.getLegs(), order.getLegExecutionInfo()):
+            instrument = leg.getInstrument()
+            fillQuantity = legExecutionInfo.getQuantity()
+            if self.getVolumeLimit() is not None:
+                volumeLeft = traits.roundQuantity(self._volumeLeft[instrument])
+                assert volumeLeft >= fillQuantity, \
+                    "Invalid fill quantity %s. Not enough volume left %s" % (fillQuantity, volumeLeft)
+                self._volumeLeft[instrument] = traits.roundQuantity(volumeLeft - fillQuantity)
+            self._volumeUsed[instrument] = traits.roundQuantity(self._volumeUsed[instrument] + fillQuantity)
+
+    # Returns the volume that combo orders can still take for an instrument.
+    def _getVolumeLeft(self, instrument):
+        return self._volumeLeft.get(instrument, 0)
+
+    def __calculateComboFillSize(self, order):
+        ret = order.getRemaining()
+        if self.getVolumeLimit() is not None:
+            for leg in order.getLegs():
+                legUnits = order.getInstrumentTraits().roundQuantity(
+                    self._getVolumeLeft(leg.getInstrument()) / float(abs(leg.getRatio()))
+                )
+                ret = min(ret, legUnits)
+
+        if order.getAllOrNone() and ret < order.getRemaining():
+            ret = 0
+        return ret
+
+    def __slipLegPrices(self, order, bars, legPrices, fillSize):
+        # Every leg is slipped in the direction it gets traded, all at once.
+        legs = order.getLegs()
+        actions = []
+        for leg in legs:
+            if (leg.getRatio() > 0) == order.isBuy():
+                actions.append(optbroker.Order.Action.BUY)
+            else:
+                actions.append(optbroker.Order.Action.SELL)
+        return [
+            float(price) for price in self._slippageModel.calculatePriceBatch(
+                [order] * len(legs), legPrices, [abs(leg.getRatio()) * fillSize for leg in legs],
+                [bars[leg.getInstrument()] for leg in legs],
+                [self._volumeUsed.get(leg.getInstrument(), 0) for leg in legs], actions
+            )
+        ]
+
+    def fillComboOrder(self, broker_, order, bars):
+        """Combo orders are filled like this:
+
+        * Market combos are filled using the open price of every leg, slipped in the direction each leg is traded.
+        * Limit combos are filled using the open price of every leg if the net price at the open satisfies the limit
+          price, or else using the close price of every leg if the net price at the close does.
+        * The fill size is limited by the volume available for every leg.
+        """
+        fillSize = self.__calculateComboFillSize(order)
+        if fillSize == 0:
+            broker_.getLogger().debug("Not enough volume to fill %s combo order [%s] for %s unit/s" % (
+                order.getInstrument(), order.getId(), order.getRemaining()
+            ))
+            return None
+
+        useAdjustedValues = broker_.getUseAdjustedValues()
+        ret = None
+        for priceMethod in ("getOpen", "getClose"):
+            legPrices = [
+                getattr(bars[leg.getInstrument()], priceMethod)(useAdjustedValues) for leg in order.getLegs()
+            ]
+            limitPrice = order.getLimitPrice()
+            if limitPrice is None and bars[order.getLegs()[0].getInstrument()].getFrequency() != \
+                    pyalgotrade.bar.Frequency.TRADE:
+                legPrices = self.__slipLegPrices(order, bars, legPrices, fillSize)
+            netPrice = sum(leg.getRatio() * price for leg, price in zip(order.getLegs(), legPrices))
+            if limitPrice is None or (order.isBuy() and netPrice <= limitPrice) or \
+                    (order.isSell() and netPrice >= limitPrice):
+                ret = ComboFillInfo(netPrice, fillSize, legPrices)
+                break
+        return ret
+
     def fillOptionMarketOrder(self, broker_, order, bar):
         # Calculate the fill size for the order.
         fillSize = self._calculateFillSize(broker_, order, bar)
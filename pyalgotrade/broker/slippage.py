@@ -20,6 +20,14 @@
 
 import abc
 
+import numpy as np
+
+from pyalgotrade import broker
+
+
+def _is_buy(action):
+    return action in [broker.Order.Action.BUY, broker.Order.Action.BUY_TO_COVER]
+
 
 class SlippageModel(object):
     """Base class for slippage models.
@@ -49,6 +57,38 @@ class SlippageModel(object):
         """
         raise NotImplementedError()
 
+    def calculatePriceBatch(self, orders, prices, quantities, bars, volumesUsed, actions=None):
+        """
+        Returns the slipped price per share for many orders at once.
+        Override to provide a vectorized implementation. The default implementation calls :meth:`calculatePrice` for
+        each order.
+
+        :param orders: The orders being filled.
+        :type orders: list of :class:`pyalgotrade.broker.Order`.
+        :param prices: The price for each share before slippage, one per order.
+        :type prices: sequence of floats.
+        :param quantities: The amount of shares that will get filled at this time, one per order.
+        :type quantities: sequence of floats.
+        :param bars: The current bar for each order's instrument.
+        :type bars: list of :class:`pyalgotrade.bar.Bar`.
+        :param volumesUsed: The volume size that was taken so far from each bar.
+        :type volumesUsed: sequence of floats.
+        :param actions: If set, the direction of each fill, that may not match the order's action. For example, the legs
+            of a combo order.
+        :type actions: list of :class:`pyalgotrade.broker.Order.Action`.
+        :rtype: numpy.array with one slipped price per order.
+
+        .. note::
+            :meth:`calculatePrice` can only tell the direction from the order, so the default implementation returns
+            the prices unslipped if actions are set.
+        """
+        if actions is not None:
+            return np.array(prices, dtype=float)
+        return np.array([
+            self.calculatePrice(order, price, quantity, bar, volumeUsed)
+            for order, price, quantity, bar, volumeUsed in zip(orders, prices, quantities, bars, volumesUsed)
+        ], dtype=float)
+
 
 class NoSlippage(SlippageModel):
     """A no slippage model."""
@@ -56,6 +96,9 @@ class NoSlippage(SlippageModel):
     def calculatePrice(self, order, price, quantity, bar, volumeUsed):
         return price
 
+    def calculatePriceBatch(self, orders, prices, quantities, bars, volumesUsed, actions=None):
+        return np.array(prices, dtype=float)
+
 
 class VolumeShareSlippage(SlippageModel):
     """
@@ -84,3 +127,15 @@ class VolumeShareSlippage(SlippageModel):
         else:
             ret = price * (1 - impactPct)
         return ret
+
+    def calculatePriceBatch(self, orders, prices, quantities, bars, volumesUsed, actions=None):
+        volumes = np.array([bar.getVolume() for bar in bars], dtype=float)
+        assert np.all(volumes), "Can't use 0 volume bars with VolumeShareSlippage"
+
+        totalVolume = np.asarray(volumesUsed, dtype=float) + np.asarray(quantities, dtype=float)
+        impactPct = (totalVolume / volumes) ** 2 * self.__priceImpact
+        if actions is None:
+            buys = np.array([order.isBuy() for order in orders], dtype=bool)
+        else:
+            buys = np.array([_is_buy(action) for action in actions], dtype=bool)
+        return np.asarray(prices, dtype=float) * np.where(buys, 1 + impactPct, 1 - impactPct)
@@ -0,0 +1,442 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import abc
+import csv
+
+from pyalgotrade import broker
+from pyalgotrade import resamplebase
+from pyalgotrade.broker import fillstrategy
+from pyalgotrade.broker import optbroker
+from pyalgotrade.broker.optbroker import optfillstrategy
+from pyalgotrade.utils import dt
+import pyalgotrade.bar
+
+
+# Returns the price at which the limit price gets penetrated when moving from prevPrice to price, or None.
+# prevPrice is None for the first tick in the bar.
+def get_limit_price_cross(action, limitPrice, prevPrice, price, continuous):
+    ret = None
+    if action in [broker.Order.Action.BUY, broker.Order.Action.BUY_TO_COVER]:
+        if price <= limitPrice:
+            ret = limitPrice if continuous and prevPrice is not None else price
+    elif action in [broker.Order.Action.SELL, broker.Order.Action.SELL_SHORT]:
+        if price >= limitPrice:
+            ret = limitPrice if continuous and prevPrice is not None else price
+    else:  # Unknown action
+        assert(False)
+    return ret
+
+
+# Returns the price at which the stop price gets penetrated when moving from prevPrice to price, or None.
+# prevPrice is None for the first tick in the bar.
+def get_stop_price_cross(action, stopPrice, prevPrice, price, continuous):
+    ret = None
+    if action in [broker.Order.Action.BUY, broker.Order.Action.BUY_TO_COVER]:
+        if price >= stopPrice:
+            ret = stopPrice if continuous and prevPrice is not None else price
+    elif action in [broker.Order.Action.SELL, broker.Order.Action.SELL_SHORT]:
+        if price <= stopPrice:
+            ret = stopPrice if continuous and prevPrice is not None else price
+    else:  # Unknown action
+        assert(False)
+    return ret
+
+
+class TickSource(object):
+    """Base class for sources of intra-bar price paths.
+
+    .. note::
+        This is a base class and should not be used directly.
+    """
+
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def isContinuous(self):
+        """Returns True if prices move continuously between ticks, or False if they can jump from one tick to the
+        next one (like real trades)."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def getTicks(self, instrument, bar, useAdjustedValues):
+        """Returns an iterable of (datetime, price, volume) tuples, in chronological order, with the trading activity
+        summarized by a bar.
+
+        :param instrument: Instrument identifier.
+        :type instrument: string.
+        :param bar: The bar.
+        :type bar: :class:`pyalgotrade.bar.Bar`.
+        :param useAdjustedValues: True if adjusted values should be used.
+        :type useAdjustedValues: boolean.
+        """
+        raise NotImplementedError()
+
+
+class OHLCPathSource(TickSource):
+    """A :class:`TickSource` that builds a synthetic path from the bar's open, high, low and close prices.
+
+    :param highFirst: True to use an O->H->L->C path, False to use an O->L->H->C path. If None, bars that close below
+        the open use O->H->L->C and the rest use O->L->H->C.
+    :type highFirst: boolean.
+    """
+
+    def __init__(self, highFirst=None):
+        super(OHLCPathSource, self).__init__()
+        self.__highFirst = highFirst
+
+    def isContinuous(self):
+        return True
+
+    def getTicks(self, instrument, bar, useAdjustedValues):
+        open_ = bar.getOpen(useAdjustedValues)
+        high = bar.getHigh(useAdjustedValues)
+        low = bar.getLow(useAdjustedValues)
+        close = bar.getClose(useAdjustedValues)
+
+        highFirst = self.__highFirst
+        if highFirst is None:
+            highFirst = close < open_
+        if highFirst:
+            prices = [open_, high, low, close]
+        else:
+            prices = [open_, low, high, close]
+
+        dateTime = bar.getDateTime()
+        volume = bar.getVolume() / float(len(prices))
+        return [(dateTime, price, volume) for price in prices]
+
+
+class _TickCursor(object):
+    def __init__(self, path):
+        self.__file = open(path, "r")
+        self.__reader = csv.reader(self.__file, delimiter=",")
+        self.__next = None
+        self.__eof = False
+        # Skip the header, if there is one.
+        row = self.__readNext()
+        if row is not None and not row[0].replace(".", "", 1).isdigit():
+            row = self.__readNext()
+        self.__setNext(row)
+
+    def __setNext(self, row):
+        if row is not None:
+            self.__next = (float(row[0]), float(row[1]), float(row[2]))
+
+    def __readNext(self):
+        row = next(self.__reader, None)
+        while row == []:
+            row = next(self.__reader, None)
+        if row is None:
+            self.__eof = True
+            self.__file.close()
+        return row
+
+    def peek(self):
+        if self.__next is None and not self.__eof:
+            self.__setNext(self.__readNext())
+        return self.__next
+
+    def pop(self):
+        ret = self.peek()
+        self.__next = None
+        return ret
+
+
+class CSVTickSource(TickSource):
+    """A :class:`TickSource` that streams trades from CSV files like the ones described in
+    http://www.bitcoincharts.com/about/markets-api/ (unixtime,price,amount).
+
+    Files are read lazily, one bar at a time, so only the trades for the bar being processed are kept in memory.
+
+    .. note::
+        * Files must be sorted with the **unixtime** column in ascending order.
+        * Bars are expected to be processed in chronological order.
+    """
+
+    def __init__(self):
+        super(CSVTickSource, self).__init__()
+        self.__paths = {}
+        self.__cursors = {}
+
+    def addTicksFromCSV(self, instrument, path):
+        """Registers a file with trades for a given instrument.
+
+        :param instrument: Instrument identifier.
+        :type instrument: string.
+        :param path: The path to the file.
+        :type path: string.
+        """
+        self.__paths[instrument] = path
+
+    def isContinuous(self):
+        return False
+
+    def getTicks(self, instrument, bar, useAdjustedValues):
+        # A trade bar has no trading activity inside to replay.
+        if bar.getFrequency() == pyalgotrade.bar.Frequency.TRADE:
+            return
+
+        cursor = self.__cursors.get(instrument)
+        if cursor is None:
+            path = self.__paths.get(instrument)
+            if path is None:
+                return
+            cursor = _TickCursor(path)
+            self.__cursors[instrument] = cursor
+
+        timeRange = resamplebase.build_range(bar.getDateTime(), bar.getFrequency())
+        begin = dt.datetime_to_timestamp(timeRange.getBeginning())
+        end = dt.datetime_to_timestamp(timeRange.getEnding())
+        localized = not dt.datetime_is_naive(bar.getDateTime())
+
+        # Skip trades that took place before the bar.
+        tick = cursor.peek()
+        while tick is not None and tick[0] < begin:
+            cursor.pop()
+            tick = cursor.peek()
+
+        while tick is not None and tick[0] < end:
+            cursor.pop()
+            yield (dt.timestamp_to_datetime(tick[0], localized), tick[1], tick[2])
+            tick = cursor.peek()
+
+
+class TickReplayStrategy(optfillstrategy.OptionDefaultStrategy):
+    """
+    A fill strategy that replays the price path inside each bar to fill orders in the order in which they would have
+    been triggered.
+
+    :param tickSource: The source for the price path inside each bar. If None, an :class:`OHLCPathSource` is used.
+    :type tickSource: :class:`TickSource`.
+    :param volumeLimit: The proportion of the volume that orders can take up in a bar. Must be > 0 and <= 1.
+        If None, then volume limit is not checked.
+    :type volumeLimit: float
+
+    This strategy works as follows:
+
+    * When new bars arrive, the price path for each instrument with active orders is walked once and each order is
+      filled at the first tick that triggers it. The volume available in the bar is taken by the orders in the same
+      order.
+    * A :class:`pyalgotrade.broker.MarketOrder` is filled using the first tick, or the last one if it is a
+      market-on-close order.
+    * A :class:`pyalgotrade.broker.LimitOrder` is filled at the first tick that penetrates the limit price.
+    * A :class:`pyalgotrade.broker.StopOrder` is filled at the first tick that penetrates the stop price.
+    * A :class:`pyalgotrade.broker.StopLimitOrder` becomes a limit order at the first tick that penetrates the stop
+      price, and the limit price is checked from that tick onwards.
+    * If the price path is continuous, like the synthetic path built by :class:`OHLCPathSource`, orders triggered
+      after the first tick get filled at the limit/stop price. Otherwise the price for the triggering tick is used.
+    * If the tick source has no ticks for a bar, the :class:`OHLCPathSource` path is used instead.
+    * A :class:`pyalgotrade.broker.optbroker.OptionComboOrder` has no single price path to replay, so it is filled
+      like :class:`pyalgotrade.broker.optbroker.optfillstrategy.OptionDefaultStrategy` does, using the volume left
+      by the other orders.
+
+    .. note::
+        * It uses :class:`pyalgotrade.broker.slippage.NoSlippage` slippage model by default.
+        * Option orders are supported as well, so it can also be used with
+          :class:`pyalgotrade.broker.optbroker.optbacktesting.OptionBroker`.
+    """
+
+    def __init__(self, tickSource=None, volumeLimit=0.25):
+        super(TickReplayStrategy, self).__init__(volumeLimit)
+        if tickSource is None:
+            tickSource = OHLCPathSource()
+        self.__tickSource = tickSource
+        self.__fallbackSource = OHLCPathSource()
+        self.__fills = {}
+        self.__reserved = {}
+
+    def getTickSource(self):
+        return self.__tickSource
+
+    def onBars(self, broker_, bars):
+        super(TickReplayStrategy, self).onBars(broker_, bars)
+        self.__fills = {}
+        self.__reserved = {}
+
+        ordersByInstrument = {}
+        comboOrders = []
+        for order in broker_.getActiveOrders():
+            # Orders that the broker is going to cancel don't take any volume.
+            if isinstance(order, optbroker.OptionComboOrder):
+                legBars = [bars.getBar(leg.getInstrument()) for leg in order.getLegs()]
+                if None not in legBars and not broker_.isOrderExpired(order, legBars[0]):
+                    comboOrders.append(order)
+            else:
+                bar = bars.getBar(order.getInstrument())
+                if bar is not None and not broker_.isOrderExpired(order, bar):
+                    ordersByInstrument.setdefault(order.getInstrument(), []).append(order)
+
+        for instrument, orders in ordersByInstrument.iteritems():
+            self.__replay(broker_, instrument, bars[instrument], orders)
+
+        # Combos take the volume left once the price paths were replayed.
+        for order in comboOrders:
+            fillInfo = super(TickReplayStrategy, self).fillComboOrder(broker_, order, bars)
+            if fillInfo is not None:
+                self.__fills[order.getId()] = fillInfo
+                for leg in order.getLegs():
+                    self.__reserve(order, leg.getInstrument(), abs(leg.getRatio()) * fillInfo.getQuantity())
+
+    def __reserve(self, order, instrument, quantity):
+        self.__reserved[instrument] = order.getInstrumentTraits().roundQuantity(
+            self.__reserved.get(instrument, 0) + quantity
+        )
+
+    def _getVolumeLeft(self, instrument):
+        return super(TickReplayStrategy, self)._getVolumeLeft(instrument) - self.__reserved.get(instrument, 0)
+
+    def __replay(self, broker_, instrument, bar, orders):
+        useAdjustedValues = broker_.getUseAdjustedValues()
+        pending = [_PendingOrder(order) for order in orders]
+        onClose = [pendingOrder for pendingOrder in pending if pendingOrder.isMarketOnClose()]
+        pending = [pendingOrder for pendingOrder in pending if not pendingOrder.isMarketOnClose()]
+        volumeLeft = self._volumeLeft.get(instrument, 0)
+        volumeUsed = self._volumeUsed.get(instrument, 0)
+
+        source = self.__tickSource
+        ticks = source.getTicks(instrument, bar, useAdjustedValues)
+        lastPrice = self.__replayTicks(broker_, bar, pending, onClose, ticks, source.isContinuous(), volumeLeft, volumeUsed)
+        if lastPrice is None:
+            source = self.__fallbackSource
+            ticks = source.getTicks(instrument, bar, useAdjustedValues)
+            self.__replayTicks(broker_, bar, pending, onClose, ticks, source.isContinuous(), volumeLeft, volumeUsed)
+
+    # Returns the last price replayed, or None if there were no ticks.
+    def __replayTicks(self, broker_, bar, pending, onClose, ticks, continuous, volumeLeft, volumeUsed):
+        prevPrice = None
+        for dateTime, price, volume in ticks:
+            stillPending = []
+            for pendingOrder in pending:
+                fillPrice = pendingOrder.getFillPrice(prevPrice, price, continuous)
+                if fillPrice is None:
+                    stillPending.append(pendingOrder)
+                else:
+                    volumeLeft, volumeUsed = self.__allocate(
+                        broker_, bar, pendingOrder, fillPrice, volumeLeft, volumeUsed
+                    )
+            pending[:] = stillPending
+            prevPrice = price
+
+            # Market-on-close orders need the whole path. Otherwise stop as soon as there is nothing left to check.
+            if len(pending) == 0 and len(onClose) == 0:
+                break
+
+        if prevPrice is not None:
+            for pendingOrder in onClose:
+                volumeLeft, volumeUsed = self.__allocate(broker_, bar, pendingOrder, prevPrice, volumeLeft, volumeUsed)
+        return prevPrice
+
+    def __allocate(self, broker_, bar, pendingOrder, price, volumeLeft, volumeUsed):
+        order = pendingOrder.getOrder()
+        traits = order.getInstrumentTraits()
+
+        # Calculate the fill size for the order, taking the volume in chronological order.
+        if self.getVolumeLimit() is not None:
+            maxVolume = traits.roundQuantity(volumeLeft)
+        else:
+            maxVolume = order.getRemaining()
+        fillSize = 0
+        if not order.getAllOrNone():
+            fillSize = min(maxVolume, order.getRemaining())
+        elif order.getRemaining() <= maxVolume:
+            fillSize = order.getRemaining()
+
+        if fillSize == 0:
+            broker_.getLogger().debug("Not enough volume to fill %s order [%s] for %s share/s" % (
+                order.getInstrument(),
+                order.getId(),
+                order.getRemaining()
+            ))
+        else:
+            # Don't slip prices when the bar represents the trading activity of a single trade.
+            if pendingOrder.canSlip() and bar.getFrequency() != pyalgotrade.bar.Frequency.TRADE:
+                price = self._slippageModel.calculatePrice(order, price, fillSize, bar, volumeUsed)
+            self.__fills[order.getId()] = fillstrategy.FillInfo(price, fillSize)
+            self.__reserve(order, order.getInstrument(), fillSize)
+            volumeLeft = traits.roundQuantity(volumeLeft - fillSize)
+            volumeUsed = traits.roundQuantity(volumeUsed + fillSize)
+        return volumeLeft, volumeUsed
+
+    def __getFill(self, order):
+        return self.__fills.pop(order.getId(), None)
+
+    def fillMarketOrder(self, broker_, order, bar):
+        return self.__getFill(order)
+
+    def fillLimitOrder(self, broker_, order, bar):
+        return self.__getFill(order)
+
+    def fillStopOrder(self, broker_, order, bar):
+        return self.__getFill(order)
+
+    def fillStopLimitOrder(self, broker_, order, bar):
+        return self.__getFill(order)
+
+    fillOptionMarketOrder = fillMarketOrder
+    fillOptionLimitOrder = fillLimitOrder
+    fillOptionStopOrder = fillStopOrder
+    fillOptionStopLimitOrder = fillStopLimitOrder
+
+    def fillComboOrder(self, broker_, order, bars):
+        return self.__getFill(order)
+
+
+class _PendingOrder(object):
+    def __init__(self, order):
+        self.__order = order
+        self.__stopPrice = order.getStopPrice() if hasattr(order, "getStopPrice") else None
+        self.__limitPrice = order.getLimitPrice() if hasattr(order, "getLimitPrice") else None
+        # Stop orders whose stop price was hit in a previous bar behave like market/limit orders.
+        if self.__stopPrice is not None and order.getStopHit():
+            self.__stopPrice = None
+        # The price at which the stop price was hit in this bar. Used to check the limit price from that point on.
+        self.__stopHitPrice = None
+
+    def getOrder(self):
+        return self.__order
+
+    def isMarketOnClose(self):
+        return self.__stopPrice is None and self.__limitPrice is None and self.__order.getFillOnClose()
+
+    def canSlip(self):
+        return self.__limitPrice is None
+
+    def getFillPrice(self, prevPrice, price, continuous):
+        action = self.__order.getAction()
+
+        if self.__stopPrice is not None and not self.__order.getStopHit():
+            stopHitPrice = get_stop_price_cross(action, self.__stopPrice, prevPrice, price, continuous)
+            if stopHitPrice is None:
+                return None
+            self.__order.setStopHit(True)
+            if self.__limitPrice is None:
+                return stopHitPrice
+            # Check the limit price starting from the price where the stop price was hit.
+            self.__stopHitPrice = stopHitPrice
+            return get_limit_price_cross(action, self.__limitPrice, None, stopHitPrice, continuous)
+
+        if self.__limitPrice is None:
+            return price if prevPrice is None else None
+
+        if self.__stopHitPrice is not None:
+            prevPrice = self.__stopHitPrice
+            self.__stopHitPrice = None
+        return get_limit_price_cross(action, self.__limitPrice, prevPrice, price, continuous)
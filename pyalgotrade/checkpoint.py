@@ -0,0 +1,223 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import copy
+import inspect
+import logging
+import pickle
+import types
+import zlib
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from StringIO import StringIO
+
+from pyalgotrade.barfeed import sharedbars
+
+
+# Checkpoints hold the state of a backtest (strategy, broker, feed cursors, analyzers, etc) but not the bars held in
+# memory by the bar feed. Those are referenced by position and taken from the bar feed supplied when restoring.
+
+def _get_bar_storage(barFeed):
+    ret = None
+    if barFeed is not None and hasattr(barFeed, "_getBars"):
+        ret = barFeed._getBars()
+    return ret
+
+
+# Returns (key, obj) tuples for the storage and every bar in it.
+def _iter_bars(storage):
+    yield ("bars",), storage
+    if isinstance(storage, sharedbars.SharedBars):
+        # Bars are built when accessed, so there are no bar objects to reference. Those held get saved by value.
+        pass
+    elif isinstance(storage, dict):
+        # pyalgotrade.barfeed.membf.BarFeed holds a list of bar.BasicBar per instrument.
+        for instrument, bars in storage.iteritems():
+            for i, bar_ in enumerate(bars):
+                yield ("bar", instrument, i), bar_
+    else:
+        # pyalgotrade.barfeed.OptimizerBarFeed holds a list of bar.Bars.
+        for i, bars in enumerate(storage):
+            yield ("bars", i), bars
+            for instrument in bars.getInstruments():
+                yield ("bar", i, instrument), bars[instrument]
+
+
+def _get_bar(storage, key):
+    if key == ("bars",):
+        ret = storage
+    elif key[0] == "bars":
+        ret = storage[key[1]]
+    else:
+        ret = storage[key[1]][key[2]]
+    return ret
+
+
+def _get_signature(storage):
+    if storage is None:
+        return None
+
+    def bars_range(bars):
+        if len(bars):
+            return (len(bars), bars[0].getDateTime(), bars[-1].getDateTime())
+        return (0, None, None)
+
+    if isinstance(storage, dict):
+        ret = sorted((instrument, bars_range(bars)) for instrument, bars in storage.iteritems())
+    else:
+        ret = bars_range(storage)
+    return ret
+
+
+def _get_loggers():
+    ret = [logging.getLogger()]
+    for logger in logging.Logger.manager.loggerDict.values():
+        if isinstance(logger, logging.Logger):
+            ret.append(logger)
+    return ret
+
+
+def _get_method_name(method):
+    name = method.im_func.__name__
+    obj = method.im_self
+    cls = obj if inspect.isclass(obj) else obj.__class__
+
+    candidates = [name]
+    # Private methods are looked up using the mangled name.
+    if name.startswith("__") and not name.endswith("__"):
+        candidates = ["_%s%s" % (klass.__name__.lstrip("_"), name) for klass in inspect.getmro(cls)]
+
+    for candidate in candidates:
+        if getattr(getattr(obj, candidate, None), "im_func", None) is method.im_func:
+            return candidate
+    raise pickle.PicklingError("Can't pickle %r" % method)
+
+
+class _Pickler(pickle.Pickler):
+    dispatch = pickle.Pickler.dispatch.copy()
+
+    def __init__(self, file, storage):
+        pickle.Pickler.__init__(self, file, pickle.HIGHEST_PROTOCOL)
+        self.__barKeys = {}
+        if storage is not None:
+            for key, obj in _iter_bars(storage):
+                self.__barKeys[id(obj)] = key
+
+    def persistent_id(self, obj):
+        # Loggers hold locks and are global anyway.
+        if isinstance(obj, logging.Logger):
+            if isinstance(obj, logging.RootLogger):
+                return ("logger", None)
+            return ("logger", obj.name)
+        key = self.__barKeys.get(id(obj))
+        if key is not None:
+            return key
+        return None
+
+    # Event handlers are bound methods, and those can't be pickled out of the box.
+    def save_method(self, obj):
+        if obj.im_self is None:
+            raise pickle.PicklingError("Can't pickle unbound method %r" % obj)
+        self.save_reduce(getattr, (obj.im_self, _get_method_name(obj)), obj=obj)
+
+    dispatch[types.MethodType] = save_method
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, storage):
+        pickle.Unpickler.__init__(self, file)
+        self.__storage = storage
+
+    def persistent_load(self, pid):
+        if pid[0] == "logger":
+            return logging.getLogger(pid[1])
+        if self.__storage is None:
+            raise Exception("A bar feed is required to restore this checkpoint")
+        return _get_bar(self.__storage, pid)
+
+
+def dumps(obj, barFeed=None):
+    """Serializes the state of a backtest.
+
+    :param obj: The object to serialize, usually a :class:`pyalgotrade.strategy.BacktestingStrategy`.
+    :param barFeed: The bar feed whose bars should be left out of the checkpoint.
+    :type barFeed: :class:`pyalgotrade.barfeed.BaseBarFeed`.
+    :rtype: string.
+    """
+    storage = _get_bar_storage(barFeed)
+    buff = StringIO()
+    pickle.dump(_get_signature(storage), buff, pickle.HIGHEST_PROTOCOL)
+    _Pickler(buff, storage).dump(obj)
+    return zlib.compress(buff.getvalue())
+
+
+def loads(data, barFeed=None):
+    """Restores an object serialized with :func:`dumps`.
+
+    :param data: The serialized data.
+    :type data: string.
+    :param barFeed: A bar feed holding the same bars as the one used when serializing. Only the bars are taken
+        from it.
+    :type barFeed: :class:`pyalgotrade.barfeed.BaseBarFeed`.
+    """
+    storage = _get_bar_storage(barFeed)
+    buff = StringIO(zlib.decompress(data))
+    signature = pickle.load(buff)
+    if signature is not None and storage is not None and signature != _get_signature(storage):
+        raise Exception("The bar feed doesn't match the one used to take the checkpoint")
+    return _Unpickler(buff, storage).load()
+
+
+def save(obj, path, barFeed=None):
+    """Saves a checkpoint to a file. Check :func:`dumps` for parameter details."""
+    data = dumps(obj, barFeed)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def load(path, barFeed=None):
+    """Loads a checkpoint from a file. Check :func:`loads` for parameter details.
+
+    To resume a backtest from a checkpoint, build the bar feed just like when the checkpoint was taken,
+    load the strategy and call run.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    return loads(data, barFeed)
+
+
+def clone(obj, barFeed=None):
+    """Returns an independent copy of a backtest that shares the bars with the original one.
+    This is useful to fork several variations from a strategy that already went through a warm-up period.
+
+    :param obj: The object to copy, usually a :class:`pyalgotrade.strategy.BacktestingStrategy`.
+    :param barFeed: The bar feed whose bars should be shared.
+    :type barFeed: :class:`pyalgotrade.barfeed.BaseBarFeed`.
+    """
+    memo = {}
+    for logger in _get_loggers():
+        memo[id(logger)] = logger
+    storage = _get_bar_storage(barFeed)
+    if storage is not None:
+        for key, bars in _iter_bars(storage):
+            memo[id(bars)] = bars
+    return copy.deepcopy(obj, memo)
@@ -28,10 +28,19 @@ class Dispatcher(object):
     def __init__(self):
         self.__subjects = []
         self.__stop = False
+        self.__dispatching = False
         self.__startEvent = observer.Event()
         self.__idleEvent = observer.Event()
+        self.__dispatchEndEvent = observer.Event()
         self.__currDateTime = None
 
+    def __getstate__(self):
+        # A stop request doesn't survive a copy/checkpoint of the dispatcher.
+        ret = self.__dict__.copy()
+        ret["_Dispatcher__stop"] = False
+        ret["_Dispatcher__dispatching"] = False
+        return ret
+
     # Returns the current event datetime. It may be None for events from realtime subjects.
     def getCurrentDateTime(self):
         return self.__currDateTime
@@ -42,9 +51,21 @@ class Dispatcher(object):
     def getIdleEvent(self):
         return self.__idleEvent
 
+    # Emitted once all the events for the current datetime were dispatched.
+    def getDispatchEndEvent(self):
+        return self.__dispatchEndEvent
+
+    # Returns True while events for the current datetime are being dispatched.
+    def isDispatching(self):
+        return self.__dispatching
+
     def stop(self):
         self.__stop = True
 
+    # Returns True if stop was called and the dispatcher didn't stop running yet.
+    def isStopRequested(self):
+        return self.__stop
+
     def getSubjects(self):
         return self.__subjects
 
@@ -106,13 +127,19 @@ class Dispatcher(object):
             self.__startEvent.emit()
 
             while not self.__stop:
+                self.__dispatching = True
                 eof, eventsDispatched = self.__dispatch()
+                self.__dispatching = False
                 if eof:
                     self.__stop = True
                 elif not eventsDispatched:
                     self.__idleEvent.emit()
+                else:
+                    self.__dispatchEndEvent.emit()
         finally:
             for subject in self.__subjects:
                 subject.stop()
             for subject in self.__subjects:
                 subject.join()
+            # Allow a stopped run to be resumed.
+            self.__stop = False
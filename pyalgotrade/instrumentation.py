@@ -0,0 +1,304 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import array
+import json
+import timeit
+
+import numpy
+
+import pyalgotrade.logger
+
+logger = pyalgotrade.logger.getLogger("instrumentation")
+
+_timer = timeit.default_timer
+
+
+def get_callable_name(callable_):
+    """Returns a name like ClassName.methodName for a bound method, or the function name otherwise."""
+    function = getattr(callable_, "im_func", callable_)
+    ret = getattr(function, "__name__", type(callable_).__name__)
+    instance = getattr(callable_, "im_self", None)
+    if instance is not None:
+        ret = "%s.%s" % (type(instance).__name__, ret)
+    return ret
+
+
+class ComponentStats(object):
+    """Time spent in a component, like an event handler or a method.
+
+    .. note::
+        This class should not be instantiated directly.
+    """
+
+    def __init__(self, name, barCount):
+        self.__name = name
+        self.__calls = 0
+        self.__totalTime = 0.0
+        self.__selfTime = 0.0
+        self.__barTime = 0.0
+        # The time spent in the component for every bar, including bars before it was first called.
+        self.__barTimes = array.array("d", [0]) * barCount
+
+    def add(self, elapsed, selfTime):
+        self.__calls += 1
+        self.__totalTime += elapsed
+        self.__selfTime += selfTime
+        self.__barTime += elapsed
+
+    def endBar(self):
+        self.__barTimes.append(self.__barTime)
+        self.__barTime = 0.0
+
+    def getName(self):
+        return self.__name
+
+    def getCalls(self):
+        """Returns the number of calls."""
+        return self.__calls
+
+    def getTotalTime(self):
+        """Returns the number of seconds spent in the component, including the time spent in other components that
+        were called from it."""
+        return self.__totalTime
+
+    def getSelfTime(self):
+        """Returns the number of seconds spent in the component, excluding the time spent in other components that
+        were called from it."""
+        return self.__selfTime
+
+    def getBarTimes(self):
+        """Returns a numpy.array with the number of seconds spent in the component for each bar."""
+        return numpy.frombuffer(self.__barTimes, dtype=float)
+
+    def getBarPercentile(self, percentile):
+        """Returns the number of seconds spent in the component for a given percentile of the bars, or None if no bars
+        were processed.
+
+        :param percentile: The percentile, between 0 and 100.
+        :type percentile: int/float.
+        """
+        ret = None
+        if len(self.__barTimes):
+            ret = numpy.percentile(self.getBarTimes(), percentile)
+        return ret
+
+    def toDict(self):
+        return {
+            "name": self.__name,
+            "calls": self.__calls,
+            "totalTime": self.__totalTime,
+            "selfTime": self.__selfTime,
+            "p50PerBar": self.getBarPercentile(50),
+            "p99PerBar": self.getBarPercentile(99),
+        }
+
+
+class Profiler(object):
+    """Measures the time spent in the different components of a strategy while it runs: the bar feed, the broker,
+    the event handlers (including indicators), the strategy's onBars and the analyzers.
+
+    :param jsonPath: If set, the figures are saved to this file as JSON once the strategy finishes running.
+    :type jsonPath: string.
+    :param foldedPath: If set, the time spent in each call stack is saved to this file once the strategy finishes
+        running, in the folded format used to build flame graphs.
+    :type foldedPath: string.
+
+    .. note::
+        * Instrumentation is opt-in. Only the strategies that a profiler is attached to pay for the timers.
+        * A strategy with a profiler attached can't be checkpointed.
+    """
+
+    def __init__(self, jsonPath=None, foldedPath=None):
+        self.__jsonPath = jsonPath
+        self.__foldedPath = foldedPath
+        self.__components = {}
+        self.__handlerNames = {}
+        # [stack path, time spent in components called from this one] for every call in progress.
+        self.__stack = []
+        # Stack path -> self time.
+        self.__stackTimes = {}
+        self.__barCount = 0
+        self.__totalTime = 0.0
+
+    def __getComponent(self, name):
+        ret = self.__components.get(name)
+        if ret is None:
+            ret = ComponentStats(name, self.__barCount)
+            self.__components[name] = ret
+        return ret
+
+    def __call(self, name, function, args, kwargs):
+        component = self.__getComponent(name)
+        stack = self.__stack
+        if len(stack):
+            frame = [stack[-1][0] + ";" + name, 0.0]
+        else:
+            frame = [name, 0.0]
+        stack.append(frame)
+        begin = _timer()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = _timer() - begin
+            stack.pop()
+            selfTime = elapsed - frame[1]
+            component.add(elapsed, selfTime)
+            self.__stackTimes[frame[0]] = self.__stackTimes.get(frame[0], 0) + selfTime
+            if len(stack):
+                stack[-1][1] += elapsed
+            else:
+                self.__totalTime += elapsed
+
+    def __callHandler(self, handler, args, kwargs):
+        name = self.__handlerNames.get(handler)
+        if name is None:
+            name = get_callable_name(handler)
+            self.__handlerNames[handler] = name
+        return self.__call(name, handler, args, kwargs)
+
+    def wrap(self, name, function):
+        """Returns a function that calls the given one and measures the time spent on it.
+
+        :param name: The component name.
+        :type name: string.
+        :param function: The function to measure.
+        """
+        def wrapper(*args, **kwargs):
+            return self.__call(name, function, args, kwargs)
+        return wrapper
+
+    def instrumentMethod(self, obj, methodName):
+        """Replaces a method in an object with one that measures the time spent on it.
+
+        :param obj: The object.
+        :param methodName: The method name.
+        :type methodName: string.
+        """
+        method = getattr(obj, methodName)
+        setattr(obj, methodName, self.wrap("%s.%s" % (type(obj).__name__, methodName), method))
+
+    def instrumentEvent(self, event):
+        """Measures the time spent on each of the handlers subscribed to an event.
+
+        :param event: The event.
+        :type event: :class:`pyalgotrade.observer.Event`.
+        """
+        event.setHandlerCaller(self.__callHandler)
+
+    def attach(self, strat):
+        """Instruments a strategy. Call this after the analyzers are attached and before running the strategy.
+
+        :param strat: The strategy.
+        :type strat: :class:`pyalgotrade.strategy.BaseStrategy`.
+        """
+        barFeed = strat.getFeed()
+        for subject in strat.getDispatcher().getSubjects():
+            self.instrumentMethod(subject, "dispatch")
+        self.instrumentMethod(barFeed, "getNextValuesAndUpdateDS")
+        self.instrumentEvent(barFeed.getNewValuesEvent())
+        # Indicators subscribe to the dataseries.
+        for instrument in barFeed.getRegisteredInstruments():
+            barDS = barFeed[instrument]
+            for ds in [
+                barDS, barDS.getOpenDataSeries(), barDS.getHighDataSeries(), barDS.getLowDataSeries(),
+                barDS.getCloseDataSeries(), barDS.getVolumeDataSeries(), barDS.getAdjCloseDataSeries()
+            ]:
+                self.instrumentEvent(ds.getNewValueEvent())
+        self.instrumentEvent(strat.getBroker().getOrderUpdatedEvent())
+        for analyzer in strat.getAnalyzers():
+            self.instrumentMethod(analyzer, "beforeOnBars")
+        self.instrumentMethod(strat, "onBars")
+        self.instrumentEvent(strat.getBarsProcessedEvent())
+        strat.getDispatcher().getDispatchEndEvent().subscribe(self.__onDispatchEnd)
+
+        run = strat.run
+
+        def runAndReport():
+            try:
+                run()
+            finally:
+                self.__onFinish()
+        strat.run = runAndReport
+
+    def __onDispatchEnd(self):
+        self.__barCount += 1
+        for component in self.__components.itervalues():
+            component.endBar()
+
+    def __onFinish(self):
+        logger.info("Profile for %d bars:\n%s" % (self.__barCount, self))
+        if self.__jsonPath is not None:
+            self.saveJSON(self.__jsonPath)
+        if self.__foldedPath is not None:
+            self.saveFolded(self.__foldedPath)
+
+    def getBarCount(self):
+        """Returns the number of bars processed."""
+        return self.__barCount
+
+    def getTotalTime(self):
+        """Returns the number of seconds spent in instrumented components."""
+        return self.__totalTime
+
+    def getComponents(self):
+        """Returns a list of :class:`ComponentStats`, sorted by total time in descending order."""
+        return sorted(self.__components.values(), key=lambda component: component.getTotalTime(), reverse=True)
+
+    def getComponent(self, name):
+        """Returns the :class:`ComponentStats` for a component, or None if it was never called."""
+        return self.__components.get(name)
+
+    def getStackTimes(self):
+        """Returns a dictionary that maps call stacks, like Feed.dispatch;BacktestingBroker.onBars, to the number of
+        seconds spent on the last component in the stack."""
+        return self.__stackTimes
+
+    def toDict(self):
+        """Returns a dictionary with all the figures, that can be serialized to JSON."""
+        return {
+            "barCount": self.__barCount,
+            "totalTime": self.__totalTime,
+            "components": [component.toDict() for component in self.getComponents()],
+        }
+
+    def saveJSON(self, path):
+        with open(path, "w") as f:
+            json.dump(self.toDict(), f, indent=2)
+
+    def saveFolded(self, path):
+        """Saves one line per call stack with the number of microseconds spent on it. Use flamegraph.pl or
+        speedscope to build a flame graph."""
+        with open(path, "w") as f:
+            for stack, seconds in sorted(self.__stackTimes.iteritems()):
+                f.write("%s %d\n" % (stack, round(seconds * 1e6)))
+
+    def __str__(self):
+        lines = ["%-50s %10s %10s %10s %12s %12s" % ("Component", "Calls", "Total", "Self", "p50/bar", "p99/bar")]
+        for component in self.getComponents():
+            percentiles = []
+            for percentile in [50, 99]:
+                value = component.getBarPercentile(percentile)
+                percentiles.append("-" if value is None else "%.6f" % (value))
+            lines.append("%-50s %10d %10.4f %10.4f %12s %12s" % (
+                component.getName(), component.getCalls(), component.getTotalTime(), component.getSelfTime(),
+                percentiles[0], percentiles[1]
+            ))
+        return "\n".join(lines)
@@ -24,12 +24,32 @@ from pyalgotrade import dispatchprio
 
 
 class Event(object):
+    # A callable that receives a handler and the arguments to call it with. Used to instrument handlers.
+    __handlerCaller = None
+
     def __init__(self):
         self.__handlers = []
         self.__toSubscribe = []
         self.__toUnsubscribe = []
         self.__emitting = False
 
+    def __getstate__(self):
+        # Events are never restored in the middle of an emit, so pending changes are applied to the copy.
+        handlers = list(self.__handlers)
+        for handler in self.__toSubscribe:
+            if handler not in handlers:
+                handlers.append(handler)
+        for handler in self.__toUnsubscribe:
+            handlers.remove(handler)
+
+        ret = self.__dict__.copy()
+        ret["_Event__handlers"] = handlers
+        ret["_Event__toSubscribe"] = []
+        ret["_Event__toUnsubscribe"] = []
+        ret["_Event__emitting"] = False
+        ret.pop("_Event__handlerCaller", None)
+        return ret
+
     def __applyChanges(self):
         if len(self.__toSubscribe):
             for handler in self.__toSubscribe:
@@ -54,11 +74,19 @@ class Event(object):
         else:
             self.__handlers.remove(handler)
 
+    # Handlers will be called through handlerCaller(handler, args, kwargs). Use None to call them directly.
+    def setHandlerCaller(self, handlerCaller):
+        self.__handlerCaller = handlerCaller
+
     def emit(self, *args, **kwargs):
         try:
             self.__emitting = True
-            for handler in self.__handlers:
-                handler(*args, **kwargs)
+            if self.__handlerCaller is None:
+                for handler in self.__handlers:
+                    handler(*args, **kwargs)
+            else:
+                for handler in self.__handlers:
+                    self.__handlerCaller(handler, args, kwargs)
         finally:
             self.__emitting = False
             self.__applyChanges()
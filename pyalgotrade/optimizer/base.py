@@ -20,6 +20,20 @@
 
 import threading
 
+from pyalgotrade.optimizer import pruning
+
+
+class Transport(object):
+    """Enum like class for the protocols that workers can use to talk to the server. Valid values are:
+
+    * **Transport.XMLRPC**: XML-RPC over HTTP. This is the default.
+    * **Transport.BINARY**: Length prefixed binary frames over TCP. Bars are sent in compressed chunks, and jobs and
+      results can be transferred in batches.
+    """
+
+    XMLRPC = "xmlrpc"
+    BINARY = "binary"
+
 
 class Parameters(object):
     def __init__(self, *args, **kwargs):
@@ -32,9 +46,15 @@ class ParameterSource(object):
     Source for backtesting parameters. This class is thread safe.
     """
     def __init__(self, params):
+        self.__total = len(params) if hasattr(params, "__len__") else None
         self.__iter = iter(params)
         self.__lock = threading.Lock()
 
+    def getTotal(self):
+        """Returns the total number of parameters to try, or None if not known in advance. Used to estimate the
+        time left."""
+        return self.__total
+
     def getNext(self, count):
         """
         Returns the next parameters to use in a backtest.
@@ -63,9 +83,30 @@ class ParameterSource(object):
         return ret
 
     def eof(self):
+        """Returns True once there are no more parameters to try."""
         with self.__lock:
             return self.__iter is None
 
+    def pushResult(self, result, parameters):
+        """
+        Called with the result obtained by running the strategy with parameters returned by :meth:`getNext`.
+        Sources that generate parameters based on previous results, like the ones in
+        :mod:`pyalgotrade.optimizer.search`, override this. An empty list from :meth:`getNext` before :meth:`eof`
+        returns True means that more parameters will be available once more results are pushed.
+
+        :param result: The result, or None if the strategy failed to run.
+        :param parameters: The parameters that yield the given result.
+        :type parameters: Parameters
+        """
+        pass
+
+
+def build_parameter_source(strategyParameters):
+    """Returns strategyParameters if it is a :class:`ParameterSource` already, or wraps it into one."""
+    if isinstance(strategyParameters, ParameterSource):
+        return strategyParameters
+    return ParameterSource(strategyParameters)
+
 
 class ResultSinc(object):
     """
@@ -76,7 +117,7 @@ class ResultSinc(object):
         self.__bestResult = None
         self.__bestParameters = None
 
-    def push(self, result, parameters):
+    def push(self, result, parameters, metrics=None):
         """
         Push strategy results obtained by running the strategy with the given parameters.
 
@@ -84,7 +125,14 @@ class ResultSinc(object):
         :type result: float
         :param parameters: The parameters that yield the given result.
         :type parameters: Parameters
+        :param metrics: Optional metrics reported by the strategy.
+        :type metrics: dict
+
+        .. note::
+            Results for runs that were stopped early are not taken into account for the best result.
         """
+        if pruning.is_pruned(metrics):
+            return
         with self.__lock:
             if result is not None and (self.__bestResult is None or result > self.__bestResult):
                 self.__bestResult = result
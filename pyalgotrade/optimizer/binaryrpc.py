@@ -0,0 +1,331 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import SocketServer
+import collections
+import json
+import pickle
+import socket
+import struct
+import threading
+import zlib
+
+import pyalgotrade.logger
+from pyalgotrade.optimizer import coordinator
+from pyalgotrade.optimizer import xmlrpcserver
+
+logger = pyalgotrade.logger.getLogger(__name__)
+
+# Every message is a frame: a 4 byte big endian length followed by the payload.
+# Requests are pickled (method, args) tuples, and responses are pickled (status, value) tuples. Bars are sent after
+# the response to getInstrumentsAndBars, as one frame per compressed chunk.
+FRAME_HEADER = struct.Struct("!I")
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+
+def send_frame(sock, data):
+    sock.sendall(FRAME_HEADER.pack(len(data)) + data)
+
+
+def _recv_all(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            raise EOFError("Connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return "".join(chunks)
+
+
+def recv_frame(sock):
+    size = FRAME_HEADER.unpack(_recv_all(sock, FRAME_HEADER.size))[0]
+    return _recv_all(sock, size)
+
+
+class RequestProcessor(object):
+    """Turns request frames into response frames. This class is thread safe.
+
+    :param coordinator_: The coordinator that keeps track of bars and jobs.
+    :type coordinator_: :class:`pyalgotrade.optimizer.coordinator.Coordinator`.
+    :param batchSize: The max number of parameter sets per job. Check
+        :class:`pyalgotrade.optimizer.coordinator.Coordinator` for details on how jobs get sized.
+    :type batchSize: int.
+    :param barsPerChunk: The number of :class:`pyalgotrade.bar.Bars` per compressed chunk.
+    :type barsPerChunk: int.
+    """
+
+    def __init__(self, coordinator_, batchSize, barsPerChunk):
+        self.__coordinator = coordinator_
+        self.__batchSize = batchSize
+        self.__barsPerChunk = barsPerChunk
+        self.__barChunks = None
+        self.__barChunksLock = threading.Lock()
+        self.__methods = {
+            "getInstrumentsAndBars": self.__getInstrumentsAndBars,
+            "getSharedBarsPath": self.__getSharedBarsPath,
+            "getBarsFrequency": self.__getBarsFrequency,
+            "getNextJobs": self.__getNextJobs,
+            "pushJobResults": self.__pushJobResults,
+            "getStatus": self.__getStatus,
+        }
+
+    def __getBarChunks(self):
+        # Chunks are compressed once and sent to every worker that asks for them.
+        with self.__barChunksLock:
+            if self.__barChunks is None:
+                instruments, bars = self.__coordinator.getInstrumentsAndBars()
+                self.__barChunks = []
+                for i in xrange(0, len(bars), self.__barsPerChunk):
+                    chunk = pickle.dumps(bars[i:i + self.__barsPerChunk], pickle.HIGHEST_PROTOCOL)
+                    self.__barChunks.append(zlib.compress(chunk))
+            return self.__barChunks
+
+    def __getInstrumentsAndBars(self):
+        instruments = self.__coordinator.getInstrumentsAndBars()[0]
+        chunks = self.__getBarChunks()
+        return (instruments, len(chunks)), chunks
+
+    def __getSharedBarsPath(self):
+        return self.__coordinator.getSharedBarsPath(), []
+
+    def __getBarsFrequency(self):
+        return self.__coordinator.getBarsFrequency(), []
+
+    def __getNextJobs(self, count, workerName):
+        ret = []
+        while len(ret) < count:
+            job = self.__coordinator.getNextJob(self.__batchSize, workerName)
+            if job is None:
+                break
+            if job.getRetryAfter() is not None:
+                # Only worth sending if there are no jobs to process meanwhile.
+                if len(ret) == 0:
+                    ret.append(job)
+                break
+            ret.append(job)
+        return ret, []
+
+    def __pushJobResults(self, results, workerName):
+        for jobId, records in results:
+            self.__coordinator.pushJobResults(jobId, records, workerName)
+        return None, []
+
+    def __getStatus(self):
+        return json.dumps(self.__coordinator.getProgress().toDict()), []
+
+    def process(self, frame):
+        """Returns the frames to send back for a request frame."""
+        try:
+            method, args = pickle.loads(frame)
+            value, extraFrames = self.__methods[method](*args)
+            ret = [pickle.dumps((STATUS_OK, value), pickle.HIGHEST_PROTOCOL)]
+            ret.extend(extraFrames)
+        except Exception, e:
+            logger.exception("Error processing request: %s" % (e))
+            ret = [pickle.dumps((STATUS_ERROR, str(e)), pickle.HIGHEST_PROTOCOL)]
+        return ret
+
+
+class RequestHandler(SocketServer.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                frame = recv_frame(self.request)
+            except (EOFError, socket.error):
+                break
+            for response in self.server.getRequestProcessor().process(frame):
+                send_frame(self.request, response)
+
+
+class Server(SocketServer.ThreadingTCPServer):
+    """An optimizer server that talks to workers using length prefixed binary frames over TCP, instead of XML-RPC.
+
+    Bars are sent in compressed chunks, workers can pull many jobs in a single request and push their results in
+    batches.
+    """
+
+    defaultBatchSize = xmlrpcserver.Server.defaultBatchSize
+    barsPerChunk = 1000
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, paramSource, resultSinc, barFeed, address, port, autoStop=True, sharedBarsPath=None,
+                 resultCache=None):
+        SocketServer.ThreadingTCPServer.__init__(self, (address, port), RequestHandler)
+        self.__coordinator = coordinator.Coordinator(
+            paramSource, resultSinc, barFeed, sharedBarsPath, resultCache
+        )
+        self.__requestProcessor = RequestProcessor(self.__coordinator, self.defaultBatchSize, self.barsPerChunk)
+        if autoStop:
+            self.__autoStopThread = xmlrpcserver.AutoStopThread(self)
+        else:
+            self.__autoStopThread = None
+
+    def getRequestProcessor(self):
+        return self.__requestProcessor
+
+    def jobsPending(self):
+        return self.__coordinator.jobsPending()
+
+    def getProgressEvent(self):
+        """Returns the event emitted with a :class:`pyalgotrade.optimizer.progress.Progress` every time results get
+        pushed."""
+        return self.__coordinator.getProgressEvent()
+
+    def getProgress(self):
+        return self.__coordinator.getProgress()
+
+    def stop(self):
+        self.shutdown()
+
+    def serve(self):
+        try:
+            # Initialize instruments, bars and parameters.
+            self.__coordinator.loadBars()
+
+            if self.__autoStopThread:
+                self.__autoStopThread.start()
+
+            logger.info("Waiting for workers")
+            self.serve_forever()
+
+            if self.__autoStopThread:
+                self.__autoStopThread.join()
+        finally:
+            self.__coordinator.forceStop()
+
+
+class TCPConnection(object):
+    """A connection to a :class:`Server`. It reconnects on the next request if the connection gets lost."""
+
+    def __init__(self, address, port):
+        self.__address = address
+        self.__port = port
+        self.__socket = None
+
+    def __wrap(self, function, *args):
+        try:
+            if self.__socket is None:
+                self.__socket = socket.create_connection((self.__address, self.__port))
+            return function(self.__socket, *args)
+        except (EOFError, socket.error), e:
+            self.close()
+            raise socket.error(str(e))
+
+    def send(self, frame):
+        self.__wrap(send_frame, frame)
+
+    def receive(self):
+        return self.__wrap(recv_frame)
+
+    def close(self):
+        if self.__socket is not None:
+            self.__socket.close()
+            self.__socket = None
+
+
+class LocalConnection(object):
+    """An in process stand-in for :class:`TCPConnection`, used for testing. Frames go through the
+    :class:`RequestProcessor` directly.
+
+    :param requestProcessor: The request processor.
+    :type requestProcessor: :class:`RequestProcessor`.
+    """
+
+    def __init__(self, requestProcessor):
+        self.__requestProcessor = requestProcessor
+        self.__pending = collections.deque()
+
+    def send(self, frame):
+        self.__pending.extend(self.__requestProcessor.process(frame))
+
+    def receive(self):
+        return self.__pending.popleft()
+
+    def close(self):
+        self.__pending.clear()
+
+
+class Client(object):
+    """The worker side of the binary protocol.
+
+    Jobs are pulled jobsPerRequest at a time. Results are held until all the jobs pulled get processed, and then
+    pushed in a single request.
+
+    :param connection: The connection to the server.
+    :type connection: :class:`TCPConnection` or :class:`LocalConnection`.
+    :param jobsPerRequest: The max number of jobs to pull in a single request.
+    :type jobsPerRequest: int.
+    """
+
+    def __init__(self, connection, jobsPerRequest=1):
+        assert(jobsPerRequest > 0)
+        self.__connection = connection
+        self.__jobsPerRequest = jobsPerRequest
+        self.__jobs = collections.deque()
+        self.__results = []
+        self.__workerName = None
+
+    def __call(self, method, *args):
+        self.__connection.send(pickle.dumps((method, args), pickle.HIGHEST_PROTOCOL))
+        status, value = pickle.loads(self.__connection.receive())
+        if status != STATUS_OK:
+            raise Exception("Error calling %s: %s" % (method, value))
+        return value
+
+    def getInstrumentsAndBars(self):
+        instruments, chunkCount = self.__call("getInstrumentsAndBars")
+        bars = []
+        for i in xrange(chunkCount):
+            bars.extend(pickle.loads(zlib.decompress(self.__connection.receive())))
+        return instruments, bars
+
+    def getSharedBarsPath(self):
+        return self.__call("getSharedBarsPath")
+
+    def getBarsFrequency(self):
+        return self.__call("getBarsFrequency")
+
+    def getStatus(self):
+        return self.__call("getStatus")
+
+    def getNextJob(self, workerName):
+        if len(self.__jobs) == 0:
+            self.flushJobResults()
+            self.__jobs.extend(self.__call("getNextJobs", self.__jobsPerRequest, workerName))
+        ret = None
+        if len(self.__jobs):
+            ret = self.__jobs.popleft()
+        return ret
+
+    def pushJobResults(self, jobId, records, workerName):
+        self.__results.append((jobId, records))
+        self.__workerName = workerName
+
+    def flushJobResults(self):
+        if len(self.__results):
+            self.__call("pushJobResults", self.__results, self.__workerName)
+            self.__results = []
+
+    def close(self):
+        self.__connection.close()
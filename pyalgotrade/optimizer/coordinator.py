@@ -0,0 +1,364 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import collections
+import itertools
+import math
+import threading
+import time
+
+import pyalgotrade.logger
+from pyalgotrade import observer
+from pyalgotrade.barfeed import sharedbars
+from pyalgotrade.optimizer import base
+from pyalgotrade.optimizer import progress
+from pyalgotrade.optimizer import pruning
+from pyalgotrade.optimizer import resultcache
+
+logger = pyalgotrade.logger.getLogger(__name__)
+
+
+class Job(object):
+    def __init__(self, strategyParameters, jobId=None, retryAfter=None):
+        self.__strategyParameters = strategyParameters
+        self.__bestResult = None
+        self.__bestParameters = None
+        self.__id = id(self) if jobId is None else jobId
+        self.__retryAfter = retryAfter
+
+    def getId(self):
+        return self.__id
+
+    # If not None, there are no parameters to process yet and the worker should ask again after this many seconds.
+    def getRetryAfter(self):
+        return self.__retryAfter
+
+    def getNextParameters(self):
+        ret = None
+        if len(self.__strategyParameters):
+            ret = self.__strategyParameters.pop()
+        return ret
+
+
+class ActiveJob(object):
+    def __init__(self, jobId, strategyParameters):
+        self.jobId = jobId
+        self.strategyParameters = strategyParameters
+        # Worker name -> time when the job was handed to that worker.
+        self.holders = {}
+        self.firstIssued = None
+
+    def issue(self, workerName):
+        now = time.time()
+        self.holders[workerName] = now
+        if self.firstIssued is None:
+            self.firstIssued = now
+        return Job(list(self.strategyParameters), self.jobId)
+
+
+# Keeps track of the bars, the jobs handed out to workers and their results, regardless of how workers connect to the
+# server. This class is thread safe.
+#
+# Jobs are sized using the throughput measured for each worker, so they take about targetJobDuration seconds, and
+# they get smaller near the end of the parameter space. Once there are no parameters left, workers asking for jobs
+# get a copy of an unfinished job held by another worker. The first results pushed for a job win.
+#
+# If a result cache is set, parameters with cached results are not handed out to workers.
+#
+# Progress figures are available using getProgress, and they are emitted using the progress event every time results
+# get pushed.
+class Coordinator(object):
+    # Set to False to hand out jobs of a fixed size, and not to re-issue unfinished jobs.
+    adaptiveBatching = True
+    # Batches are sized so jobs take about this many seconds.
+    targetJobDuration = 2.0
+    # Batch size used until the throughput for a worker gets measured.
+    initialBatchSize = 1
+    # Max number of workers holding the same job at the same time.
+    maxJobCopies = 2
+    # Weight given to the last throughput measurement.
+    throughputWeight = 0.5
+    # Seconds workers wait before asking again when the parameter source is waiting for more results.
+    retryInterval = 0.2
+    # Seconds between progress summaries in the log. Set to None to disable them.
+    progressLogInterval = 30
+
+    def __init__(self, paramSource, resultSinc, barFeed, sharedBarsPath=None, resultCache=None):
+        self.__paramSource = paramSource
+        self.__resultSinc = resultSinc
+        self.__barFeed = barFeed
+        self.__instruments = None
+        self.__bars = None
+        self.__barsFreq = None
+        self.__barCount = None
+        self.__barsLock = threading.Lock()
+        # If set, bars are saved there for workers running on this host to memory-map them.
+        self.__sharedBarsPath = sharedBarsPath
+        # Parameters read ahead from the parameter source. Once the source is exhausted, these are all that is left.
+        self.__pendingParameters = collections.deque()
+        self.__activeJobs = {}
+        # Jobs whose results were taken but not pushed yet. They still count as pending.
+        self.__pushesInFlight = 0
+        # Worker name -> progress.WorkerStats
+        self.__workerStats = {}
+        self.__workers = set()
+        self.__activeJobsLock = threading.Lock()
+        self.__forcedStop = False
+        self.__bestResult = None
+        self.__jobIds = itertools.count(1)
+        self.__resultCache = resultCache
+        self.__dataFingerprint = None
+        self.__cacheHits = 0
+        self.__completed = 0
+        self.__failed = 0
+        self.__pruned = 0
+        self.__startTime = None
+        self.__lastProgressLog = None
+        self.__progressEvent = observer.Event()
+        self.__progressEventLock = threading.Lock()
+
+    def __iterBars(self, fingerprint):
+        self.__barCount = 0
+        for dateTime, bars in self.__barFeed:
+            if fingerprint is not None:
+                fingerprint.update(bars)
+            self.__barCount += 1
+            yield bars
+
+    def loadBars(self):
+        logger.info("Loading bars")
+        instruments = self.__barFeed.getRegisteredInstruments()
+        fingerprint = None
+        if self.__resultCache is not None:
+            fingerprint = resultcache.BarsFingerprint(instruments, self.__barFeed.getFrequency())
+        if self.__sharedBarsPath is not None:
+            sharedbars.write(self.__sharedBarsPath, instruments, self.__iterBars(fingerprint))
+        else:
+            self.__bars = list(self.__iterBars(fingerprint))
+        if fingerprint is not None:
+            self.__dataFingerprint = fingerprint.getFingerprint()
+        self.__instruments = instruments
+        self.__barsFreq = self.__barFeed.getFrequency()
+
+    def getInstrumentsAndBars(self):
+        # When using shared bars, these are only loaded if a worker can't attach to them.
+        with self.__barsLock:
+            if self.__bars is None and self.__sharedBarsPath is not None:
+                self.__bars = list(sharedbars.SharedBars(self.__sharedBarsPath))
+        return self.__instruments, self.__bars
+
+    def getBarsFrequency(self):
+        return self.__barsFreq
+
+    def getSharedBarsPath(self):
+        return self.__sharedBarsPath
+
+    def getDataFingerprint(self):
+        return self.__dataFingerprint
+
+    def getCacheHits(self):
+        """Returns the number of parameter sets whose results were taken from the result cache."""
+        with self.__activeJobsLock:
+            return self.__cacheHits
+
+    def getThroughput(self, workerName):
+        """Returns the number of parameter sets per second measured for a worker, or None if not available yet."""
+        with self.__activeJobsLock:
+            stats = self.__workerStats.get(workerName)
+            return None if stats is None else stats.throughput
+
+    def getProgressEvent(self):
+        """Returns the event emitted with a :class:`pyalgotrade.optimizer.progress.Progress` every time results get
+        pushed. Handlers are called from the threads that handle worker requests."""
+        return self.__progressEvent
+
+    def getProgress(self):
+        """Returns a :class:`pyalgotrade.optimizer.progress.Progress` with the current figures."""
+        with self.__activeJobsLock:
+            return self.__getProgress()
+
+    def __getProgress(self):
+        now = time.time()
+        elapsed = 0 if self.__startTime is None else now - self.__startTime
+        inFlight = sum(len(activeJob.strategyParameters) for activeJob in self.__activeJobs.itervalues())
+        workers = [
+            progress.WorkerProgress(name, stats, self.__barCount, now)
+            for name, stats in sorted(self.__workerStats.iteritems())
+        ]
+        return progress.Progress(
+            elapsed, self.__completed, self.__failed, self.__pruned, self.__cacheHits, len(self.__pendingParameters),
+            inFlight, self.__paramSource.getTotal(), self.__barCount, workers
+        )
+
+    def __getWorkerStats(self, workerName):
+        ret = self.__workerStats.get(workerName)
+        if ret is None:
+            ret = progress.WorkerStats()
+            self.__workerStats[workerName] = ret
+        return ret
+
+    def __readAhead(self, maxBatchSize):
+        lookAhead = maxBatchSize * (len(self.__workers) + 1)
+        while not self.__paramSource.eof() and len(self.__pendingParameters) < lookAhead:
+            params = self.__paramSource.getNext(lookAhead - len(self.__pendingParameters))
+            if len(params) == 0:
+                # The source needs more results before generating more parameters.
+                break
+            for p in params:
+                if not self.__pushCachedResult(p):
+                    self.__pendingParameters.append(p.args)
+
+    def __pushCachedResult(self, parameters):
+        if self.__resultCache is None:
+            return False
+        cached = self.__resultCache.get(self.__dataFingerprint, parameters.args)
+        if cached is None:
+            return False
+        result, metrics = cached
+        self.__cacheHits += 1
+        self.__completed += 1
+        self.__resultSinc.push(result, parameters, metrics)
+        self.__paramSource.pushResult(result, parameters)
+        return True
+
+    def __getBatchSize(self, maxBatchSize, workerName):
+        if not self.adaptiveBatching:
+            return maxBatchSize
+
+        throughput = self.__getWorkerStats(workerName).throughput
+        if throughput is None:
+            ret = self.initialBatchSize
+        else:
+            ret = int(throughput * self.targetJobDuration)
+        # Near the end of the parameter space leave work for the rest of the workers.
+        if self.__paramSource.eof():
+            tail = int(math.ceil(len(self.__pendingParameters) / float(2 * max(1, len(self.__workers)))))
+            ret = min(ret, tail)
+        return max(1, min(ret, maxBatchSize))
+
+    def __getJobToReissue(self, workerName):
+        ret = None
+        if self.adaptiveBatching:
+            for activeJob in self.__activeJobs.itervalues():
+                if workerName not in activeJob.holders and len(activeJob.holders) < self.maxJobCopies and \
+                        (ret is None or activeJob.firstIssued < ret.firstIssued):
+                    ret = activeJob
+        return ret
+
+    def getNextJob(self, maxBatchSize, workerName=None):
+        ret = None
+        with self.__activeJobsLock:
+            self.__workers.add(workerName)
+            self.__getWorkerStats(workerName).lastSeen = time.time()
+            if self.__startTime is None:
+                self.__startTime = time.time()
+            self.__readAhead(maxBatchSize)
+            if len(self.__pendingParameters):
+                batchSize = min(self.__getBatchSize(maxBatchSize, workerName), len(self.__pendingParameters))
+                params = [self.__pendingParameters.popleft() for i in xrange(batchSize)]
+                activeJob = ActiveJob(self.__jobIds.next(), params)
+                self.__activeJobs[activeJob.jobId] = activeJob
+                ret = activeJob.issue(workerName)
+            else:
+                # Re-issue the oldest unfinished job held by other workers.
+                activeJob = self.__getJobToReissue(workerName)
+                if activeJob is not None:
+                    logger.info("Re-issuing job %s to %s" % (activeJob.jobId, workerName))
+                    ret = activeJob.issue(workerName)
+                elif not self.__paramSource.eof():
+                    ret = Job([], None, self.retryInterval)
+        return ret
+
+    def jobsPending(self):
+        if self.__forcedStop:
+            return False
+
+        jobsPending = not self.__paramSource.eof()
+
+        with self.__activeJobsLock:
+            activeJobs = len(self.__activeJobs) > 0 or len(self.__pendingParameters) > 0 or self.__pushesInFlight > 0
+
+        return jobsPending or activeJobs
+
+    # Records are (parameters, result, metrics) tuples, one for every set of parameters in the job.
+    def pushJobResults(self, jobId, records, workerName):
+        with self.__activeJobsLock:
+            # Remove the job mapping.
+            activeJob = self.__activeJobs.pop(jobId, None)
+            if activeJob is None:
+                # The job's results were already submitted.
+                return
+
+            stats = self.__getWorkerStats(workerName)
+            stats.lastSeen = time.time()
+            issued = activeJob.holders.get(workerName)
+            if issued is not None:
+                elapsed = max(stats.lastSeen - issued, 0.001)
+                throughput = len(activeJob.strategyParameters) / elapsed
+                if stats.throughput is not None:
+                    throughput = self.throughputWeight * throughput + (1 - self.throughputWeight) * stats.throughput
+                stats.throughput = throughput
+                stats.jobs += 1
+                stats.parameterSets += len(records)
+                stats.busyTime += elapsed
+
+            for parameters, result, metrics in records:
+                self.__completed += 1
+                if result is None:
+                    self.__failed += 1
+                elif pruning.is_pruned(metrics):
+                    self.__pruned += 1
+                elif result > self.__bestResult:
+                    logger.info("Best result so far %s with parameters %s" % (result, parameters))
+                    self.__bestResult = result
+            self.__pushesInFlight += 1
+
+        try:
+            for parameters, result, metrics in records:
+                # Truncated results depend on the pruning checks, so they are not cached.
+                if self.__resultCache is not None and not pruning.is_pruned(metrics):
+                    self.__resultCache.put(self.__dataFingerprint, parameters, result, metrics)
+                parameters = base.Parameters(*parameters)
+                self.__resultSinc.push(result, parameters, metrics)
+                # Truncated results are not comparable, so pruned runs count as failed ones.
+                self.__paramSource.pushResult(None if pruning.is_pruned(metrics) else result, parameters)
+        finally:
+            with self.__activeJobsLock:
+                self.__pushesInFlight -= 1
+
+        self.__notifyProgress()
+
+    def __notifyProgress(self):
+        with self.__activeJobsLock:
+            currentProgress = self.__getProgress()
+            logProgress = self.progressLogInterval is not None and (
+                self.__lastProgressLog is None or
+                time.time() - self.__lastProgressLog >= self.progressLogInterval
+            )
+            if logProgress:
+                self.__lastProgressLog = time.time()
+        if logProgress:
+            logger.info("Progress: %s" % (currentProgress))
+        # Results may get pushed from many threads at the same time.
+        with self.__progressEventLock:
+            self.__progressEvent.emit(currentProgress)
+
+    def forceStop(self):
+        self.__forcedStop = True
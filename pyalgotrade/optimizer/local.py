@@ -22,13 +22,15 @@ import logging
 import multiprocessing
 import os
 import random
+import shutil
 import socket
+import tempfile
 import threading
 
 from pyalgotrade.optimizer import base
+from pyalgotrade.optimizer import results
 from pyalgotrade.optimizer import server
 from pyalgotrade.optimizer import worker
-from pyalgotrade.optimizer import xmlrpcserver
 
 logger = logging.getLogger(__name__)
 
@@ -42,18 +44,29 @@ class ServerThread(threading.Thread):
         self.__results = self.__server.serve()
 
 
-def worker_process(strategyClass, port, logLevel):
+def worker_process(strategyClass, port, logLevel, transport, pruningChecks, pruningPeriod, sharedFeed):
     class Worker(worker.Worker):
         def runStrategy(self, barFeed, *args, **kwargs):
+            return self.runStrategyWithMetrics(barFeed, *args, **kwargs)[0]
+
+        def runStrategyWithMetrics(self, barFeed, *args, **kwargs):
             strat = strategyClass(barFeed, *args, **kwargs)
+            self.attachPruner(strat)
             strat.run()
-            return strat.getResult()
+            return strat.getResult(), worker.get_metrics(strat)
+
+        def runStrategiesWithMetrics(self, barFeed, parametersList):
+            if not sharedFeed:
+                return None
+            return worker.run_shared_feed(self, strategyClass, barFeed, parametersList)
 
     # Create a worker and run it.
     try:
         name = "worker-%s" % (os.getpid())
-        w = Worker("localhost", port, name)
+        w = Worker("localhost", port, name, transport)
         w.getLogger().setLevel(logLevel)
+        if pruningChecks is not None:
+            w.setPruningChecks(pruningChecks, pruningPeriod)
         w.run()
     except Exception, e:
         w.getLogger().exception("Failed to run worker: %s" % (e))
@@ -78,17 +91,37 @@ def wait_process(p):
         p.join(timeout)
 
 
-def run(strategyClass, barFeed, strategyParameters, workerCount=None, logLevel=logging.ERROR):
+def run(strategyClass, barFeed, strategyParameters, workerCount=None, logLevel=logging.ERROR,
+        transport=base.Transport.XMLRPC, resultsPath=None, topK=10, resultCache=None, pruningChecks=None,
+        pruningPeriod=1, sharedFeed=False, progressHandler=None):
     """Executes many instances of a strategy in parallel and finds the parameters that yield the best results.
 
     :param strategyClass: The strategy class.
     :param barFeed: The bar feed to use to backtest the strategy.
     :type barFeed: :class:`pyalgotrade.barfeed.BarFeed`.
     :param strategyParameters: The set of parameters to use for backtesting. An iterable object where **each element is
-        a tuple that holds parameter values**.
+        a tuple that holds parameter values**, or a :class:`pyalgotrade.optimizer.search.SearchDriver`.
     :param workerCount: The number of strategies to run in parallel. If None then as many workers as CPUs are used.
     :type workerCount: int.
     :param logLevel: The log level. Defaults to **logging.ERROR**.
+    :param transport: The protocol used by the workers to talk to the server.
+    :type transport: A :class:`pyalgotrade.optimizer.base.Transport` value.
+    :param resultsPath: The file where every result is saved. If None, a temporary file is used.
+    :type resultsPath: string.
+    :param topK: The number of best results to keep in memory.
+    :type topK: int.
+    :param resultCache: If set, the strategy is not run for parameters with cached results, and new results are
+        added to the cache.
+    :type resultCache: :class:`pyalgotrade.optimizer.resultcache.ResultCache`.
+    :param pruningChecks: Checks used to stop hopeless runs early. Pruned runs are flagged in their metrics.
+    :type pruningChecks: list of :class:`pyalgotrade.optimizer.pruning.Check`.
+    :param pruningPeriod: Checks are run every this many bars.
+    :type pruningPeriod: int.
+    :param sharedFeed: True to run all the parameter sets in a job in a single pass over the bars. Check
+        :class:`pyalgotrade.optimizer.multirun.MultiRunner`.
+    :type sharedFeed: boolean.
+    :param progressHandler: A function called with a :class:`pyalgotrade.optimizer.progress.Progress` every time
+        results get pushed.
     :rtype: A :class:`Results` instance with the best results found.
     """
 
@@ -104,9 +137,15 @@ def run(strategyClass, barFeed, strategyParameters, workerCount=None, logLevel=l
 
     # Build and start the server thread before the worker processes.
     # We'll manually stop the server once workers have finished.
-    paramSource = base.ParameterSource(strategyParameters)
-    resultSinc = base.ResultSinc()
-    srv = xmlrpcserver.Server(paramSource, resultSinc, barFeed, "localhost", port, False)
+    # Bars are loaded once into memory-mapped files that all the workers share.
+    paramSource = base.build_parameter_source(strategyParameters)
+    resultSinc = results.ResultStore(resultsPath, topK)
+    sharedBarsPath = tempfile.mkdtemp(prefix="pyalgotrade-bars-")
+    srv = server.build_server(
+        transport, paramSource, resultSinc, barFeed, "localhost", port, False, sharedBarsPath, resultCache
+    )
+    if progressHandler is not None:
+        srv.getProgressEvent().subscribe(progressHandler)
     serverThread = ServerThread(srv)
     serverThread.start()
 
@@ -115,7 +154,7 @@ def run(strategyClass, barFeed, strategyParameters, workerCount=None, logLevel=l
         for i in range(workerCount):
             workers.append(multiprocessing.Process(
                 target=worker_process,
-                args=(strategyClass, port, logLevel))
+                args=(strategyClass, port, logLevel, transport, pruningChecks, pruningPeriod, sharedFeed))
             )
 
         logger.info("Executing workers")
@@ -133,9 +172,11 @@ def run(strategyClass, barFeed, strategyParameters, workerCount=None, logLevel=l
         # Stop and wait the server to finish.
         srv.stop()
         serverThread.join()
+        shutil.rmtree(sharedBarsPath, ignore_errors=True)
+        resultSinc.close()
 
         bestResult, bestParameters = resultSinc.getBest()
         if bestResult is not None:
-            ret = server.Results(bestParameters.args, bestResult)
+            ret = server.Results(bestParameters.args, bestResult, resultSinc)
 
     return ret
@@ -0,0 +1,186 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import weakref
+
+from pyalgotrade import dispatcher
+from pyalgotrade import logger
+from pyalgotrade.broker import backtesting
+
+# Bar feed -> {key: indicator}
+_sharedIndicators = weakref.WeakKeyDictionary()
+
+
+def get_shared(barFeed, key, factory):
+    """Returns an indicator built on top of a bar feed, building it only the first time it is requested for that
+    feed. Strategies that run on the same feed using a :class:`MultiRunner` can use this to share indicators instead
+    of calculating them once per strategy. It works as well for strategies that don't share the feed.
+
+    :param barFeed: The bar feed the indicator is built on.
+    :type barFeed: :class:`pyalgotrade.barfeed.BaseBarFeed`.
+    :param key: A hashable value that identifies the indicator, for example ("sma", "orcl", 20).
+    :param factory: A function with no arguments that builds the indicator.
+
+    .. note::
+        Only indicators that depend solely on the bar feed should be shared, and never the ones that depend on the
+        state of a strategy.
+    """
+
+    indicators = _sharedIndicators.get(barFeed)
+    if indicators is None:
+        indicators = {}
+        _sharedIndicators[barFeed] = indicators
+    ret = indicators.get(key)
+    if ret is None:
+        ret = factory()
+        indicators[key] = ret
+    return ret
+
+
+class MultiRunner(object):
+    """Runs many strategies on the same bar feed in a single pass over the bars.
+    Each strategy has its own broker, but bars, dataseries and shared indicators (check :func:`get_shared`) are
+    built only once for all of them.
+
+    :param barFeed: The bar feed shared by all the strategies.
+    :type barFeed: :class:`pyalgotrade.barfeed.BaseBarFeed`.
+    :param resultFun: A function that receives a strategy once it finishes and returns its result. If None,
+        getResult is used.
+
+    .. note::
+        * Strategies must be built using barFeed, and they should not be run on their own.
+        * A strategy that calls stop gets finished right away, and the rest keep running. Its result is the one at
+          that time.
+        * Strategies are independent, so the result for each one is the same as if it was run on its own.
+    """
+
+    def __init__(self, barFeed, resultFun=None):
+        self.__barFeed = barFeed
+        if resultFun is None:
+            resultFun = lambda strat: strat.getResult()
+        self.__resultFun = resultFun
+        self.__strategies = []
+        self.__results = []
+        self.__active = []
+        self.__dispatcher = dispatcher.Dispatcher()
+        self.__dispatcher.getStartEvent().subscribe(self.__onStart)
+        self.__dispatcher.getIdleEvent().subscribe(self.__onIdle)
+        self.__dispatcher.getDispatchEndEvent().subscribe(self.__onDispatchEnd)
+
+    def addStrategy(self, strat):
+        """Adds a strategy to run.
+
+        :param strat: The strategy.
+        :type strat: :class:`pyalgotrade.strategy.BaseStrategy`.
+        """
+        if strat.getFeed() is not self.__barFeed:
+            raise Exception("The strategy must be built using the same bar feed")
+        self.__strategies.append(strat)
+        self.__results.append(None)
+        self.__active.append(len(self.__strategies) - 1)
+        # Brokers are dispatched before the bar feed, like when running the strategy on its own.
+        self.__dispatcher.addSubject(strat.getBroker())
+
+    def getStrategies(self):
+        return self.__strategies
+
+    def getResults(self):
+        """Returns the results, in the same order the strategies were added."""
+        return self.__results
+
+    def getDispatcher(self):
+        return self.__dispatcher
+
+    def __finish(self, index, bars):
+        strat = self.__strategies[index]
+        strat.onFinish(bars)
+        self.__results[index] = self.__resultFun(strat)
+
+    def __finishStopped(self):
+        active = []
+        for index in self.__active:
+            strat = self.__strategies[index]
+            if strat.getDispatcher().isStopRequested():
+                # Stop processing bars so the strategy and its broker are left as they were when stop was called.
+                strat._detachFromFeed()
+                if isinstance(strat.getBroker(), backtesting.Broker):
+                    self.__barFeed.getNewValuesEvent().unsubscribe(strat.getBroker().onBars)
+                self.__finish(index, self.__barFeed.getCurrentBars())
+            else:
+                active.append(index)
+        self.__active = active
+        if len(self.__active) == 0:
+            self.__dispatcher.stop()
+
+    def __forward(self, getEvent):
+        for index in self.__active:
+            getEvent(self.__strategies[index].getDispatcher()).emit()
+        self.__finishStopped()
+
+    def __onStart(self):
+        self.__forward(lambda disp: disp.getStartEvent())
+
+    def __onIdle(self):
+        self.__forward(lambda disp: disp.getIdleEvent())
+
+    def __onDispatchEnd(self):
+        self.__forward(lambda disp: disp.getDispatchEndEvent())
+
+    def run(self):
+        """Call once (**and only once**) to run all the strategies."""
+        if len(self.__strategies) == 0:
+            return
+
+        self.__dispatcher.addSubject(self.__barFeed)
+        # Strategies log using the datetime from their own dispatchers, which are not running.
+        dateTimeHook = logger.Formatter.DATETIME_HOOK
+        if dateTimeHook is not None:
+            logger.Formatter.DATETIME_HOOK = self.__dispatcher.getCurrentDateTime
+        try:
+            self.__dispatcher.run()
+        finally:
+            logger.Formatter.DATETIME_HOOK = dateTimeHook
+
+        bars = self.__barFeed.getCurrentBars()
+        if bars is None:
+            raise Exception("Feed was empty")
+        for index in self.__active:
+            self.__finish(index, bars)
+        self.__active = []
+
+
+def run(barFeed, strategies, resultFun=None):
+    """Runs many strategies on the same bar feed in a single pass over the bars, and returns their results in the
+    same order. Check :class:`MultiRunner` for details.
+
+    :param barFeed: The bar feed shared by all the strategies.
+    :type barFeed: :class:`pyalgotrade.barfeed.BaseBarFeed`.
+    :param strategies: The strategies, built using barFeed.
+    :type strategies: list of :class:`pyalgotrade.strategy.BaseStrategy`.
+    :param resultFun: A function that receives a strategy once it finishes and returns its result. If None,
+        getResult is used.
+    :rtype: list.
+    """
+
+    runner = MultiRunner(barFeed, resultFun)
+    for strat in strategies:
+        runner.addStrategy(strat)
+    runner.run()
+    return runner.getResults()
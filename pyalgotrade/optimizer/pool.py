@@ -0,0 +1,305 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import Queue
+import logging
+import multiprocessing
+import os
+import pickle
+import time
+
+import pyalgotrade.logger
+from pyalgotrade import barfeed
+from pyalgotrade.optimizer import base
+from pyalgotrade.optimizer import coordinator
+from pyalgotrade.optimizer import pruning
+from pyalgotrade.optimizer import results
+from pyalgotrade.optimizer import server
+from pyalgotrade.optimizer import worker
+from pyalgotrade.optimizer import xmlrpcserver
+
+logger = logging.getLogger(__name__)
+
+# The runner for the worker process and the queue where it reports the jobs it starts. They get set once, when the
+# process starts.
+_runner = None
+_startedJobs = None
+
+# Seconds to wait for results before checking for jobs that failed or were lost.
+_pollInterval = 0.1
+
+
+class Runner(object):
+    # Runs the strategy for the parameter sets in a job, inside a worker process.
+    def __init__(self, strategyClass, barsFreq, instruments, bars, logLevel, pruningChecks, pruningPeriod,
+                 sharedFeed):
+        self.__strategyClass = strategyClass
+        self.__barsFreq = barsFreq
+        self.__instruments = instruments
+        self.__bars = bars
+        self.__pruningChecks = [] if pruningChecks is None else pruningChecks
+        self.__pruningPeriod = pruningPeriod
+        self.__sharedFeed = sharedFeed
+        self.__logger = pyalgotrade.logger.getLogger("worker-%s" % (os.getpid()))
+        self.__logger.setLevel(logLevel)
+
+    def getLogger(self):
+        return self.__logger
+
+    def attachPruner(self, strat):
+        if len(self.__pruningChecks):
+            pruning.attach(strat, self.__pruningChecks, self.__pruningPeriod)
+
+    def __buildFeed(self):
+        return barfeed.OptimizerBarFeed(self.__barsFreq, self.__instruments, self.__bars)
+
+    def __runStrategy(self, parameters):
+        self.__logger.info("Running strategy with parameters %s" % (str(parameters)))
+        result = None
+        metrics = None
+        try:
+            strat = self.__strategyClass(self.__buildFeed(), *parameters)
+            self.attachPruner(strat)
+            strat.run()
+            result, metrics = strat.getResult(), worker.get_metrics(strat)
+        except Exception, e:
+            self.__logger.exception("Error running strategy with parameters %s: %s" % (str(parameters), e))
+        self.__logger.info("Result %s" % result)
+        return parameters, result, metrics
+
+    def runJob(self, parametersList):
+        if self.__sharedFeed and len(parametersList) > 1:
+            try:
+                runResults = worker.run_shared_feed(self, self.__strategyClass, self.__buildFeed(), parametersList)
+                return [
+                    (parameters, result, metrics)
+                    for parameters, (result, metrics) in zip(parametersList, runResults)
+                ]
+            except Exception, e:
+                # One failing parameter set takes down the whole pass, so run them one at a time instead.
+                self.__logger.exception(
+                    "Error running %d parameter sets in a single pass: %s" % (len(parametersList), e)
+                )
+        return [self.__runStrategy(parameters) for parameters in parametersList]
+
+
+def _init_process(startedJobs, *runnerArgs):
+    global _runner, _startedJobs
+    _runner = Runner(*runnerArgs)
+    _startedJobs = startedJobs
+
+
+def _check_picklable(record):
+    # Records that can't be sent back would make the whole job fail.
+    try:
+        pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+    except Exception, e:
+        _runner.getLogger().error("Result for parameters %s can't be pickled: %s" % (str(record[0]), e))
+        record = (record[0], None, None)
+    return record
+
+
+def _run_job(slot, jobId, parametersList):
+    _startedJobs.put((slot, jobId, os.getpid()))
+    try:
+        records = [_check_picklable(record) for record in _runner.runJob(parametersList)]
+    except Exception, e:
+        # Results should always be sent back, otherwise the job would never be finished.
+        _runner.getLogger().exception("Error running job: %s" % (e))
+        records = [(parameters, None, None) for parameters in parametersList]
+    return slot, jobId, records
+
+
+def _drain(job):
+    ret = []
+    parameters = job.getNextParameters()
+    while parameters is not None:
+        ret.append(parameters)
+        parameters = job.getNextParameters()
+    return ret
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+class _Dispatcher(object):
+    # Hands out jobs to the process pool. Every slot is a job being processed, and it is seen by the coordinator as a
+    # worker, so jobs get sized using the throughput measured for a single process. The coordinator may hand out copies
+    # of the same job to different slots, so work is tracked by slot.
+    def __init__(self, coord, processPool, workerCount, startedJobs):
+        self.__coord = coord
+        self.__processPool = processPool
+        self.__startedJobs = startedJobs
+        self.__freeSlots = ["pool-%d" % (i) for i in range(workerCount)]
+        # Results get here through the AsyncResult callback, that is only called if the job succeeds.
+        self.__finished = Queue.Queue()
+        # Slot -> (job id, parameters list, AsyncResult).
+        self.__inFlight = {}
+        # Slot -> id of the process running its job.
+        self.__pids = {}
+
+    def __submitJobs(self):
+        retryAfter = None
+        while len(self.__freeSlots):
+            job = self.__coord.getNextJob(xmlrpcserver.Server.defaultBatchSize, self.__freeSlots[-1])
+            if job is None:
+                break
+            if job.getRetryAfter() is not None:
+                retryAfter = job.getRetryAfter()
+                break
+            slot = self.__freeSlots.pop()
+            parametersList = _drain(job)
+            asyncResult = self.__processPool.apply_async(
+                _run_job, (slot, job.getId(), parametersList), callback=self.__finished.put
+            )
+            self.__inFlight[slot] = (job.getId(), parametersList, asyncResult)
+        return retryAfter
+
+    def __isRunning(self, slot, jobId):
+        return slot in self.__inFlight and self.__inFlight[slot][0] == jobId
+
+    def __finishJob(self, slot, jobId, records):
+        # Results for a job that was already failed in this slot are ignored.
+        if not self.__isRunning(slot, jobId):
+            return
+        del self.__inFlight[slot]
+        self.__pids.pop(slot, None)
+        self.__freeSlots.append(slot)
+        # If a copy of the job already finished in another slot, the coordinator ignores these results.
+        self.__coord.pushJobResults(jobId, records, slot)
+
+    def __failJob(self, slot, reason):
+        jobId, parametersList, asyncResult = self.__inFlight[slot]
+        logger.error("Job with %d parameter sets failed: %s" % (len(parametersList), reason))
+        self.__finishJob(slot, jobId, [(parameters, None, None) for parameters in parametersList])
+
+    def __checkFailedJobs(self):
+        while True:
+            try:
+                slot, jobId, pid = self.__startedJobs.get_nowait()
+            except Queue.Empty:
+                break
+            if self.__isRunning(slot, jobId):
+                self.__pids[slot] = pid
+
+        for slot, (jobId, parametersList, asyncResult) in self.__inFlight.items():
+            if asyncResult.ready():
+                if not asyncResult.successful():
+                    try:
+                        asyncResult.get(0)
+                    except Exception, e:
+                        self.__failJob(slot, e)
+            elif slot in self.__pids and not _is_alive(self.__pids[slot]):
+                # The pool replaces processes that die, but the job they were running is lost.
+                self.__failJob(slot, "The process running it died")
+
+    def run(self):
+        while self.__coord.jobsPending():
+            retryAfter = self.__submitJobs()
+
+            if len(self.__inFlight) == 0:
+                if retryAfter is None:
+                    break
+                # Nothing to process until the parameter source generates more parameters.
+                time.sleep(retryAfter)
+                continue
+
+            # Waiting with a timeout also lets KeyboardInterrupt through.
+            try:
+                slot, jobId, records = self.__finished.get(timeout=_pollInterval)
+                self.__finishJob(slot, jobId, records)
+            except Queue.Empty:
+                pass
+            self.__checkFailedJobs()
+
+
+def run(strategyClass, barFeed, strategyParameters, workerCount=None, logLevel=logging.ERROR, resultsPath=None,
+        topK=10, resultCache=None, pruningChecks=None, pruningPeriod=1, sharedFeed=False, progressHandler=None):
+    """Executes many instances of a strategy in parallel using a pool of processes, and finds the parameters that
+    yield the best results. Unlike :func:`pyalgotrade.optimizer.local.run`, there is no server listening for workers,
+    so no ports are used. Bars are loaded once and inherited by the processes when they get forked.
+
+    :param strategyClass: The strategy class.
+    :param barFeed: The bar feed to use to backtest the strategy.
+    :type barFeed: :class:`pyalgotrade.barfeed.BarFeed`.
+    :param strategyParameters: The set of parameters to use for backtesting. An iterable object where **each element is
+        a tuple that holds parameter values**, or a :class:`pyalgotrade.optimizer.search.SearchDriver`.
+    :param workerCount: The number of processes. If None then as many processes as CPUs are used.
+    :type workerCount: int.
+    :param logLevel: The log level for the processes. Defaults to **logging.ERROR**.
+    :param resultsPath: The file where every result is saved. If None, a temporary file is used.
+    :type resultsPath: string.
+    :param topK: The number of best results to keep in memory.
+    :type topK: int.
+    :param resultCache: If set, the strategy is not run for parameters with cached results, and new results are
+        added to the cache.
+    :type resultCache: :class:`pyalgotrade.optimizer.resultcache.ResultCache`.
+    :param pruningChecks: Checks used to stop hopeless runs early. Pruned runs are flagged in their metrics.
+    :type pruningChecks: list of :class:`pyalgotrade.optimizer.pruning.Check`.
+    :param pruningPeriod: Checks are run every this many bars.
+    :type pruningPeriod: int.
+    :param sharedFeed: True to run all the parameter sets in a job in a single pass over the bars. Check
+        :class:`pyalgotrade.optimizer.multirun.MultiRunner`.
+    :type sharedFeed: boolean.
+    :param progressHandler: A function called with a :class:`pyalgotrade.optimizer.progress.Progress` every time
+        results are received.
+    :rtype: A :class:`pyalgotrade.optimizer.server.Results` instance with the best results found, or None if no
+        results were obtained.
+    """
+
+    assert(workerCount is None or workerCount > 0)
+    if workerCount is None:
+        workerCount = multiprocessing.cpu_count()
+
+    paramSource = base.build_parameter_source(strategyParameters)
+    resultSinc = results.ResultStore(resultsPath, topK)
+    coord = coordinator.Coordinator(paramSource, resultSinc, barFeed, resultCache=resultCache)
+    if progressHandler is not None:
+        coord.getProgressEvent().subscribe(progressHandler)
+
+    try:
+        coord.loadBars()
+        instruments, bars = coord.getInstrumentsAndBars()
+        startedJobs = multiprocessing.Queue()
+        processPool = multiprocessing.Pool(workerCount, _init_process, (
+            startedJobs, strategyClass, coord.getBarsFrequency(), instruments, bars, logLevel, pruningChecks,
+            pruningPeriod, sharedFeed
+        ))
+        try:
+            logger.info("Executing workers")
+            _Dispatcher(coord, processPool, workerCount, startedJobs).run()
+            logger.info("All workers finished")
+        finally:
+            # Processes may still be running copies of jobs that were already finished.
+            processPool.terminate()
+            processPool.join()
+    finally:
+        resultSinc.close()
+
+    ret = None
+    bestResult, bestParameters = resultSinc.getBest()
+    if bestResult is not None:
+        ret = server.Results(bestParameters.args, bestResult, resultSinc)
+    return ret
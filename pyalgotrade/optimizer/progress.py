@@ -0,0 +1,222 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+
+def format_seconds(seconds):
+    """Returns a string like 1h 02m 03s for a number of seconds."""
+    seconds = int(round(seconds))
+    return "%dh %02dm %02ds" % (seconds / 3600, seconds % 3600 / 60, seconds % 60)
+
+
+def _safe_div(a, b):
+    if not b:
+        return None
+    return a / float(b)
+
+
+class WorkerStats(object):
+    # Accumulates the figures for a single worker. Used by the coordinator while holding its lock.
+    def __init__(self):
+        self.jobs = 0
+        self.parameterSets = 0
+        self.busyTime = 0.0
+        self.throughput = None
+        self.lastSeen = None
+
+
+class WorkerProgress(object):
+    """Progress figures for a single worker.
+
+    .. note::
+        This class should not be instantiated directly.
+    """
+
+    def __init__(self, name, stats, barCount, now):
+        self.__name = name
+        self.__jobs = stats.jobs
+        self.__parameterSets = stats.parameterSets
+        self.__throughput = stats.throughput
+        self.__avgRunTime = _safe_div(stats.busyTime, stats.parameterSets)
+        self.__barsPerSecond = None
+        if stats.throughput is not None and barCount is not None:
+            self.__barsPerSecond = stats.throughput * barCount
+        self.__idleTime = None if stats.lastSeen is None else now - stats.lastSeen
+
+    def getName(self):
+        return self.__name
+
+    def getJobs(self):
+        """Returns the number of jobs completed."""
+        return self.__jobs
+
+    def getParameterSets(self):
+        """Returns the number of parameter sets completed."""
+        return self.__parameterSets
+
+    def getThroughput(self):
+        """Returns the parameter sets per second recently measured, or None."""
+        return self.__throughput
+
+    def getBarsPerSecond(self):
+        """Returns the bars per second recently measured, or None."""
+        return self.__barsPerSecond
+
+    def getAvgRunTime(self):
+        """Returns the average number of seconds it takes to run the strategy with a set of parameters, or None."""
+        return self.__avgRunTime
+
+    def getIdleTime(self):
+        """Returns the number of seconds since the worker last asked for a job or pushed results, or None."""
+        return self.__idleTime
+
+    def toDict(self):
+        return {
+            "name": self.__name,
+            "jobs": self.__jobs,
+            "parameterSets": self.__parameterSets,
+            "throughput": self.__throughput,
+            "barsPerSecond": self.__barsPerSecond,
+            "avgRunTime": self.__avgRunTime,
+            "idleTime": self.__idleTime,
+        }
+
+
+class Progress(object):
+    """A snapshot of the progress of an optimization.
+    Check :meth:`pyalgotrade.optimizer.coordinator.Coordinator.getProgress`.
+
+    .. note::
+        This class should not be instantiated directly.
+    """
+
+    def __init__(self, elapsed, completed, failed, pruned, cacheHits, queued, inFlight, total, barCount, workers):
+        self.__elapsed = elapsed
+        self.__completed = completed
+        self.__failed = failed
+        self.__pruned = pruned
+        self.__cacheHits = cacheHits
+        self.__queued = queued
+        self.__inFlight = inFlight
+        self.__total = total
+        self.__barCount = barCount
+        self.__workers = workers
+
+    def getElapsed(self):
+        """Returns the number of seconds since the first job was handed out."""
+        return self.__elapsed
+
+    def getCompleted(self):
+        """Returns the number of parameter sets completed, including failed, pruned and cached ones."""
+        return self.__completed
+
+    def getFailed(self):
+        return self.__failed
+
+    def getPruned(self):
+        return self.__pruned
+
+    def getCacheHits(self):
+        return self.__cacheHits
+
+    def getQueued(self):
+        """Returns the number of parameter sets read from the parameter source that were not handed out yet."""
+        return self.__queued
+
+    def getInFlight(self):
+        """Returns the number of parameter sets handed out to workers whose results were not received yet."""
+        return self.__inFlight
+
+    def getTotal(self):
+        """Returns the total number of parameter sets, or None if not known in advance."""
+        return self.__total
+
+    def getPending(self):
+        """Returns the number of parameter sets left, or None if not known."""
+        if self.__total is None:
+            return None
+        return max(0, self.__total - self.__completed)
+
+    def getBarCount(self):
+        """Returns the number of bars each strategy run goes through, or None if bars were not loaded yet."""
+        return self.__barCount
+
+    def getWorkers(self):
+        """Returns a list of :class:`WorkerProgress`, one for every worker."""
+        return self.__workers
+
+    def getThroughput(self):
+        """Returns the parameter sets per second since the first job was handed out, excluding cached ones, or None."""
+        return _safe_div(self.__completed - self.__cacheHits, self.__elapsed)
+
+    def getAvgRunTime(self):
+        """Returns the average number of seconds it takes to run the strategy with a set of parameters, or None."""
+        busyTime = 0.0
+        parameterSets = 0
+        for worker in self.__workers:
+            if worker.getAvgRunTime() is not None:
+                busyTime += worker.getAvgRunTime() * worker.getParameterSets()
+                parameterSets += worker.getParameterSets()
+        return _safe_div(busyTime, parameterSets)
+
+    def getETA(self):
+        """Returns the estimated number of seconds left, or None if it can't be estimated."""
+        pending = self.getPending()
+        throughput = self.getThroughput()
+        if pending is None or not throughput:
+            return None
+        return pending / throughput
+
+    def toDict(self):
+        """Returns a dictionary with all the figures, that can be serialized to JSON."""
+        return {
+            "elapsed": self.__elapsed,
+            "completed": self.__completed,
+            "failed": self.__failed,
+            "pruned": self.__pruned,
+            "cacheHits": self.__cacheHits,
+            "queued": self.__queued,
+            "inFlight": self.__inFlight,
+            "total": self.__total,
+            "pending": self.getPending(),
+            "barCount": self.__barCount,
+            "throughput": self.getThroughput(),
+            "avgRunTime": self.getAvgRunTime(),
+            "eta": self.getETA(),
+            "workers": [worker.toDict() for worker in self.__workers],
+        }
+
+    def __str__(self):
+        ret = "%d parameter sets completed" % (self.__completed)
+        if self.__total is not None:
+            ret += " out of %d" % (self.__total)
+        ret += ", %d queued, %d in flight, %d failed, %d pruned, %d cached" % (
+            self.__queued, self.__inFlight, self.__failed, self.__pruned, self.__cacheHits
+        )
+        throughput = self.getThroughput()
+        if throughput is not None:
+            ret += ", %.2f parameter sets per second" % (throughput)
+        avgRunTime = self.getAvgRunTime()
+        if avgRunTime is not None:
+            ret += ", %.3f seconds per run" % (avgRunTime)
+        eta = self.getETA()
+        if eta is not None:
+            ret += ", ETA %s" % (format_seconds(eta))
+        ret += ", %d workers" % (len(self.__workers))
+        return ret
@@ -0,0 +1,180 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+from pyalgotrade import stratanalyzer
+from pyalgotrade.stratanalyzer import drawdown
+
+# The name the Pruner is attached to strategies with.
+ANALYZER_NAME = "pruning"
+# The key in the metrics with the reason why a run was pruned.
+METRICS_KEY = "pruned"
+
+
+class Check(object):
+    """Base class for pruning checks. Checks don't hold any state, so the same instance can be used for many runs.
+
+    .. note::
+        This is a base class and should not be used directly.
+    """
+
+    def check(self, pruner):
+        """Override to return a string with the reason to stop the run, or None to keep going.
+
+        :param pruner: The pruner that holds the equity figures for the run.
+        :type pruner: :class:`Pruner`.
+        """
+        raise NotImplementedError()
+
+
+class MaxDrawDown(Check):
+    """Stops runs once the max drawdown exceeds a threshold.
+
+    :param maxDrawDown: The max drawdown allowed, as a fraction of the equity. For example, 0.3 means 30%.
+    :type maxDrawDown: float.
+    """
+
+    def __init__(self, maxDrawDown):
+        assert(maxDrawDown > 0)
+        self.__maxDrawDown = maxDrawDown
+
+    def check(self, pruner):
+        if pruner.getMaxDrawDown() > self.__maxDrawDown:
+            return "Max drawdown %.2f %% over %.2f %%" % (pruner.getMaxDrawDown() * 100, self.__maxDrawDown * 100)
+        return None
+
+
+class MinEquity(Check):
+    """Stops runs once the equity falls below a fraction of the initial equity.
+
+    :param fraction: The fraction of the initial equity. For example, 0.5 stops runs that lost half of it.
+    :type fraction: float.
+    """
+
+    def __init__(self, fraction):
+        assert(fraction > 0)
+        self.__fraction = fraction
+
+    def check(self, pruner):
+        if pruner.getEquity() < pruner.getInitialEquity() * self.__fraction:
+            return "Equity %.2f under %.2f %% of %.2f" % (
+                pruner.getEquity(), self.__fraction * 100, pruner.getInitialEquity()
+            )
+        return None
+
+
+class Pruner(stratanalyzer.StrategyAnalyzer):
+    """A :class:`pyalgotrade.stratanalyzer.StrategyAnalyzer` that tracks the equity and stops the strategy once
+    any of the checks trips. The result of a pruned run is the one at the time it was stopped.
+
+    :param checks: The checks.
+    :type checks: list of :class:`Check`.
+    :param period: Checks are run every this many bars.
+    :type period: int.
+
+    .. note::
+        Use :func:`attach` instead of attaching this analyzer directly.
+    """
+
+    def __init__(self, checks, period=1):
+        super(Pruner, self).__init__()
+        assert(period > 0)
+        self.__checks = list(checks)
+        self.__period = period
+        self.__drawDown = drawdown.DrawDownHelper()
+        self.__maxDrawDown = 0
+        self.__initialEquity = None
+        self.__equity = None
+        self.__barsProcessed = 0
+        self.__reason = None
+
+    def addChecks(self, checks):
+        self.__checks.extend(checks)
+
+    def beforeOnBars(self, strat, bars):
+        if self.__reason is not None:
+            return
+
+        self.__equity = strat.getBroker().getEquity()
+        if self.__initialEquity is None:
+            self.__initialEquity = self.__equity
+        self.__drawDown.update(bars.getDateTime(), self.__equity, self.__equity)
+        self.__maxDrawDown = min(self.__maxDrawDown, self.__drawDown.getMaxDrawDown())
+        self.__barsProcessed += 1
+
+        if self.__barsProcessed % self.__period == 0:
+            for check in self.__checks:
+                reason = check.check(self)
+                if reason is not None:
+                    self.__reason = reason
+                    strat.stop()
+                    break
+
+    def getEquity(self):
+        """Returns the equity as of the last bars."""
+        return self.__equity
+
+    def getInitialEquity(self):
+        return self.__initialEquity
+
+    def getMaxDrawDown(self):
+        """Returns the max drawdown so far, as a positive fraction of the equity."""
+        return abs(self.__maxDrawDown)
+
+    def getBarsProcessed(self):
+        return self.__barsProcessed
+
+    def isPruned(self):
+        return self.__reason is not None
+
+    def getReason(self):
+        """Returns the reason why the strategy was stopped, or None."""
+        return self.__reason
+
+
+def attach(strat, checks, period=1):
+    """Attaches a :class:`Pruner` to a strategy, or adds the checks to the one already attached.
+    Call it before running the strategy, either from the strategy itself or from the worker.
+
+    :param strat: The strategy.
+    :type strat: :class:`pyalgotrade.strategy.BaseStrategy`.
+    :param checks: The checks.
+    :type checks: list of :class:`Check`.
+    :param period: Checks are run every this many bars. Ignored if a pruner was already attached.
+    :type period: int.
+    :rtype: :class:`Pruner`.
+    """
+
+    ret = get_pruner(strat)
+    if ret is None:
+        ret = Pruner(checks, period)
+        strat.attachAnalyzerEx(ret, ANALYZER_NAME)
+    else:
+        ret.addChecks(checks)
+    return ret
+
+
+def get_pruner(strat):
+    """Returns the :class:`Pruner` attached to a strategy, or None."""
+    return strat.getNamedAnalyzer(ANALYZER_NAME)
+
+
+def is_pruned(metrics):
+    """Returns True if the metrics belong to a pruned run."""
+    return metrics is not None and metrics.get(METRICS_KEY) is not None
@@ -0,0 +1,179 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import hashlib
+import inspect
+import os
+import pickle
+import sqlite3
+import threading
+
+
+def strategy_fingerprint(strategyClass, version=None):
+    """Returns a fingerprint for a strategy class, based on the source code of the class and its base classes.
+
+    :param strategyClass: The strategy class.
+    :param version: An optional version to include in the fingerprint. Change it to invalidate cached results when
+        something the strategy depends on, other than its source code, changes.
+    :type version: string.
+    :rtype: string.
+    """
+
+    ret = hashlib.sha1()
+    for cls in inspect.getmro(strategyClass):
+        if cls is object:
+            continue
+        ret.update("%s.%s" % (cls.__module__, cls.__name__))
+        try:
+            ret.update(inspect.getsource(cls))
+        except (IOError, TypeError):
+            pass
+    if version is not None:
+        ret.update(str(version))
+    return ret.hexdigest()
+
+
+class BarsFingerprint(object):
+    """Builds a fingerprint for a sequence of :class:`pyalgotrade.bar.Bars`, one at a time."""
+
+    def __init__(self, instruments, frequency):
+        self.__hash = hashlib.sha1()
+        self.__hash.update(repr((sorted(instruments), frequency)))
+
+    def update(self, bars):
+        values = [bars.getDateTime().isoformat()]
+        for instrument in sorted(bars.getInstruments()):
+            bar = bars[instrument]
+            values.append((
+                instrument, bar.getOpen(), bar.getHigh(), bar.getLow(), bar.getClose(), bar.getVolume(),
+                bar.getAdjClose(), bar.getFrequency(), sorted(bar.getExtraColumns().items())
+            ))
+        self.__hash.update(repr(values))
+
+    def getFingerprint(self):
+        return self.__hash.hexdigest()
+
+
+class ResultCache(object):
+    """A persistent cache for the results of running a strategy with a set of parameters on a set of bars.
+    Results are looked up using the strategy fingerprint, the bars fingerprint and the parameters, so results get
+    recomputed if any of them changes. This class is thread safe.
+
+    :param dbFilePath: The path to the SQLite database. It gets created if it doesn't exist.
+    :type dbFilePath: string.
+    :param strategyFingerprint: The strategy fingerprint. Check :func:`strategy_fingerprint`.
+    :type strategyFingerprint: string.
+
+    .. note::
+        * Results for failed runs are not cached.
+        * Stale results are not used, but they are kept until :meth:`invalidate` is called.
+    """
+
+    def __init__(self, dbFilePath, strategyFingerprint):
+        self.__strategyFingerprint = strategyFingerprint
+        self.__lock = threading.Lock()
+
+        # If the file doesn't exist, we'll create it and initialize it.
+        initialize = not os.path.exists(dbFilePath)
+        self.__connection = sqlite3.connect(dbFilePath, check_same_thread=False)
+        self.__connection.isolation_level = None  # To do auto-commit
+        if initialize:
+            self.createSchema()
+
+    def createSchema(self):
+        self.__connection.execute(
+            "create table if not exists result ("
+            "strategy text not null"
+            ", data text not null"
+            ", parameters text not null"
+            ", result blob not null"
+            ", primary key (strategy, data, parameters))")
+
+    def getStrategyFingerprint(self):
+        return self.__strategyFingerprint
+
+    def get(self, dataFingerprint, parameters):
+        """Returns a (result, metrics) tuple, or None if there is no result cached for the parameters.
+
+        :param dataFingerprint: The bars fingerprint. Check :class:`BarsFingerprint`.
+        :type dataFingerprint: string.
+        :param parameters: The parameter values.
+        :type parameters: tuple.
+        """
+
+        sql = "select result from result where strategy = ? and data = ? and parameters = ?"
+        args = [self.__strategyFingerprint, dataFingerprint, repr(tuple(parameters))]
+        with self.__lock:
+            row = self.__connection.execute(sql, args).fetchone()
+        ret = None
+        if row is not None:
+            ret = pickle.loads(str(row[0]))
+        return ret
+
+    def put(self, dataFingerprint, parameters, result, metrics=None):
+        """Saves the result for a set of parameters. Nothing is saved if result is None.
+
+        :param dataFingerprint: The bars fingerprint. Check :class:`BarsFingerprint`.
+        :type dataFingerprint: string.
+        :param parameters: The parameter values.
+        :type parameters: tuple.
+        :param result: The result.
+        :param metrics: Optional metrics reported by the strategy.
+        :type metrics: dict.
+        """
+
+        if result is None:
+            return
+        sql = "insert or replace into result (strategy, data, parameters, result) values (?, ?, ?, ?)"
+        args = [
+            self.__strategyFingerprint, dataFingerprint, repr(tuple(parameters)),
+            sqlite3.Binary(pickle.dumps((result, metrics), pickle.HIGHEST_PROTOCOL))
+        ]
+        with self.__lock:
+            self.__connection.execute(sql, args)
+
+    def getCount(self):
+        """Returns the number of cached results, including stale ones."""
+        with self.__lock:
+            return self.__connection.execute("select count(*) from result").fetchone()[0]
+
+    def invalidate(self, strategyFingerprint=None, dataFingerprint=None):
+        """Removes cached results. If no fingerprint is set, every result is removed.
+
+        :param strategyFingerprint: Only remove results for this strategy fingerprint.
+        :type strategyFingerprint: string.
+        :param dataFingerprint: Only remove results for this bars fingerprint.
+        :type dataFingerprint: string.
+        """
+
+        sql = "delete from result where 1 = 1"
+        args = []
+        if strategyFingerprint is not None:
+            sql += " and strategy = ?"
+            args.append(strategyFingerprint)
+        if dataFingerprint is not None:
+            sql += " and data = ?"
+            args.append(dataFingerprint)
+        with self.__lock:
+            self.__connection.execute(sql, args)
+
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
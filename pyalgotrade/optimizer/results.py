@@ -0,0 +1,153 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import heapq
+import itertools
+import os
+import pickle
+import tempfile
+import threading
+
+from pyalgotrade.optimizer import base
+from pyalgotrade.optimizer import pruning
+
+
+class Record(object):
+    """The outcome of running a strategy with a set of parameters.
+
+    .. note::
+        This class should not be instantiated directly.
+    """
+
+    def __init__(self, parameters, result, metrics):
+        self.__parameters = parameters
+        self.__result = result
+        self.__metrics = metrics
+
+    def getParameters(self):
+        """Returns a sequence of parameter values."""
+        return self.__parameters
+
+    def getResult(self):
+        """Returns the result, or None if the strategy failed to run."""
+        return self.__result
+
+    def getMetrics(self):
+        """Returns a dictionary with the metrics reported by the strategy, or None.
+        Check :meth:`pyalgotrade.optimizer.worker.Worker.runStrategyWithMetrics`."""
+        return self.__metrics
+
+    def isPruned(self):
+        """Returns True if the run was stopped early. Check :mod:`pyalgotrade.optimizer.pruning`."""
+        return pruning.is_pruned(self.__metrics)
+
+
+class ResultStore(base.ResultSinc):
+    """A :class:`pyalgotrade.optimizer.base.ResultSinc` that keeps every result. Records are appended to a file, and
+    the top ones, excluding the ones for pruned runs, are also kept in memory. This class is thread safe.
+
+    :param path: The file where records are appended. If None, a temporary file is used.
+    :type path: string.
+    :param topK: The number of top records to keep in memory.
+    :type topK: int.
+    """
+
+    def __init__(self, path=None, topK=10):
+        super(ResultStore, self).__init__()
+        assert(topK > 0)
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="pyalgotrade-results-", suffix=".pickle")
+            os.close(fd)
+        self.__path = path
+        self.__lock = threading.Lock()
+        self.__topK = topK
+        # Min-heap with the top records. The sequence number breaks ties in favor of the records pushed first.
+        self.__top = []
+        self.__sequence = itertools.count()
+        self.__count = 0
+        self.__file = open(path, "ab")
+
+    def getPath(self):
+        return self.__path
+
+    def push(self, result, parameters, metrics=None):
+        super(ResultStore, self).push(result, parameters, metrics)
+        with self.__lock:
+            record = (parameters.args, result, metrics)
+            pickle.dump(record, self.__file, pickle.HIGHEST_PROTOCOL)
+            self.__count += 1
+            if result is not None and not pruning.is_pruned(metrics):
+                entry = (result, -self.__sequence.next(), record)
+                if len(self.__top) < self.__topK:
+                    heapq.heappush(self.__top, entry)
+                elif entry > self.__top[0]:
+                    heapq.heapreplace(self.__top, entry)
+
+    def getCount(self):
+        """Returns the number of records, including the ones for failed runs."""
+        with self.__lock:
+            return self.__count
+
+    def getTop(self, count=None):
+        """Returns the records with the best results, best first.
+
+        :param count: The max number of records to return. Can't be bigger than topK. If None, topK is used.
+        :type count: int.
+        :rtype: A list of :class:`Record`.
+        """
+        assert(count is None or count <= self.__topK)
+        with self.__lock:
+            entries = sorted(self.__top, reverse=True)
+        if count is not None:
+            entries = entries[:count]
+        return [Record(*entry[2]) for entry in entries]
+
+    def getAll(self, filterFun=None):
+        """Returns a generator with every record, in the order they were pushed.
+
+        :param filterFun: An optional function that receives a :class:`Record` and returns True if it should be
+            included.
+        """
+        with self.__lock:
+            if not self.__file.closed:
+                self.__file.flush()
+        for record in load(self.__path):
+            if filterFun is None or filterFun(record):
+                yield record
+
+    def close(self):
+        """Closes the file. Records can still be read after closing the store."""
+        with self.__lock:
+            self.__file.close()
+
+
+def load(path):
+    """Loads the records appended to a file by a :class:`ResultStore`.
+
+    :param path: The file.
+    :type path: string.
+    :rtype: A generator of :class:`Record`.
+    """
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield Record(*pickle.load(f))
+            except EOFError:
+                break
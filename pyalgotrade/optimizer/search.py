@@ -0,0 +1,546 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import math
+import random
+import threading
+
+from pyalgotrade.optimizer import base
+
+# Max number of attempts to generate parameters that were not tried before.
+MAX_ATTEMPTS = 100
+
+
+class Dimension(object):
+    """Base class for the values that a strategy parameter can take.
+
+    .. note::
+        This is a base class and should not be used directly.
+    """
+
+    def getSize(self):
+        """Returns the number of values, or None if there are infinitely many."""
+        raise NotImplementedError()
+
+    def sample(self, rnd):
+        """Returns a random value."""
+        raise NotImplementedError()
+
+    def mutate(self, value, rnd, scale):
+        """Returns a random value close to another one. Scale is a fraction of the range of values."""
+        raise NotImplementedError()
+
+    def density(self, value, values, scale):
+        """Returns the density, estimated from a sequence of values, at a given value."""
+        raise NotImplementedError()
+
+
+class Real(Dimension):
+    """Real values in [low, high].
+
+    :param low: The lowest value.
+    :type low: float.
+    :param high: The highest value.
+    :type high: float.
+    """
+
+    def __init__(self, low, high):
+        assert(low <= high)
+        self.__low = low
+        self.__high = high
+
+    def getSize(self):
+        return None
+
+    def toUnit(self, value):
+        if self.__high == self.__low:
+            return 0.5
+        return (value - self.__low) / float(self.__high - self.__low)
+
+    def fromUnit(self, unit):
+        unit = min(max(unit, 0), 1)
+        return self.__low + unit * (self.__high - self.__low)
+
+    def sample(self, rnd):
+        return self.fromUnit(rnd.random())
+
+    def mutate(self, value, rnd, scale):
+        unit = self.toUnit(value) + rnd.gauss(0, scale)
+        # Reflect at the bounds instead of clipping, so values don't pile up there.
+        if unit < 0:
+            unit = -unit
+        elif unit > 1:
+            unit = 2 - unit
+        return self.fromUnit(unit)
+
+    def density(self, value, values, scale):
+        # A mixture of a gaussian kernel for every value and a uniform prior, in the unit interval.
+        unit = self.toUnit(value)
+        ret = 1.0
+        for other in values:
+            ret += math.exp(-0.5 * ((unit - self.toUnit(other)) / scale) ** 2) / (scale * math.sqrt(2 * math.pi))
+        return ret / (len(values) + 1)
+
+
+class Integer(Real):
+    """Integer values in [low, high].
+
+    :param low: The lowest value.
+    :type low: int.
+    :param high: The highest value.
+    :type high: int.
+    :param step: The distance between values.
+    :type step: int.
+    """
+
+    def __init__(self, low, high, step=1):
+        assert(step > 0)
+        super(Integer, self).__init__(low, high)
+        self.__low = low
+        self.__step = step
+        self.__size = (high - low) / step + 1
+
+    def getSize(self):
+        return self.__size
+
+    def fromUnit(self, unit):
+        unit = min(max(unit, 0), 1)
+        return self.__low + int(round(unit * (self.__size - 1))) * self.__step
+
+
+class Choice(Dimension):
+    """A value out of a sequence. Use a single value for parameters that don't change, like the instrument.
+
+    :param values: The values.
+    :type values: list.
+    """
+
+    def __init__(self, values):
+        assert(len(values) > 0)
+        self.__values = list(values)
+
+    def getSize(self):
+        return len(self.__values)
+
+    def sample(self, rnd):
+        return rnd.choice(self.__values)
+
+    def mutate(self, value, rnd, scale):
+        # Values are not ordered, so there is no such thing as a close value. Pick any value instead.
+        if rnd.random() < max(scale, 1.0 / len(self.__values)):
+            value = self.sample(rnd)
+        return value
+
+    def density(self, value, values, scale):
+        return (values.count(value) + 1) / float(len(values) + len(self.__values))
+
+
+class SearchDriver(base.ParameterSource):
+    """Base class for :class:`pyalgotrade.optimizer.base.ParameterSource` implementations that generate parameters
+    based on the results of previous runs. Pass an instance instead of the parameters to
+    :func:`pyalgotrade.optimizer.local.run` or :func:`pyalgotrade.optimizer.server.serve`.
+
+    :param space: One :class:`Dimension` for every strategy parameter.
+    :type space: list.
+    :param maxEvaluations: The max number of parameter sets to try, or None for no limit.
+    :type maxEvaluations: int.
+    :param maxPending: The max number of parameter sets handed out whose results were not received yet. Workers are
+        kept waiting when this limit is reached, so the higher it is the less results new parameters are based on.
+    :type maxPending: int.
+    :param seed: The seed for the random number generator.
+
+    .. note::
+        * This is a base class and should not be used directly.
+        * The search stops early if every combination of parameters was tried.
+    """
+
+    def __init__(self, space, maxEvaluations, maxPending=10, seed=None):
+        super(SearchDriver, self).__init__([])
+        assert(len(space) > 0)
+        assert(maxPending > 0)
+        self.__space = space
+        self.__maxEvaluations = maxEvaluations
+        self.__maxPending = maxPending
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__proposed = set()
+        self.__pending = 0
+        self.__history = []
+
+        self.__spaceSize = 1
+        for dimension in space:
+            size = dimension.getSize()
+            if size is None:
+                self.__spaceSize = None
+                break
+            self.__spaceSize *= size
+
+    def getSpace(self):
+        return self.__space
+
+    def getRandom(self):
+        return self.__random
+
+    def getSpaceSize(self):
+        """Returns the number of parameter combinations, or None if there are infinitely many."""
+        return self.__spaceSize
+
+    def getTotal(self):
+        ret = self.__spaceSize
+        if self.__maxEvaluations is not None:
+            ret = self.__maxEvaluations if ret is None else min(ret, self.__maxEvaluations)
+        return ret
+
+    def getPendingCount(self):
+        """Returns the number of parameter sets handed out whose results were not received yet."""
+        return self.__pending
+
+    def getProposedCount(self):
+        return len(self.__proposed)
+
+    def wasProposed(self, parameters):
+        return parameters in self.__proposed
+
+    def getHistory(self):
+        """Returns a list of (parameters, result) tuples, in the order results were received."""
+        with self.__lock:
+            return list(self.__history)
+
+    def getCompleted(self):
+        """Returns the (parameters, result) tuples with a result, best first."""
+        ret = [entry for entry in self.__history if entry[1] is not None]
+        return sorted(ret, key=lambda entry: entry[1], reverse=True)
+
+    def sample(self, exclude=None):
+        """Returns random parameters, avoiding the ones in exclude if possible."""
+        if exclude is None:
+            exclude = self.__proposed
+        for i in xrange(MAX_ATTEMPTS):
+            ret = tuple(dimension.sample(self.__random) for dimension in self.__space)
+            if ret not in exclude:
+                break
+        return ret
+
+    def getNext(self, count):
+        assert count > 0, "Invalid number of parameters"
+
+        ret = []
+        with self.__lock:
+            while len(ret) < count and self.__pending < self.__maxPending and not self.isFinished():
+                parameters = self.propose()
+                if parameters is None:
+                    break
+                self.__proposed.add(parameters)
+                self.__pending += 1
+                ret.append(base.Parameters(*parameters))
+        return ret
+
+    def eof(self):
+        with self.__lock:
+            return self.isFinished()
+
+    def pushResult(self, result, parameters):
+        with self.__lock:
+            self.__pending = max(0, self.__pending - 1)
+            self.__history.append((parameters.args, result))
+            self.onResult(parameters.args, result)
+
+    def isFinished(self):
+        """Returns True if no more parameters will be proposed. Called while holding a lock."""
+        if self.__maxEvaluations is not None and len(self.__proposed) >= self.__maxEvaluations:
+            return True
+        return self.__spaceSize is not None and len(self.__proposed) >= self.__spaceSize
+
+    def propose(self):
+        """Override to return a tuple with the next parameters to try, or None to wait for more results.
+        Called while holding a lock."""
+        raise NotImplementedError()
+
+    def onResult(self, parameters, result):
+        """Override to get notified about results. Called while holding a lock."""
+        pass
+
+
+class RandomSearch(SearchDriver):
+    """Tries parameters sampled at random.
+
+    :param space: One :class:`Dimension` for every strategy parameter.
+    :type space: list.
+    :param maxEvaluations: The number of parameter sets to try.
+    :type maxEvaluations: int.
+    :param seed: The seed for the random number generator.
+    """
+
+    def __init__(self, space, maxEvaluations, seed=None):
+        # Results are not used, so there is no need to limit the parameters handed out.
+        super(RandomSearch, self).__init__(space, maxEvaluations, maxEvaluations, seed)
+
+    def propose(self):
+        return self.sample()
+
+
+class GeneticSearch(SearchDriver):
+    """A steady state genetic algorithm. Once populationSize results are available, parameters are generated by
+    crossing over and mutating parameters picked from the best populationSize results so far.
+
+    :param space: One :class:`Dimension` for every strategy parameter.
+    :type space: list.
+    :param maxEvaluations: The number of parameter sets to try.
+    :type maxEvaluations: int.
+    :param populationSize: The number of parameter sets to breed from.
+    :type populationSize: int.
+    :param mutationRate: The probability for every parameter to get mutated.
+    :type mutationRate: float.
+    :param tournamentSize: The number of parameter sets that compete to be picked as parents.
+    :type tournamentSize: int.
+    :param maxPending: The max number of parameter sets handed out whose results were not received yet.
+    :type maxPending: int.
+    :param seed: The seed for the random number generator.
+    """
+
+    def __init__(self, space, maxEvaluations, populationSize=20, mutationRate=0.2, tournamentSize=3,
+                 maxPending=10, seed=None):
+        super(GeneticSearch, self).__init__(space, maxEvaluations, maxPending, seed)
+        assert(populationSize > 1)
+        self.__populationSize = populationSize
+        self.__mutationRate = mutationRate
+        self.__tournamentSize = tournamentSize
+
+    def __select(self, population):
+        rnd = self.getRandom()
+        contenders = [rnd.randrange(len(population)) for i in xrange(self.__tournamentSize)]
+        # The population is sorted best first.
+        return population[min(contenders)][0]
+
+    def __breed(self, population):
+        rnd = self.getRandom()
+        father = self.__select(population)
+        mother = self.__select(population)
+        ret = []
+        for dimension, fatherValue, motherValue in zip(self.getSpace(), father, mother):
+            value = fatherValue if rnd.random() < 0.5 else motherValue
+            if rnd.random() < self.__mutationRate:
+                value = dimension.mutate(value, rnd, 0.1)
+            ret.append(value)
+        return tuple(ret)
+
+    def propose(self):
+        population = self.getCompleted()[:self.__populationSize]
+        if len(population) < self.__populationSize:
+            return self.sample()
+
+        for i in xrange(MAX_ATTEMPTS):
+            ret = self.__breed(population)
+            if not self.wasProposed(ret):
+                return ret
+        # The population converged.
+        return self.sample()
+
+
+class TPESearch(SearchDriver):
+    """A Tree-structured Parzen Estimator. Results are split in good and bad ones, and the density of the parameters
+    for each group is estimated. Candidates are generated around good parameters, and the one with the highest ratio
+    between the good and the bad densities is tried next.
+
+    :param space: One :class:`Dimension` for every strategy parameter.
+    :type space: list.
+    :param maxEvaluations: The number of parameter sets to try.
+    :type maxEvaluations: int.
+    :param startupEvaluations: The number of random parameter sets to try before using the estimator.
+    :type startupEvaluations: int.
+    :param gamma: The fraction of results considered good.
+    :type gamma: float.
+    :param candidates: The number of candidates to generate for every set of parameters proposed.
+    :type candidates: int.
+    :param maxPending: The max number of parameter sets handed out whose results were not received yet.
+    :type maxPending: int.
+    :param seed: The seed for the random number generator.
+    """
+
+    def __init__(self, space, maxEvaluations, startupEvaluations=10, gamma=0.25, candidates=24, maxPending=4,
+                 seed=None):
+        super(TPESearch, self).__init__(space, maxEvaluations, maxPending, seed)
+        assert(startupEvaluations > 0)
+        assert(0 < gamma < 1)
+        self.__startupEvaluations = startupEvaluations
+        self.__gamma = gamma
+        self.__candidates = candidates
+
+    def propose(self):
+        completed = self.getCompleted()
+        if len(completed) < self.__startupEvaluations:
+            return self.sample()
+
+        rnd = self.getRandom()
+        goodCount = max(1, int(math.ceil(self.__gamma * len(completed))))
+        # For every parameter, the good and the bad values.
+        values = []
+        for i in xrange(len(self.getSpace())):
+            good = [parameters[i] for parameters, result in completed[:goodCount]]
+            bad = [parameters[i] for parameters, result in completed[goodCount:]]
+            values.append((good, bad))
+        # The kernels get narrower as results come in.
+        scale = max(0.02, 1.0 / len(completed) ** 0.6)
+
+        ret = None
+        bestRatio = None
+        for i in xrange(self.__candidates):
+            # Every parameter is sampled independently from the density of the good values.
+            candidate = []
+            ratio = 0
+            for dimension, (good, bad) in zip(self.getSpace(), values):
+                value = dimension.mutate(rnd.choice(good), rnd, scale)
+                candidate.append(value)
+                ratio += math.log(dimension.density(value, good, scale))
+                ratio -= math.log(dimension.density(value, bad, scale))
+            candidate = tuple(candidate)
+            if not self.wasProposed(candidate) and (bestRatio is None or ratio > bestRatio):
+                ret = candidate
+                bestRatio = ratio
+        if ret is None:
+            ret = self.sample()
+        return ret
+
+
+class SuccessiveHalving(SearchDriver):
+    """Asynchronous successive halving. Parameters are tried on a fraction of the bars first, and the best 1/eta of
+    them are promoted to try them on eta times more bars, until the whole history is used. Most of the time gets spent
+    on the promising parameters.
+
+    The fraction of the bars is passed to the strategy as an extra, last, parameter. Use :func:`partial_history` to
+    wrap a strategy class so it stops after that fraction of the bars.
+
+    :param space: One :class:`Dimension` for every strategy parameter.
+    :type space: list.
+    :param maxConfigurations: The number of parameter sets to try on the smallest fraction of the bars.
+    :type maxConfigurations: int.
+    :param minBudget: The smallest fraction of the bars.
+    :type minBudget: float.
+    :param eta: The reduction factor.
+    :type eta: int.
+    :param maxPending: The max number of parameter sets handed out whose results were not received yet.
+    :type maxPending: int.
+    :param seed: The seed for the random number generator.
+
+    .. note::
+        Results for different fractions of the bars are not comparable. Use :meth:`getBest` instead of the best
+        result found by the optimizer.
+    """
+
+    def __init__(self, space, maxConfigurations, minBudget=1/9.0, eta=3, maxPending=10, seed=None):
+        super(SuccessiveHalving, self).__init__(space, None, maxPending, seed)
+        assert(0 < minBudget <= 1)
+        assert(eta > 1)
+        if self.getSpaceSize() is not None:
+            maxConfigurations = min(maxConfigurations, self.getSpaceSize())
+        self.__maxConfigurations = maxConfigurations
+        self.__eta = eta
+        self.__budgets = []
+        budget = 1.0
+        while budget >= minBudget * (1 - 1e-9):
+            self.__budgets.insert(0, budget)
+            budget /= eta
+        # For every rung, the results for each configuration and the configurations promoted to the next rung.
+        self.__results = [{} for budget in self.__budgets]
+        self.__promoted = [set() for budget in self.__budgets]
+        self.__configurations = set()
+
+    def getBudgets(self):
+        """Returns the fractions of the bars used on every rung."""
+        return self.__budgets
+
+    def getTotal(self):
+        # The number of evaluations if every rung gets filled.
+        ret = 0
+        configurations = self.__maxConfigurations
+        for budget in self.__budgets:
+            ret += configurations
+            configurations /= self.__eta
+        return ret
+
+    def getBest(self):
+        """Returns a (parameters, result) tuple for the best result using all the bars, or (None, None)."""
+        ret = (None, None)
+        for configuration, result in self.__results[-1].iteritems():
+            if result is not None and (ret[1] is None or result > ret[1]):
+                ret = (configuration, result)
+        return ret
+
+    def __getPromotable(self, rung):
+        results = self.__results[rung]
+        completed = [(result, configuration) for configuration, result in results.iteritems() if result is not None]
+        completed.sort(reverse=True)
+        for result, configuration in completed[:len(results) / self.__eta]:
+            if configuration not in self.__promoted[rung]:
+                return configuration
+        return None
+
+    def propose(self):
+        # Promotions to the highest rungs first.
+        for rung in reversed(xrange(len(self.__budgets) - 1)):
+            configuration = self.__getPromotable(rung)
+            if configuration is not None:
+                self.__promoted[rung].add(configuration)
+                return configuration + (self.__budgets[rung + 1],)
+
+        if len(self.__configurations) < self.__maxConfigurations:
+            configuration = self.sample(self.__configurations)
+            self.__configurations.add(configuration)
+            return configuration + (self.__budgets[0],)
+        return None
+
+    def onResult(self, parameters, result):
+        rung = self.__budgets.index(parameters[-1])
+        self.__results[rung][parameters[:-1]] = result
+
+    def isFinished(self):
+        if len(self.__configurations) < self.__maxConfigurations or self.getPendingCount() > 0:
+            return False
+        for rung in xrange(len(self.__budgets) - 1):
+            if self.__getPromotable(rung) is not None:
+                return False
+        return True
+
+
+def partial_history(strategyClass):
+    """Wraps a strategy class so the last parameter is the fraction of the bars to process, like the parameters
+    generated by :class:`SuccessiveHalving`.
+
+    :param strategyClass: The strategy class. The bar feed should be a :class:`pyalgotrade.barfeed.OptimizerBarFeed`
+        so the number of bars is known in advance. Otherwise all the bars are processed.
+    """
+
+    class PartialHistoryStrategy(strategyClass):
+        def __init__(self, barFeed, *args):
+            super(PartialHistoryStrategy, self).__init__(barFeed, *args[:-1])
+            self.__barsLeft = None
+            getBars = getattr(barFeed, "_getBars", None)
+            if getBars is not None:
+                self.__barsLeft = max(1, int(math.ceil(args[-1] * len(getBars()))))
+            self.getBarsProcessedEvent().subscribe(self.__onBarsProcessed)
+
+        def __onBarsProcessed(self, strat, bars):
+            if self.__barsLeft is not None:
+                self.__barsLeft -= 1
+                if self.__barsLeft == 0:
+                    self.stop()
+
+    PartialHistoryStrategy.__name__ = strategyClass.__name__
+    return PartialHistoryStrategy
@@ -20,6 +20,8 @@
 
 import pyalgotrade.logger
 from pyalgotrade.optimizer import base
+from pyalgotrade.optimizer import binaryrpc
+from pyalgotrade.optimizer import results
 from pyalgotrade.optimizer import xmlrpcserver
 
 logger = pyalgotrade.logger.getLogger(__name__)
@@ -27,9 +29,10 @@ logger = pyalgotrade.logger.getLogger(__name__)
 
 class Results(object):
     """The results of the strategy executions."""
-    def __init__(self, parameters, result):
+    def __init__(self, parameters, result, store=None):
         self.__parameters = parameters
         self.__result = result
+        self.__store = store
 
     def getParameters(self):
         """Returns a sequence of parameter values."""
@@ -39,32 +42,78 @@ class Results(object):
         """Returns the result for a given set of parameters."""
         return self.__result
 
+    def getStore(self):
+        """Returns the :class:`pyalgotrade.optimizer.results.ResultStore` with every result, or None."""
+        return self.__store
 
-def serve(barFeed, strategyParameters, address, port):
+    def getCount(self):
+        """Returns the number of strategy executions, including the failed ones."""
+        return self.__store.getCount()
+
+    def getTop(self, count=None):
+        """Returns the executions with the best results, best first.
+        Check :meth:`pyalgotrade.optimizer.results.ResultStore.getTop`."""
+        return self.__store.getTop(count)
+
+    def getAll(self, filterFun=None):
+        """Returns a generator with every execution.
+        Check :meth:`pyalgotrade.optimizer.results.ResultStore.getAll`."""
+        return self.__store.getAll(filterFun)
+
+
+def build_server(transport, paramSource, resultSinc, barFeed, address, port, autoStop=True, sharedBarsPath=None,
+                 resultCache=None):
+    if transport == base.Transport.XMLRPC:
+        serverClass = xmlrpcserver.Server
+    elif transport == base.Transport.BINARY:
+        serverClass = binaryrpc.Server
+    else:
+        raise Exception("Invalid transport %s" % (transport))
+    return serverClass(paramSource, resultSinc, barFeed, address, port, autoStop, sharedBarsPath, resultCache)
+
+
+def serve(barFeed, strategyParameters, address, port, transport=base.Transport.XMLRPC, resultsPath=None, topK=10,
+          resultCache=None, progressHandler=None):
     """Executes a server that will provide bars and strategy parameters for workers to use.
 
     :param barFeed: The bar feed that each worker will use to backtest the strategy.
     :type barFeed: :class:`pyalgotrade.barfeed.BarFeed`.
-    :param strategyParameters: The set of parameters to use for backtesting. An iterable object where **each element is a tuple that holds parameter values**.
+    :param strategyParameters: The set of parameters to use for backtesting. An iterable object where **each element is a tuple that holds parameter values**, or a :class:`pyalgotrade.optimizer.search.SearchDriver`.
     :param address: The address to listen for incoming worker connections.
     :type address: string.
     :param port: The port to listen for incoming worker connections.
     :type port: int.
+    :param transport: The protocol used to talk to the workers.
+    :type transport: A :class:`pyalgotrade.optimizer.base.Transport` value.
+    :param resultsPath: The file where every result is saved. If None, a temporary file is used.
+    :type resultsPath: string.
+    :param topK: The number of best results to keep in memory.
+    :type topK: int.
+    :param resultCache: If set, parameters with cached results are not sent to the workers, and new results are
+        added to the cache.
+    :type resultCache: :class:`pyalgotrade.optimizer.resultcache.ResultCache`.
+    :param progressHandler: A function called with a :class:`pyalgotrade.optimizer.progress.Progress` every time
+        results get pushed.
     :rtype: A :class:`Results` instance with the best results found or None if no results were obtained.
     """
 
-    paramSource = base.ParameterSource(strategyParameters)
-    resultSinc = base.ResultSinc()
-    s = xmlrpcserver.Server(paramSource, resultSinc, barFeed, address, port)
+    paramSource = base.build_parameter_source(strategyParameters)
+    resultSinc = results.ResultStore(resultsPath, topK)
+    s = build_server(transport, paramSource, resultSinc, barFeed, address, port, resultCache=resultCache)
+    if progressHandler is not None:
+        s.getProgressEvent().subscribe(progressHandler)
     logger.info("Starting server")
-    s.serve()
+    try:
+        s.serve()
+    finally:
+        resultSinc.close()
     logger.info("Server finished")
 
     ret = None
     bestResult, bestParameters = resultSinc.getBest()
     if bestResult is not None:
         logger.info("Best final result %s with parameters %s" % (bestResult, bestParameters.args))
-        ret = Results(bestParameters.args, bestResult)
+        ret = Results(bestParameters.args, bestResult, resultSinc)
     else:
         logger.error("No results. All jobs failed or no jobs were processed.")
     return ret
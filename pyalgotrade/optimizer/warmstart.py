@@ -0,0 +1,143 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import logging
+import multiprocessing
+import os
+
+from pyalgotrade import checkpoint
+from pyalgotrade.optimizer import base
+from pyalgotrade.optimizer import results
+from pyalgotrade.optimizer import server
+
+logger = logging.getLogger(__name__)
+
+# The warmed-up strategy and the function used to run the forks. These are inherited by the worker processes when
+# they get forked, so the warm-up state is shared copy-on-write instead of being pickled.
+_warmStrategy = None
+_runFork = None
+
+
+class _WarmUpStopper(object):
+    def __init__(self, strat, dateTime):
+        self.__strat = strat
+        self.__dateTime = dateTime
+
+    def __call__(self):
+        nextDateTime = self.__strat.getFeed().peekDateTime()
+        if nextDateTime is None or nextDateTime > self.__dateTime:
+            self.__strat.stop()
+
+
+def run_until(strat, dateTime):
+    """Runs a strategy until all the bars up to a given datetime, inclusive, were processed.
+    The strategy can then be resumed by calling run, or forked using :func:`fork`.
+
+    :param strat: The strategy to run.
+    :type strat: :class:`pyalgotrade.strategy.BacktestingStrategy`.
+    :param dateTime: The last datetime to process.
+    :type dateTime: datetime.datetime.
+    """
+    stopper = _WarmUpStopper(strat, dateTime)
+    dispatcher = strat.getDispatcher()
+    dispatcher.getStartEvent().subscribe(stopper)
+    dispatcher.getDispatchEndEvent().subscribe(stopper)
+    try:
+        # onFinish should not get called, so the dispatcher is run directly.
+        dispatcher.run()
+    finally:
+        dispatcher.getStartEvent().unsubscribe(stopper)
+        dispatcher.getDispatchEndEvent().unsubscribe(stopper)
+
+
+def fork(strat):
+    """Returns an independent copy of a strategy that shares the bars with the original one.
+
+    :param strat: The strategy to copy.
+    :type strat: :class:`pyalgotrade.strategy.BacktestingStrategy`.
+    """
+    return checkpoint.clone(strat, strat.getFeed())
+
+
+def _run_fork(parameters):
+    ret = None
+    try:
+        ret = _runFork(fork(_warmStrategy), *parameters.args, **parameters.kwargs)
+    except Exception, e:
+        logger.exception("Error running strategy with parameters %s: %s" % (str(parameters.args), e))
+    return ret
+
+
+def run(warmStrategy, dateTime, strategyParameters, runFork, workerCount=None):
+    """Runs a strategy up to a given datetime once, and then continues a copy of it for every set of parameters.
+    Use this when many parameter sets share the same warm-up period, like in walk-forward analysis.
+
+    :param warmStrategy: The strategy to warm-up.
+    :type warmStrategy: :class:`pyalgotrade.strategy.BacktestingStrategy`.
+    :param dateTime: The datetime where the warm-up period ends.
+    :type dateTime: datetime.datetime.
+    :param strategyParameters: The set of parameters to use for backtesting. An iterable object where **each element is
+        a tuple that holds parameter values**.
+    :param runFork: A function that receives a copy of the warmed-up strategy and a set of parameters, and returns the
+        result of running the copy with those parameters.
+    :param workerCount: The number of processes to use. If None then as many processes as CPUs are used.
+        Processes are forked once the warm-up period is over so they share its state.
+    :type workerCount: int.
+    :rtype: A :class:`pyalgotrade.optimizer.server.Results` instance with the best results found.
+    """
+    global _warmStrategy, _runFork
+
+    assert(workerCount is None or workerCount > 0)
+    if workerCount is None:
+        workerCount = multiprocessing.cpu_count()
+
+    parameters = []
+    paramSource = base.ParameterSource(strategyParameters)
+    while not paramSource.eof():
+        parameters.extend(paramSource.getNext(100))
+
+    logger.info("Running warm-up period")
+    run_until(warmStrategy, dateTime)
+
+    _warmStrategy = warmStrategy
+    _runFork = runFork
+    try:
+        if workerCount > 1 and hasattr(os, "fork"):
+            pool = multiprocessing.Pool(workerCount)
+            try:
+                forkResults = pool.map(_run_fork, parameters)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            forkResults = map(_run_fork, parameters)
+    finally:
+        _warmStrategy = None
+        _runFork = None
+
+    ret = None
+    resultSinc = results.ResultStore()
+    for params, result in zip(parameters, forkResults):
+        resultSinc.push(result, params)
+    resultSinc.close()
+    bestResult, bestParameters = resultSinc.getBest()
+    if bestResult is not None:
+        ret = server.Results(bestParameters.args, bestResult, resultSinc)
+    return ret
@@ -20,6 +20,7 @@
 
 import xmlrpclib
 import pickle
+import os
 import time
 import socket
 import random
@@ -27,6 +28,12 @@ import multiprocessing
 
 import pyalgotrade.logger
 from pyalgotrade import barfeed
+from pyalgotrade.barfeed import sharedbars
+from pyalgotrade.optimizer import base
+from pyalgotrade.optimizer import binaryrpc
+from pyalgotrade.optimizer import multirun
+from pyalgotrade.optimizer import pruning
+from pyalgotrade.optimizer import warmstart
 
 
 def call_function(function, *args, **kwargs):
@@ -46,99 +53,258 @@ def call_and_retry_on_network_error(function, retryCount, *args, **kwargs):
     return ret
 
 
-class Worker(object):
-    def __init__(self, address, port, workerName=None):
+class XMLRPCClient(object):
+    def __init__(self, address, port):
         url = "http://%s:%s/PyAlgoTradeRPC" % (address, port)
         self.__server = xmlrpclib.ServerProxy(url, allow_none=True)
+
+    def getInstrumentsAndBars(self):
+        return pickle.loads(self.__server.getInstrumentsAndBars())
+
+    def getSharedBarsPath(self):
+        return self.__server.getSharedBarsPath()
+
+    def getBarsFrequency(self):
+        return int(self.__server.getBarsFrequency())
+
+    def getNextJob(self, workerName):
+        return pickle.loads(self.__server.getNextJob(workerName))
+
+    def pushJobResults(self, jobId, records, workerName):
+        jobId = pickle.dumps(jobId)
+        records = pickle.dumps(records)
+        workerName = pickle.dumps(workerName)
+        self.__server.pushJobResults(jobId, records, workerName)
+
+    def flushJobResults(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def build_client(transport, address, port):
+    if transport == base.Transport.XMLRPC:
+        ret = XMLRPCClient(address, port)
+    elif transport == base.Transport.BINARY:
+        ret = binaryrpc.Client(binaryrpc.TCPConnection(address, port))
+    else:
+        raise Exception("Invalid transport %s" % (transport))
+    return ret
+
+
+class Worker(object):
+    def __init__(self, address, port, workerName=None, transport=base.Transport.XMLRPC):
+        self.__client = build_client(transport, address, port)
         self.__logger = pyalgotrade.logger.getLogger(workerName)
         if workerName is None:
             self.__workerName = socket.gethostname()
         else:
             self.__workerName = workerName
+        # Many worker processes may share the same name, but the server needs to tell them apart to size their jobs.
+        self.__workerId = "%s-%d" % (self.__workerName, os.getpid())
+        self.__warmStrategy = None
+        self.__pruningChecks = []
+        self.__pruningPeriod = 1
 
     def getLogger(self):
         return self.__logger
 
+    def setPruningChecks(self, checks, period=1):
+        """Sets the checks used to stop hopeless runs early. Check :mod:`pyalgotrade.optimizer.pruning`.
+
+        :param checks: The checks.
+        :type checks: list of :class:`pyalgotrade.optimizer.pruning.Check`.
+        :param period: Checks are run every this many bars.
+        :type period: int.
+        """
+        self.__pruningChecks = list(checks)
+        self.__pruningPeriod = period
+
+    def attachPruner(self, strat):
+        """Attaches the pruning checks to a strategy before running it. Call it from :meth:`runStrategy` if you
+        override it."""
+        if len(self.__pruningChecks):
+            pruning.attach(strat, self.__pruningChecks, self.__pruningPeriod)
+
     def getInstrumentsAndBars(self):
-        ret = call_and_retry_on_network_error(self.__server.getInstrumentsAndBars, 10)
-        ret = pickle.loads(ret)
-        return ret
+        # Attach to the bars shared by the server if running on the same host, instead of downloading a copy.
+        sharedBarsPath = call_and_retry_on_network_error(self.__client.getSharedBarsPath, 10)
+        if sharedBarsPath is not None and os.path.exists(os.path.join(sharedBarsPath, sharedbars.METADATA_FILE)):
+            bars = sharedbars.SharedBars(sharedBarsPath)
+            return bars.getInstruments(), bars
+
+        return call_and_retry_on_network_error(self.__client.getInstrumentsAndBars, 10)
 
     def getBarsFrequency(self):
-        ret = call_and_retry_on_network_error(self.__server.getBarsFrequency, 10)
-        ret = int(ret)
-        return ret
+        return call_and_retry_on_network_error(self.__client.getBarsFrequency, 10)
 
     def getNextJob(self):
-        ret = call_and_retry_on_network_error(self.__server.getNextJob, 10)
-        ret = pickle.loads(ret)
-        return ret
+        return call_and_retry_on_network_error(self.__client.getNextJob, 10, self.__workerId)
 
-    def pushJobResults(self, jobId, result, parameters):
-        jobId = pickle.dumps(jobId)
-        result = pickle.dumps(result)
-        parameters = pickle.dumps(parameters)
-        workerName = pickle.dumps(self.__workerName)
-        call_and_retry_on_network_error(self.__server.pushJobResults, 10, jobId, result, parameters, workerName)
+    # Records are (parameters, result, metrics) tuples.
+    def pushJobResults(self, jobId, records):
+        call_and_retry_on_network_error(self.__client.pushJobResults, 10, jobId, records, self.__workerId)
+
+    def __runStrategy(self, barsFreq, instruments, bars, parameters):
+        # Run the strategy.
+        self.getLogger().info("Running strategy with parameters %s" % (str(parameters)))
+        result = None
+        metrics = None
+        try:
+            if self.__warmStrategy is not None:
+                result = self.runWarmStrategy(warmstart.fork(self.__warmStrategy), *parameters)
+            else:
+                # Wrap the bars into a feed.
+                feed = barfeed.OptimizerBarFeed(barsFreq, instruments, bars)
+                result, metrics = self.runStrategyWithMetrics(feed, *parameters)
+        except Exception, e:
+            self.getLogger().exception("Error running strategy with parameters %s: %s" % (str(parameters), e))
+        self.getLogger().info("Result %s" % result)
+        return parameters, result, metrics
+
+    def __runStrategies(self, barsFreq, instruments, bars, parametersList):
+        # Try running all the parameter sets in a single pass over the bars.
+        ret = None
+        if self.__warmStrategy is None and len(parametersList) > 1:
+            try:
+                feed = barfeed.OptimizerBarFeed(barsFreq, instruments, bars)
+                runResults = self.runStrategiesWithMetrics(feed, parametersList)
+                if runResults is not None:
+                    self.getLogger().info("Ran %d parameter sets in a single pass" % (len(parametersList)))
+                    ret = [
+                        (parameters, result, metrics)
+                        for parameters, (result, metrics) in zip(parametersList, runResults)
+                    ]
+            except Exception, e:
+                # One failing parameter set takes down the whole pass, so run them one at a time instead.
+                self.getLogger().exception(
+                    "Error running %d parameter sets in a single pass: %s" % (len(parametersList), e)
+                )
+        if ret is None:
+            ret = [self.__runStrategy(barsFreq, instruments, bars, parameters) for parameters in parametersList]
+        return ret
 
     def __processJob(self, job, barsFreq, instruments, bars):
-        bestResult = None
+        parametersList = []
         parameters = job.getNextParameters()
-        bestParams = parameters
         while parameters is not None:
-            # Wrap the bars into a feed.
-            feed = barfeed.OptimizerBarFeed(barsFreq, instruments, bars)
-            # Run the strategy.
-            self.getLogger().info("Running strategy with parameters %s" % (str(parameters)))
-            result = None
-            try:
-                result = self.runStrategy(feed, *parameters)
-            except Exception, e:
-                self.getLogger().exception("Error running strategy with parameters %s: %s" % (str(parameters), e))
-            self.getLogger().info("Result %s" % result)
-            if bestResult is None or result > bestResult:
-                bestResult = result
-                bestParams = parameters
-            # Run with the next set of parameters.
+            parametersList.append(parameters)
             parameters = job.getNextParameters()
 
-        assert(bestParams is not None)
-        self.pushJobResults(job.getId(), bestResult, bestParams)
+        # Every result is sent to the server, not just the best one.
+        records = self.__runStrategies(barsFreq, instruments, bars, parametersList)
+        assert(len(records))
+        self.pushJobResults(job.getId(), records)
 
     # Run the strategy and return the result.
     def runStrategy(self, feed, parameters):
         raise Exception("Not implemented")
 
+    def runStrategyWithMetrics(self, feed, *parameters):
+        """Runs the strategy and returns a (result, metrics) tuple, where metrics is a dictionary or None.
+        By default :meth:`runStrategy` is used and no metrics are reported. Override to report metrics for every
+        set of parameters, like the number of trades or the max drawdown."""
+        return self.runStrategy(feed, *parameters), None
+
+    def runStrategiesWithMetrics(self, feed, parametersList):
+        """Override to run many sets of parameters in a single pass over the bars, using
+        :class:`pyalgotrade.optimizer.multirun.MultiRunner`. Return a list with a (result, metrics) tuple for every
+        set of parameters, or None to run them one at a time using :meth:`runStrategyWithMetrics`, which is the
+        default."""
+        return None
+
+    # Override to share a warm-up period among all the parameter sets processed by this worker.
+    # Return a (strategy, datetime) tuple or None. The strategy will be run up to that datetime once, and a copy of
+    # it will be passed to runWarmStrategy for every set of parameters.
+    def buildWarmUpStrategy(self, feed):
+        return None
+
+    # Run a copy of the warmed-up strategy with the given parameters and return the result.
+    def runWarmStrategy(self, strat, parameters):
+        raise Exception("Not implemented")
+
+    def __warmUp(self, barsFreq, instruments, bars):
+        warmUp = self.buildWarmUpStrategy(barfeed.OptimizerBarFeed(barsFreq, instruments, bars))
+        if warmUp is not None:
+            strat, dateTime = warmUp
+            self.getLogger().info("Running warm-up period up to %s" % (dateTime))
+            warmstart.run_until(strat, dateTime)
+            self.__warmStrategy = strat
+
     def run(self):
         try:
             self.getLogger().info("Started running")
             # Get the instruments and bars.
             instruments, bars = self.getInstrumentsAndBars()
             barsFreq = self.getBarsFrequency()
+            self.__warmUp(barsFreq, instruments, bars)
 
             # Process jobs
             job = self.getNextJob()
             while job is not None:
-                self.__processJob(job, barsFreq, instruments, bars)
+                if job.getRetryAfter() is not None:
+                    # The server is waiting for results from other workers before handing out more parameters.
+                    time.sleep(job.getRetryAfter())
+                else:
+                    self.__processJob(job, barsFreq, instruments, bars)
                 job = self.getNextJob()
+            call_and_retry_on_network_error(self.__client.flushJobResults, 10)
             self.getLogger().info("Finished running")
         except Exception, e:
             self.getLogger().exception("Finished running with errors: %s" % (e))
+        finally:
+            self.__client.close()
+
 
+def get_metrics(strat):
+    """Returns the metrics reported by a strategy that implements a getMetrics method, or None.
+    If the run was pruned, the reason is included in the metrics."""
+    getMetrics = getattr(strat, "getMetrics", None)
+    ret = None if getMetrics is None else getMetrics()
+    pruner = pruning.get_pruner(strat)
+    if pruner is not None and pruner.isPruned():
+        ret = dict(ret or {})
+        ret[pruning.METRICS_KEY] = pruner.getReason()
+    return ret
 
-def worker_process(strategyClass, address, port, workerName):
+
+def run_shared_feed(w, strategyClass, barFeed, parametersList):
+    """Runs a strategy for many sets of parameters in a single pass over the bars and returns a list of
+    (result, metrics) tuples. Used by the workers built by :func:`run` and :func:`pyalgotrade.optimizer.local.run`."""
+    strategies = []
+    for parameters in parametersList:
+        strat = strategyClass(barFeed, *parameters)
+        w.attachPruner(strat)
+        strategies.append(strat)
+    return multirun.run(barFeed, strategies, lambda strat: (strat.getResult(), get_metrics(strat)))
+
+
+def worker_process(strategyClass, address, port, workerName, transport, pruningChecks, pruningPeriod, sharedFeed):
     class MyWorker(Worker):
         def runStrategy(self, barFeed, *args, **kwargs):
+            return self.runStrategyWithMetrics(barFeed, *args, **kwargs)[0]
+
+        def runStrategyWithMetrics(self, barFeed, *args, **kwargs):
             strat = strategyClass(barFeed, *args, **kwargs)
+            self.attachPruner(strat)
             strat.run()
-            return strat.getResult()
+            return strat.getResult(), get_metrics(strat)
+
+        def runStrategiesWithMetrics(self, barFeed, parametersList):
+            if not sharedFeed:
+                return None
+            return run_shared_feed(self, strategyClass, barFeed, parametersList)
 
     # Create a worker and run it.
-    w = MyWorker(address, port, workerName)
+    w = MyWorker(address, port, workerName, transport)
+    if pruningChecks is not None:
+        w.setPruningChecks(pruningChecks, pruningPeriod)
     w.run()
 
 
-def run(strategyClass, address, port, workerCount=None, workerName=None):
+def run(strategyClass, address, port, workerCount=None, workerName=None, transport=base.Transport.XMLRPC,
+        pruningChecks=None, pruningPeriod=1, sharedFeed=False):
     """Executes one or more worker processes that will run a strategy with the bars and parameters supplied by the server.
 
     :param strategyClass: The strategy class.
@@ -150,6 +316,15 @@ def run(strategyClass, address, port, workerCount=None, workerName=None):
     :type workerCount: int.
     :param workerName: A name for the worker. A name that identifies the worker. If None, the hostname is used.
     :type workerName: string.
+    :param transport: The protocol used to talk to the server. It must match the one used by the server.
+    :type transport: A :class:`pyalgotrade.optimizer.base.Transport` value.
+    :param pruningChecks: Checks used to stop hopeless runs early. Pruned runs are flagged in their metrics.
+    :type pruningChecks: list of :class:`pyalgotrade.optimizer.pruning.Check`.
+    :param pruningPeriod: Checks are run every this many bars.
+    :type pruningPeriod: int.
+    :param sharedFeed: True to run all the parameter sets in a job in a single pass over the bars. Check
+        :class:`pyalgotrade.optimizer.multirun.MultiRunner`.
+    :type sharedFeed: boolean.
     """
 
     assert(workerCount is None or workerCount > 0)
@@ -159,7 +334,9 @@ def run(strategyClass, address, port, workerCount=None, workerName=None):
     workers = []
     # Build the worker processes.
     for i in range(workerCount):
-        workers.append(multiprocessing.Process(target=worker_process, args=(strategyClass, address, port, workerName)))
+        workers.append(multiprocessing.Process(target=worker_process, args=(
+            strategyClass, address, port, workerName, transport, pruningChecks, pruningPeriod, sharedFeed
+        )))
 
     # Start workers
     for process in workers:
@@ -19,15 +19,19 @@
 """
 
 import SimpleXMLRPCServer
+import json
 import pickle
 import threading
 import time
 
 import pyalgotrade.logger
-from pyalgotrade.optimizer import base
+from pyalgotrade.optimizer import coordinator
 
 logger = pyalgotrade.logger.getLogger(__name__)
 
+# Kept for backwards compatibility.
+Job = coordinator.Job
+
 
 class AutoStopThread(threading.Thread):
     def __init__(self, server):
@@ -40,44 +44,37 @@ class AutoStopThread(threading.Thread):
         self.__server.stop()
 
 
-class Job(object):
-    def __init__(self, strategyParameters):
-        self.__strategyParameters = strategyParameters
-        self.__bestResult = None
-        self.__bestParameters = None
-        self.__id = id(self)
-
-    def getId(self):
-        return self.__id
-
-    def getNextParameters(self):
-        ret = None
-        if len(self.__strategyParameters):
-            ret = self.__strategyParameters.pop()
-        return ret
-
-
 # Restrict to a particular path.
 class RequestHandler(SimpleXMLRPCServer.SimpleXMLRPCRequestHandler):
     rpc_paths = ('/PyAlgoTradeRPC',)
+    # Plain HTTP GET requests to this path get the progress as JSON.
+    status_path = '/status'
+
+    def do_GET(self):
+        if self.path != self.status_path:
+            self.report_404()
+            return
+
+        response = self.server.getStatus()
+        self.send_response(200)
+        self.send_header("Content-type", "application/json")
+        self.send_header("Content-length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
 
 
 class Server(SimpleXMLRPCServer.SimpleXMLRPCServer):
     defaultBatchSize = 200
 
-    def __init__(self, paramSource, resultSinc, barFeed, address, port, autoStop=True):
+    def __init__(self, paramSource, resultSinc, barFeed, address, port, autoStop=True, sharedBarsPath=None,
+                 resultCache=None):
         SimpleXMLRPCServer.SimpleXMLRPCServer.__init__(self, (address, port), requestHandler=RequestHandler, logRequests=False, allow_none=True)
         # super(Server, self).__init__((address, port), requestHandler=RequestHandler, logRequests=False, allow_none=True)
 
-        self.__paramSource = paramSource
-        self.__resultSinc = resultSinc
-        self.__barFeed = barFeed
+        self.__coordinator = coordinator.Coordinator(
+            paramSource, resultSinc, barFeed, sharedBarsPath, resultCache
+        )
         self.__instrumentsAndBars = None  # Pickle'd instruments and bars for faster retrieval.
-        self.__barsFreq = None
-        self.__activeJobs = {}
-        self.__activeJobsLock = threading.Lock()
-        self.__forcedStop = False
-        self.__bestResult = None
         if autoStop:
             self.__autoStopThread = AutoStopThread(self)
         else:
@@ -85,60 +82,46 @@ class Server(SimpleXMLRPCServer.SimpleXMLRPCServer):
 
         self.register_introspection_functions()
         self.register_function(self.getInstrumentsAndBars, 'getInstrumentsAndBars')
+        self.register_function(self.getSharedBarsPath, 'getSharedBarsPath')
         self.register_function(self.getBarsFrequency, 'getBarsFrequency')
         self.register_function(self.getNextJob, 'getNextJob')
         self.register_function(self.pushJobResults, 'pushJobResults')
+        self.register_function(self.getStatus, 'getStatus')
 
     def getInstrumentsAndBars(self):
+        if self.__instrumentsAndBars is None:
+            self.__instrumentsAndBars = pickle.dumps(self.__coordinator.getInstrumentsAndBars())
         return self.__instrumentsAndBars
 
-    def getBarsFrequency(self):
-        return str(self.__barsFreq)
-
-    def getNextJob(self):
-        ret = None
+    def getSharedBarsPath(self):
+        return self.__coordinator.getSharedBarsPath()
 
-        # Get the next set of parameters.
-        params = self.__paramSource.getNext(self.defaultBatchSize)
-        params = map(lambda p: p.args, params)
-
-        # Map the active job
-        if len(params):
-            ret = Job(params)
-            with self.__activeJobsLock:
-                self.__activeJobs[ret.getId()] = ret
+    def getBarsFrequency(self):
+        return str(self.__coordinator.getBarsFrequency())
 
-        return pickle.dumps(ret)
+    def getNextJob(self, workerName=None):
+        return pickle.dumps(self.__coordinator.getNextJob(self.defaultBatchSize, workerName))
 
     def jobsPending(self):
-        if self.__forcedStop:
-            return False
+        return self.__coordinator.jobsPending()
 
-        jobsPending = not self.__paramSource.eof()
+    def getProgressEvent(self):
+        """Returns the event emitted with a :class:`pyalgotrade.optimizer.progress.Progress` every time results get
+        pushed."""
+        return self.__coordinator.getProgressEvent()
 
-        with self.__activeJobsLock:
-            activeJobs = len(self.__activeJobs) > 0
+    def getProgress(self):
+        return self.__coordinator.getProgress()
 
-        return jobsPending or activeJobs
+    def getStatus(self):
+        """Returns the progress as a JSON string. Also available using HTTP GET on /status."""
+        return json.dumps(self.__coordinator.getProgress().toDict())
 
-    def pushJobResults(self, jobId, result, parameters, workerName):
+    def pushJobResults(self, jobId, records, workerName):
         jobId = pickle.loads(jobId)
-        result = pickle.loads(result)
-        parameters = pickle.loads(parameters)
-
-        # Remove the job mapping.
-        with self.__activeJobsLock:
-            try:
-                del self.__activeJobs[jobId]
-            except KeyError:
-                # The job's results were already submitted.
-                return
-
-        if result is None or result > self.__bestResult:
-            logger.info("Best result so far %s with parameters %s" % (result, parameters))
-            self.__bestResult = result
-
-        self.__resultSinc.push(result, base.Parameters(*parameters))
+        records = pickle.loads(records)
+        workerName = pickle.loads(workerName)
+        self.__coordinator.pushJobResults(jobId, records, workerName)
 
     def stop(self):
         self.shutdown()
@@ -146,13 +129,7 @@ class Server(SimpleXMLRPCServer.SimpleXMLRPCServer):
     def serve(self):
         try:
             # Initialize instruments, bars and parameters.
-            logger.info("Loading bars")
-            loadedBars = []
-            for dateTime, bars in self.__barFeed:
-                loadedBars.append(bars)
-            instruments = self.__barFeed.getRegisteredInstruments()
-            self.__instrumentsAndBars = pickle.dumps((instruments, loadedBars))
-            self.__barsFreq = self.__barFeed.getFrequency()
+            self.__coordinator.loadBars()
 
             if self.__autoStopThread:
                 self.__autoStopThread.start()
@@ -163,4 +140,4 @@ class Server(SimpleXMLRPCServer.SimpleXMLRPCServer):
             if self.__autoStopThread:
                 self.__autoStopThread.join()
         finally:
-            self.__forcedStop = True
+            self.__coordinator.forceStop()
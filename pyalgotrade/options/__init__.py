@@ -0,0 +1,40 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import datetime
+
+
+def expiry_datetime(expiry, tzinfo=None):
+    """Returns the datetime when an option expires.
+
+    :param expiry: The expiry. If a date is given, the option expires at the end of that day.
+    :type expiry: datetime.date or datetime.datetime.
+    :param tzinfo: If set, a naive expiry is localized to this timezone. Use the timezone of the datetimes that the
+        expiry will be compared with.
+    :rtype: datetime.datetime.
+    """
+    if not isinstance(expiry, datetime.datetime):
+        expiry = datetime.datetime.combine(expiry, datetime.time.max)
+    if tzinfo is not None and expiry.tzinfo is None:
+        if hasattr(tzinfo, "localize"):
+            expiry = tzinfo.localize(expiry)
+        else:
+            expiry = expiry.replace(tzinfo=tzinfo)
+    return expiry
@@ -0,0 +1,229 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import numpy as np
+
+from pyalgotrade.broker import optbroker
+
+try:
+    from scipy.special import ndtr
+except ImportError:
+    ndtr = None
+
+
+# All the functions in this module take scalars or numpy arrays, and broadcast them like numpy does, so a whole chain can
+# be priced at once. Rights are optbroker.OptionOrder.Right values, times to expiry are in years and rates, dividend
+# yields and volatilities are annualized and continuously compounded.
+# Vega and rho are per unit (multiply by 0.01 to get the change per 1%) and theta is per year.
+
+
+def norm_pdf(x):
+    x = np.asarray(x, dtype=float)
+    return np.exp(-0.5 * x * x) / np.sqrt(2 * np.pi)
+
+
+def norm_cdf(x):
+    x = np.asarray(x, dtype=float)
+    if ndtr is not None:
+        return ndtr(x)
+
+    # Complementary error function with fractional error below 1.2e-7 (Numerical Recipes, erfcc).
+    z = np.abs(x) / np.sqrt(2)
+    t = 1 / (1 + 0.5 * z)
+    erfc = t * np.exp(
+        -z * z - 1.26551223 + t * (1.00002368 + t * (0.37409196 + t * (0.09678418 + t * (-0.18628806 + t * (
+            0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (-0.82215223 + t * 0.17087277))))))))
+    )
+    return np.where(x >= 0, 1 - 0.5 * erfc, 0.5 * erfc)
+
+
+def _is_call(right):
+    return np.asarray(right) == optbroker.OptionOrder.Right.CALL
+
+
+def _d1_d2(spot, strike, timeToExpiry, rate, volatility, dividendYield):
+    spot = np.asarray(spot, dtype=float)
+    strike = np.asarray(strike, dtype=float)
+    timeToExpiry = np.asarray(timeToExpiry, dtype=float)
+    volatility = np.asarray(volatility, dtype=float)
+    volSqrtT = volatility * np.sqrt(timeToExpiry)
+    d1 = (np.log(spot / strike) + (rate - dividendYield + 0.5 * volatility * volatility) * timeToExpiry) / volSqrtT
+    return d1, d1 - volSqrtT
+
+
+def _price_and_vega(right, spot, strike, timeToExpiry, rate, volatility, dividendYield):
+    d1, d2 = _d1_d2(spot, strike, timeToExpiry, rate, volatility, dividendYield)
+    discountedSpot = spot * np.exp(-dividendYield * np.asarray(timeToExpiry))
+    discountedStrike = strike * np.exp(-rate * np.asarray(timeToExpiry))
+    call = discountedSpot * norm_cdf(d1) - discountedStrike * norm_cdf(d2)
+    put = discountedStrike * norm_cdf(-d2) - discountedSpot * norm_cdf(-d1)
+    price = np.where(_is_call(right), call, put)
+    vega = discountedSpot * norm_pdf(d1) * np.sqrt(timeToExpiry)
+    return price, vega
+
+
+def price(right, spot, strike, timeToExpiry, rate, volatility, dividendYield=0.0):
+    """Returns Black-Scholes prices for european options.
+
+    :param right: optbroker.OptionOrder.Right.PUT or optbroker.OptionOrder.Right.CALL.
+    :param spot: The underlying price.
+    :param strike: The strike price.
+    :param timeToExpiry: The time to expiry, in years.
+    :param rate: The risk free rate.
+    :param volatility: The volatility.
+    :param dividendYield: The dividend yield.
+    :rtype: numpy.array.
+    """
+    return _price_and_vega(right, spot, strike, timeToExpiry, rate, volatility, dividendYield)[0]
+
+
+def greeks(right, spot, strike, timeToExpiry, rate, volatility, dividendYield=0.0):
+    """Returns the Black-Scholes greeks for european options.
+    Check :func:`price` for parameter details.
+
+    :rtype: A dictionary with numpy arrays for **delta**, **gamma**, **vega**, **theta** and **rho**.
+    """
+    isCall = _is_call(right)
+    timeToExpiry = np.asarray(timeToExpiry, dtype=float)
+    spot = np.asarray(spot, dtype=float)
+    d1, d2 = _d1_d2(spot, strike, timeToExpiry, rate, volatility, dividendYield)
+    sqrtT = np.sqrt(timeToExpiry)
+    spotDiscount = np.exp(-dividendYield * timeToExpiry)
+    strikeDiscount = np.asarray(strike, dtype=float) * np.exp(-rate * timeToExpiry)
+    pdfD1 = norm_pdf(d1)
+    cdfD1 = norm_cdf(d1)
+    cdfD2 = norm_cdf(d2)
+
+    gamma = spotDiscount * pdfD1 / (spot * volatility * sqrtT)
+    vega = spot * spotDiscount * pdfD1 * sqrtT
+    decay = -spot * spotDiscount * pdfD1 * volatility / (2 * sqrtT)
+    callTheta = decay - rate * strikeDiscount * cdfD2 + dividendYield * spot * spotDiscount * cdfD1
+    putTheta = decay + rate * strikeDiscount * (1 - cdfD2) - dividendYield * spot * spotDiscount * (1 - cdfD1)
+    return {
+        "delta": np.where(isCall, spotDiscount * cdfD1, spotDiscount * (cdfD1 - 1)),
+        "gamma": gamma,
+        "vega": vega,
+        "theta": np.where(isCall, callTheta, putTheta),
+        "rho": np.where(isCall, timeToExpiry * strikeDiscount * cdfD2, -timeToExpiry * strikeDiscount * (1 - cdfD2)),
+    }
+
+
+def delta(right, spot, strike, timeToExpiry, rate, volatility, dividendYield=0.0):
+    return greeks(right, spot, strike, timeToExpiry, rate, volatility, dividendYield)["delta"]
+
+
+def gamma(right, spot, strike, timeToExpiry, rate, volatility, dividendYield=0.0):
+    return greeks(right, spot, strike, timeToExpiry, rate, volatility, dividendYield)["gamma"]
+
+
+def vega(right, spot, strike, timeToExpiry, rate, volatility, dividendYield=0.0):
+    return greeks(right, spot, strike, timeToExpiry, rate, volatility, dividendYield)["vega"]
+
+
+def theta(right, spot, strike, timeToExpiry, rate, volatility, dividendYield=0.0):
+    return greeks(right, spot, strike, timeToExpiry, rate, volatility, dividendYield)["theta"]
+
+
+def rho(right, spot, strike, timeToExpiry, rate, volatility, dividendYield=0.0):
+    return greeks(right, spot, strike, timeToExpiry, rate, volatility, dividendYield)["rho"]
+
+
+# Black-76 is Black-Scholes on the forward with a dividend yield equal to the rate. Only rho differs, since the forward
+# doesn't depend on the rate.
+
+def black76_price(right, forward, strike, timeToExpiry, rate, volatility):
+    """Returns Black-76 prices for european options on futures or forwards.
+    Check :func:`price` for parameter details.
+    """
+    return price(right, forward, strike, timeToExpiry, rate, volatility, rate)
+
+
+def black76_greeks(right, forward, strike, timeToExpiry, rate, volatility):
+    """Returns the Black-76 greeks for european options on futures or forwards.
+    Check :func:`greeks` for details.
+    """
+    ret = greeks(right, forward, strike, timeToExpiry, rate, volatility, rate)
+    ret["rho"] = -np.asarray(timeToExpiry, dtype=float) * black76_price(
+        right, forward, strike, timeToExpiry, rate, volatility
+    )
+    return ret
+
+
+def implied_volatility(
+    right, optionPrice, spot, strike, timeToExpiry, rate, dividendYield=0.0, tolerance=1e-8, maxIterations=100,
+    minVolatility=1e-6, maxVolatility=5.0
+):
+    """Returns the Black-Scholes implied volatilities for european options.
+    Newton's method is used, falling back to bisection whenever a step leaves the bracket that holds the solution.
+
+    :param optionPrice: The option price.
+    :param tolerance: The maximum difference between the option price and the model price.
+    :type tolerance: float.
+    :param maxIterations: The maximum number of iterations.
+    :type maxIterations: int.
+    :param minVolatility: The lower bound for the implied volatility.
+    :type minVolatility: float.
+    :param maxVolatility: The upper bound for the implied volatility.
+    :type maxVolatility: float.
+    :rtype: numpy.array. Values are NaN where the option price is outside the bounds.
+
+    Check :func:`price` for the rest of the parameters.
+    """
+    optionPrice, right, spot, strike, timeToExpiry = np.broadcast_arrays(
+        np.asarray(optionPrice, dtype=float), np.asarray(right), np.asarray(spot, dtype=float),
+        np.asarray(strike, dtype=float), np.asarray(timeToExpiry, dtype=float)
+    )
+
+    low = np.empty(optionPrice.shape)
+    low.fill(minVolatility)
+    high = np.empty(optionPrice.shape)
+    high.fill(maxVolatility)
+    # Prices outside the range covered by the volatility bounds have no solution.
+    valid = (optionPrice >= price(right, spot, strike, timeToExpiry, rate, low, dividendYield) - tolerance) & \
+        (optionPrice <= price(right, spot, strike, timeToExpiry, rate, high, dividendYield) + tolerance)
+
+    # Start with the Brenner-Subrahmanyam approximation.
+    ret = np.sqrt(2 * np.pi / timeToExpiry) * optionPrice / spot
+    ret = np.clip(np.where(np.isfinite(ret), ret, 0.2), minVolatility, maxVolatility)
+    pending = valid.copy()
+    for i in xrange(maxIterations):
+        if not pending.any():
+            break
+        modelPrice, modelVega = _price_and_vega(right, spot, strike, timeToExpiry, rate, ret, dividendYield)
+        diff = modelPrice - optionPrice
+        pending &= np.abs(diff) > tolerance
+
+        # Prices increase with volatility, so the solution is below ret if diff > 0.
+        high = np.where(pending & (diff > 0), ret, high)
+        low = np.where(pending & (diff < 0), ret, low)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = ret - diff / modelVega
+        bisection = (low + high) / 2
+        useNewton = np.isfinite(newton) & (newton > low) & (newton < high)
+        ret = np.where(pending, np.where(useNewton, newton, bisection), ret)
+
+    return np.where(valid, ret, np.nan)
+
+
+def black76_implied_volatility(right, optionPrice, forward, strike, timeToExpiry, rate, **kwargs):
+    """Returns the Black-76 implied volatilities for european options on futures or forwards.
+    Check :func:`implied_volatility` for details.
+    """
+    return implied_volatility(right, optionPrice, forward, strike, timeToExpiry, rate, rate, **kwargs)
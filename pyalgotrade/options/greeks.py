@@ -0,0 +1,128 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import math
+
+from pyalgotrade import dataseries
+from pyalgotrade import options
+from pyalgotrade.dataseries import aligned
+from pyalgotrade.options import blackscholes
+
+
+SECONDS_PER_YEAR = 365 * 24 * 60 * 60.0
+
+
+def time_to_expiry(dateTime, expiry):
+    """Returns the time left until expiry, in years (ACT/365).
+
+    :param dateTime: The current datetime.
+    :type dateTime: datetime.datetime.
+    :param expiry: The expiry. If a date is given then the option expires at the end of that day. A naive expiry is
+        localized to the timezone of dateTime.
+    :type expiry: datetime.date or datetime.datetime.
+    """
+    expiry = options.expiry_datetime(expiry, dateTime.tzinfo)
+    return (expiry - dateTime).total_seconds() / SECONDS_PER_YEAR
+
+
+class ImpliedVolatility(dataseries.SequenceDataSeries):
+    """This dataseries calculates the Black-Scholes implied volatility of an option, and its greeks, using the prices
+    from the option and the underlying dataseries that share the same datetime.
+
+    :param underlyingDS: The underlying prices.
+    :type underlyingDS: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param optionDS: The option prices.
+    :type optionDS: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param right: optbroker.OptionOrder.Right.PUT or optbroker.OptionOrder.Right.CALL.
+    :param strike: The strike price.
+    :type strike: float.
+    :param expiry: The expiry.
+    :type expiry: datetime.date or datetime.datetime.
+    :param rate: The risk free rate.
+    :type rate: float.
+    :param dividendYield: The dividend yield.
+    :type dividendYield: float.
+    :param maxLen: The maximum number of values to hold.
+        Once a bounded length is full, when new items are added, a corresponding number of items are discarded from the
+        opposite end. If None then dataseries.DEFAULT_MAX_LEN is used.
+    :type maxLen: int.
+
+    .. note::
+        Values are None once the option expired or if the option price is outside the bounds.
+    """
+
+    def __init__(self, underlyingDS, optionDS, right, strike, expiry, rate=0.0, dividendYield=0.0, maxLen=None):
+        super(ImpliedVolatility, self).__init__(maxLen)
+        self.__right = right
+        self.__strike = strike
+        self.__expiry = expiry
+        self.__rate = rate
+        self.__dividendYield = dividendYield
+        self.__deltaDS = dataseries.SequenceDataSeries(maxLen)
+        self.__gammaDS = dataseries.SequenceDataSeries(maxLen)
+        self.__vegaDS = dataseries.SequenceDataSeries(maxLen)
+        self.__thetaDS = dataseries.SequenceDataSeries(maxLen)
+        self.__rhoDS = dataseries.SequenceDataSeries(maxLen)
+        # Values get appended to the first aligned dataseries before the second one.
+        self.__underlyingDS, alignedOptionDS = aligned.datetime_aligned(underlyingDS, optionDS, maxLen)
+        alignedOptionDS.getNewValueEvent().subscribe(self.__onNewValue)
+
+    def __onNewValue(self, dataSeries, dateTime, value):
+        spot = self.__underlyingDS[-1]
+        iv = None
+        values = None
+        timeToExpiry = time_to_expiry(dateTime, self.__expiry)
+        if value is not None and spot is not None and timeToExpiry > 0:
+            iv = float(blackscholes.implied_volatility(
+                self.__right, value, spot, self.__strike, timeToExpiry, self.__rate, self.__dividendYield
+            ))
+            if math.isnan(iv):
+                iv = None
+            else:
+                values = blackscholes.greeks(
+                    self.__right, spot, self.__strike, timeToExpiry, self.__rate, iv, self.__dividendYield
+                )
+
+        self.appendWithDateTime(dateTime, iv)
+        for name, ds in (
+            ("delta", self.__deltaDS), ("gamma", self.__gammaDS), ("vega", self.__vegaDS),
+            ("theta", self.__thetaDS), ("rho", self.__rhoDS)
+        ):
+            ds.appendWithDateTime(dateTime, None if values is None else float(values[name]))
+
+    def getDeltaDataSeries(self):
+        """Returns a :class:`pyalgotrade.dataseries.DataSeries` with the deltas."""
+        return self.__deltaDS
+
+    def getGammaDataSeries(self):
+        """Returns a :class:`pyalgotrade.dataseries.DataSeries` with the gammas."""
+        return self.__gammaDS
+
+    def getVegaDataSeries(self):
+        """Returns a :class:`pyalgotrade.dataseries.DataSeries` with the vegas."""
+        return self.__vegaDS
+
+    def getThetaDataSeries(self):
+        """Returns a :class:`pyalgotrade.dataseries.DataSeries` with the thetas."""
+        return self.__thetaDS
+
+    def getRhoDataSeries(self):
+        """Returns a :class:`pyalgotrade.dataseries.DataSeries` with the rhos."""
+        return self.__rhoDS
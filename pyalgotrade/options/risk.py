@@ -0,0 +1,132 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+GREEKS = ("delta", "gamma", "vega", "theta", "rho")
+
+
+def _zero_greeks():
+    return dict((name, 0.0) for name in GREEKS)
+
+
+# Holdings in the underlying itself only contribute delta.
+_UNDERLYING_GREEKS = dict(_zero_greeks(), delta=1.0)
+
+
+class RiskAggregator(object):
+    """Keeps the net greeks per underlying, and for the whole book, for the positions held in an
+    :class:`pyalgotrade.broker.optbroker.optbacktesting.OptionBroker`.
+
+    The exposure for an instrument is updated when an order for it gets filled, and the exposures for all the
+    instruments held are updated once per bar using the broker's volatility surfaces. If the greeks for a contract
+    are not available on a given bar, the last ones available are used. Expired contracts have no exposure, even if
+    the shares are still held.
+
+    :param broker: The broker.
+    :type broker: :class:`pyalgotrade.broker.optbroker.optbacktesting.OptionBroker`.
+
+    .. note::
+        * This class should not be instantiated directly. Use the broker's getRiskAggregator method instead.
+        * Option contracts need an underlying. Check the broker's setUnderlying method. Instruments that are not
+          option contracts are considered to be underlyings, with a delta of 1 per share.
+    """
+
+    def __init__(self, broker):
+        self.__broker = broker
+        # Instrument -> (underlying, shares, greeks per share).
+        self.__exposures = {}
+        # Underlying -> net greeks.
+        self.__totals = {}
+        self.__bookTotals = _zero_greeks()
+        self.refresh()
+
+    def __getUnderlyingAndGreeks(self, instrument, previous):
+        underlying = self.__broker.getUnderlying(instrument)
+        if underlying is not None:
+            if self.__broker.getExpiry(instrument) is None:
+                # The broker drops contracts once they expire.
+                greeks = _zero_greeks()
+            else:
+                greeks = self.__broker.getVolatilitySurface(underlying).getGreeks(instrument)
+            if greeks is None:
+                greeks = previous[2] if previous is not None else _zero_greeks()
+        elif self.__broker.getExpiry(instrument) is None:
+            underlying = instrument
+            greeks = _UNDERLYING_GREEKS
+        else:
+            # An option contract without an underlying. It can't be aggregated.
+            greeks = None
+        return underlying, greeks
+
+    def __add(self, underlying, shares, greeks, sign):
+        totals = self.__totals.setdefault(underlying, _zero_greeks())
+        for name in GREEKS:
+            value = sign * shares * greeks[name]
+            totals[name] += value
+            self.__bookTotals[name] += value
+
+    def update(self, instrument):
+        """Updates the exposure for a given instrument."""
+        previous = self.__exposures.pop(instrument, None)
+        if previous is not None:
+            self.__add(previous[0], previous[1], previous[2], -1)
+
+        shares = self.__broker.getShares(instrument)
+        underlying, greeks = self.__getUnderlyingAndGreeks(instrument, previous)
+        if shares != 0 and greeks is not None:
+            self.__exposures[instrument] = (underlying, shares, greeks)
+            self.__add(underlying, shares, greeks, 1)
+
+        # Reset the totals when there is nothing left, to avoid accumulating rounding errors.
+        if previous is not None and not any(exposure[0] == previous[0] for exposure in self.__exposures.itervalues()):
+            del self.__totals[previous[0]]
+        if len(self.__exposures) == 0:
+            self.__bookTotals = _zero_greeks()
+
+    def refresh(self):
+        """Updates the exposures for all the instruments held."""
+        instruments = set(self.__exposures.keys())
+        instruments.update(self.__broker.getActiveInstruments())
+        for instrument in instruments:
+            self.update(instrument)
+
+    def getUnderlyings(self):
+        """Returns the underlyings with exposure."""
+        return self.__totals.keys()
+
+    def getExposure(self, instrument):
+        """Returns a dictionary with the net greeks for an instrument, or None if there is no exposure."""
+        ret = None
+        exposure = self.__exposures.get(instrument)
+        if exposure is not None:
+            underlying, shares, greeks = exposure
+            ret = dict((name, shares * greeks[name]) for name in GREEKS)
+        return ret
+
+    def getGreeks(self, underlying=None):
+        """Returns a dictionary with the net **delta**, **gamma**, **vega**, **theta** and **rho**.
+
+        :param underlying: Underlying instrument identifier. If None, the net greeks for the whole book are returned.
+        :type underlying: string.
+        """
+        if underlying is None:
+            ret = self.__bookTotals
+        else:
+            ret = self.__totals.get(underlying, _zero_greeks())
+        return dict(ret)
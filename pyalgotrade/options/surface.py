@@ -0,0 +1,275 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import collections
+
+import numpy as np
+
+from pyalgotrade.options import blackscholes
+from pyalgotrade.options import greeks
+
+
+class Snapshot(object):
+    """The implied volatilities and greeks for the contracts of an underlying at a given datetime.
+
+    .. note::
+        This class should not be instantiated directly. Use :meth:`VolatilitySurface.getSnapshot` instead.
+    """
+
+    def __init__(self, dateTime, spot, instruments, rights, strikes, timesToExpiry, prices, rate, dividendYield):
+        self.__dateTime = dateTime
+        self.__spot = spot
+        self.__instruments = instruments
+        self.__positions = dict((instrument, i) for i, instrument in enumerate(instruments))
+        self.__strikes = strikes
+        self.__timesToExpiry = timesToExpiry
+        if len(instruments):
+            self.__ivs = blackscholes.implied_volatility(
+                rights, prices, spot, strikes, timesToExpiry, rate, dividendYield
+            )
+            self.__greeks = blackscholes.greeks(rights, spot, strikes, timesToExpiry, rate, self.__ivs, dividendYield)
+        else:
+            self.__ivs = np.empty(0)
+            self.__greeks = dict((name, np.empty(0)) for name in ("delta", "gamma", "vega", "theta", "rho"))
+
+    def getDateTime(self):
+        return self.__dateTime
+
+    def getSpot(self):
+        """Returns the underlying price used."""
+        return self.__spot
+
+    def getInstruments(self):
+        """Returns the option instruments included, in the same order as the arrays returned by :meth:`getValues`."""
+        return self.__instruments
+
+    def getValues(self):
+        """Returns a dictionary with numpy arrays for **strike**, **timeToExpiry**, **iv**, **delta**, **gamma**,
+        **vega**, **theta** and **rho**."""
+        ret = dict(self.__greeks)
+        ret["strike"] = self.__strikes
+        ret["timeToExpiry"] = self.__timesToExpiry
+        ret["iv"] = self.__ivs
+        return ret
+
+    def getImpliedVolatility(self, instrument):
+        """Returns the implied volatility for an option instrument, or None if not available."""
+        ret = None
+        pos = self.__positions.get(instrument)
+        if pos is not None and not np.isnan(self.__ivs[pos]):
+            ret = float(self.__ivs[pos])
+        return ret
+
+    def getGreeks(self, instrument):
+        """Returns a dictionary with the **delta**, **gamma**, **vega**, **theta** and **rho** for an option
+        instrument, or None if not available."""
+        ret = None
+        pos = self.__positions.get(instrument)
+        if pos is not None and not np.isnan(self.__ivs[pos]):
+            ret = dict((name, float(values[pos])) for name, values in self.__greeks.iteritems())
+        return ret
+
+    def interpolate(self, strike, timeToExpiry):
+        """Returns the implied volatility for a given strike and time to expiry, or None if there are no implied
+        volatilities available.
+        Volatilities are interpolated linearly across strikes, and total variance is interpolated linearly across
+        expiries. Values outside the surface are extrapolated flat.
+
+        :param strike: The strike price.
+        :type strike: float.
+        :param timeToExpiry: The time to expiry, in years.
+        :type timeToExpiry: float.
+        """
+        valid = ~np.isnan(self.__ivs)
+        if not valid.any():
+            return None
+
+        strikes = self.__strikes[valid]
+        timesToExpiry = self.__timesToExpiry[valid]
+        ivs = self.__ivs[valid]
+        expiries = np.unique(timesToExpiry)
+        variances = np.empty(len(expiries))
+        for i, expiry in enumerate(expiries):
+            inSlice = timesToExpiry == expiry
+            # Calls and puts with the same strike get averaged.
+            sliceStrikes, inverse = np.unique(strikes[inSlice], return_inverse=True)
+            sliceIVs = np.bincount(inverse, ivs[inSlice]) / np.bincount(inverse)
+            iv = np.interp(strike, sliceStrikes, sliceIVs)
+            variances[i] = iv * iv * expiry
+
+        if timeToExpiry <= expiries[0]:
+            ret = np.sqrt(variances[0] / expiries[0])
+        elif timeToExpiry >= expiries[-1]:
+            ret = np.sqrt(variances[-1] / expiries[-1])
+        else:
+            ret = np.sqrt(np.interp(timeToExpiry, expiries, variances) / timeToExpiry)
+        return float(ret)
+
+
+class VolatilitySurface(object):
+    """Calculates, at most once per bar, the implied volatilities and greeks for all the live option contracts of an
+    underlying, so strategies, brokers and analyzers can share them.
+
+    :param barFeed: The bar feed that supplies the underlying and the option bars.
+    :type barFeed: :class:`pyalgotrade.barfeed.BaseBarFeed`.
+    :param underlying: Underlying instrument identifier.
+    :type underlying: string.
+    :param rate: The risk free rate.
+    :type rate: float.
+    :param dividendYield: The dividend yield.
+    :type dividendYield: float.
+    :param cacheSize: The number of snapshots to keep. Older ones are evicted first.
+    :type cacheSize: int.
+
+    .. note::
+        * Contracts are added using :meth:`addContract`. If the bar feed is a
+          :class:`pyalgotrade.barfeed.optchainfeed.OptionChainFeed`, its open contracts for the underlying are also
+          included.
+        * Only the contracts that have a bar at the snapshot datetime are included.
+    """
+
+    def __init__(self, barFeed, underlying, rate=0.0, dividendYield=0.0, cacheSize=1):
+        assert(cacheSize > 0)
+        self.__barFeed = barFeed
+        self.__underlying = underlying
+        self.__rate = rate
+        self.__dividendYield = dividendYield
+        self.__cacheSize = cacheSize
+        self.__contracts = {}
+        self.__snapshots = collections.OrderedDict()
+
+    def getUnderlying(self):
+        return self.__underlying
+
+    def setRate(self, rate):
+        self.__rate = rate
+        self.__snapshots.clear()
+
+    def getRate(self):
+        return self.__rate
+
+    def setDividendYield(self, dividendYield):
+        self.__dividendYield = dividendYield
+        self.__snapshots.clear()
+
+    def getDividendYield(self):
+        return self.__dividendYield
+
+    def addContract(self, instrument, right, strike, expiry):
+        """Adds an option contract to the surface.
+
+        :param instrument: Option instrument identifier.
+        :type instrument: string.
+        :param right: optbroker.OptionOrder.Right.PUT or optbroker.OptionOrder.Right.CALL.
+        :param strike: The strike price.
+        :type strike: float.
+        :param expiry: The expiry.
+        :type expiry: datetime.date or datetime.datetime.
+        """
+        if self.__contracts.get(instrument) != (right, strike, expiry):
+            self.__contracts[instrument] = (right, strike, expiry)
+            self.__snapshots.clear()
+
+    def removeContract(self, instrument):
+        if self.__contracts.pop(instrument, None) is not None:
+            self.__snapshots.clear()
+
+    def getContracts(self):
+        """Returns the instruments for the contracts added using :meth:`addContract`."""
+        return self.__contracts.keys()
+
+    def __getContracts(self):
+        ret = dict(self.__contracts)
+        getOpenContracts = getattr(self.__barFeed, "getOpenContracts", None)
+        if getOpenContracts is not None:
+            for contract in getOpenContracts():
+                if contract.getSymbol() == self.__underlying:
+                    ret.setdefault(
+                        contract.getInstrument(), (contract.getRight(), contract.getStrike(), contract.getExpiry())
+                    )
+        return ret
+
+    def __buildSnapshot(self, dateTime, bars):
+        spot = bars[self.__underlying].getPrice()
+        instruments = []
+        rights = []
+        strikes = []
+        timesToExpiry = []
+        prices = []
+        for instrument, (right, strike, expiry) in sorted(self.__getContracts().iteritems()):
+            bar_ = bars.getBar(instrument)
+            timeToExpiry = greeks.time_to_expiry(dateTime, expiry)
+            if bar_ is not None and timeToExpiry > 0:
+                instruments.append(instrument)
+                rights.append(right)
+                strikes.append(strike)
+                timesToExpiry.append(timeToExpiry)
+                prices.append(bar_.getPrice())
+
+        return Snapshot(
+            dateTime, spot, instruments, np.array(rights), np.array(strikes, dtype=float),
+            np.array(timesToExpiry, dtype=float), np.array(prices, dtype=float), self.__rate, self.__dividendYield
+        )
+
+    def getSnapshot(self, dateTime=None):
+        """Returns the :class:`Snapshot` for a given datetime, or None if not available.
+        Snapshots get calculated the first time they are requested for the current bars.
+
+        :param dateTime: The datetime. If None, the current datetime is used.
+        :type dateTime: datetime.datetime.
+        """
+        bars = self.__barFeed.getCurrentBars()
+        if dateTime is None and bars is not None:
+            dateTime = bars.getDateTime()
+
+        ret = self.__snapshots.get(dateTime)
+        if ret is None and bars is not None and bars.getDateTime() == dateTime and \
+                bars.getBar(self.__underlying) is not None:
+            ret = self.__buildSnapshot(dateTime, bars)
+            self.__snapshots[dateTime] = ret
+            while len(self.__snapshots) > self.__cacheSize:
+                self.__snapshots.popitem(last=False)
+        return ret
+
+    def getImpliedVolatility(self, instrument):
+        """Returns the current implied volatility for an option instrument, or None if not available."""
+        snapshot = self.getSnapshot()
+        return None if snapshot is None else snapshot.getImpliedVolatility(instrument)
+
+    def getGreeks(self, instrument):
+        """Returns the current greeks for an option instrument, or None if not available.
+        Check :meth:`Snapshot.getGreeks` for details."""
+        snapshot = self.getSnapshot()
+        return None if snapshot is None else snapshot.getGreeks(instrument)
+
+    def interpolate(self, strike, expiry):
+        """Returns the current implied volatility for a given strike and expiry, or None if not available.
+        Check :meth:`Snapshot.interpolate` for details.
+
+        :param strike: The strike price.
+        :type strike: float.
+        :param expiry: The expiry.
+        :type expiry: datetime.date or datetime.datetime.
+        """
+        ret = None
+        snapshot = self.getSnapshot()
+        if snapshot is not None:
+            ret = snapshot.interpolate(strike, greeks.time_to_expiry(snapshot.getDateTime(), expiry))
+        return ret
@@ -0,0 +1,202 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import datetime
+import math
+
+import numpy
+
+from pyalgotrade import stratanalyzer
+from pyalgotrade.stratanalyzer import sharpe
+
+
+# :param returns: The returns.
+# :param riskFreeRate: The risk free rate per annum.
+# :param tradingPeriods: The number of trading periods per annum.
+# :param annualized: True if the sortino ratio should be annualized.
+# Like the sharpe ratio, but only the returns under the risk free rate are taken into account for the volatility.
+def sortino_ratio(returns, riskFreeRate, tradingPeriods, annualized=True):
+    ret = 0.0
+    returns = numpy.asarray(returns, dtype=float)
+    if len(returns):
+        rfPerReturn = riskFreeRate / float(tradingPeriods)
+        excessReturns = returns - rfPerReturn
+        downsideVolatility = math.sqrt(numpy.mean(numpy.minimum(excessReturns, 0) ** 2))
+        if downsideVolatility != 0:
+            ret = excessReturns.mean() / downsideVolatility
+            if annualized:
+                ret = ret * math.sqrt(tradingPeriods)
+    return ret
+
+
+class EquityCurve(stratanalyzer.StrategyAnalyzer):
+    """A :class:`pyalgotrade.stratanalyzer.StrategyAnalyzer` that records the portfolio equity for every bar, and
+    calculates returns, Sharpe ratio, Sortino ratio and drawdown once the strategy has finished.
+
+    Only the equity is recorded while the strategy runs, so this is cheaper than using
+    :class:`pyalgotrade.stratanalyzer.returns.Returns`, :class:`pyalgotrade.stratanalyzer.sharpe.SharpeRatio` and
+    :class:`pyalgotrade.stratanalyzer.drawdown.DrawDown`, while yielding the same figures. Use it when only the final
+    figures are needed, like when optimizing.
+
+    :param capacity: The number of bars to allocate room for. If None, the number of bars in the feed is used if
+        known in advance. Room is added as needed in any case.
+    :type capacity: int.
+    """
+
+    def __init__(self, capacity=None):
+        super(EquityCurve, self).__init__()
+        self.__capacity = capacity
+        self.__initialEquity = None
+        self.__equity = None
+        self.__dateTimes = []
+        self.__count = 0
+
+    def attached(self, strat):
+        self.__initialEquity = strat.getBroker().getEquity()
+        capacity = self.__capacity
+        if capacity is None:
+            getBars = getattr(strat.getFeed(), "_getBars", None)
+            capacity = 1024 if getBars is None else len(getBars())
+        self.__equity = numpy.empty(max(1, capacity))
+
+    def beforeOnBars(self, strat, bars):
+        if self.__count == len(self.__equity):
+            self.__equity = numpy.resize(self.__equity, len(self.__equity) * 2)
+        self.__equity[self.__count] = strat.getBroker().getEquity()
+        self.__dateTimes.append(bars.getDateTime())
+        self.__count += 1
+
+    def getInitialEquity(self):
+        return self.__initialEquity
+
+    def getEquity(self):
+        """Returns a NumPy array with the equity for each bar."""
+        return self.__equity[:self.__count]
+
+    def getDateTimes(self):
+        """Returns a list with the datetime for each bar."""
+        return self.__dateTimes
+
+    def getReturns(self):
+        """Returns a NumPy array with the returns for each bar."""
+        equity = self.getEquity()
+        previous = numpy.empty(len(equity))
+        previous[:1] = self.__initialEquity
+        previous[1:] = equity[:-1]
+        ret = numpy.zeros(len(equity))
+        nonZero = previous != 0
+        ret[nonZero] = (equity[nonZero] - previous[nonZero]) / previous[nonZero]
+        return ret
+
+    def getCumulativeReturns(self):
+        """Returns a NumPy array with the cumulative returns for each bar."""
+        return numpy.cumprod(1 + self.getReturns()) - 1
+
+    def getCumulativeReturn(self):
+        """Returns the cumulative returns for the whole run."""
+        ret = 0.0
+        if self.__count:
+            ret = self.getCumulativeReturns()[-1]
+        return ret
+
+    def getDailyReturns(self):
+        """Returns a NumPy array with the returns for each day, compounding the returns for the bars in the same
+        day."""
+        returns = self.getReturns()
+        if len(returns) == 0:
+            return returns
+        days = numpy.fromiter((dateTime.toordinal() for dateTime in self.__dateTimes), dtype=int, count=len(returns))
+        dayStarts = numpy.flatnonzero(numpy.concatenate(([True], days[1:] != days[:-1])))
+        return numpy.multiply.reduceat(1 + returns, dayStarts) - 1
+
+    def getSharpeRatio(self, riskFreeRate, annualized=True, useDailyReturns=True):
+        """Returns the Sharpe ratio for the strategy execution. If the volatility is 0, 0 is returned.
+        Check :meth:`pyalgotrade.stratanalyzer.sharpe.SharpeRatio.getSharpeRatio`.
+
+        :param riskFreeRate: The risk free rate per annum.
+        :type riskFreeRate: int/float.
+        :param annualized: True if the sharpe ratio should be annualized.
+        :type annualized: boolean.
+        :param useDailyReturns: True if daily returns should be used instead of the returns for each bar.
+        :type useDailyReturns: boolean.
+        """
+
+        if self.__count == 0:
+            ret = 0.0
+        elif useDailyReturns:
+            ret = sharpe.sharpe_ratio(self.getDailyReturns(), riskFreeRate, 252, annualized)
+        else:
+            ret = sharpe.sharpe_ratio_2(
+                self.getReturns(), riskFreeRate, self.__dateTimes[0], self.__dateTimes[-1], annualized
+            )
+        return ret
+
+    def getSortinoRatio(self, riskFreeRate, annualized=True, useDailyReturns=True):
+        """Returns the Sortino ratio for the strategy execution. If the downside volatility is 0, 0 is returned.
+
+        :param riskFreeRate: The risk free rate per annum.
+        :type riskFreeRate: int/float.
+        :param annualized: True if the sortino ratio should be annualized.
+        :type annualized: boolean.
+        :param useDailyReturns: True if daily returns should be used instead of the returns for each bar.
+        :type useDailyReturns: boolean.
+        """
+
+        if self.__count == 0:
+            ret = 0.0
+        elif useDailyReturns:
+            ret = sortino_ratio(self.getDailyReturns(), riskFreeRate, 252, annualized)
+        else:
+            # Periods per annum as in sharpe.sharpe_ratio_2.
+            yearsTraded = sharpe.days_traded(self.__dateTimes[0], self.__dateTimes[-1]) / 365.0
+            ret = sortino_ratio(self.getReturns(), riskFreeRate, self.__count / yearsTraded, annualized)
+        return ret
+
+    def __getHighs(self):
+        equity = self.getEquity()
+        highWatermarks = numpy.maximum.accumulate(equity)
+        return equity, highWatermarks
+
+    def getMaxDrawDown(self):
+        """Returns the max. (deepest) drawdown.
+        Check :meth:`pyalgotrade.stratanalyzer.drawdown.DrawDown.getMaxDrawDown`."""
+        ret = 0.0
+        if self.__count:
+            equity, highWatermarks = self.__getHighs()
+            ret = abs(min(0, ((equity - highWatermarks) / highWatermarks).min()))
+        return ret
+
+    def getLongestDrawDownDuration(self):
+        """Returns the duration of the longest drawdown.
+        Check :meth:`pyalgotrade.stratanalyzer.drawdown.DrawDown.getLongestDrawDownDuration`.
+
+        :rtype: :class:`datetime.timedelta`.
+        """
+        ret = datetime.timedelta()
+        if self.__count:
+            equity, highWatermarks = self.__getHighs()
+            indexes = numpy.arange(self.__count)
+            isHigh = equity >= highWatermarks
+            # The index of the last high for every bar.
+            lastHigh = numpy.maximum.accumulate(numpy.where(isHigh, indexes, 0))
+            # Drawdowns are the longest on the bar before a new high, or on the last bar.
+            for end in numpy.flatnonzero(numpy.concatenate((isHigh[1:], [True]))):
+                ret = max(ret, self.__dateTimes[end] - self.__dateTimes[lastHigh[end]])
+        return ret
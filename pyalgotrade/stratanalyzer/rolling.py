@@ -0,0 +1,283 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import collections
+import math
+
+from pyalgotrade import stratanalyzer
+from pyalgotrade.stratanalyzer import returns
+
+
+# Helper class to calculate the mean and variance of a sequence of values, one value at a time.
+# Check https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance#Welford's_online_algorithm
+class RunningMoments(object):
+    def __init__(self):
+        self.__count = 0
+        self.__mean = 0.0
+        self.__m2 = 0.0
+
+    def add(self, value):
+        self.__count += 1
+        delta = value - self.__mean
+        self.__mean += delta / self.__count
+        self.__m2 += delta * (value - self.__mean)
+
+    def remove(self, value):
+        assert(self.__count > 0)
+        self.__count -= 1
+        if self.__count == 0:
+            self.__mean = 0.0
+            self.__m2 = 0.0
+        else:
+            delta = value - self.__mean
+            self.__mean -= delta / self.__count
+            self.__m2 -= delta * (value - self.__mean)
+
+    def getCount(self):
+        return self.__count
+
+    def getMean(self):
+        ret = None
+        if self.__count:
+            ret = self.__mean
+        return ret
+
+    def getStdDev(self, ddof=1):
+        ret = None
+        if self.__count > ddof:
+            # Rounding errors may turn tiny variances negative.
+            ret = math.sqrt(max(0, self.__m2) / (self.__count - ddof))
+        return ret
+
+
+# Helper class to calculate the mean and variance of the last windowSize values.
+class RollingMoments(object):
+    def __init__(self, windowSize):
+        assert(windowSize > 0)
+        self.__values = collections.deque(maxlen=windowSize)
+        self.__moments = RunningMoments()
+
+    def add(self, value):
+        if len(self.__values) == self.__values.maxlen:
+            self.__moments.remove(self.__values[0])
+        self.__values.append(value)
+        self.__moments.add(value)
+
+    def getCount(self):
+        return self.__moments.getCount()
+
+    def getMean(self):
+        return self.__moments.getMean()
+
+    def getStdDev(self, ddof=1):
+        return self.__moments.getStdDev(ddof)
+
+
+# Helper class to calculate the max of the last windowSize values, in amortized constant time.
+class RollingMax(object):
+    def __init__(self, windowSize):
+        assert(windowSize > 0)
+        self.__windowSize = windowSize
+        self.__count = 0
+        # (index, value) tuples with decreasing values.
+        self.__candidates = collections.deque()
+
+    def add(self, value):
+        while len(self.__candidates) and self.__candidates[-1][1] <= value:
+            self.__candidates.pop()
+        self.__candidates.append((self.__count, value))
+        self.__count += 1
+        if self.__candidates[0][0] <= self.__count - 1 - self.__windowSize:
+            self.__candidates.popleft()
+
+    def getMax(self):
+        ret = None
+        if len(self.__candidates):
+            ret = self.__candidates[0][1]
+        return ret
+
+
+class RollingMetrics(stratanalyzer.StrategyAnalyzer):
+    """A :class:`pyalgotrade.stratanalyzer.StrategyAnalyzer` that calculates performance metrics for the portfolio
+    as bars get processed, both for the whole run and for a window with the last bars. Every figure is updated and
+    queried in constant time, and only the last windowSize returns are held in memory, so it is well suited for
+    metrics that are polled often while paper trading or live trading.
+
+    :param windowSize: The number of returns in the rolling window.
+    :type windowSize: int.
+    :param tradingPeriods: The number of returns per annum, used to annualize figures. If using daily bars this
+        should be 252, and if using hourly bars (with 6.5 trading hours a day) this should be 252 * 6.5 = 1638.
+    :type tradingPeriods: int.
+
+    .. note::
+        Returns are calculated for every bar, not for every day like in
+        :class:`pyalgotrade.stratanalyzer.sharpe.SharpeRatio` with the default settings.
+    """
+
+    def __init__(self, windowSize=252, tradingPeriods=252):
+        super(RollingMetrics, self).__init__()
+        assert(windowSize > 1)
+        assert(tradingPeriods > 0)
+        self.__windowSize = windowSize
+        self.__tradingPeriods = tradingPeriods
+        self.__broker = None
+        self.__moments = RunningMoments()
+        self.__rollingMoments = RollingMoments(windowSize)
+        # 1 for positive returns, 0 for negative returns and None for flat ones.
+        self.__hits = collections.deque(maxlen=windowSize)
+        self.__hitCount = 0
+        self.__missCount = 0
+        self.__highWatermark = None
+        self.__equity = None
+        self.__maxDrawDown = 0.0
+        self.__rollingHigh = RollingMax(windowSize)
+
+    def beforeAttach(self, strat):
+        # Get or create a shared ReturnsAnalyzerBase
+        analyzer = returns.ReturnsAnalyzerBase.getOrCreateShared(strat)
+        analyzer.getEvent().subscribe(self.__onReturns)
+        self.__broker = strat.getBroker()
+
+    def __updateHits(self, netReturn):
+        if len(self.__hits) == self.__hits.maxlen:
+            removed = self.__hits[0]
+            if removed == 1:
+                self.__hitCount -= 1
+            elif removed == 0:
+                self.__missCount -= 1
+
+        if netReturn > 0:
+            hit = 1
+            self.__hitCount += 1
+        elif netReturn < 0:
+            hit = 0
+            self.__missCount += 1
+        else:
+            hit = None
+        self.__hits.append(hit)
+
+    def __onReturns(self, dateTime, returnsAnalyzerBase):
+        netReturn = returnsAnalyzerBase.getNetReturn()
+        self.__moments.add(netReturn)
+        self.__rollingMoments.add(netReturn)
+        self.__updateHits(netReturn)
+
+        self.__equity = self.__broker.getEquity()
+        if self.__highWatermark is None or self.__equity > self.__highWatermark:
+            self.__highWatermark = self.__equity
+        self.__maxDrawDown = max(self.__maxDrawDown, self.getCurrentDrawDown())
+        self.__rollingHigh.add(self.__equity)
+
+    def __sharpeRatio(self, moments, riskFreeRate, annualized):
+        ret = None
+        volatility = moments.getStdDev()
+        if volatility is not None:
+            ret = 0.0
+            if volatility != 0:
+                ret = (moments.getMean() - riskFreeRate / float(self.__tradingPeriods)) / volatility
+                if annualized:
+                    ret = ret * math.sqrt(self.__tradingPeriods)
+        return ret
+
+    def __volatility(self, moments, annualized):
+        ret = moments.getStdDev()
+        if ret is not None and annualized:
+            ret = ret * math.sqrt(self.__tradingPeriods)
+        return ret
+
+    def getWindowSize(self):
+        return self.__windowSize
+
+    def getCount(self):
+        """Returns the number of returns processed."""
+        return self.__moments.getCount()
+
+    def getMeanReturn(self):
+        """Returns the mean of the returns, or None if there are no returns yet."""
+        return self.__moments.getMean()
+
+    def getVolatility(self, annualized=True):
+        """Returns the standard deviation of the returns, or None if there are less than 2 returns.
+
+        :param annualized: True if the volatility should be annualized.
+        :type annualized: boolean.
+        """
+        return self.__volatility(self.__moments, annualized)
+
+    def getSharpeRatio(self, riskFreeRate, annualized=True):
+        """Returns the Sharpe ratio, or None if there are less than 2 returns. If the volatility is 0, 0 is returned.
+
+        :param riskFreeRate: The risk free rate per annum.
+        :type riskFreeRate: int/float.
+        :param annualized: True if the sharpe ratio should be annualized.
+        :type annualized: boolean.
+        """
+        return self.__sharpeRatio(self.__moments, riskFreeRate, annualized)
+
+    def getRollingMeanReturn(self):
+        """Returns the mean of the returns in the window, or None if there are no returns yet."""
+        return self.__rollingMoments.getMean()
+
+    def getRollingVolatility(self, annualized=True):
+        """Returns the standard deviation of the returns in the window, or None if there are less than 2 returns.
+
+        :param annualized: True if the volatility should be annualized.
+        :type annualized: boolean.
+        """
+        return self.__volatility(self.__rollingMoments, annualized)
+
+    def getRollingSharpeRatio(self, riskFreeRate, annualized=True):
+        """Returns the Sharpe ratio for the returns in the window, or None if there are less than 2 returns.
+        If the volatility is 0, 0 is returned.
+
+        :param riskFreeRate: The risk free rate per annum.
+        :type riskFreeRate: int/float.
+        :param annualized: True if the sharpe ratio should be annualized.
+        :type annualized: boolean.
+        """
+        return self.__sharpeRatio(self.__rollingMoments, riskFreeRate, annualized)
+
+    def getRollingHitRate(self):
+        """Returns the fraction of positive returns in the window, not counting flat ones, or None if all the
+        returns in the window are flat."""
+        ret = None
+        total = self.__hitCount + self.__missCount
+        if total:
+            ret = self.__hitCount / float(total)
+        return ret
+
+    def getCurrentDrawDown(self):
+        """Returns the drawdown from the highest equity so far, as a positive fraction."""
+        ret = 0.0
+        if self.__highWatermark:
+            ret = (self.__highWatermark - self.__equity) / float(self.__highWatermark)
+        return ret
+
+    def getMaxDrawDown(self):
+        """Returns the max. (deepest) drawdown so far, as a positive fraction."""
+        return self.__maxDrawDown
+
+    def getRollingDrawDown(self):
+        """Returns the drawdown from the highest equity in the window, as a positive fraction."""
+        ret = 0.0
+        highWatermark = self.__rollingHigh.getMax()
+        if highWatermark:
+            ret = (highWatermark - self.__equity) / float(highWatermark)
+        return ret
@@ -21,10 +21,123 @@
 from pyalgotrade import stratanalyzer
 from pyalgotrade import broker
 from pyalgotrade.stratanalyzer import returns
+from pyalgotrade.utils import dt
 
 import numpy as np
 
 
+def _read_only(array):
+    array.flags.writeable = False
+    return array
+
+
+class TradeLedger(object):
+    """Holds every completed trade in columns of typed arrays, that grow as trades get added.
+
+    :param capacity: The number of trades to allocate room for. Room is added as needed.
+    :type capacity: int.
+
+    .. note::
+        The arrays returned are read-only views and should not be modified.
+    """
+
+    # Column name and type.
+    COLUMNS = [
+        ("entryTimestamp", np.float64),
+        ("exitTimestamp", np.float64),
+        ("instrumentId", np.int32),
+        ("quantity", np.float64),
+        ("pnl", np.float64),
+        ("return", np.float64),
+        ("commissions", np.float64),
+    ]
+
+    def __init__(self, capacity=256):
+        assert(capacity > 0)
+        self.__count = 0
+        self.__columns = dict((name, np.empty(capacity, dtype=dtype)) for name, dtype in TradeLedger.COLUMNS)
+        self.__instruments = []
+        self.__instrumentIds = {}
+
+    def __getInstrumentId(self, instrument):
+        ret = self.__instrumentIds.get(instrument)
+        if ret is None:
+            ret = len(self.__instruments)
+            self.__instruments.append(instrument)
+            self.__instrumentIds[instrument] = ret
+        return ret
+
+    def addTrade(self, entryDateTime, exitDateTime, instrument, quantity, pnl, netReturn, commissions):
+        """Adds a completed trade. Naive datetimes are assumed to be in UTC.
+
+        :param quantity: The largest position held, negative for short positions.
+        """
+        if self.__count == len(self.__columns["pnl"]):
+            for name in self.__columns:
+                self.__columns[name] = np.resize(self.__columns[name], self.__count * 2)
+
+        row = {
+            "entryTimestamp": dt.datetime_to_timestamp(entryDateTime),
+            "exitTimestamp": dt.datetime_to_timestamp(exitDateTime),
+            "instrumentId": self.__getInstrumentId(instrument),
+            "quantity": quantity,
+            "pnl": pnl,
+            "return": netReturn,
+            "commissions": commissions,
+        }
+        for name, value in row.iteritems():
+            self.__columns[name][self.__count] = value
+        self.__count += 1
+
+    def getCount(self):
+        return self.__count
+
+    def getColumn(self, name):
+        """Returns a numpy.array with the values in a column, for each trade.
+
+        :param name: The column name. One of entryTimestamp, exitTimestamp, instrumentId, quantity, pnl, return or
+            commissions.
+        :type name: string.
+        """
+        return _read_only(self.__columns[name][:self.__count])
+
+    def getEntryTimestamps(self):
+        """Returns a numpy.array with the UTC timestamp for the first fill of each trade."""
+        return self.getColumn("entryTimestamp")
+
+    def getExitTimestamps(self):
+        """Returns a numpy.array with the UTC timestamp for the fill that closed each trade."""
+        return self.getColumn("exitTimestamp")
+
+    def getInstrumentIds(self):
+        """Returns a numpy.array with the instrument id for each trade. Check :meth:`getInstrumentNames`."""
+        return self.getColumn("instrumentId")
+
+    def getInstrumentNames(self):
+        """Returns a list with the instruments, indexed by instrument id."""
+        return self.__instruments
+
+    def getInstruments(self):
+        """Returns a numpy.array with the instrument for each trade."""
+        return np.array(self.__instruments, dtype=object)[self.getInstrumentIds()]
+
+    def getQuantities(self):
+        """Returns a numpy.array with the largest position held for each trade, negative for short positions."""
+        return self.getColumn("quantity")
+
+    def getPnLs(self):
+        """Returns a numpy.array with the profit/loss for each trade."""
+        return self.getColumn("pnl")
+
+    def getReturns(self):
+        """Returns a numpy.array with the return for each trade."""
+        return self.getColumn("return")
+
+    def getCommissions(self):
+        """Returns a numpy.array with the commissions for each trade."""
+        return self.getColumn("commissions")
+
+
 class Trades(stratanalyzer.StrategyAnalyzer):
     """A :class:`pyalgotrade.stratanalyzer.StrategyAnalyzer` that records the profit/loss
     and returns of every completed trade.
@@ -36,48 +149,40 @@ class Trades(stratanalyzer.StrategyAnalyzer):
 
             * The trade's profit was $10.
             * The trade's return is 100%, even though your whole portfolio went from $1000 to $1020, a 2% return.
+
+    .. note::
+        Trades are kept in a :class:`TradeLedger`, and the arrays returned are calculated when first requested after
+        a trade completes. They are read-only and should not be modified.
     """
 
     def __init__(self):
         super(Trades, self).__init__()
-        self.__all = []
-        self.__profits = []
-        self.__losses = []
-        self.__allReturns = []
-        self.__positiveReturns = []
-        self.__negativeReturns = []
-        self.__allCommissions = []
-        self.__profitableCommissions = []
-        self.__unprofitableCommissions = []
-        self.__evenCommissions = []
-        self.__evenTrades = 0
+        self.__ledger = TradeLedger()
+        # Arrays derived from the ledger, until the next trade completes.
+        self.__cache = {}
         self.__posTrackers = {}
+        # Instrument -> [entry datetime, largest position] for open trades.
+        self.__openTrades = {}
 
-    def __updateTrades(self, posTracker):
+    def __updateTrades(self, posTracker, instrument, dateTime):
         price = 0  # The price doesn't matter since the position should be closed.
         assert posTracker.getPosition() == 0
-        netProfit = posTracker.getPnL(price)
-        netReturn = posTracker.getReturn(price)
-
-        if netProfit > 0:
-            self.__profits.append(netProfit)
-            self.__positiveReturns.append(netReturn)
-            self.__profitableCommissions.append(posTracker.getCommissions())
-        elif netProfit < 0:
-            self.__losses.append(netProfit)
-            self.__negativeReturns.append(netReturn)
-            self.__unprofitableCommissions.append(posTracker.getCommissions())
-        else:
-            self.__evenTrades += 1
-            self.__evenCommissions.append(posTracker.getCommissions())
-
-        self.__all.append(netProfit)
-        self.__allReturns.append(netReturn)
-        self.__allCommissions.append(posTracker.getCommissions())
-
+        entryDateTime, quantity = self.__openTrades.pop(instrument)
+        self.__ledger.addTrade(
+            entryDateTime, dateTime, instrument, quantity, posTracker.getPnL(price), posTracker.getReturn(price),
+            posTracker.getCommissions()
+        )
+        self.__cache = {}
         posTracker.reset()
 
-    def __updatePosTracker(self, posTracker, price, commission, quantity):
+    def __updateOpenTrade(self, posTracker, instrument, dateTime):
+        position = posTracker.getPosition()
+        if position != 0:
+            openTrade = self.__openTrades.setdefault(instrument, [dateTime, 0])
+            if abs(position) > abs(openTrade[1]):
+                openTrade[1] = position
+
+    def __updatePosTracker(self, posTracker, instrument, dateTime, price, commission, quantity):
         currentShares = posTracker.getPosition()
 
         if currentShares > 0:  # Current position is long
@@ -87,13 +192,13 @@ class Trades(stratanalyzer.StrategyAnalyzer):
                 newShares = currentShares + quantity
                 if newShares == 0:  # Exit long.
                     posTracker.sell(currentShares, price, commission)
-                    self.__updateTrades(posTracker)
+                    self.__updateTrades(posTracker, instrument, dateTime)
                 elif newShares > 0:  # Sell some shares.
                     posTracker.sell(quantity*-1, price, commission)
                 else:  # Exit long and enter short. Use proportional commissions.
                     proportionalCommission = commission * currentShares / float(quantity*-1)
                     posTracker.sell(currentShares, price, proportionalCommission)
-                    self.__updateTrades(posTracker)
+                    self.__updateTrades(posTracker, instrument, dateTime)
                     proportionalCommission = commission * newShares / float(quantity)
                     posTracker.sell(newShares*-1, price, proportionalCommission)
         elif currentShares < 0:  # Current position is short
@@ -103,13 +208,13 @@ class Trades(stratanalyzer.StrategyAnalyzer):
                 newShares = currentShares + quantity
                 if newShares == 0:  # Exit short.
                     posTracker.buy(currentShares*-1, price, commission)
-                    self.__updateTrades(posTracker)
+                    self.__updateTrades(posTracker, instrument, dateTime)
                 elif newShares < 0:  # Re-buy some shares.
                     posTracker.buy(quantity, price, commission)
                 else:  # Exit short and enter long. Use proportional commissions.
                     proportionalCommission = commission * currentShares * -1 / float(quantity)
                     posTracker.buy(currentShares*-1, price, proportionalCommission)
-                    self.__updateTrades(posTracker)
+                    self.__updateTrades(posTracker, instrument, dateTime)
                     proportionalCommission = commission * newShares / float(quantity)
                     posTracker.buy(newShares, price, proportionalCommission)
         elif quantity > 0:
@@ -143,63 +248,97 @@ class Trades(stratanalyzer.StrategyAnalyzer):
         else:  # Unknown action
             assert(False)
 
-        self.__updatePosTracker(posTracker, price, commission, quantity)
+        instrument = order.getInstrument()
+        dateTime = execInfo.getDateTime()
+        self.__updatePosTracker(posTracker, instrument, dateTime, price, commission, quantity)
+        self.__updateOpenTrade(posTracker, instrument, dateTime)
 
     def attached(self, strat):
         strat.getBroker().getOrderUpdatedEvent().subscribe(self.__onOrderEvent)
 
+    def __getCached(self, key, function):
+        ret = self.__cache.get(key)
+        if ret is None:
+            ret = function()
+            self.__cache[key] = ret
+        return ret
+
+    def __getMask(self, category):
+        def buildMask():
+            pnls = self.__ledger.getPnLs()
+            if category == "profitable":
+                ret = pnls > 0
+            elif category == "unprofitable":
+                ret = pnls < 0
+            else:
+                ret = pnls == 0
+            return ret
+        return self.__getCached(category, buildMask)
+
+    def __select(self, column, category):
+        return self.__getCached(
+            (column, category), lambda: _read_only(self.__ledger.getColumn(column)[self.__getMask(category)])
+        )
+
+    def __countTrades(self, category):
+        return self.__getCached((category, "count"), lambda: int(np.count_nonzero(self.__getMask(category))))
+
+    def getLedger(self):
+        """Returns the :class:`TradeLedger` with every completed trade."""
+        return self.__ledger
+
     def getCount(self):
         """Returns the total number of trades."""
-        return len(self.__all)
+        return self.__ledger.getCount()
 
     def getProfitableCount(self):
         """Returns the number of profitable trades."""
-        return len(self.__profits)
+        return self.__countTrades("profitable")
 
     def getUnprofitableCount(self):
         """Returns the number of unprofitable trades."""
-        return len(self.__losses)
+        return self.__countTrades("unprofitable")
 
     def getEvenCount(self):
         """Returns the number of trades whose net profit was 0."""
-        return self.__evenTrades
+        return self.__countTrades("even")
 
     def getAll(self):
         """Returns a numpy.array with the profits/losses for each trade."""
-        return np.asarray(self.__all)
+        return self.__ledger.getPnLs()
 
     def getProfits(self):
         """Returns a numpy.array with the profits for each profitable trade."""
-        return np.asarray(self.__profits)
+        return self.__select("pnl", "profitable")
 
     def getLosses(self):
         """Returns a numpy.array with the losses for each unprofitable trade."""
-        return np.asarray(self.__losses)
+        return self.__select("pnl", "unprofitable")
 
     def getAllReturns(self):
         """Returns a numpy.array with the returns for each trade."""
-        return np.asarray(self.__allReturns)
+        return self.__ledger.getReturns()
 
     def getPositiveReturns(self):
         """Returns a numpy.array with the positive returns for each trade."""
-        return np.asarray(self.__positiveReturns)
+        return self.__select("return", "profitable")
 
     def getNegativeReturns(self):
         """Returns a numpy.array with the negative returns for each trade."""
-        return np.asarray(self.__negativeReturns)
+        return self.__select("return", "unprofitable")
 
     def getCommissionsForAllTrades(self):
         """Returns a numpy.array with the commissions for each trade."""
-        return np.asarray(self.__allCommissions)
+        return self.__ledger.getCommissions()
 
     def getCommissionsForProfitableTrades(self):
         """Returns a numpy.array with the commissions for each profitable trade."""
-        return np.asarray(self.__profitableCommissions)
+        return self.__select("commissions", "profitable")
 
     def getCommissionsForUnprofitableTrades(self):
         """Returns a numpy.array with the commissions for each unprofitable trade."""
-        return np.asarray(self.__unprofitableCommissions)
+        return self.__select("commissions", "unprofitable")
 
     def getCommissionsForEvenTrades(self):
         """Returns a numpy.array with the commissions for each trade whose net profit was 0."""
-        return np.asarray(self.__evenCommissions)
+        return self.__select("commissions", "even")
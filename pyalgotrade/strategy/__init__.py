@@ -27,6 +27,7 @@ from pyalgotrade import observer
 from pyalgotrade import dispatcher
 import pyalgotrade.strategy.position
 from pyalgotrade import logger
+from pyalgotrade import checkpoint
 from pyalgotrade.barfeed import resampled
 
 
@@ -55,12 +56,15 @@ class BaseStrategy(object):
         self.__analyzers = []
         self.__namedAnalyzers = {}
         self.__resampledBarFeeds = []
+        self.__started = False
+        self.__pendingCheckpoints = []
         self.__dispatcher = dispatcher.Dispatcher()
         self.__broker.getOrderUpdatedEvent().subscribe(self.__onOrderEvent)
         self.__barFeed.getNewValuesEvent().subscribe(self.__onBars)
 
-        self.__dispatcher.getStartEvent().subscribe(self.onStart)
+        self.__dispatcher.getStartEvent().subscribe(self.__onStart)
         self.__dispatcher.getIdleEvent().subscribe(self.__onIdle)
+        self.__dispatcher.getDispatchEndEvent().subscribe(self.__onDispatchEnd)
 
         # It is important to dispatch broker events before feed events, specially if we're backtesting.
         self.__dispatcher.addSubject(self.__broker)
@@ -474,6 +478,18 @@ class BaseStrategy(object):
         """
         pass
 
+    def __onStart(self):
+        # A strategy restored from a checkpoint was already started.
+        if not self.__started:
+            self.__started = True
+            self.onStart()
+
+    def __onDispatchEnd(self):
+        pendingCheckpoints = self.__pendingCheckpoints
+        self.__pendingCheckpoints = []
+        for path in pendingCheckpoints:
+            checkpoint.save(self, path, self.__barFeed)
+
     def __onIdle(self):
         # Force a resample check to avoid depending solely on the underlying
         # barfeed events.
@@ -520,6 +536,26 @@ class BaseStrategy(object):
         """Stops a running strategy."""
         self.__dispatcher.stop()
 
+    # Stops processing bars from the feed. Used when the feed is shared with other strategies that keep running.
+    def _detachFromFeed(self):
+        self.__barFeed.getNewValuesEvent().unsubscribe(self.__onBars)
+
+    def saveCheckpoint(self, path):
+        """Saves the state of the strategy, including the broker, the bar feed and the analyzers, to a file.
+        If called while the strategy is processing bars, the checkpoint is taken once all the events for the current
+        datetime were dispatched.
+
+        :param path: The path to the file.
+        :type path: string.
+
+        .. note::
+            Use :func:`pyalgotrade.checkpoint.load` to restore the strategy and then call run to resume it.
+        """
+        if self.__dispatcher.isDispatching():
+            self.__pendingCheckpoints.append(path)
+        else:
+            checkpoint.save(self, path, self.__barFeed)
+
     def attachAnalyzer(self, strategyAnalyzer):
         """Adds a :class:`pyalgotrade.stratanalyzer.StrategyAnalyzer`."""
         self.attachAnalyzerEx(strategyAnalyzer)
@@ -527,6 +563,9 @@ class BaseStrategy(object):
     def getNamedAnalyzer(self, name):
         return self.__namedAnalyzers.get(name, None)
 
+    def getAnalyzers(self):
+        return self.__analyzers
+
     def debug(self, msg):
         """Logs a message with level DEBUG on the strategy logger."""
         self.getLogger().debug(msg)
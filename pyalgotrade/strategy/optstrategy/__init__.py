@@ -19,7 +19,7 @@ import logging
 
 import pyalgotrade.broker
 from pyalgotrade.strategy import BaseStrategy
-from pyalgotrade.broker.optbroker.optbacktesting import OptionBroker
+from pyalgotrade.broker.optbroker.optbacktesting import OptionBroker, OptionSettlementOrder
 from . import optposition
 from .strategytransferobject import StrategyTransferObject
 
@@ -37,6 +37,19 @@ class OptionBaseStrategy(BaseStrategy):
 
     def __init__(self, barFeed, broker):
         super(OptionBaseStrategy, self).__init__(barFeed, broker)
+        broker.getOrderUpdatedEvent().subscribe(self.__onOrderEvent)
+
+    def __onOrderEvent(self, broker_, orderEvent):
+        # Settlements close the open positions on the expired contract.
+        order = orderEvent.getOrder()
+        if isinstance(order, OptionSettlementOrder):
+            execInfo = orderEvent.getEventInfo()
+            for position in list(self.getActivePositions()):
+                if position.getInstrument() == order.getInstrument() and position.getShares() != 0:
+                    positionExecInfo = pyalgotrade.broker.OrderExecutionInfo(
+                        execInfo.getPrice(), abs(position.getShares()), 0, execInfo.getDateTime()
+                    )
+                    position.settle(pyalgotrade.broker.OrderEvent(order, orderEvent.getEventType(), positionExecInfo))
 
     def optionMarketOrder(self, instrument, quantity, right, strike, expiry, onClose=False, goodTillCanceled=False,
                           allOrNone=False):
@@ -195,6 +208,37 @@ class OptionBaseStrategy(BaseStrategy):
             self.getBroker().submitOrder(ret)
         return ret
 
+    def optionComboOrder(self, legs, quantity, limitPrice=None, goodTillCanceled=False, allOrNone=False):
+        """Submits a combo order, like a spread or a straddle, where all the legs get filled at once.
+
+        :param legs: The legs.
+        :type legs: list of :class:`pyalgotrade.broker.optbroker.ComboLeg`.
+        :param quantity: The number of combo units. Positive means buy the legs as specified, negative means trade them
+            in the opposite direction.
+        :type quantity: int/float.
+        :param limitPrice: The net limit price for one combo unit, or None for a market order.
+            The net price is positive for a debit and negative for a credit.
+        :type limitPrice: float.
+        :param goodTillCanceled: True if the order is good till canceled. If False then the order gets automatically canceled when the session closes.
+        :type goodTillCanceled: boolean.
+        :param allOrNone: True if the order should be completely filled or not at all.
+        :type allOrNone: boolean.
+        :rtype: The :class:`pyalgotrade.broker.optbroker.OptionComboOrder` submitted.
+        """
+
+        ret = None
+        if quantity > 0:
+            ret = self.getBroker().createOptionComboOrder(pyalgotrade.broker.Order.Action.BUY, legs, quantity,
+                                                          limitPrice)
+        elif quantity < 0:
+            ret = self.getBroker().createOptionComboOrder(pyalgotrade.broker.Order.Action.SELL, legs, quantity * -1,
+                                                          limitPrice)
+        if ret:
+            ret.setGoodTillCanceled(goodTillCanceled)
+            ret.setAllOrNone(allOrNone)
+            self.getBroker().submitOrder(ret)
+        return ret
+
     def enterOptionLong(self, instrument, quantity, right, strike, expiry, goodTillCanceled=False, allOrNone=False):
         """Generates a buy :class:`pyalgotrade.broker.MarketOrder` to enter a long position.
 
@@ -481,6 +525,20 @@ class OptionBacktestingStrategy(OptionBaseStrategy):
         self.getBroker().setUseAdjustedValues(useAdjusted)
         self.__useAdjustedValues = useAdjusted
 
+    def getVolatilitySurface(self, underlying):
+        """Returns the :class:`pyalgotrade.options.surface.VolatilitySurface` for an underlying instrument.
+        The surface is shared with the broker, so implied volatilities and greeks get calculated once per bar.
+
+        :param underlying: Underlying instrument identifier.
+        :type underlying: string.
+        """
+        return self.getBroker().getVolatilitySurface(underlying)
+
+    def getRiskAggregator(self):
+        """Returns the broker's :class:`pyalgotrade.options.risk.RiskAggregator`, with the net greeks for the
+        positions held."""
+        return self.getBroker().getRiskAggregator()
+
     def setDebugMode(self, debugOn):
         """Enable/disable debug level messages in the strategy and backtesting broker.
         This is enabled by default."""
@@ -507,7 +565,10 @@ class OptionBacktestingStrategy(OptionBaseStrategy):
         self.__strategyTransferObject.setInitialEquity(self.getBroker().getEquity())
 
     def onFinish(self, bars):
-        # TODO Add final Equity to result output object
-        # TODO Dump data from output object to json file
         self.__strategyTransferObject.setFinalEquity(self.getBroker().getEquity())
-        self.__strategyTransferObject.dumpToFile()
+        self.__strategyTransferObject.close()
+
+    def getStrategyTransferObject(self):
+        """Returns the :class:`strategytransferobject.StrategyTransferObject` where the results of the run get
+        recorded."""
+        return self.__strategyTransferObject
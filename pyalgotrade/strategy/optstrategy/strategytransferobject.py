@@ -1,21 +1,157 @@
+import array
+import contextlib
 import datetime
+import itertools
 import json
 import os
+import tempfile
+import threading
+
 from pyalgotrade.broker import Order
+from pyalgotrade.utils import dt
+
+# Runs are written to a new file in this folder unless a path is given. Check output_path.
+DEFAULT_OUTPUT_FOLDER = os.path.join(tempfile.gettempdir(), "pyalgotrade", "runs")
+DEFAULT_CHUNK_SIZE = 10000
+FORMAT_VERSION = 1
+
+_runCounter = itertools.count()
+_outputPath = threading.local()
+
+
+@contextlib.contextmanager
+def output_path(path):
+    """
+    Makes the transfer objects created by the current thread, inside the with block, write to a given path.
+    :param path: as the path to the file to write
+    """
+    previous = getattr(_outputPath, "path", None)
+    _outputPath.path = path
+    try:
+        yield path
+    finally:
+        _outputPath.path = previous
 
-# Hardcoded paths to the temporary json transfer file to be used by webapp.
-PYALGOTRADE_BASE = os.path.abspath(os.path.join(__file__, "../../../../"))
-PYALGOTRADE_TEMP_DUMP_JSON_FILE = os.path.join(PYALGOTRADE_BASE, "data/temp/jsondump.json")
+
+def _open_for_writing(path, mode):
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    return open(path, mode)
+
+
+def new_output_path(folder=DEFAULT_OUTPUT_FOLDER):
+    """
+    Returns a new path, unique to this run, to write a transfer object to.
+    :param folder: as the folder where the file should be
+    :return: str
+    """
+    fileName = "%s-%d-%d.ndjson" % (datetime.datetime.now().strftime("%Y%m%d%H%M%S"), os.getpid(), _runCounter.next())
+    return os.path.join(folder, fileName)
 
 
 class StrategyTransferObject:
+    """
+    Records the results of a strategy run to be used by the webapp.
+    Fills are kept in columns (action codes, instrument ids, timestamps and prices) and are streamed to the file in
+    chunks, so memory usage doesn't grow with the number of fills.
+
+    Copies, like the ones made when pickling a strategy to take a checkpoint or when cloning it, continue on a new
+    file that starts with what was written up to the moment the copy was made.
+
+    The file has one JSON document per line:
+        {"type": "start", "version": 1, "initialEquity": ...}
+        {"type": "fills", "count": ..., "size": ...} followed by a line of the given size with the columns for the chunk.
+        {"type": "finish", "finalEquity": ..., "count": ...}
+    Use Reader to load it.
+    """
+
     BUY_ACTION_STR = "BUY"
     SELL_ACTION_STR = "SELL"
 
-    def __init__(self):
+    def __init__(self, path=None, chunkSize=DEFAULT_CHUNK_SIZE):
+        if path is None:
+            path = getattr(_outputPath, "path", None)
+        if path is None:
+            path = new_output_path()
+        self.__path = path
+        self.__chunkSize = chunkSize
+        self.__file = None
         self.__initialEquity = 0
         self.__finalEquity = 0
-        self.__buySellHistory = []
+        self.__count = 0
+        self.__resetChunk()
+
+    def __getstate__(self):
+        # Flush the pending fills so the copy starts with everything recorded so far.
+        self.__flush()
+        if self.__file is not None:
+            self.__file.flush()
+        ret = self.__dict__.copy()
+        ret["_StrategyTransferObject__file"] = None
+        ret["_StrategyTransferObject__written"] = os.path.getsize(self.__path) if os.path.exists(self.__path) else 0
+        return ret
+
+    def __setstate__(self, state):
+        written = state.pop("_StrategyTransferObject__written")
+        self.__dict__.update(state)
+        # Copies never write to the original file, since that one may still be in use.
+        source = self.__path
+        self.__path = new_output_path(os.path.dirname(source))
+        if written:
+            with open(source, "rb") as src:
+                with _open_for_writing(self.__path, "wb") as dst:
+                    while written > 0:
+                        data = src.read(min(written, 1 << 20))
+                        if not data:
+                            raise Exception("%s is shorter than when the copy was made" % (source))
+                        dst.write(data)
+                        written -= len(data)
+
+    def __resetChunk(self):
+        self.__instruments = []
+        self.__instrumentIds = {}
+        self.__actions = array.array("b")
+        self.__instrumentColumn = array.array("l")
+        self.__timestamps = array.array("l")
+        self.__prices = array.array("d")
+
+    def __write(self, record):
+        if self.__file is None:
+            self.__file = _open_for_writing(self.__path, "ab")
+        self.__file.write(json.dumps(record))
+        self.__file.write("\n")
+
+    def __flush(self):
+        if len(self.__actions) == 0:
+            return
+        payload = json.dumps({
+            "instruments": self.__instruments,
+            "instrumentIds": self.__instrumentColumn.tolist(),
+            "actions": self.__actions.tolist(),
+            "timestamps": self.__timestamps.tolist(),
+            "prices": self.__prices.tolist(),
+        })
+        self.__write({"type": "fills", "count": len(self.__actions), "size": len(payload)})
+        self.__file.write(payload)
+        self.__file.write("\n")
+        # Make full chunks visible to readers while the run is still in progress.
+        self.__file.flush()
+        self.__resetChunk()
+
+    def getPath(self):
+        """
+        Returns the path to the file where the transfer object is written.
+        :return: str
+        """
+        return self.__path
+
+    def getCount(self):
+        """
+        Returns the number of fills recorded.
+        :return: int
+        """
+        return self.__count
 
     def setInitialEquity(self, equity):
         """
@@ -24,6 +160,7 @@ class StrategyTransferObject:
         :return: None
         """
         self.__initialEquity = equity
+        self.__write({"type": "start", "version": FORMAT_VERSION, "initialEquity": equity})
 
     def setFinalEquity(self, equity):
         """
@@ -42,24 +179,126 @@ class StrategyTransferObject:
         :param price: as the order price
         :return: None
         """
-        buySell = ""
-        if action == Order.Action.BUY:
-            buySell = StrategyTransferObject.BUY_ACTION_STR
-        elif action == Order.Action.SELL:
-            buySell = StrategyTransferObject.SELL_ACTION_STR
+        instrumentId = self.__instrumentIds.get(instrument)
+        if instrumentId is None:
+            instrumentId = len(self.__instruments)
+            self.__instrumentIds[instrument] = instrumentId
+            self.__instruments.append(instrument)
 
-        dateStr = date.strftime("%Y-%m-%d %H:%M:%S")
-        buySell = {"buysell": buySell, "instrument": instrument, "date": dateStr, "price": price}
-        self.__buySellHistory.append(buySell)
+        self.__actions.append(action)
+        self.__instrumentColumn.append(instrumentId)
+        # Timestamps hold the wall clock time, so localized datetimes keep their local date and time.
+        self.__timestamps.append(int(dt.datetime_to_timestamp(dt.unlocalize(date))))
+        self.__prices.append(price)
+        self.__count += 1
+        if len(self.__actions) >= self.__chunkSize:
+            self.__flush()
 
-    def dumpToFile(self):
+    def close(self):
         """
-        Dumps the transfer object to a specified file in json formatting.
+        Writes the pending fills and the final equity, and closes the file.
         :return: None
         """
-        jsonToDump = {"initialEquity": self.__initialEquity,
-                    "finalEquity": self.__finalEquity,
-                    "buySellHistory": self.__buySellHistory}
-        with open(PYALGOTRADE_TEMP_DUMP_JSON_FILE, 'w') as jsonfp:
-            json.dump(jsonToDump, jsonfp)
+        self.__flush()
+        self.__write({"type": "finish", "finalEquity": self.__finalEquity, "count": self.__count})
+        self.__file.close()
+        self.__file = None
+
+
+class Reader:
+    """
+    Reads a file written by a StrategyTransferObject, one page of fills at a time.
+    Only the chunk headers are read when opening the file, so paging doesn't require loading all the fills.
+    :param path: as the path to the file
+    """
 
+    def __init__(self, path):
+        self.__path = path
+        self.__initialEquity = None
+        self.__finalEquity = None
+        # (first fill index, fill count, file offset) for every chunk.
+        self.__chunks = []
+        self.__count = 0
+
+        with open(path, "rb") as f:
+            while True:
+                line = f.readline()
+                if not line:
+                    break
+                record = json.loads(line)
+                if record["type"] == "start":
+                    self.__initialEquity = record["initialEquity"]
+                elif record["type"] == "finish":
+                    self.__finalEquity = record["finalEquity"]
+                elif record["type"] == "fills":
+                    self.__chunks.append((self.__count, record["count"], f.tell()))
+                    self.__count += record["count"]
+                    f.seek(record["size"] + 1, os.SEEK_CUR)
+
+    def getInitialEquity(self):
+        return self.__initialEquity
+
+    def getFinalEquity(self):
+        """
+        Returns the final equity, or None if the run didn't finish.
+        """
+        return self.__finalEquity
+
+    def getCount(self):
+        """
+        Returns the number of fills.
+        :return: int
+        """
+        return self.__count
+
+    def getColumns(self, offset=0, limit=None):
+        """
+        Returns a page of fills as columns.
+        :param offset: as the index of the first fill
+        :param limit: as the maximum number of fills to return, or None to return all the fills from offset
+        :return: dict with lists for "actions", "instruments", "datetimes" and "prices". Datetimes are naive, with the
+            local date and time of the datetimes recorded.
+        """
+        end = self.__count if limit is None else min(self.__count, offset + limit)
+        ret = {"actions": [], "instruments": [], "datetimes": [], "prices": []}
+        with open(self.__path, "rb") as f:
+            for first, count, fileOffset in self.__chunks:
+                if first + count <= offset:
+                    continue
+                if first >= end:
+                    break
+                f.seek(fileOffset)
+                chunk = json.loads(f.readline())
+                begin = max(offset - first, 0)
+                stop = min(end - first, count)
+                instruments = chunk["instruments"]
+                ret["actions"].extend(chunk["actions"][begin:stop])
+                ret["instruments"].extend(instruments[i] for i in chunk["instrumentIds"][begin:stop])
+                ret["datetimes"].extend(
+                    dt.timestamp_to_datetime(timestamp, False) for timestamp in chunk["timestamps"][begin:stop]
+                )
+                ret["prices"].extend(chunk["prices"][begin:stop])
+        return ret
+
+    def getBuySellHistory(self, offset=0, limit=None):
+        """
+        Returns a page of fills in the format used by the webapp.
+        :param offset: as the index of the first fill
+        :param limit: as the maximum number of fills to return, or None to return all the fills from offset
+        :return: list of dicts with "buysell", "instrument", "date" and "price"
+        """
+        columns = self.getColumns(offset, limit)
+        ret = []
+        for action, instrument, dateTime, price in zip(
+            columns["actions"], columns["instruments"], columns["datetimes"], columns["prices"]
+        ):
+            buySell = ""
+            if action == Order.Action.BUY:
+                buySell = StrategyTransferObject.BUY_ACTION_STR
+            elif action == Order.Action.SELL:
+                buySell = StrategyTransferObject.SELL_ACTION_STR
+            ret.append({
+                "buysell": buySell, "instrument": instrument, "date": dateTime.strftime("%Y-%m-%d %H:%M:%S"),
+                "price": price
+            })
+        return ret
@@ -384,6 +384,19 @@ class Position(object):
 
         self.__state.onOrderEvent(self, orderEvent)
 
+    def settle(self, orderEvent):
+        """Closes the position with an order that the broker filled on its own, like the ones used to settle expired
+        option contracts. The event's execution info should hold the shares of this position.
+
+        :param orderEvent: The fill event for the settlement order.
+        :type orderEvent: :class:`pyalgotrade.broker.OrderEvent`.
+        """
+        assert(self.__shares != 0)
+        order = orderEvent.getOrder()
+        self.__exitOrder = order
+        self.__activeOrders[order.getId()] = order
+        self.onOrderEvent(orderEvent)
+
     def __updatePosTracker(self, orderEvent):
         if orderEvent.getEventType() in (broker.OrderEvent.Type.PARTIALLY_FILLED, broker.OrderEvent.Type.FILLED):
             order = orderEvent.getOrder()
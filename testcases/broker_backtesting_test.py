@@ -154,6 +154,24 @@ class CommissionTestCase(common.TestCase):
         self.assertEqual(comm.calculate(None, 1, 1), 0.1)
         self.assertEqual(comm.calculate(None, 2, 2), 0.4)
 
+    def testNoCommissionBatch(self):
+        comm = backtesting.NoCommission()
+        self.assertEqual(comm.calculateBatch([None, None], [1, 2], [1, 2]).tolist(), [0, 0])
+
+    def testFixedPerTradeBatch(self):
+        comm = backtesting.FixedPerTrade(1.2)
+        order1 = backtesting.MarketOrder(broker.Order.Action.BUY, "orcl", 1, False, broker.IntegerTraits())
+        order2 = backtesting.MarketOrder(broker.Order.Action.BUY, "orcl", 2, False, broker.IntegerTraits())
+        order2.switchState(broker.Order.State.SUBMITTED)
+        order2.switchState(broker.Order.State.ACCEPTED)
+        order2.addExecutionInfo(broker.OrderExecutionInfo(1, 1, 1.2, datetime.datetime.now()))
+        self.assertEqual(comm.calculateBatch([order1, order2], [1, 1], [1, 1]).tolist(), [1.2, 0])
+
+    def testTradePercentageBatch(self):
+        comm = backtesting.TradePercentage(0.1)
+        commissions = comm.calculateBatch([None, None, None], [1, 2, 4], [1, 2, 10])
+        self.assertEqual(commissions.tolist(), [comm.calculate(None, 1, 1), comm.calculate(None, 2, 2), 4])
+
 
 class BrokerTestCase(BaseTestCase):
     def testOneCancelsAnother(self):
@@ -0,0 +1,181 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import os
+import datetime
+
+import common
+
+from pyalgotrade import strategy
+from pyalgotrade import checkpoint
+from pyalgotrade import bar
+from pyalgotrade import barfeed
+from pyalgotrade.barfeed import yahoofeed
+from pyalgotrade.technical import ma
+from pyalgotrade.stratanalyzer import returns
+from pyalgotrade.stratanalyzer import trades
+
+
+class SMAStrategy(strategy.BacktestingStrategy):
+    def __init__(self, feed, period, instrument="orcl"):
+        strategy.BacktestingStrategy.__init__(self, feed, 10000)
+        self.setDebugMode(False)
+        self.__instrument = instrument
+        self.__sma = ma.SMA(feed[instrument].getPriceDataSeries(), period)
+        self.__position = None
+        self.__startCount = 0
+        self.checkpointAt = None
+        self.checkpointPath = None
+        self.stopAt = None
+        self.tradesAnalyzer = trades.Trades()
+        self.returnsAnalyzer = returns.Returns()
+        self.attachAnalyzer(self.tradesAnalyzer)
+        self.attachAnalyzer(self.returnsAnalyzer)
+
+    def getStartCount(self):
+        return self.__startCount
+
+    def onStart(self):
+        self.__startCount += 1
+
+    def onEnterCanceled(self, position):
+        self.__position = None
+
+    def onExitOk(self, position):
+        self.__position = None
+
+    def onExitCanceled(self, position):
+        self.__position.exitMarket()
+
+    def onBars(self, bars):
+        if self.__sma[-1] is not None:
+            price = bars[self.__instrument].getPrice()
+            if self.__position is None and price > self.__sma[-1]:
+                self.__position = self.enterLong(self.__instrument, 10, True)
+            elif self.__position is not None and price < self.__sma[-1] and not self.__position.exitActive():
+                self.__position.exitMarket()
+
+        if bars.getDateTime() == self.checkpointAt:
+            self.saveCheckpoint(self.checkpointPath)
+        if bars.getDateTime() == self.stopAt:
+            self.stop()
+
+
+def build_feed():
+    ret = yahoofeed.Feed()
+    ret.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+    return ret
+
+
+def get_results(strat):
+    return (
+        strat.getBroker().getEquity(),
+        strat.getBroker().getShares("orcl"),
+        strat.tradesAnalyzer.getCount(),
+        list(strat.tradesAnalyzer.getAll()),
+        list(strat.returnsAnalyzer.getCumulativeReturns()),
+    )
+
+
+class CheckpointTestCase(common.TestCase):
+    def testResume(self):
+        expected = SMAStrategy(build_feed(), 20)
+        expected.run()
+
+        with common.TmpDir() as tmpPath:
+            path = os.path.join(tmpPath, "checkpoint")
+            strat = SMAStrategy(build_feed(), 20)
+            strat.checkpointAt = datetime.datetime(2000, 6, 30)
+            strat.checkpointPath = path
+            strat.stopAt = strat.checkpointAt
+            strat.run()
+            self.assertNotEqual(get_results(strat), get_results(expected))
+
+            resumed = checkpoint.load(path, build_feed())
+            self.assertEqual(resumed.getCurrentDateTime(), datetime.datetime(2000, 6, 30))
+            resumed.checkpointAt = None
+            resumed.stopAt = None
+            resumed.run()
+
+        self.assertEqual(resumed.getStartCount(), 1)
+        self.assertEqual(get_results(resumed), get_results(expected))
+
+    def testFeedMismatch(self):
+        with common.TmpDir() as tmpPath:
+            path = os.path.join(tmpPath, "checkpoint")
+            strat = SMAStrategy(build_feed(), 20)
+            strat.saveCheckpoint(path)
+
+            feed = yahoofeed.Feed()
+            feed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2001-yahoofinance.csv"))
+            with self.assertRaisesRegexp(Exception, "The bar feed doesn't match.*"):
+                checkpoint.load(path, feed)
+            with self.assertRaisesRegexp(Exception, "A bar feed is required.*"):
+                checkpoint.load(path)
+
+    def testBarsLeftOut(self):
+        feed = build_feed()
+        strat = SMAStrategy(feed, 20)
+        self.assertLess(len(checkpoint.dumps(strat, feed)), len(checkpoint.dumps(strat)) / 2)
+
+    def testFork(self):
+        feed = build_feed()
+        warmUp = SMAStrategy(feed, 20)
+        warmUp.stopAt = datetime.datetime(2000, 3, 31)
+        warmUp.run()
+
+        forks = []
+        for stopAt in [datetime.datetime(2000, 9, 29), None]:
+            fork = checkpoint.clone(warmUp, feed)
+            fork.stopAt = stopAt
+            forks.append(fork)
+        for fork in forks:
+            fork.run()
+            self.assertTrue(fork.getFeed()._getBars() is feed._getBars())
+
+        expected = SMAStrategy(build_feed(), 20)
+        expected.stopAt = datetime.datetime(2000, 9, 29)
+        expected.run()
+        self.assertEqual(get_results(forks[0]), get_results(expected))
+        expected = SMAStrategy(build_feed(), 20)
+        expected.run()
+        self.assertEqual(get_results(forks[1]), get_results(expected))
+        # The warm-up strategy is left untouched.
+        self.assertEqual(warmUp.getCurrentDateTime(), datetime.datetime(2000, 3, 31))
+
+    def testOptimizerBarFeed(self):
+        bars = []
+        for dateTime, currentBars in build_feed():
+            bars.append(currentBars)
+
+        def build_optimizer_feed():
+            return barfeed.OptimizerBarFeed(bar.Frequency.DAY, ["orcl"], bars)
+
+        expected = SMAStrategy(build_optimizer_feed(), 10)
+        expected.run()
+
+        feed = build_optimizer_feed()
+        strat = SMAStrategy(feed, 10)
+        strat.stopAt = datetime.datetime(2000, 6, 30)
+        strat.run()
+        resumed = checkpoint.loads(checkpoint.dumps(strat, feed), build_optimizer_feed())
+        resumed.stopAt = None
+        resumed.run()
+        self.assertEqual(get_results(resumed), get_results(expected))
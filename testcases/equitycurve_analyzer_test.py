@@ -0,0 +1,156 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import datetime
+import math
+
+import common
+import strategy_test
+
+from pyalgotrade import marketsession
+from pyalgotrade import strategy
+from pyalgotrade.barfeed import csvfeed
+from pyalgotrade.barfeed import ninjatraderfeed
+from pyalgotrade.barfeed import yahoofeed
+from pyalgotrade.stratanalyzer import drawdown
+from pyalgotrade.stratanalyzer import equitycurve
+from pyalgotrade.stratanalyzer import returns
+from pyalgotrade.stratanalyzer import sharpe
+
+
+class InAndOutStrategy(strategy.BacktestingStrategy):
+    # Enters a long position every period bars, and exits it half way.
+    def __init__(self, barFeed, instrument, period):
+        super(InAndOutStrategy, self).__init__(barFeed)
+        self.__instrument = instrument
+        self.__period = period
+        self.__bars = 0
+        self.__position = None
+
+    def onBars(self, bars):
+        if self.__bars % self.__period == 0 and self.__position is None:
+            shares = int(self.getBroker().getCash() * 0.9 / bars[self.__instrument].getPrice())
+            self.__position = self.enterLong(self.__instrument, shares, True)
+        elif self.__bars % self.__period == self.__period / 2 and self.__position is not None:
+            self.__position.exitMarket()
+            self.__position = None
+        self.__bars += 1
+
+
+class EquityCurveTestCase(common.TestCase):
+    def attachAnalyzers(self, strat, equityCurve):
+        ret = {
+            "returns": returns.Returns(maxLen=100000),
+            "dailySharpe": sharpe.SharpeRatio(True),
+            "sharpe": sharpe.SharpeRatio(False),
+            "drawDown": drawdown.DrawDown(),
+        }
+        for analyzer in ret.values():
+            strat.attachAnalyzer(analyzer)
+        strat.attachAnalyzer(equityCurve)
+        return ret
+
+    def assertSameFigures(self, analyzers, equityCurve):
+        expectedReturns = analyzers["returns"].getReturns()
+        self.assertEqual(len(equityCurve.getReturns()), len(expectedReturns))
+        for i, value in enumerate(equityCurve.getReturns()):
+            self.assertEqual(value, expectedReturns[i])
+        expectedCumReturns = analyzers["returns"].getCumulativeReturns()
+        for i, value in enumerate(equityCurve.getCumulativeReturns()):
+            self.assertAlmostEqual(value, expectedCumReturns[i], places=10)
+        self.assertAlmostEqual(equityCurve.getCumulativeReturn(), expectedCumReturns[-1], places=10)
+
+        dailyReturns = analyzers["dailySharpe"].getReturns()
+        self.assertEqual(len(equityCurve.getDailyReturns()), len(dailyReturns))
+        for value, expected in zip(equityCurve.getDailyReturns(), dailyReturns):
+            self.assertAlmostEqual(value, expected, places=12)
+
+        for riskFreeRate in [0, 0.04]:
+            for annualized in [True, False]:
+                self.assertAlmostEqual(
+                    equityCurve.getSharpeRatio(riskFreeRate, annualized),
+                    analyzers["dailySharpe"].getSharpeRatio(riskFreeRate, annualized), places=10
+                )
+                self.assertAlmostEqual(
+                    equityCurve.getSharpeRatio(riskFreeRate, annualized, False),
+                    analyzers["sharpe"].getSharpeRatio(riskFreeRate, annualized), places=10
+                )
+
+        self.assertEqual(equityCurve.getMaxDrawDown(), analyzers["drawDown"].getMaxDrawDown())
+        self.assertEqual(
+            equityCurve.getLongestDrawDownDuration(), analyzers["drawDown"].getLongestDrawDownDuration()
+        )
+
+    def testDaily(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        strat = InAndOutStrategy(barFeed, "orcl", 20)
+        # Room gets added as needed.
+        equityCurve = equitycurve.EquityCurve(10)
+        analyzers = self.attachAnalyzers(strat, equityCurve)
+        strat.run()
+
+        self.assertEqual(len(equityCurve.getEquity()), 252)
+        self.assertEqual(equityCurve.getEquity()[-1], strat.getBroker().getEquity())
+        self.assertEqual(equityCurve.getInitialEquity(), 1000000)
+        self.assertEqual(equityCurve.getDateTimes()[-1], datetime.datetime(2000, 12, 29))
+        self.assertGreater(equityCurve.getMaxDrawDown(), 0)
+        self.assertSameFigures(analyzers, equityCurve)
+
+    def testIntraDay(self):
+        barFeed = ninjatraderfeed.Feed(ninjatraderfeed.Frequency.MINUTE, marketsession.USEquities.getTimezone())
+        barFeed.setBarFilter(csvfeed.USEquitiesRTH())
+        barFeed.addBarsFromCSV("spy", common.get_data_file_path("nt-spy-minute-2011.csv"))
+        strat = InAndOutStrategy(barFeed, "spy", 300)
+        equityCurve = equitycurve.EquityCurve()
+        analyzers = self.attachAnalyzers(strat, equityCurve)
+        strat.run()
+
+        self.assertLess(len(equityCurve.getDailyReturns()), len(equityCurve.getReturns()))
+        self.assertSameFigures(analyzers, equityCurve)
+
+    def testNoTrades(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("ige", common.get_data_file_path("sharpe-ratio-test-ige.csv"))
+        strat = strategy_test.TestStrategy(barFeed, 1000)
+        equityCurve = equitycurve.EquityCurve()
+        analyzers = self.attachAnalyzers(strat, equityCurve)
+        strat.run()
+
+        self.assertEqual(equityCurve.getCumulativeReturn(), 0)
+        self.assertEqual(equityCurve.getSharpeRatio(0.04), 0)
+        self.assertEqual(equityCurve.getSortinoRatio(0), 0)
+        self.assertEqual(equityCurve.getMaxDrawDown(), 0)
+        self.assertEqual(equityCurve.getLongestDrawDownDuration(), datetime.timedelta())
+        self.assertSameFigures(analyzers, equityCurve)
+
+    def testSortinoRatio(self):
+        values = [0.01, -0.02, 0.03, -0.01, 0.02]
+        riskFreeRate = 0.04
+        rfPerReturn = riskFreeRate / 252.0
+        excess = [value - rfPerReturn for value in values]
+        downside = math.sqrt(sum(min(0, value) ** 2 for value in excess) / len(excess))
+        expected = sum(excess) / len(excess) / downside
+        self.assertAlmostEqual(equitycurve.sortino_ratio(values, riskFreeRate, 252, False), expected, places=12)
+        self.assertAlmostEqual(
+            equitycurve.sortino_ratio(values, riskFreeRate, 252), expected * math.sqrt(252), places=12
+        )
+        self.assertEqual(equitycurve.sortino_ratio([0.01, 0.02], 0, 252), 0)
+        self.assertEqual(equitycurve.sortino_ratio([], 0, 252), 0)
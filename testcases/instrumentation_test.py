@@ -0,0 +1,134 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import json
+import os
+
+import common
+
+from pyalgotrade import instrumentation
+from pyalgotrade import observer
+from pyalgotrade import strategy
+from pyalgotrade.barfeed import yahoofeed
+from pyalgotrade.stratanalyzer import returns
+from pyalgotrade.technical import ma
+
+
+class SMAStrategy(strategy.BacktestingStrategy):
+    def __init__(self, barFeed, instrument, period):
+        super(SMAStrategy, self).__init__(barFeed)
+        self.__instrument = instrument
+        self.__sma = ma.SMA(barFeed[instrument].getPriceDataSeries(), period)
+        self.__position = None
+
+    def onBars(self, bars):
+        if self.__sma[-1] is None:
+            return
+        price = bars[self.__instrument].getPrice()
+        if self.__position is None and price > self.__sma[-1]:
+            self.__position = self.enterLong(self.__instrument, 10, True)
+        elif self.__position is not None and price < self.__sma[-1]:
+            self.__position.exitMarket()
+            self.__position = None
+
+
+class EventTestCase(common.TestCase):
+    def testHandlerCaller(self):
+        values = []
+        calls = []
+        event = observer.Event()
+        event.subscribe(lambda value: values.append(value))
+        event.emit(1)
+
+        def handlerCaller(handler, args, kwargs):
+            calls.append(args)
+            handler(*args, **kwargs)
+        event.setHandlerCaller(handlerCaller)
+        event.emit(2)
+        self.assertEqual(values, [1, 2])
+        self.assertEqual(calls, [(2,)])
+
+        # The handler caller doesn't survive a copy.
+        state = event.__getstate__()
+        self.assertNotIn("_Event__handlerCaller", state)
+        event.setHandlerCaller(None)
+        event.emit(3)
+        self.assertEqual(values, [1, 2, 3])
+        self.assertEqual(calls, [(2,)])
+
+
+class ProfilerTestCase(common.TestCase):
+    def __buildStrategy(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        ret = SMAStrategy(barFeed, "orcl", 20)
+        ret.attachAnalyzer(returns.Returns())
+        return ret
+
+    def testProfile(self):
+        strat = self.__buildStrategy()
+        strat.run()
+        expectedEquity = strat.getBroker().getEquity()
+
+        strat = self.__buildStrategy()
+        with common.TmpDir() as tmpPath:
+            jsonPath = os.path.join(tmpPath, "profile.json")
+            foldedPath = os.path.join(tmpPath, "profile.folded")
+            profiler = instrumentation.Profiler(jsonPath, foldedPath)
+            profiler.attach(strat)
+            strat.run()
+
+            with open(jsonPath) as f:
+                profile = json.load(f)
+            with open(foldedPath) as f:
+                folded = f.read().splitlines()
+
+        # Instrumentation doesn't change the results.
+        self.assertEqual(strat.getBroker().getEquity(), expectedEquity)
+
+        self.assertEqual(profiler.getBarCount(), 252)
+        for name in [
+            "Feed.dispatch", "Feed.getNextValuesAndUpdateDS", "SMA.__onNewValue", "Broker.onBars",
+            "SMAStrategy.onBars", "Returns.beforeOnBars",
+        ]:
+            component = profiler.getComponent(name)
+            self.assertEqual(component.getCalls(), 252, name)
+            self.assertGreaterEqual(component.getTotalTime(), component.getSelfTime())
+            self.assertEqual(len(component.getBarTimes()), 252)
+            self.assertLessEqual(component.getBarPercentile(50), component.getBarPercentile(99))
+        self.assertGreater(profiler.getComponent("SMAStrategy.__onOrderEvent").getCalls(), 0)
+        self.assertEqual(profiler.getComponent("Unknown"), None)
+
+        components = profiler.getComponents()
+        self.assertEqual(components[0].getName(), "Feed.dispatch")
+        self.assertAlmostEqual(sum(component.getSelfTime() for component in components), profiler.getTotalTime())
+        self.assertAlmostEqual(sum(profiler.getStackTimes().values()), profiler.getTotalTime())
+        self.assertIn("Feed.dispatch;Feed.getNextValuesAndUpdateDS;SMA.__onNewValue", profiler.getStackTimes())
+        self.assertIn("SMAStrategy.onBars", str(profiler))
+
+        self.assertEqual(profile["barCount"], 252)
+        self.assertEqual(
+            [component["name"] for component in profile["components"]],
+            [component.getName() for component in components]
+        )
+        self.assertEqual(len(folded), len(profiler.getStackTimes()))
+        stack, microseconds = folded[0].rsplit(" ", 1)
+        self.assertIn(stack, profiler.getStackTimes())
+        self.assertGreaterEqual(int(microseconds), 0)
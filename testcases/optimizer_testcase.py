@@ -20,12 +20,33 @@
 
 import sys
 import logging
+import datetime
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import urllib2
+import xmlrpclib
 
 import common
 
+from pyalgotrade.optimizer import base
+from pyalgotrade.optimizer import binaryrpc
+from pyalgotrade.optimizer import coordinator
 from pyalgotrade.optimizer import local
+from pyalgotrade.optimizer import multirun
+from pyalgotrade.optimizer import pool
+from pyalgotrade.optimizer import pruning
+from pyalgotrade.optimizer import resultcache
+from pyalgotrade.optimizer import results
+from pyalgotrade.optimizer import search
+from pyalgotrade.optimizer import warmstart
+from pyalgotrade.optimizer import worker
+from pyalgotrade.optimizer import xmlrpcserver
 from pyalgotrade import strategy
 from pyalgotrade.barfeed import yahoofeed
+from pyalgotrade.technical import ma
 
 sys.path.append("samples")
 import sma_crossover
@@ -44,6 +65,81 @@ class FailingStrategy(strategy.BacktestingStrategy):
         raise Exception("oh no!")
 
 
+class SometimesFailingStrategy(sma_crossover.SMACrossOver):
+    def __init__(self, barFeed, instrument, smaPeriod):
+        super(SometimesFailingStrategy, self).__init__(barFeed, instrument, smaPeriod)
+        self.__fail = smaPeriod == 10
+
+    def onBars(self, bars):
+        if self.__fail:
+            raise Exception("oh no!")
+        super(SometimesFailingStrategy, self).onBars(bars)
+
+
+class UnpicklableResultStrategy(sma_crossover.SMACrossOver):
+    def __init__(self, barFeed, instrument, smaPeriod):
+        super(UnpicklableResultStrategy, self).__init__(barFeed, instrument, smaPeriod)
+        self.__unpicklable = smaPeriod == 10
+
+    def getResult(self):
+        result = super(UnpicklableResultStrategy, self).getResult()
+        if self.__unpicklable:
+            return lambda: result
+        return result
+
+
+class DyingStrategy(sma_crossover.SMACrossOver):
+    def __init__(self, barFeed, instrument, smaPeriod):
+        super(DyingStrategy, self).__init__(barFeed, instrument, smaPeriod)
+        self.__die = smaPeriod == 10
+
+    def onBars(self, bars):
+        if self.__die:
+            os._exit(1)
+        super(DyingStrategy, self).onBars(bars)
+
+
+class WarmUpStrategy(strategy.BacktestingStrategy):
+    def __init__(self, barFeed, instrument, tradeFrom, smaPeriod=None):
+        super(WarmUpStrategy, self).__init__(barFeed)
+        self.setDebugMode(False)
+        self.__instrument = instrument
+        self.__tradeFrom = tradeFrom
+        self.__smaPeriod = smaPeriod
+        self.__position = None
+        # Indicators for every candidate period are calculated during the warm-up period.
+        priceDS = barFeed[instrument].getPriceDataSeries()
+        self.__smas = dict((period, ma.SMA(priceDS, period)) for period in range(5, 31))
+
+    def setSMAPeriod(self, smaPeriod):
+        self.__smaPeriod = smaPeriod
+
+    def onExitOk(self, position):
+        self.__position = None
+
+    def onBars(self, bars):
+        if bars.getDateTime() <= self.__tradeFrom:
+            return
+
+        sma = self.__smas[self.__smaPeriod][-1]
+        price = bars[self.__instrument].getPrice()
+        if self.__position is None and price > sma:
+            self.__position = self.enterLong(self.__instrument, 100, True)
+        elif self.__position is not None and price < sma and not self.__position.exitActive():
+            self.__position.exitMarket()
+
+
+class MetricsStrategy(sma_crossover.SMACrossOver):
+    def getMetrics(self):
+        return {"equity": self.getBroker().getEquity()}
+
+
+def run_warm_strategy(strat, smaPeriod):
+    strat.setSMAPeriod(smaPeriod)
+    strat.run()
+    return strat.getResult()
+
+
 class OptimizerTestCase(common.TestCase):
     def testLocal(self):
         barFeed = yahoofeed.Feed()
@@ -54,6 +150,125 @@ class OptimizerTestCase(common.TestCase):
         )
         self.assertEquals(round(res.getResult(), 2), 1295462.6)
         self.assertEquals(res.getParameters()[1], 20)
+        # Every result is kept, not just the best one.
+        self.assertEquals(res.getCount(), 96)
+        top = res.getTop(3)
+        self.assertEquals(len(top), 3)
+        self.assertEquals(top[0].getParameters(), res.getParameters())
+        self.assertEquals(top[0].getResult(), res.getResult())
+        self.assertGreaterEqual(top[1].getResult(), top[2].getResult())
+        self.assertEquals(len(list(res.getAll(lambda record: record.getParameters()[1] < 10))), 5)
+
+    def testLocalProgress(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        progresses = []
+        local.run(
+            sma_crossover.SMACrossOver, barFeed, list(parameters_generator("orcl", 5, 30)),
+            progressHandler=progresses.append
+        )
+        currentProgress = progresses[-1]
+        self.assertEquals(currentProgress.getCompleted(), 26)
+        self.assertEquals(currentProgress.getTotal(), 26)
+        self.assertEquals(currentProgress.getPending(), 0)
+        self.assertEquals(currentProgress.getETA(), 0)
+        self.assertEquals(currentProgress.getBarCount(), 252)
+        self.assertGreater(len(currentProgress.getWorkers()), 0)
+        for workerProgress in currentProgress.getWorkers():
+            self.assertGreater(workerProgress.getBarsPerSecond(), 0)
+
+    def testLocalMetrics(self):
+        barFeed = yahoofeed.Feed()
+        instrument = "orcl"
+        barFeed.addBarsFromCSV(instrument, common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        resultsPath = tempfile.mktemp()
+        try:
+            res = local.run(
+                MetricsStrategy, barFeed, parameters_generator(instrument, 5, 30), resultsPath=resultsPath, topK=5
+            )
+            self.assertEquals(res.getParameters()[1], 20)
+            self.assertEquals(len(res.getTop()), 5)
+            records = list(results.load(resultsPath))
+            self.assertEquals(sorted(record.getParameters()[1] for record in records), range(5, 31))
+            for record in records:
+                self.assertEquals(record.getMetrics()["equity"], record.getResult())
+        finally:
+            os.remove(resultsPath)
+
+    def testLocalBinaryTransport(self):
+        barFeed = yahoofeed.Feed()
+        instrument = "orcl"
+        barFeed.addBarsFromCSV(instrument, common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        res = local.run(
+            sma_crossover.SMACrossOver, barFeed, parameters_generator(instrument, 5, 100), logLevel=logging.DEBUG,
+            transport=base.Transport.BINARY
+        )
+        self.assertEquals(round(res.getResult(), 2), 1295462.6)
+        self.assertEquals(res.getParameters()[1], 20)
+
+    def testBinaryClient(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        resultSinc = base.ResultSinc()
+        coord = coordinator.Coordinator(
+            base.ParameterSource(parameters_generator("orcl", 5, 14)), resultSinc, barFeed
+        )
+        coord.loadBars()
+        processor = binaryrpc.RequestProcessor(coord, 3, 100)
+        client = binaryrpc.Client(binaryrpc.LocalConnection(processor), jobsPerRequest=2)
+
+        # Bars are transferred in compressed chunks.
+        instruments, bars = client.getInstrumentsAndBars()
+        self.assertEquals(instruments, ["orcl"])
+        self.assertEquals(len(bars), 252)
+        self.assertEquals(bars[-1].getDateTime(), datetime.datetime(2000, 12, 29))
+        self.assertEquals(client.getSharedBarsPath(), None)
+        self.assertEquals(client.getBarsFrequency(), barFeed.getFrequency())
+
+        # Jobs are pulled 2 at a time, and results are pushed before pulling more jobs.
+        processed = []
+        job = client.getNextJob("worker")
+        while job is not None:
+            parameters = job.getNextParameters()
+            while parameters is not None:
+                processed.append(parameters)
+                parameters = job.getNextParameters()
+            client.pushJobResults(job.getId(), [(processed[-1], processed[-1][1], None)], "worker")
+            job = client.getNextJob("worker")
+        self.assertEquals(sorted(processed), list(parameters_generator("orcl", 5, 14)))
+        self.assertFalse(coord.jobsPending())
+
+        status, value = pickle.loads(processor.process(pickle.dumps(("invalidMethod", ())))[0])
+        self.assertEquals(status, binaryrpc.STATUS_ERROR)
+
+    def testStatusEndpoint(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        port = local.find_port()
+        srv = xmlrpcserver.Server(
+            base.ParameterSource(list(parameters_generator("orcl", 5, 14))), base.ResultSinc(), barFeed,
+            "localhost", port, autoStop=False
+        )
+        serverThread = local.ServerThread(srv)
+        serverThread.start()
+        try:
+            status = json.loads(urllib2.urlopen("http://localhost:%d/status" % (port)).read())
+            self.assertEquals(status["completed"], 0)
+            self.assertEquals(status["total"], 10)
+            self.assertEquals(status["barCount"], 252)
+            self.assertEquals(status["workers"], [])
+
+            proxy = xmlrpclib.ServerProxy("http://localhost:%d/PyAlgoTradeRPC" % (port), allow_none=True)
+            pickle.loads(proxy.getNextJob("worker"))
+            status = json.loads(proxy.getStatus())
+            self.assertEquals(status["inFlight"], 1)
+            self.assertEquals(status["workers"][0]["name"], "worker")
+
+            with self.assertRaises(urllib2.HTTPError):
+                urllib2.urlopen("http://localhost:%d/invalid" % (port))
+        finally:
+            srv.stop()
+            serverThread.join()
 
     def testFailingStrategy(self):
         barFeed = yahoofeed.Feed()
@@ -61,3 +276,587 @@ class OptimizerTestCase(common.TestCase):
         barFeed.addBarsFromCSV(instrument, common.get_data_file_path("orcl-2000-yahoofinance.csv"))
         res = local.run(FailingStrategy, barFeed, parameters_generator(instrument, 5, 100), logLevel=logging.DEBUG)
         self.assertIsNone(res)
+
+    def testWarmStart(self):
+        instrument = "orcl"
+        tradeFrom = datetime.datetime(2000, 6, 30)
+
+        def build_feed():
+            ret = yahoofeed.Feed()
+            ret.addBarsFromCSV(instrument, common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+            return ret
+
+        results = {}
+        for smaPeriod in range(5, 31):
+            strat = WarmUpStrategy(build_feed(), instrument, tradeFrom, smaPeriod)
+            strat.run()
+            results[smaPeriod] = strat.getResult()
+        bestPeriod = max(results, key=lambda period: results[period])
+
+        for workerCount in [1, 2]:
+            warmStrategy = WarmUpStrategy(build_feed(), instrument, tradeFrom)
+            res = warmstart.run(
+                warmStrategy, tradeFrom, [(period,) for period in range(5, 31)], run_warm_strategy, workerCount
+            )
+            self.assertEquals(res.getParameters(), (bestPeriod,))
+            self.assertEquals(res.getResult(), results[bestPeriod])
+            # The warmed-up strategy is not consumed by the forks.
+            self.assertEquals(warmStrategy.getCurrentDateTime(), tradeFrom)
+
+    def testRunUntil(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        strat = WarmUpStrategy(barFeed, "orcl", datetime.datetime(2000, 12, 31), 10)
+        # There are no bars on 2000-07-01, so it stops right before that.
+        warmstart.run_until(strat, datetime.datetime(2000, 7, 1))
+        self.assertEquals(strat.getCurrentDateTime(), datetime.datetime(2000, 6, 30))
+        strat.run()
+        self.assertEquals(strat.getCurrentDateTime(), datetime.datetime(2000, 12, 29))
+
+
+def run_search(driver, function, count=3):
+    while not driver.eof():
+        parameters = driver.getNext(count)
+        assert(len(parameters))
+        for params in parameters:
+            driver.pushResult(function(*params.args), params)
+    return driver
+
+
+def quadratic(x, y, z):
+    return -(x - 0.3) ** 2 - (y - 0.7) ** 2 - (z - 7) ** 2
+
+
+class SearchTestCase(common.TestCase):
+    def getSpace(self):
+        return [search.Real(0, 1), search.Real(0, 1), search.Integer(0, 10)]
+
+    def testRandomSearch(self):
+        driver = run_search(search.RandomSearch(self.getSpace(), 50, seed=1), quadratic)
+        self.assertEquals(len(driver.getHistory()), 50)
+        for (x, y, z), result in driver.getHistory():
+            self.assertTrue(0 <= x <= 1 and 0 <= y <= 1)
+            self.assertIn(z, range(11))
+
+    def testFiniteSpace(self):
+        # The search stops once every combination was tried.
+        space = [search.Choice(["orcl"]), search.Integer(5, 15, 5)]
+        driver = search.RandomSearch(space, 100, seed=1)
+        self.assertEquals(driver.getTotal(), 3)
+        parameters = driver.getNext(100)
+        self.assertEquals(sorted(params.args for params in parameters), [("orcl", 5), ("orcl", 10), ("orcl", 15)])
+        self.assertTrue(driver.eof())
+
+    def getMedianResult(self, driverClass):
+        results = []
+        for seed in range(11):
+            driver = run_search(driverClass(self.getSpace(), 80, seed=seed), quadratic)
+            results.append(driver.getCompleted()[0][1])
+        return sorted(results)[5]
+
+    def testAdaptiveSearch(self):
+        randomResult = self.getMedianResult(search.RandomSearch)
+        for driverClass in [search.GeneticSearch, search.TPESearch]:
+            bestResult = self.getMedianResult(driverClass)
+            self.assertGreater(bestResult, randomResult)
+
+    def testWaitsForResults(self):
+        driver = search.TPESearch(self.getSpace(), 20, maxPending=2, seed=1)
+        parameters = driver.getNext(5)
+        self.assertEquals(len(parameters), 2)
+        self.assertEquals(driver.getNext(5), [])
+        self.assertFalse(driver.eof())
+        driver.pushResult(1, parameters[0])
+        self.assertEquals(len(driver.getNext(5)), 1)
+
+    def testSuccessiveHalving(self):
+        driver = search.SuccessiveHalving([search.Integer(1, 27)], 27, seed=1)
+        self.assertEquals(driver.getBudgets(), [1/9.0, 1/3.0, 1.0])
+        self.assertEquals(driver.getTotal(), 27 + 9 + 3)
+        run_search(driver, lambda x, budget: x * budget, 1)
+        self.assertEquals(driver.getBest(), ((27,), 27))
+        budgets = [params[-1] for params, result in driver.getHistory()]
+        self.assertEquals(budgets.count(1/9.0), 27)
+        # Only the best configurations get to use more bars.
+        self.assertLess(budgets.count(1/3.0), 27)
+        self.assertLess(budgets.count(1.0), budgets.count(1/3.0))
+
+    def testCoordinatorRetry(self):
+        driver = search.TPESearch(self.getSpace(), 20, maxPending=1, seed=1)
+        coord = coordinator.Coordinator(driver, base.ResultSinc(), None)
+        job = coord.getNextJob(10, "a")
+        self.assertEquals(job.getRetryAfter(), None)
+        # The driver needs the results for the first job before generating more parameters.
+        self.assertEquals(coord.getNextJob(10, "b").getId(), job.getId())
+        retryJob = coord.getNextJob(10, "c")
+        self.assertEquals(retryJob.getRetryAfter(), coord.retryInterval)
+        self.assertEquals(retryJob.getNextParameters(), None)
+        parameters = job.getNextParameters()
+        coord.pushJobResults(job.getId(), [(parameters, quadratic(*parameters), None)], "a")
+        self.assertEquals(len(driver.getHistory()), 1)
+        self.assertEquals(coord.getNextJob(10, "c").getRetryAfter(), None)
+
+    def testLocal(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        driver = search.TPESearch([search.Choice(["orcl"]), search.Integer(5, 100)], 15, seed=1)
+        res = local.run(sma_crossover.SMACrossOver, barFeed, driver, 2)
+        self.assertEquals(res.getCount(), 15)
+        self.assertEquals(len(driver.getHistory()), 15)
+        self.assertEquals(res.getResult(), driver.getCompleted()[0][1])
+
+    def testLocalSuccessiveHalving(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        driver = search.SuccessiveHalving([search.Choice(["orcl"]), search.Integer(5, 100)], 9, seed=1)
+        local.run(search.partial_history(sma_crossover.SMACrossOver), barFeed, driver, 2)
+        parameters, result = driver.getBest()
+        self.assertIsNotNone(parameters)
+        # Using all the bars matches a regular run.
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        strat = sma_crossover.SMACrossOver(barFeed, *parameters)
+        strat.run()
+        self.assertEquals(round(strat.getResult(), 2), round(result, 2))
+
+
+class PoolTestCase(common.TestCase):
+    def buildFeed(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        return barFeed
+
+    def testRun(self):
+        progresses = []
+        res = pool.run(
+            sma_crossover.SMACrossOver, self.buildFeed(), list(parameters_generator("orcl", 5, 100)), 2,
+            progressHandler=progresses.append
+        )
+        self.assertEquals(round(res.getResult(), 2), 1295462.6)
+        self.assertEquals(res.getParameters()[1], 20)
+        self.assertEquals(res.getCount(), 96)
+        self.assertEquals(progresses[-1].getCompleted(), 96)
+        self.assertEquals(progresses[-1].getPending(), 0)
+
+    def testSharedFeedAndPruning(self):
+        res = pool.run(
+            MetricsStrategy, self.buildFeed(), parameters_generator("orcl", 5, 30), 2,
+            pruningChecks=[pruning.MaxDrawDown(0.25)], sharedFeed=True
+        )
+        self.assertEquals(round(res.getResult(), 2), 1295462.6)
+        self.assertEquals(res.getCount(), 26)
+        self.assertGreater(len(list(res.getAll(lambda record: record.isPruned()))), 10)
+        for record in res.getAll(lambda record: not record.isPruned()):
+            self.assertEquals(record.getMetrics()["equity"], record.getResult())
+
+    def testSearchDriver(self):
+        driver = search.TPESearch([search.Choice(["orcl"]), search.Integer(5, 100)], 15, maxPending=2, seed=1)
+        res = pool.run(sma_crossover.SMACrossOver, self.buildFeed(), driver, 2)
+        self.assertEquals(res.getCount(), 15)
+        self.assertEquals(len(driver.getHistory()), 15)
+        self.assertEquals(res.getResult(), driver.getCompleted()[0][1])
+
+    def testSearchDriverWithMoreProcesses(self):
+        # Once the driver has maxPending parameters out, free processes get copies of unfinished jobs.
+        driver = search.TPESearch([search.Choice(["orcl"]), search.Integer(5, 100)], 12, maxPending=1, seed=1)
+        res = pool.run(sma_crossover.SMACrossOver, self.buildFeed(), driver, 3)
+        self.assertEquals(res.getCount(), 12)
+        self.assertEquals(len(driver.getHistory()), 12)
+
+    def testFailingStrategy(self):
+        res = pool.run(FailingStrategy, self.buildFeed(), parameters_generator("orcl", 5, 10), 2)
+        self.assertIsNone(res)
+
+    def testUnpicklableResult(self):
+        res = pool.run(UnpicklableResultStrategy, self.buildFeed(), list(parameters_generator("orcl", 5, 20)), 1)
+        self.assertEquals(res.getParameters()[1], 20)
+        self.assertEquals(round(res.getResult(), 2), 1295462.6)
+        self.assertEquals(res.getCount(), 16)
+        failed = list(res.getAll(lambda record: record.getResult() is None))
+        self.assertEquals([record.getParameters()[1] for record in failed], [10])
+
+    def testDyingProcess(self):
+        res = pool.run(DyingStrategy, self.buildFeed(), list(parameters_generator("orcl", 5, 20)), 1)
+        self.assertEquals(res.getParameters()[1], 20)
+        self.assertEquals(res.getCount(), 16)
+        failed = list(res.getAll(lambda record: record.getResult() is None))
+        self.assertIn(10, [record.getParameters()[1] for record in failed])
+
+
+class StopAfterBars(pruning.Check):
+    def __init__(self, bars):
+        self.__bars = bars
+
+    def check(self, pruner):
+        if pruner.getBarsProcessed() >= self.__bars:
+            return "Done"
+        return None
+
+
+class PruningTestCase(common.TestCase):
+    def buildStrategy(self, smaPeriod=20):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        return sma_crossover.SMACrossOver(barFeed, "orcl", smaPeriod)
+
+    def testMaxDrawDown(self):
+        strat = self.buildStrategy()
+        pruner = pruning.attach(strat, [pruning.MaxDrawDown(0.05)])
+        strat.run()
+        self.assertTrue(pruner.isPruned())
+        self.assertTrue(pruner.getReason().startswith("Max drawdown"))
+        self.assertGreater(pruner.getMaxDrawDown(), 0.05)
+        self.assertLess(pruner.getBarsProcessed(), 252)
+        self.assertEquals(worker.get_metrics(strat), {pruning.METRICS_KEY: pruner.getReason()})
+
+    def testMinEquity(self):
+        strat = self.buildStrategy(5)
+        pruner = pruning.attach(strat, [pruning.MinEquity(0.9)])
+        strat.run()
+        self.assertTrue(pruner.isPruned())
+        self.assertLess(pruner.getEquity(), pruner.getInitialEquity() * 0.9)
+
+        strat = self.buildStrategy()
+        pruner = pruning.attach(strat, [pruning.MinEquity(0.1)])
+        strat.run()
+        self.assertFalse(pruner.isPruned())
+        self.assertEquals(pruner.getBarsProcessed(), 252)
+        self.assertEquals(worker.get_metrics(strat), None)
+
+    def testPeriod(self):
+        for period, expectedBars in [(1, 10), (5, 10), (4, 12)]:
+            strat = self.buildStrategy()
+            pruner = pruning.attach(strat, [StopAfterBars(10)], period)
+            strat.run()
+            self.assertEquals(pruner.getBarsProcessed(), expectedBars)
+            self.assertEquals(strat.getCurrentDateTime(), strat.getFeed()["orcl"][expectedBars - 1].getDateTime())
+
+    def testAttachTwice(self):
+        strat = self.buildStrategy()
+        pruner = pruning.attach(strat, [pruning.MinEquity(0.1)])
+        self.assertEquals(pruning.attach(strat, [StopAfterBars(10)]), pruner)
+        self.assertEquals(pruning.get_pruner(strat), pruner)
+        strat.run()
+        self.assertEquals(pruner.getReason(), "Done")
+
+    def testLocal(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        res = local.run(
+            sma_crossover.SMACrossOver, barFeed, parameters_generator("orcl", 5, 30),
+            pruningChecks=[pruning.MaxDrawDown(0.25)]
+        )
+        # Pruned runs are reported, but they don't count for the best result.
+        self.assertEquals(res.getCount(), 26)
+        self.assertEquals(round(res.getResult(), 2), 1295462.6)
+        self.assertEquals(res.getParameters()[1], 20)
+        pruned = list(res.getAll(lambda record: record.isPruned()))
+        self.assertGreater(len(pruned), 10)
+        for record in res.getTop():
+            self.assertFalse(record.isPruned())
+
+
+class MultiRunTestCase(common.TestCase):
+    def buildFeed(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        return barFeed
+
+    def runStrategy(self, smaPeriod, pruningChecks):
+        strat = sma_crossover.SMACrossOver(self.buildFeed(), "orcl", smaPeriod)
+        if pruningChecks is not None:
+            pruning.attach(strat, pruningChecks)
+        strat.run()
+        return strat.getResult(), worker.get_metrics(strat)
+
+    def runShared(self, smaPeriods, pruningChecks):
+        barFeed = self.buildFeed()
+        strategies = []
+        for smaPeriod in smaPeriods:
+            strat = sma_crossover.SMACrossOver(barFeed, "orcl", smaPeriod)
+            if pruningChecks is not None:
+                pruning.attach(strat, pruningChecks)
+            strategies.append(strat)
+        return multirun.run(barFeed, strategies, lambda strat: (strat.getResult(), worker.get_metrics(strat)))
+
+    def testSameResults(self):
+        smaPeriods = range(5, 40, 3)
+        for pruningChecks in [None, [pruning.MaxDrawDown(0.2)], [StopAfterBars(1)]]:
+            expected = [self.runStrategy(smaPeriod, pruningChecks) for smaPeriod in smaPeriods]
+            self.assertEquals(self.runShared(smaPeriods, pruningChecks), expected)
+
+    def testPrunedStrategiesStopProcessingBars(self):
+        barFeed = self.buildFeed()
+        strategies = [sma_crossover.SMACrossOver(barFeed, "orcl", 20) for i in range(3)]
+        pruners = [pruning.attach(strat, [StopAfterBars(bars)]) for strat, bars in zip(strategies, [10, 100, 1000])]
+        multirun.run(barFeed, strategies)
+        self.assertEquals([pruner.getBarsProcessed() for pruner in pruners], [10, 100, 252])
+
+    def testInvalidFeed(self):
+        runner = multirun.MultiRunner(self.buildFeed())
+        with self.assertRaisesRegexp(Exception, "same bar feed"):
+            runner.addStrategy(sma_crossover.SMACrossOver(self.buildFeed(), "orcl", 20))
+
+    def testGetShared(self):
+        barFeed = self.buildFeed()
+        prices = barFeed["orcl"].getPriceDataSeries()
+        sma = multirun.get_shared(barFeed, ("sma", 20), lambda: ma.SMA(prices, 20))
+        self.assertEquals(multirun.get_shared(barFeed, ("sma", 20), lambda: ma.SMA(prices, 20)), sma)
+        self.assertNotEquals(multirun.get_shared(barFeed, ("sma", 10), lambda: ma.SMA(prices, 10)), sma)
+        otherFeed = self.buildFeed()
+        otherPrices = otherFeed["orcl"].getPriceDataSeries()
+        self.assertNotEquals(multirun.get_shared(otherFeed, ("sma", 20), lambda: ma.SMA(otherPrices, 20)), sma)
+
+    def testLocal(self):
+        res = local.run(
+            sma_crossover.SMACrossOver, self.buildFeed(), parameters_generator("orcl", 5, 100), sharedFeed=True
+        )
+        self.assertEquals(round(res.getResult(), 2), 1295462.6)
+        self.assertEquals(res.getParameters()[1], 20)
+        self.assertEquals(res.getCount(), 96)
+
+    def testLocalFailingStrategy(self):
+        # Parameter sets are run one at a time if the single pass fails.
+        res = local.run(
+            SometimesFailingStrategy, self.buildFeed(), parameters_generator("orcl", 5, 30), sharedFeed=True
+        )
+        self.assertEquals(res.getParameters()[1], 20)
+        self.assertEquals(res.getCount(), 26)
+        self.assertEquals(list(res.getAll(lambda record: record.getResult() is None))[0].getParameters()[1], 10)
+
+
+class ResultCacheTestCase(common.TestCase):
+    def buildCache(self, strategyFingerprint):
+        tmpDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpDir)
+        dbFilePath = os.path.join(tmpDir, "cache.sqlite")
+        return dbFilePath, resultcache.ResultCache(dbFilePath, strategyFingerprint)
+
+    def testStrategyFingerprint(self):
+        fingerprint = resultcache.strategy_fingerprint(sma_crossover.SMACrossOver)
+        self.assertEquals(fingerprint, resultcache.strategy_fingerprint(sma_crossover.SMACrossOver))
+        self.assertNotEquals(fingerprint, resultcache.strategy_fingerprint(sma_crossover.SMACrossOver, "2"))
+        self.assertNotEquals(fingerprint, resultcache.strategy_fingerprint(FailingStrategy))
+
+    def testGetPutInvalidate(self):
+        dbFilePath, cache = self.buildCache("strat")
+        self.assertEquals(cache.get("data", ("orcl", 10)), None)
+        cache.put("data", ("orcl", 10), 1.5, {"trades": 3})
+        cache.put("data", ("orcl", 11), None)
+        cache.put("otherData", ("orcl", 10), 2.5)
+        self.assertEquals(cache.get("data", ("orcl", 10)), (1.5, {"trades": 3}))
+        self.assertEquals(cache.get("data", ("orcl", 11)), None)
+        self.assertEquals(cache.getCount(), 2)
+        cache.close()
+
+        # Results persist, but they are not shared with other strategies.
+        cache = resultcache.ResultCache(dbFilePath, "strat")
+        self.assertEquals(cache.get("otherData", ("orcl", 10)), (2.5, None))
+        self.assertEquals(resultcache.ResultCache(dbFilePath, "otherStrat").get("data", ("orcl", 10)), None)
+
+        cache.invalidate(dataFingerprint="otherData")
+        self.assertEquals(cache.get("otherData", ("orcl", 10)), None)
+        self.assertEquals(cache.getCount(), 1)
+        cache.invalidate()
+        self.assertEquals(cache.getCount(), 0)
+        cache.close()
+
+    def testCoordinatorSkipsCachedParameters(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        dbFilePath, cache = self.buildCache("strat")
+        resultSinc = base.ResultSinc()
+        coord = coordinator.Coordinator(
+            base.ParameterSource(parameters_generator("orcl", 5, 14)), resultSinc, barFeed, resultCache=cache
+        )
+        coord.loadBars()
+        self.assertIsNotNone(coord.getDataFingerprint())
+        for sma in range(5, 10):
+            cache.put(coord.getDataFingerprint(), ("orcl", sma), sma)
+
+        job = coord.getNextJob(100, "worker")
+        parameters = []
+        while job is not None:
+            records = []
+            params = job.getNextParameters()
+            while params is not None:
+                parameters.append(params)
+                records.append((params, 0, None))
+                params = job.getNextParameters()
+            coord.pushJobResults(job.getId(), records, "worker")
+            job = coord.getNextJob(100, "worker")
+        self.assertEquals(sorted(parameters), list(parameters_generator("orcl", 10, 14)))
+        self.assertEquals(coord.getCacheHits(), 5)
+        self.assertEquals(resultSinc.getBest()[0], 9)
+        # New results were added to the cache.
+        self.assertEquals(cache.getCount(), 10)
+        cache.close()
+
+    def testLocal(self):
+        def build_feed():
+            ret = yahoofeed.Feed()
+            ret.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+            return ret
+
+        dbFilePath, cache = self.buildCache("strat")
+        local.run(sma_crossover.SMACrossOver, build_feed(), parameters_generator("orcl", 15, 25), resultCache=cache)
+        self.assertEquals(cache.getCount(), 11)
+        # Every result comes from the cache, so the strategy is not run at all.
+        res = local.run(FailingStrategy, build_feed(), parameters_generator("orcl", 5, 25), resultCache=cache)
+        self.assertEquals(res.getCount(), 21)
+        self.assertEquals(round(res.getResult(), 2), 1295462.6)
+        self.assertEquals(res.getParameters()[1], 20)
+        cache.close()
+
+
+class ResultStoreTestCase(common.TestCase):
+    def buildStore(self, topK):
+        ret = results.ResultStore(topK=topK)
+        self.addCleanup(os.remove, ret.getPath())
+        return ret
+
+    def testTop(self):
+        store = self.buildStore(3)
+        for i, result in enumerate([5, None, 1, 7, 5, 3, 7]):
+            store.push(result, base.Parameters(i), {"i": i})
+        self.assertEquals(store.getCount(), 7)
+        self.assertEquals([record.getParameters() for record in store.getTop()], [(3,), (6,), (0,)])
+        self.assertEquals([record.getResult() for record in store.getTop(2)], [7, 7])
+        self.assertEquals(store.getTop(1)[0].getMetrics(), {"i": 3})
+        self.assertEquals(store.getBest()[1].args, (3,))
+
+    def testAll(self):
+        store = self.buildStore(1)
+        for i in range(10):
+            store.push(None if i == 4 else i, base.Parameters(i))
+        store.close()
+        records = list(store.getAll())
+        self.assertEquals([record.getParameters() for record in records], [(i,) for i in range(10)])
+        self.assertEquals(records[4].getResult(), None)
+        self.assertEquals(records[4].getMetrics(), None)
+        odd = store.getAll(lambda record: record.getParameters()[0] % 2)
+        self.assertEquals([record.getResult() for record in odd], [1, 3, 5, 7, 9])
+        self.assertEquals(len(list(results.load(store.getPath()))), 10)
+
+
+class CoordinatorTestCase(common.TestCase):
+    def buildCoordinator(self, paramCount):
+        self.resultSinc = base.ResultSinc()
+        paramSource = base.ParameterSource([(i,) for i in range(paramCount)])
+        return coordinator.Coordinator(paramSource, self.resultSinc, None)
+
+    def runJob(self, coord, job, workerName):
+        parameters = job.getNextParameters()
+        count = 0
+        while parameters is not None:
+            count += 1
+            bestParameters = parameters
+            parameters = job.getNextParameters()
+        coord.pushJobResults(job.getId(), [(bestParameters, bestParameters[0], None)], workerName)
+        return count
+
+    def testAdaptiveBatchSize(self):
+        coord = self.buildCoordinator(1000)
+        # The first job for every worker is small, to measure its throughput.
+        job = coord.getNextJob(50, "fast")
+        self.assertEquals(self.runJob(coord, job, "fast"), 1)
+        self.assertGreater(coord.getThroughput("fast"), 0)
+        # Fast workers get jobs as big as allowed.
+        self.assertEquals(self.runJob(coord, coord.getNextJob(50, "fast"), "fast"), 50)
+        self.assertEquals(coord.getThroughput("slow"), None)
+        self.assertEquals(self.runJob(coord, coord.getNextJob(50, "slow"), "slow"), 1)
+
+    def testProgress(self):
+        coord = self.buildCoordinator(10)
+        progresses = []
+        coord.getProgressEvent().subscribe(progresses.append)
+        self.assertEquals(coord.getProgress().getCompleted(), 0)
+        self.assertEquals(coord.getProgress().getPending(), 10)
+        self.assertEquals(coord.getProgress().getETA(), None)
+
+        job = coord.getNextJob(3, "a")
+        currentProgress = coord.getProgress()
+        self.assertEquals(currentProgress.getInFlight(), 1)
+        self.assertEquals(currentProgress.getQueued(), 5)
+        parameters = job.getNextParameters()
+        coord.pushJobResults(job.getId(), [(parameters, 1, None)], "a")
+        job = coord.getNextJob(3, "a")
+        coord.pushJobResults(job.getId(), [(job.getNextParameters(), None, None)], "a")
+
+        self.assertEquals(len(progresses), 2)
+        currentProgress = progresses[-1]
+        self.assertEquals(currentProgress.getCompleted(), 2)
+        self.assertEquals(currentProgress.getFailed(), 1)
+        self.assertEquals(currentProgress.getInFlight(), 0)
+        self.assertEquals(currentProgress.getPending(), 8)
+        self.assertGreater(currentProgress.getThroughput(), 0)
+        self.assertGreaterEqual(currentProgress.getETA(), 0)
+        self.assertEquals(len(currentProgress.getWorkers()), 1)
+        workerProgress = currentProgress.getWorkers()[0]
+        self.assertEquals(workerProgress.getName(), "a")
+        self.assertEquals(workerProgress.getJobs(), 2)
+        self.assertEquals(workerProgress.getParameterSets(), 2)
+        self.assertGreater(workerProgress.getAvgRunTime(), 0)
+        # No bars were loaded.
+        self.assertEquals(workerProgress.getBarsPerSecond(), None)
+        self.assertEquals(json.loads(json.dumps(currentProgress.toDict()))["completed"], 2)
+
+    def testTailShrinks(self):
+        coord = self.buildCoordinator(100)
+        self.runJob(coord, coord.getNextJob(50, "a"), "a")
+        self.runJob(coord, coord.getNextJob(50, "b"), "b")
+        sizes = []
+        job = coord.getNextJob(50, "a")
+        while job is not None:
+            sizes.append(self.runJob(coord, job, "a"))
+            job = coord.getNextJob(50, "a")
+        self.assertEquals(sum(sizes), 98)
+        # Batches get smaller as the parameters run out.
+        self.assertEquals(sizes, sorted(sizes, reverse=True))
+        self.assertEquals(sizes[-1], 1)
+        self.assertFalse(coord.jobsPending())
+
+    def testReissue(self):
+        coord = self.buildCoordinator(3)
+        slowJob = coord.getNextJob(50, "slow")
+        self.runJob(coord, coord.getNextJob(50, "fast"), "fast")
+        self.runJob(coord, coord.getNextJob(50, "fast"), "fast")
+
+        # There are no parameters left, so the fast worker gets a copy of the job held by the slow one.
+        copy = coord.getNextJob(50, "fast")
+        self.assertEquals(copy.getId(), slowJob.getId())
+        # But only once.
+        self.assertEquals(coord.getNextJob(50, "fast"), None)
+        self.assertEquals(coord.getNextJob(50, "other"), None)
+        self.assertTrue(coord.jobsPending())
+
+        # The first results win.
+        self.runJob(coord, copy, "fast")
+        self.assertFalse(coord.jobsPending())
+        self.runJob(coord, slowJob, "slow")
+        self.assertEquals(self.resultSinc.getBest()[0], 2)
+
+    def testPendingWhilePushing(self):
+        coord = self.buildCoordinator(1)
+        pendingOnPush = []
+        push = self.resultSinc.push
+
+        def checkedPush(result, parameters, metrics=None):
+            pendingOnPush.append(coord.jobsPending())
+            push(result, parameters, metrics)
+        self.resultSinc.push = checkedPush
+
+        self.runJob(coord, coord.getNextJob(50, "a"), "a")
+        # The job is still pending while its results are being pushed.
+        self.assertEquals(pendingOnPush, [True])
+        self.assertFalse(coord.jobsPending())
+
+    def testFixedBatchSize(self):
+        coord = self.buildCoordinator(120)
+        coord.adaptiveBatching = False
+        slowJob = coord.getNextJob(50, "slow")
+        self.assertEquals(self.runJob(coord, coord.getNextJob(50, "fast"), "fast"), 50)
+        self.assertEquals(self.runJob(coord, coord.getNextJob(50, "fast"), "fast"), 20)
+        self.assertEquals(coord.getNextJob(50, "fast"), None)
+        self.runJob(coord, slowJob, "slow")
+        self.assertFalse(coord.jobsPending())
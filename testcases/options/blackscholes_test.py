@@ -0,0 +1,110 @@
+import datetime
+
+import numpy as np
+
+import testcases.common as common
+
+from pyalgotrade import dataseries
+from pyalgotrade import marketsession
+from pyalgotrade.broker import optbroker
+from pyalgotrade.options import blackscholes
+from pyalgotrade.options import greeks
+from pyalgotrade.utils import dt
+
+CALL = optbroker.OptionOrder.Right.CALL
+PUT = optbroker.OptionOrder.Right.PUT
+
+
+class BlackScholesTestCase(common.TestCase):
+    def testPrice(self):
+        self.assertAlmostEqual(blackscholes.price(CALL, 100, 100, 1, 0.05, 0.2), 10.4506, places=4)
+        self.assertAlmostEqual(blackscholes.price(PUT, 100, 100, 1, 0.05, 0.2), 5.5735, places=4)
+        self.assertAlmostEqual(blackscholes.black76_price(CALL, 100, 100, 1, 0.05, 0.2), 7.5771, places=4)
+
+    def testVectorized(self):
+        strikes = np.array([90, 100, 110])
+        prices = blackscholes.price([CALL, PUT, CALL], 100, strikes, 1, 0.05, 0.2)
+        self.assertEqual(prices.shape, (3,))
+        for i in range(3):
+            right = [CALL, PUT, CALL][i]
+            self.assertAlmostEqual(prices[i], blackscholes.price(right, 100, strikes[i], 1, 0.05, 0.2))
+
+    def testGreeks(self):
+        values = blackscholes.greeks(CALL, 100, 100, 1, 0.05, 0.2)
+        self.assertAlmostEqual(values["delta"], 0.6368, places=4)
+        self.assertAlmostEqual(values["gamma"], 0.01876, places=5)
+        self.assertAlmostEqual(values["vega"], 37.524, places=3)
+        self.assertAlmostEqual(values["theta"], -6.414, places=3)
+        self.assertAlmostEqual(values["rho"], 53.232, places=3)
+        self.assertAlmostEqual(blackscholes.delta(PUT, 100, 100, 1, 0.05, 0.2), 0.6368 - 1, places=4)
+
+    def testNormCDFFallback(self):
+        x = np.linspace(-5, 5, 21)
+        ndtr = blackscholes.ndtr
+        expected = blackscholes.norm_cdf(x)
+        blackscholes.ndtr = None
+        try:
+            self.assertTrue(np.allclose(blackscholes.norm_cdf(x), expected, atol=1e-7))
+        finally:
+            blackscholes.ndtr = ndtr
+
+    def testImpliedVolatility(self):
+        strikes = np.array([60, 80, 100, 120, 160.])
+        volatilities = np.array([0.6, 0.3, 0.2, 0.25, 0.9])
+        rights = [PUT, PUT, CALL, CALL, CALL]
+        prices = blackscholes.price(rights, 100, strikes, 0.25, 0.03, volatilities, 0.01)
+        ivs = blackscholes.implied_volatility(rights, prices, 100, strikes, 0.25, 0.03, 0.01)
+        self.assertTrue(np.allclose(ivs, volatilities, atol=1e-6))
+
+        # Prices below the intrinsic value or above the underlying have no solution.
+        ivs = blackscholes.implied_volatility(CALL, [1, 101], [120, 100], [100, 100], 1, 0.05)
+        self.assertTrue(np.isnan(ivs).all())
+
+
+class ImpliedVolatilityTestCase(common.TestCase):
+    def testDataSeries(self):
+        underlyingDS = dataseries.SequenceDataSeries()
+        optionDS = dataseries.SequenceDataSeries()
+        # Expires at the end of the day, one year after begin.
+        expiry = datetime.date(2001, 12, 31)
+        iv = greeks.ImpliedVolatility(underlyingDS, optionDS, CALL, 100, expiry, 0.05)
+
+        begin = datetime.datetime(2001, 1, 1)
+        underlyingDS.appendWithDateTime(begin, 100)
+        optionDS.appendWithDateTime(begin, blackscholes.price(CALL, 100, 100, 1, 0.05, 0.2))
+        # Not aligned.
+        optionDS.appendWithDateTime(begin + datetime.timedelta(days=1), 10)
+        self.assertEqual(len(iv), 1)
+        self.assertAlmostEqual(iv[-1], 0.2, places=6)
+        self.assertAlmostEqual(iv.getDeltaDataSeries()[-1], 0.6368, places=4)
+        self.assertAlmostEqual(iv.getVegaDataSeries()[-1], 37.524, places=3)
+
+        # Out of bounds.
+        underlyingDS.appendWithDateTime(begin + datetime.timedelta(days=2), 100)
+        optionDS.appendWithDateTime(begin + datetime.timedelta(days=2), 0.0001)
+        self.assertEqual(iv[-1], None)
+        self.assertEqual(iv.getRhoDataSeries()[-1], None)
+
+        # Expiry date.
+        underlyingDS.appendWithDateTime(datetime.datetime(2001, 12, 31, 12), 100)
+        optionDS.appendWithDateTime(datetime.datetime(2001, 12, 31, 12), 1)
+        self.assertEqual(len(iv), 3)
+        self.assertNotEqual(iv[-1], None)
+
+        # Expired.
+        underlyingDS.appendWithDateTime(datetime.datetime(2002, 1, 1), 100)
+        optionDS.appendWithDateTime(datetime.datetime(2002, 1, 1), 1)
+        self.assertEqual(len(iv), 4)
+        self.assertEqual(iv[-1], None)
+        self.assertEqual(iv.getGammaDataSeries()[-1], None)
+
+    def testTimeToExpiry(self):
+        expiry = datetime.date(2001, 12, 31)
+        self.assertAlmostEqual(greeks.time_to_expiry(datetime.datetime(2001, 1, 1), expiry), 1)
+        self.assertAlmostEqual(greeks.time_to_expiry(datetime.datetime(2001, 12, 31, 12), expiry), 0.5 / 365)
+        self.assertLess(greeks.time_to_expiry(datetime.datetime(2002, 1, 1), expiry), 0)
+
+        # Naive expiries are localized to the timezone of the datetime.
+        dateTime = dt.localize(datetime.datetime(2001, 12, 31, 12), marketsession.USEquities.timezone)
+        self.assertAlmostEqual(greeks.time_to_expiry(dateTime, expiry), 0.5 / 365)
+        self.assertAlmostEqual(greeks.time_to_expiry(dateTime, datetime.datetime(2001, 12, 31, 18)), 0.25 / 365)
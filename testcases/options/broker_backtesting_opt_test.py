@@ -4,6 +4,8 @@ import testcases.common as common
 
 from pyalgotrade import broker as stockbroker
 from pyalgotrade.broker import backtesting as stockbacktesting
+from pyalgotrade.broker import slippage
+from pyalgotrade.broker import tickfillstrategy
 from pyalgotrade.broker import optbroker
 from pyalgotrade.broker.optbroker import optbacktesting
 from pyalgotrade import bar
@@ -2594,4 +2596,329 @@ class StopLimitOrderTestCase(BaseTestCase):
         self.assertEqual(order.getAvgFillPrice(), 8)
         self.assertTrue(order.getExecutionInfo().getPrice() == 8)
         self.assertEqual(order.getFilled(), 1)
-        self.assertEqual(order.getRemaining(), 0)
\ No newline at end of file
+        self.assertEqual(order.getRemaining(), 0)
+
+class ExpiryTestCase(common.TestCase):
+    OptionInstrument = "orcl20110103"
+    Underlying = "orcl"
+
+    def buildBarFeed(self, prices):
+        # prices is a list of (option price, underlying price) tuples, one per day.
+        bars = []
+        dateTime = datetime.datetime(2011, 1, 1)
+        for optionPrice, underlyingPrice in prices:
+            bars.append(bar.Bars({
+                ExpiryTestCase.OptionInstrument: bar.BasicBar(
+                    dateTime, optionPrice, optionPrice, optionPrice, optionPrice, 1000, None, bar.Frequency.DAY
+                ),
+                ExpiryTestCase.Underlying: bar.BasicBar(
+                    dateTime, underlyingPrice, underlyingPrice, underlyingPrice, underlyingPrice, 1000, None, bar.Frequency.DAY
+                ),
+            }))
+            dateTime += datetime.timedelta(days=1)
+        return barfeed.OptimizerBarFeed(bar.Frequency.DAY, [ExpiryTestCase.OptionInstrument, ExpiryTestCase.Underlying], bars)
+
+    def buildOrder(self, brk, action, quantity, right, expiry=datetime.datetime(2011, 1, 3, 16)):
+        ret = brk.createOptionMarketOrder(action, ExpiryTestCase.OptionInstrument, quantity, right, 20, expiry)
+        ret.setGoodTillCanceled(True)
+        brk.submitOrder(ret)
+        return ret
+
+    def testCashSettlementAtOptionPrice(self):
+        barFeed = self.buildBarFeed([(1, 20), (2, 21), (3, 23), (4, 23)])
+        brk = optbacktesting.OptionBroker(1000, barFeed)
+        brk.setSettlementType(optbacktesting.OptionBroker.SettlementType.CASH)
+        self.buildOrder(brk, optbroker.Order.Action.BUY, 10, optbroker.OptionOrder.Right.CALL)
+        self.assertEqual(brk.getExpiry(ExpiryTestCase.OptionInstrument), datetime.datetime(2011, 1, 3, 16))
+
+        barFeed.dispatch()
+        self.assertEqual(brk.getShares(ExpiryTestCase.OptionInstrument), 10)
+        barFeed.dispatch()
+        self.assertEqual(brk.getShares(ExpiryTestCase.OptionInstrument), 10)
+        # Orders for the expiry date get processed before settling.
+        order = self.buildOrder(brk, optbroker.Order.Action.BUY, 10, optbroker.OptionOrder.Right.CALL)
+        pendingOrder = brk.createOptionLimitOrder(
+            optbroker.Order.Action.BUY, ExpiryTestCase.OptionInstrument, 0.5, 10, optbroker.OptionOrder.Right.CALL, 20,
+            datetime.datetime(2011, 1, 3, 16)
+        )
+        pendingOrder.setGoodTillCanceled(True)
+        brk.submitOrder(pendingOrder)
+        barFeed.dispatch()
+        self.assertTrue(order.isFilled())
+        self.assertTrue(pendingOrder.isCanceled())
+        self.assertEqual(brk.getShares(ExpiryTestCase.OptionInstrument), 0)
+        self.assertEqual(brk.getCash(), 1000 - 10 - 30 + 20 * 3)
+        self.assertEqual(brk.getExpiry(ExpiryTestCase.OptionInstrument), None)
+
+    def testCashSettlementAtIntrinsicValue(self):
+        barFeed = self.buildBarFeed([(1, 20), (2, 21), (3, 23)])
+        brk = optbacktesting.OptionBroker(1000, barFeed)
+        brk.setSettlementType(optbacktesting.OptionBroker.SettlementType.CASH)
+        brk.setUnderlying(ExpiryTestCase.OptionInstrument, ExpiryTestCase.Underlying)
+        self.buildOrder(brk, optbroker.Order.Action.SELL_SHORT, 10, optbroker.OptionOrder.Right.PUT)
+        for i in range(3):
+            barFeed.dispatch()
+        # Out of the money puts expire worthless.
+        self.assertEqual(brk.getShares(ExpiryTestCase.OptionInstrument), 0)
+        self.assertEqual(brk.getCash(), 1000 + 10)
+
+    def testExercise(self):
+        barFeed = self.buildBarFeed([(1, 20), (2, 21), (3, 23)])
+        brk = optbacktesting.OptionBroker(1000, barFeed)
+        brk.setSettlementType(optbacktesting.OptionBroker.SettlementType.EXERCISE)
+        brk.setUnderlying(ExpiryTestCase.OptionInstrument, ExpiryTestCase.Underlying)
+        self.buildOrder(brk, optbroker.Order.Action.BUY, 10, optbroker.OptionOrder.Right.CALL)
+        fills = []
+        brk.getOrderUpdatedEvent().subscribe(
+            lambda broker_, orderEvent: fills.append(orderEvent)
+            if orderEvent.getEventType() == stockbroker.OrderEvent.Type.FILLED else None
+        )
+        for i in range(3):
+            barFeed.dispatch()
+        self.assertEqual(brk.getShares(ExpiryTestCase.OptionInstrument), 0)
+        self.assertEqual(brk.getShares(ExpiryTestCase.Underlying), 10)
+        self.assertEqual(brk.getCash(), 1000 - 10 - 20 * 10)
+
+        # The contract is closed at the intrinsic value and the underlying is bought at its price.
+        self.assertEqual(len(fills), 3)
+        settlement = fills[1].getOrder()
+        self.assertTrue(isinstance(settlement, optbacktesting.OptionSettlementOrder))
+        self.assertEqual(settlement.getAction(), optbroker.Order.Action.SELL)
+        self.assertEqual(fills[1].getEventInfo().getPrice(), 3)
+        self.assertEqual(fills[1].getEventInfo().getCommission(), 0)
+        self.assertEqual(fills[2].getOrder().getInstrument(), ExpiryTestCase.Underlying)
+        self.assertTrue(fills[2].getOrder().isBuy())
+        self.assertEqual(fills[2].getEventInfo().getPrice(), 23)
+
+    def testNoSettlement(self):
+        barFeed = self.buildBarFeed([(1, 20), (2, 21), (3, 23), (4, 23)])
+        brk = optbacktesting.OptionBroker(1000, barFeed)
+        self.assertEqual(brk.getSettlementType(), optbacktesting.OptionBroker.SettlementType.NONE)
+        self.buildOrder(brk, optbroker.Order.Action.BUY, 10, optbroker.OptionOrder.Right.CALL)
+        pendingOrder = brk.createOptionLimitOrder(
+            optbroker.Order.Action.BUY, ExpiryTestCase.OptionInstrument, 0.5, 10, optbroker.OptionOrder.Right.CALL, 20,
+            datetime.datetime(2011, 1, 3, 16)
+        )
+        pendingOrder.setGoodTillCanceled(True)
+        brk.submitOrder(pendingOrder)
+        for i in range(4):
+            barFeed.dispatch()
+        # The shares are left untouched, but the contract is gone along with its orders.
+        self.assertEqual(brk.getShares(ExpiryTestCase.OptionInstrument), 10)
+        self.assertEqual(brk.getCash(), 1000 - 10)
+        self.assertTrue(pendingOrder.isCanceled())
+        self.assertEqual(brk.getExpiry(ExpiryTestCase.OptionInstrument), None)
+        self.assertEqual(len(brk.getActiveOrders()), 0)
+
+    def testIntradaySettlement(self):
+        # prices is a list of (datetime, option price) tuples. There is no option bar on the day after expiry.
+        bars = []
+        for dateTime, optionPrice in [
+            (datetime.datetime(2011, 1, 3, 9, 30), 1),
+            (datetime.datetime(2011, 1, 3, 15, 59), 2),
+            (datetime.datetime(2011, 1, 4, 9, 30), None),
+        ]:
+            currentBars = {
+                ExpiryTestCase.Underlying: bar.BasicBar(dateTime, 20, 20, 20, 20, 1000, None, bar.Frequency.MINUTE)
+            }
+            if optionPrice is not None:
+                currentBars[ExpiryTestCase.OptionInstrument] = bar.BasicBar(
+                    dateTime, optionPrice, optionPrice, optionPrice, optionPrice, 1000, None, bar.Frequency.MINUTE
+                )
+            bars.append(bar.Bars(currentBars))
+        barFeed = barfeed.OptimizerBarFeed(
+            bar.Frequency.MINUTE, [ExpiryTestCase.OptionInstrument, ExpiryTestCase.Underlying], bars
+        )
+        brk = optbacktesting.OptionBroker(1000, barFeed)
+        brk.setSettlementType(optbacktesting.OptionBroker.SettlementType.CASH)
+        expiry = datetime.date(2011, 1, 3)
+
+        # The option can be traded during the whole expiry date.
+        self.buildOrder(brk, optbroker.Order.Action.BUY, 10, optbroker.OptionOrder.Right.CALL, expiry)
+        barFeed.dispatch()
+        self.assertEqual(brk.getShares(ExpiryTestCase.OptionInstrument), 10)
+        order = self.buildOrder(brk, optbroker.Order.Action.BUY, 10, optbroker.OptionOrder.Right.CALL, expiry)
+        barFeed.dispatch()
+        self.assertTrue(order.isFilled())
+        self.assertEqual(brk.getShares(ExpiryTestCase.OptionInstrument), 20)
+        self.assertEqual(brk.getCash(), 1000 - 10 - 20)
+
+        # It gets settled before processing the orders for the next day, at the last price before expiry.
+        order = self.buildOrder(brk, optbroker.Order.Action.BUY, 10, optbroker.OptionOrder.Right.CALL, expiry)
+        barFeed.dispatch()
+        self.assertTrue(order.isCanceled())
+        self.assertEqual(brk.getShares(ExpiryTestCase.OptionInstrument), 0)
+        self.assertEqual(brk.getCash(), 1000 - 10 - 20 + 20 * 2)
+
+
+class ComboOrderTestCase(common.TestCase):
+    Legs = [
+        optbroker.ComboLeg("orcl-c100", optbroker.OptionOrder.Right.CALL, 100, datetime.date(2011, 3, 18), 1),
+        optbroker.ComboLeg("orcl-c110", optbroker.OptionOrder.Right.CALL, 110, datetime.date(2011, 3, 18), -1),
+    ]
+
+    def buildBarFeed(self, prices, volume=1000):
+        # prices is a list of dictionaries with (open, close) tuples for every instrument, one per day.
+        bars = []
+        dateTime = datetime.datetime(2011, 1, 3)
+        for currentPrices in prices:
+            currentBars = {}
+            for instrument, (openPrice, closePrice) in currentPrices.iteritems():
+                currentBars[instrument] = bar.BasicBar(
+                    dateTime, openPrice, max(openPrice, closePrice), min(openPrice, closePrice), closePrice, volume,
+                    None, bar.Frequency.DAY
+                )
+            bars.append(bar.Bars(currentBars))
+            dateTime += datetime.timedelta(days=1)
+        return barfeed.OptimizerBarFeed(bar.Frequency.DAY, ["orcl-c100", "orcl-c110"], bars)
+
+    def buildOrder(self, brk, action, quantity, limitPrice=None, legs=None):
+        if legs is None:
+            legs = ComboOrderTestCase.Legs
+        ret = brk.createOptionComboOrder(action, legs, quantity, limitPrice)
+        ret.setGoodTillCanceled(True)
+        brk.submitOrder(ret)
+        return ret
+
+    def testMarketOrder(self):
+        barFeed = self.buildBarFeed([{"orcl-c100": (5, 6), "orcl-c110": (2, 2.5)}])
+        brk = optbacktesting.OptionBroker(1000, barFeed)
+        cb = OrderUpdateCallback(brk)
+        order = self.buildOrder(brk, optbroker.Order.Action.BUY, 10)
+        self.assertEqual(order.getInstrument(), "orcl-c100/orcl-c110")
+        barFeed.dispatch()
+
+        self.assertTrue(order.isFilled())
+        self.assertEqual(order.getAvgFillPrice(), 3)
+        self.assertEqual([info.getPrice() for info in order.getLegExecutionInfo()], [5, 2])
+        self.assertEqual([info.getQuantity() for info in order.getLegExecutionInfo()], [10, 10])
+        self.assertEqual(brk.getShares("orcl-c100"), 10)
+        self.assertEqual(brk.getShares("orcl-c110"), -10)
+        self.assertEqual(brk.getCash(), 1000 - 30)
+        self.assertEqual(
+            [event.getEventType() for event in cb.events],
+            [stockbroker.OrderEvent.Type.SUBMITTED, stockbroker.OrderEvent.Type.ACCEPTED,
+             stockbroker.OrderEvent.Type.FILLED]
+        )
+        self.assertEqual(brk.getExpiry("orcl-c110"), datetime.datetime(2011, 3, 18, 23, 59, 59, 999999))
+
+    def testSellForCredit(self):
+        barFeed = self.buildBarFeed([{"orcl-c100": (5, 6), "orcl-c110": (2, 2.5)}])
+        brk = optbacktesting.OptionBroker(1000, barFeed)
+        order = self.buildOrder(brk, optbroker.Order.Action.SELL, 10, 2.5)
+        barFeed.dispatch()
+        self.assertTrue(order.isFilled())
+        self.assertEqual(brk.getShares("orcl-c100"), -10)
+        self.assertEqual(brk.getShares("orcl-c110"), 10)
+        self.assertEqual(brk.getCash(), 1000 + 30)
+
+    def testMarketOrderCommission(self):
+        barFeed = self.buildBarFeed([{"orcl-c100": (5, 6), "orcl-c110": (2, 2.5)}])
+        brk = optbacktesting.OptionBroker(1000, barFeed, stockbacktesting.TradePercentage(0.01))
+        order = self.buildOrder(brk, optbroker.Order.Action.BUY, 10)
+        barFeed.dispatch()
+
+        self.assertTrue(order.isFilled())
+        self.assertEqual([info.getCommission() for info in order.getLegExecutionInfo()], [0.5, 0.2])
+        self.assertAlmostEqual(order.getCommissions(), 0.7)
+        self.assertAlmostEqual(brk.getCash(), 1000 - 30 - 0.7)
+
+    def testMarketOrderSlippage(self):
+        barFeed = self.buildBarFeed([{"orcl-c100": (5, 6), "orcl-c110": (2, 2.5)}])
+        brk = optbacktesting.OptionBroker(1000, barFeed)
+        brk.getFillStrategy().setSlippageModel(slippage.VolumeShareSlippage())
+        order = self.buildOrder(brk, optbroker.Order.Action.BUY, 100)
+        barFeed.dispatch()
+
+        # The long leg is bought above the open and the short leg is sold below it.
+        self.assertTrue(order.isFilled())
+        self.assertEqual([info.getPrice() for info in order.getLegExecutionInfo()], [5 * 1.001, 2 * 0.999])
+        self.assertAlmostEqual(order.getAvgFillPrice(), 3.007)
+        self.assertAlmostEqual(brk.getCash(), 1000 - 300.7)
+
+    def testLimitOrder(self):
+        barFeed = self.buildBarFeed([
+            {"orcl-c100": (5, 6), "orcl-c110": (2, 2.5)},
+            # Only the close satisfies the net limit price.
+            {"orcl-c100": (5, 4), "orcl-c110": (1.5, 1.8)},
+        ])
+        brk = optbacktesting.OptionBroker(1000, barFeed)
+        order = self.buildOrder(brk, optbroker.Order.Action.BUY, 10, 2.5)
+        barFeed.dispatch()
+        self.assertTrue(order.isAccepted())
+        self.assertEqual(brk.getShares("orcl-c100"), 0)
+        barFeed.dispatch()
+        self.assertTrue(order.isFilled())
+        self.assertAlmostEqual(order.getAvgFillPrice(), 2.2)
+        self.assertAlmostEqual(brk.getCash(), 1000 - 22)
+
+    def testMissingLegBar(self):
+        barFeed = self.buildBarFeed([
+            {"orcl-c100": (5, 6)},
+            {"orcl-c100": (5, 6), "orcl-c110": (2, 2.5)},
+        ])
+        brk = optbacktesting.OptionBroker(1000, barFeed)
+        order = self.buildOrder(brk, optbroker.Order.Action.BUY, 1)
+        barFeed.dispatch()
+        self.assertTrue(order.isSubmitted())
+        barFeed.dispatch()
+        self.assertTrue(order.isFilled())
+
+    def testVolumeLimit(self):
+        barFeed = self.buildBarFeed([{"orcl-c100": (5, 6), "orcl-c110": (2, 2.5)}] * 2, volume=100)
+        brk = optbacktesting.OptionBroker(1000, barFeed)
+        legs = [
+            ComboOrderTestCase.Legs[0],
+            optbroker.ComboLeg("orcl-c110", optbroker.OptionOrder.Right.CALL, 110, datetime.date(2011, 3, 18), -2),
+        ]
+        order = self.buildOrder(brk, optbroker.Order.Action.BUY, 20, legs=legs)
+        # Only 25 contracts can be used per bar, so only 12 units of the 1x2 ratio spread get filled.
+        barFeed.dispatch()
+        self.assertTrue(order.isPartiallyFilled())
+        self.assertEqual(order.getFilled(), 12)
+        self.assertEqual(brk.getShares("orcl-c110"), -24)
+        barFeed.dispatch()
+        self.assertTrue(order.isFilled())
+        self.assertEqual(brk.getShares("orcl-c100"), 20)
+        self.assertEqual(brk.getShares("orcl-c110"), -40)
+
+    def testTickReplayStrategy(self):
+        barFeed = self.buildBarFeed([{"orcl-c100": (5, 6), "orcl-c110": (2, 2.5)}], volume=100)
+        brk = optbacktesting.OptionBroker(1000, barFeed)
+        brk.setFillStrategy(tickfillstrategy.TickReplayStrategy())
+        order = self.buildOrder(brk, optbroker.Order.Action.BUY, 20)
+        legOrder = brk.createOptionMarketOrder(
+            optbroker.Order.Action.BUY, "orcl-c110", 20, optbroker.OptionOrder.Right.CALL, 110, datetime.date(2011, 3, 18)
+        )
+        brk.submitOrder(legOrder)
+        barFeed.dispatch()
+        # The replayed order takes 20 of the 25 contracts available for orcl-c110, so only 5 units are left for the combo.
+        self.assertTrue(legOrder.isFilled())
+        self.assertEqual(legOrder.getAvgFillPrice(), 2)
+        self.assertTrue(order.isPartiallyFilled())
+        self.assertEqual(order.getFilled(), 5)
+        self.assertEqual(order.getAvgFillPrice(), 3)
+        self.assertEqual(brk.getShares("orcl-c100"), 5)
+        self.assertEqual(brk.getShares("orcl-c110"), 15)
+
+    def testNotEnoughCash(self):
+        barFeed = self.buildBarFeed([{"orcl-c100": (5, 6), "orcl-c110": (2, 2.5)}])
+        brk = optbacktesting.OptionBroker(20, barFeed)
+        order = self.buildOrder(brk, optbroker.Order.Action.BUY, 10)
+        barFeed.dispatch()
+        self.assertTrue(order.isAccepted())
+        self.assertEqual(brk.getShares("orcl-c100"), 0)
+        self.assertEqual(brk.getShares("orcl-c110"), 0)
+        self.assertEqual(brk.getCash(), 20)
+
+    def testCanceledOnExpiry(self):
+        barFeed = self.buildBarFeed([{"orcl-c100": (5, 6), "orcl-c110": (2, 2.5)}] * 2)
+        brk = optbacktesting.OptionBroker(1000, barFeed)
+        legs = [
+            ComboOrderTestCase.Legs[0],
+            optbroker.ComboLeg("orcl-c110", optbroker.OptionOrder.Right.CALL, 110, datetime.date(2011, 1, 4), -1),
+        ]
+        order = self.buildOrder(brk, optbroker.Order.Action.BUY, 10, 1, legs=legs)
+        barFeed.dispatch()
+        barFeed.dispatch()
+        self.assertTrue(order.isCanceled())
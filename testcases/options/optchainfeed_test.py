@@ -0,0 +1,105 @@
+import os
+import datetime
+
+import testcases.common as common
+
+from pyalgotrade.barfeed import optchainfeed
+from pyalgotrade.broker import optbroker
+
+
+def write_bars(path, prices, begin=datetime.datetime(2016, 3, 7, 9, 30)):
+    with open(path, "w") as f:
+        f.write("Date;OPEN;HIGH;LOW;Close;NUMBER_TICKS;VOLUME;VALUE\n")
+        for i, price in enumerate(prices):
+            if price is None:
+                continue
+            dateTime = begin + datetime.timedelta(minutes=i)
+            f.write("%d/%d/%d %d:%02d;%s;%s;%s;%s;10;100;1000\n" % (
+                dateTime.month, dateTime.day, dateTime.year, dateTime.hour, dateTime.minute, price, price, price, price
+            ))
+
+
+class OptionChainFeedTestCase(common.TestCase):
+    def writeChain(self, path):
+        # The underlying goes from 20 to 25.
+        write_bars(os.path.join(path, "bac.csv"), [20, 20, 21, 25, 25])
+        write_bars(os.path.join(path, "bac_2000-c20160318.csv"), [1, 1.1, 1.2, 5, 5])
+        write_bars(os.path.join(path, "bac_2500-p20160318.csv"), [5, 4.9, 4.8, 1, 1])
+        # This one starts trading later.
+        write_bars(os.path.join(path, "bac_2100-c20160318.csv"), [None, None, 0.6, 4, 4])
+        write_bars(os.path.join(path, "bac_1000-c20160318.csv"), [10, 10, 11, 15, 15])
+        write_bars(os.path.join(path, "notes.csv"), [1])
+
+    def testIndex(self):
+        with common.TmpDir() as tmpPath:
+            self.writeChain(tmpPath)
+            index = optchainfeed.build_index(tmpPath)
+            self.assertTrue(os.path.exists(os.path.join(tmpPath, optchainfeed.INDEX_FILE_NAME)))
+            self.assertEqual(len(index), 4)
+            self.assertEqual(index.getSymbols(), ["bac"])
+
+            contract = index.getContracts("bac")[2]
+            self.assertEqual(contract.getInstrument(), "bac_2100-c20160318")
+            self.assertEqual(contract.getStrike(), 21)
+            self.assertEqual(contract.getRight(), optbroker.OptionOrder.Right.CALL)
+            self.assertEqual(contract.getExpiry(), datetime.date(2016, 3, 18))
+            self.assertEqual(contract.getRowCount(), 3)
+            self.assertEqual(contract.getFirstDateTime(), datetime.datetime(2016, 3, 7, 9, 32))
+            self.assertEqual(contract.getLastDateTime(), datetime.datetime(2016, 3, 7, 9, 34))
+
+            # Only the files that changed get scanned again.
+            write_bars(os.path.join(tmpPath, "bac_1000-c20160318.csv"), [10])
+            index = optchainfeed.build_index(tmpPath)
+            self.assertEqual(index.getContracts("bac")[0].getRowCount(), 1)
+            self.assertEqual(index.getContracts("bac")[2].getRowCount(), 3)
+            self.assertEqual(index.getContracts("bac")[2].getExpiry(), datetime.date(2016, 3, 18))
+
+    def testStrikeBand(self):
+        with common.TmpDir() as tmpPath:
+            self.writeChain(tmpPath)
+            feed = optchainfeed.OptionChainFeed(optchainfeed.build_index(tmpPath), strikeBand=0.1)
+            feed.addUnderlyingFromCSV("bac", os.path.join(tmpPath, "bac.csv"))
+
+            instruments = []
+            for dateTime, bars in feed:
+                instruments.append(sorted(bars.getInstruments()))
+            self.assertEqual(instruments, [
+                # No underlying price yet, so every contract alive is loaded.
+                ["bac", "bac_1000-c20160318", "bac_2000-c20160318", "bac_2500-p20160318"],
+                ["bac", "bac_1000-c20160318", "bac_2000-c20160318", "bac_2500-p20160318"],
+                # With the underlying at 20, 21 is within the band.
+                ["bac", "bac_1000-c20160318", "bac_2000-c20160318", "bac_2100-c20160318", "bac_2500-p20160318"],
+                ["bac", "bac_1000-c20160318", "bac_2000-c20160318", "bac_2100-c20160318", "bac_2500-p20160318"],
+                ["bac", "bac_1000-c20160318", "bac_2000-c20160318", "bac_2100-c20160318", "bac_2500-p20160318"],
+            ])
+            self.assertEqual(feed["bac_2100-c20160318"][-1].getClose(), 4)
+            self.assertEqual(feed.getContract("bac_2100-c20160318").getStrike(), 21)
+            self.assertEqual(feed.getOpenContracts(), [])
+
+    def testContractsOutOfBand(self):
+        with common.TmpDir() as tmpPath:
+            self.writeChain(tmpPath)
+            # Contracts start trading once the underlying already has a price.
+            write_bars(os.path.join(tmpPath, "bac.csv"), [20, 20, 21, 25, 25], datetime.datetime(2016, 3, 7, 9, 29))
+            feed = optchainfeed.OptionChainFeed(optchainfeed.build_index(tmpPath), strikeBand=0.1)
+            feed.addUnderlyingFromCSV("bac", os.path.join(tmpPath, "bac.csv"))
+
+            instruments = set()
+            for dateTime, bars in feed:
+                instruments.update(bars.getInstruments())
+            # 25 got within the band once the underlying went to 25, and 10 was never within the band.
+            self.assertEqual(
+                sorted(instruments), ["bac", "bac_2000-c20160318", "bac_2100-c20160318", "bac_2500-p20160318"]
+            )
+            self.assertEqual(len(feed["bac_2500-p20160318"]), 2)
+            self.assertEqual(len(feed["bac_2000-c20160318"]), 5)
+            self.assertFalse("bac_1000-c20160318" in feed)
+
+    def testNoUnderlying(self):
+        with common.TmpDir() as tmpPath:
+            self.writeChain(tmpPath)
+            feed = optchainfeed.OptionChainFeed(optchainfeed.build_index(tmpPath), strikeBand=0.1)
+            count = 0
+            for dateTime, bars in feed:
+                count += len(bars.getInstruments())
+            self.assertEqual(count, 18)
@@ -13,6 +13,7 @@ from pyalgotrade import barfeed
 import pytz
 from pyalgotrade import bar
 from pyalgotrade.broker import optbroker
+from pyalgotrade.broker.optbroker import optbacktesting
 
 def load_daily_barfeed(instrument):
     barFeed = yahoofeed.Feed()
@@ -353,6 +354,28 @@ class LongPosTestCase(BaseTestCase):
         self.assertTrue(round(strat.getNetProfit(), 2) == round(27.37 - 30.69, 2))
         self.assertEqual(strat.positions[0].getAge().days, 2)
 
+    def testLongPositionSettled(self):
+        strat = self.createStrategy()
+        strat.getBroker().setSettlementType(optbacktesting.OptionBroker.SettlementType.CASH)
+
+        # Date,Open,High,Low,Close,Volume,Adj Close
+        # 2000-11-07,28.37,28.44,26.50,26.56,58950800,25.97 - Expiry
+        # 2000-11-06,30.69,30.69,27.50,27.94,75552300,27.32 - Buy
+        # 2000-11-03,31.50,31.75,29.50,30.31,65020900,29.64 - Enter long
+
+        strat.addPosEntry(datetime.datetime(2000, 11, 3), strat.enterOptionLong, BaseTestCase.TestInstrument, 1, optbroker.OptionOrder.Right.CALL, 20, datetime.date(2000, 11, 7), False)
+        strat.run()
+
+        self.assertEqual(strat.positions[0].isOpen(), False)
+        self.assertEqual(strat.enterOkCalls, 1)
+        self.assertEqual(strat.exitOkCalls, 1)
+        self.assertEqual(strat.getBroker().getShares(BaseTestCase.TestInstrument), 0)
+        self.assertTrue(isinstance(strat.positions[0].getExitOrder(), optbacktesting.OptionSettlementOrder))
+        self.assertEqual(strat.positions[0].getAge().days, 1)
+        self.assertTrue(round(strat.getBroker().getCash(), 2) == round(1000 + 26.56 - 30.69, 2))
+        self.assertTrue(round(strat.getNetProfit(), 2) == round(26.56 - 30.69, 2))
+        self.assertEqual(len(strat.getActivePositions()), 0)
+
     def testLongPositionAdjClose(self):
         strat = self.createStrategy()
         strat.setUseAdjustedValues(True)
@@ -0,0 +1,155 @@
+import datetime
+
+import testcases.common as common
+
+from pyalgotrade import bar
+from pyalgotrade import barfeed
+from pyalgotrade.broker import optbroker
+from pyalgotrade.broker.optbroker import optbacktesting
+from pyalgotrade.options import blackscholes
+from pyalgotrade.options import greeks
+
+CALL = optbroker.OptionOrder.Right.CALL
+PUT = optbroker.OptionOrder.Right.PUT
+BEGIN = datetime.datetime(2011, 1, 3)
+EXPIRY = datetime.datetime(2011, 7, 3)
+
+
+def build_bar(dateTime, price):
+    return bar.BasicBar(dateTime, price, price, price, price, 1000, None, bar.Frequency.DAY)
+
+
+class RiskAggregatorTestCase(common.TestCase):
+    Contracts = [("orcl-c100", CALL, 100), ("orcl-p95", PUT, 95)]
+
+    def buildBroker(self, spots, missingContractBars=()):
+        bars = []
+        for i, spot in enumerate(spots):
+            dateTime = BEGIN + datetime.timedelta(days=i)
+            currentBars = {"orcl": build_bar(dateTime, spot)}
+            for instrument, right, strike in RiskAggregatorTestCase.Contracts:
+                if i in missingContractBars:
+                    continue
+                price = blackscholes.price(right, spot, strike, greeks.time_to_expiry(dateTime, EXPIRY), 0, 0.25)
+                currentBars[instrument] = build_bar(dateTime, float(price))
+            bars.append(bar.Bars(currentBars))
+        instruments = ["orcl"] + [contract[0] for contract in RiskAggregatorTestCase.Contracts]
+        self.barFeed = barfeed.OptimizerBarFeed(bar.Frequency.DAY, instruments, bars)
+        ret = optbacktesting.OptionBroker(1000000, self.barFeed)
+        ret.setAllowNegativeCash(True)
+        for instrument, right, strike in RiskAggregatorTestCase.Contracts:
+            ret.setUnderlying(instrument, "orcl")
+        return ret
+
+    def submitOrder(self, brk, instrument, quantity):
+        right, strike = [(c[1], c[2]) for c in RiskAggregatorTestCase.Contracts if c[0] == instrument][0]
+        action = optbroker.Order.Action.BUY if quantity > 0 else optbroker.Order.Action.SELL_SHORT
+        order = brk.createOptionMarketOrder(action, instrument, abs(quantity), right, strike, EXPIRY)
+        brk.submitOrder(order)
+        return order
+
+    def expectedGreeks(self, spot, dateTime, positions):
+        ret = dict((name, 0.0) for name in ("delta", "gamma", "vega", "theta", "rho"))
+        for instrument, right, strike in RiskAggregatorTestCase.Contracts:
+            values = blackscholes.greeks(right, spot, strike, greeks.time_to_expiry(dateTime, EXPIRY), 0, 0.25)
+            for name in ret:
+                ret[name] += positions.get(instrument, 0) * float(values[name])
+        return ret
+
+    def assertGreeksEqual(self, actual, expected):
+        self.assertEqual(sorted(actual.keys()), sorted(expected.keys()))
+        for name in expected:
+            self.assertAlmostEqual(actual[name], expected[name], places=4)
+
+    def testAggregation(self):
+        brk = self.buildBroker([100, 105, 95])
+        risk = brk.getRiskAggregator()
+        self.assertGreeksEqual(risk.getGreeks(), self.expectedGreeks(100, BEGIN, {}))
+        self.assertEqual(risk.getUnderlyings(), [])
+
+        positions = {"orcl-c100": 10, "orcl-p95": -5}
+        for instrument, quantity in positions.iteritems():
+            self.submitOrder(brk, instrument, quantity)
+        self.barFeed.dispatch()
+        self.assertEqual(risk.getUnderlyings(), ["orcl"])
+        self.assertGreeksEqual(risk.getGreeks(), self.expectedGreeks(100, BEGIN, positions))
+        self.assertGreeksEqual(risk.getGreeks("orcl"), risk.getGreeks())
+        self.assertAlmostEqual(risk.getExposure("orcl-p95")["delta"], -5 * float(
+            blackscholes.delta(PUT, 100, 95, greeks.time_to_expiry(BEGIN, EXPIRY), 0, 0.25)
+        ))
+
+        # The greeks for the contracts held get updated on every bar.
+        dateTime = BEGIN + datetime.timedelta(days=1)
+        self.barFeed.dispatch()
+        self.assertGreeksEqual(risk.getGreeks(), self.expectedGreeks(105, dateTime, positions))
+
+        # And the positions on every fill.
+        self.submitOrder(brk, "orcl-c100", -10)
+        self.barFeed.dispatch()
+        positions = {"orcl-p95": -5}
+        self.assertGreeksEqual(
+            risk.getGreeks(), self.expectedGreeks(95, BEGIN + datetime.timedelta(days=2), positions)
+        )
+        self.assertEqual(risk.getExposure("orcl-c100"), None)
+
+    def testUpdatedBeforeOrderEvents(self):
+        brk = self.buildBroker([100])
+        risk = brk.getRiskAggregator()
+        deltas = []
+        brk.getOrderUpdatedEvent().subscribe(lambda broker_, orderEvent: deltas.append(risk.getGreeks()["delta"]))
+        self.submitOrder(brk, "orcl-c100", 7)
+        self.barFeed.dispatch()
+        self.assertEqual(deltas[0], 0)
+        self.assertAlmostEqual(deltas[-1], self.expectedGreeks(100, BEGIN, {"orcl-c100": 7})["delta"])
+
+    def testUnderlyingHoldings(self):
+        # Exercised contracts end up as shares of the underlying.
+        brk = self.buildBroker([100, 110])
+        brk.setSettlementType(optbacktesting.OptionBroker.SettlementType.EXERCISE)
+        risk = brk.getRiskAggregator()
+        order = brk.createOptionMarketOrder(
+            optbroker.Order.Action.BUY, "orcl-c100", 2, CALL, 100, BEGIN + datetime.timedelta(days=1)
+        )
+        brk.submitOrder(order)
+        self.barFeed.dispatch()
+        self.barFeed.dispatch()
+        self.assertEqual(brk.getShares("orcl"), 2)
+        self.assertEqual(risk.getExposure("orcl-c100"), None)
+        self.assertEqual(risk.getGreeks("orcl"), {"delta": 2, "gamma": 0, "vega": 0, "theta": 0, "rho": 0})
+
+    def testMissingGreeks(self):
+        # The last greeks available are used if there is no bar to calculate them.
+        brk = self.buildBroker([100, 105], missingContractBars=(1,))
+        risk = brk.getRiskAggregator()
+        self.submitOrder(brk, "orcl-c100", 3)
+        self.barFeed.dispatch()
+        exposure = risk.getExposure("orcl-c100")
+        self.assertGreater(exposure["delta"], 0)
+        self.barFeed.dispatch()
+        self.assertEqual(risk.getExposure("orcl-c100"), exposure)
+
+    def testExpiredWithoutSettlement(self):
+        # Expired contracts that are not settled are still held, but they have no exposure.
+        brk = self.buildBroker([100, 110, 110])
+        risk = brk.getRiskAggregator()
+        order = brk.createOptionMarketOrder(
+            optbroker.Order.Action.BUY, "orcl-c100", 2, CALL, 100, BEGIN + datetime.timedelta(days=1)
+        )
+        brk.submitOrder(order)
+        self.barFeed.dispatch()
+        self.assertGreater(risk.getGreeks()["delta"], 0)
+        self.barFeed.dispatch()
+        self.barFeed.dispatch()
+        self.assertEqual(brk.getShares("orcl-c100"), 2)
+        self.assertEqual(risk.getExposure("orcl-c100"), {"delta": 0, "gamma": 0, "vega": 0, "theta": 0, "rho": 0})
+        self.assertEqual(risk.getGreeks(), {"delta": 0, "gamma": 0, "vega": 0, "theta": 0, "rho": 0})
+
+    def testOptionWithoutUnderlying(self):
+        brk = self.buildBroker([100])
+        brk.setUnderlying("orcl-c100", None)
+        risk = brk.getRiskAggregator()
+        self.submitOrder(brk, "orcl-c100", 1)
+        self.barFeed.dispatch()
+        self.assertEqual(brk.getShares("orcl-c100"), 1)
+        self.assertEqual(risk.getExposure("orcl-c100"), None)
+        self.assertEqual(risk.getGreeks()["delta"], 0)
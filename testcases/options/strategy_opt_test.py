@@ -195,6 +195,19 @@ class StrategyOrderTestCase(StrategyTestCase):
         self.assertEqual(strat.orderUpdatedCalls, 3)
         self.assertEqual(o.getExecutionInfo().getDateTime(), datetime.datetime(2000, 1, 10))
 
+    def testComboOrderSell(self):
+        strat = self.createStrategy()
+
+        legs = [optbroker.ComboLeg(StrategyTestCase.TestInstrument, optbroker.OptionOrder.Right.CALL, 20, "2016-01-01", 1)]
+        o = strat.optionComboOrder(legs, -2, 100, True)
+        strat.run()
+        self.assertTrue(o.isFilled())
+        self.assertEquals(o.getAction(), optbroker.Order.Action.SELL)
+        self.assertEquals(o.getAvgFillPrice(), 124.62)
+        self.assertEquals(o.getFilled(), 2)
+        self.assertEquals(strat.getBroker().getShares(StrategyTestCase.TestInstrument), -2)
+        self.assertEqual(strat.orderUpdatedCalls, 3)
+
 
 class OptionalOverridesTestCase(StrategyTestCase):
     def testOnStartIdleFinish(self):
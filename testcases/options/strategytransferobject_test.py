@@ -0,0 +1,160 @@
+import copy
+import datetime
+import os
+import pickle
+
+import pytz
+
+import testcases.common as common
+
+from pyalgotrade import bar
+from pyalgotrade import barfeed
+from pyalgotrade.broker import Order
+from pyalgotrade.strategy import optstrategy
+from pyalgotrade.strategy.optstrategy import strategytransferobject
+
+BEGIN = datetime.datetime(2011, 1, 3)
+
+
+def record_fills(transferObject, count):
+    for i in range(count):
+        action = Order.Action.BUY if i % 2 == 0 else Order.Action.SELL
+        instrument = "orcl" if i % 3 else "aapl"
+        transferObject.recordBuySell(action, instrument, BEGIN + datetime.timedelta(days=i), 10 + i)
+
+
+class Strategy(optstrategy.OptionBacktestingStrategy):
+    def onBars(self, bars):
+        pass
+
+
+class StrategyTransferObjectTestCase(common.TestCase):
+    def testChunkedWrites(self):
+        with common.TmpDir() as tmpPath:
+            path = os.path.join(tmpPath, "run.ndjson")
+            transferObject = strategytransferobject.StrategyTransferObject(path, chunkSize=3)
+            transferObject.setInitialEquity(1000)
+            record_fills(transferObject, 8)
+            transferObject.setFinalEquity(1100)
+            transferObject.close()
+            self.assertEqual(transferObject.getCount(), 8)
+
+            reader = strategytransferobject.Reader(path)
+            self.assertEqual(reader.getInitialEquity(), 1000)
+            self.assertEqual(reader.getFinalEquity(), 1100)
+            self.assertEqual(reader.getCount(), 8)
+
+            columns = reader.getColumns()
+            self.assertEqual(columns["actions"], [Order.Action.BUY, Order.Action.SELL] * 4)
+            self.assertEqual(columns["instruments"], ["aapl", "orcl", "orcl"] * 2 + ["aapl", "orcl"])
+            self.assertEqual(columns["datetimes"], [BEGIN + datetime.timedelta(days=i) for i in range(8)])
+            self.assertEqual(columns["prices"], [10 + i for i in range(8)])
+
+    def testPaging(self):
+        with common.TmpDir() as tmpPath:
+            path = os.path.join(tmpPath, "run.ndjson")
+            transferObject = strategytransferobject.StrategyTransferObject(path, chunkSize=3)
+            transferObject.setInitialEquity(1000)
+            record_fills(transferObject, 10)
+            transferObject.close()
+
+            reader = strategytransferobject.Reader(path)
+            # Pages that span chunk boundaries.
+            self.assertEqual(reader.getColumns(2, 5)["prices"], [12, 13, 14, 15, 16])
+            self.assertEqual(reader.getColumns(8, 5)["prices"], [18, 19])
+            self.assertEqual(reader.getColumns(10, 5)["prices"], [])
+
+            history = reader.getBuySellHistory(0, 2)
+            self.assertEqual(history, [
+                {"buysell": "BUY", "instrument": "aapl", "date": "2011-01-03 00:00:00", "price": 10},
+                {"buysell": "SELL", "instrument": "orcl", "date": "2011-01-04 00:00:00", "price": 11},
+            ])
+
+    def testUnfinishedRun(self):
+        with common.TmpDir() as tmpPath:
+            path = os.path.join(tmpPath, "run.ndjson")
+            transferObject = strategytransferobject.StrategyTransferObject(path, chunkSize=2)
+            transferObject.setInitialEquity(1000)
+            record_fills(transferObject, 5)
+
+            # Only the full chunks are written until the run finishes.
+            reader = strategytransferobject.Reader(path)
+            self.assertEqual(reader.getFinalEquity(), None)
+            self.assertEqual(reader.getCount(), 4)
+
+    def testPickle(self):
+        with common.TmpDir() as tmpPath:
+            path = os.path.join(tmpPath, "run.ndjson")
+            transferObject = strategytransferobject.StrategyTransferObject(path)
+            transferObject.setInitialEquity(1000)
+            record_fills(transferObject, 3)
+            restored = pickle.loads(pickle.dumps(transferObject))
+            # The original run goes on, but the copy continues on its own file.
+            record_fills(transferObject, 1)
+            transferObject.close()
+            self.assertNotEqual(restored.getPath(), path)
+            self.assertEqual(os.path.dirname(restored.getPath()), tmpPath)
+            record_fills(restored, 2)
+            restored.close()
+
+            reader = strategytransferobject.Reader(path)
+            self.assertEqual(reader.getColumns()["prices"], [10, 11, 12, 10])
+            reader = strategytransferobject.Reader(restored.getPath())
+            self.assertEqual(reader.getInitialEquity(), 1000)
+            self.assertEqual(reader.getColumns()["prices"], [10, 11, 12, 10, 11])
+
+    def testDeepCopy(self):
+        with common.TmpDir() as tmpPath:
+            path = os.path.join(tmpPath, "run.ndjson")
+            transferObject = strategytransferobject.StrategyTransferObject(path)
+            fork = copy.deepcopy(transferObject)
+            self.assertNotEqual(fork.getPath(), path)
+            fork.setInitialEquity(1000)
+            record_fills(fork, 2)
+            fork.close()
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(strategytransferobject.Reader(fork.getPath()).getCount(), 2)
+
+    def testLocalizedDateTimes(self):
+        with common.TmpDir() as tmpPath:
+            path = os.path.join(tmpPath, "run.ndjson")
+            transferObject = strategytransferobject.StrategyTransferObject(path)
+            transferObject.setInitialEquity(1000)
+            dateTime = pytz.timezone("US/Eastern").localize(datetime.datetime(2011, 1, 3, 20, 30))
+            transferObject.recordBuySell(Order.Action.BUY, "orcl", dateTime, 10)
+            transferObject.close()
+
+            # The local date and time are kept.
+            history = strategytransferobject.Reader(path).getBuySellHistory()
+            self.assertEqual(history[0]["date"], "2011-01-03 20:30:00")
+
+    def testOutputPath(self):
+        with common.TmpDir() as tmpPath:
+            path = os.path.join(tmpPath, "run.ndjson")
+            with strategytransferobject.output_path(path):
+                self.assertEqual(strategytransferobject.StrategyTransferObject().getPath(), path)
+            self.assertNotEqual(strategytransferobject.StrategyTransferObject().getPath(), path)
+
+            otherPath = strategytransferobject.new_output_path(tmpPath)
+            self.assertEqual(os.path.dirname(otherPath), tmpPath)
+            self.assertNotEqual(strategytransferobject.new_output_path(tmpPath), otherPath)
+
+    def testStrategyRun(self):
+        with common.TmpDir() as tmpPath:
+            bars = [
+                bar.Bars({"orcl": bar.BasicBar(
+                    BEGIN + datetime.timedelta(days=i), 10, 10, 10, 10, 1000, None, bar.Frequency.DAY
+                )})
+                for i in range(3)
+            ]
+            feed = barfeed.OptimizerBarFeed(bar.Frequency.DAY, ["orcl"], bars)
+            path = os.path.join(tmpPath, "runs", "run.ndjson")
+            with strategytransferobject.output_path(path):
+                strat = Strategy(feed, 1000)
+            strat.run()
+            self.assertEqual(strat.getStrategyTransferObject().getPath(), path)
+
+            reader = strategytransferobject.Reader(path)
+            self.assertEqual(reader.getInitialEquity(), 1000)
+            self.assertEqual(reader.getFinalEquity(), 1000)
+            self.assertEqual(reader.getCount(), 0)
@@ -0,0 +1,130 @@
+import datetime
+
+import testcases.common as common
+
+from pyalgotrade import bar
+from pyalgotrade import barfeed
+from pyalgotrade.broker import optbroker
+from pyalgotrade.broker.optbroker import optbacktesting
+from pyalgotrade.options import blackscholes
+from pyalgotrade.options import greeks
+from pyalgotrade.options import surface
+from pyalgotrade.strategy import optstrategy
+
+CALL = optbroker.OptionOrder.Right.CALL
+PUT = optbroker.OptionOrder.Right.PUT
+BEGIN = datetime.datetime(2011, 1, 3)
+NEAR_EXPIRY = datetime.datetime(2011, 4, 3)
+FAR_EXPIRY = datetime.datetime(2012, 1, 3)
+
+# Instrument, right, strike, expiry, volatility.
+CONTRACTS = [
+    ("orcl-c90", CALL, 90, NEAR_EXPIRY, 0.3),
+    ("orcl-p90", PUT, 90, NEAR_EXPIRY, 0.3),
+    ("orcl-c110", CALL, 110, NEAR_EXPIRY, 0.2),
+    ("orcl-c100", CALL, 100, FAR_EXPIRY, 0.4),
+]
+
+
+def build_bar(dateTime, price):
+    return bar.BasicBar(dateTime, price, price, price, price, 1000, None, bar.Frequency.DAY)
+
+
+def build_feed(days=3):
+    bars = []
+    for i in range(days):
+        dateTime = BEGIN + datetime.timedelta(days=i)
+        currentBars = {"orcl": build_bar(dateTime, 100)}
+        for instrument, right, strike, expiry, volatility in CONTRACTS:
+            price = blackscholes.price(right, 100, strike, greeks.time_to_expiry(dateTime, expiry), 0.01, volatility)
+            currentBars[instrument] = build_bar(dateTime, float(price))
+        bars.append(bar.Bars(currentBars))
+    instruments = ["orcl"] + [contract[0] for contract in CONTRACTS]
+    return barfeed.OptimizerBarFeed(bar.Frequency.DAY, instruments, bars)
+
+
+def build_surface(feed, cacheSize=1):
+    ret = surface.VolatilitySurface(feed, "orcl", rate=0.01, cacheSize=cacheSize)
+    for instrument, right, strike, expiry, volatility in CONTRACTS:
+        ret.addContract(instrument, right, strike, expiry)
+    return ret
+
+
+class VolatilitySurfaceTestCase(common.TestCase):
+    def testSnapshot(self):
+        feed = build_feed()
+        surface_ = build_surface(feed)
+        self.assertEqual(surface_.getSnapshot(), None)
+
+        feed.dispatch()
+        snapshot = surface_.getSnapshot()
+        self.assertEqual(snapshot.getDateTime(), BEGIN)
+        self.assertEqual(snapshot.getSpot(), 100)
+        self.assertEqual(snapshot.getInstruments(), ["orcl-c100", "orcl-c110", "orcl-c90", "orcl-p90"])
+        for instrument, right, strike, expiry, volatility in CONTRACTS:
+            self.assertAlmostEqual(surface_.getImpliedVolatility(instrument), volatility, places=6)
+        self.assertAlmostEqual(surface_.getGreeks("orcl-p90")["delta"], float(blackscholes.delta(
+            PUT, 100, 90, greeks.time_to_expiry(BEGIN, NEAR_EXPIRY), 0.01, 0.3
+        )), places=6)
+        self.assertEqual(surface_.getImpliedVolatility("orcl-c120"), None)
+        self.assertEqual(len(snapshot.getValues()["iv"]), 4)
+
+    def testCache(self):
+        feed = build_feed()
+        surface_ = build_surface(feed, cacheSize=2)
+        snapshots = []
+        for i in range(3):
+            feed.dispatch()
+            snapshots.append(surface_.getSnapshot())
+            self.assertTrue(surface_.getSnapshot() is snapshots[-1])
+
+        self.assertTrue(surface_.getSnapshot(BEGIN + datetime.timedelta(days=1)) is snapshots[1])
+        self.assertEqual(surface_.getSnapshot(BEGIN), None)
+
+        # Changes to the contracts invalidate the cache.
+        surface_.removeContract("orcl-c100")
+        self.assertEqual(surface_.getSnapshot().getInstruments(), ["orcl-c110", "orcl-c90", "orcl-p90"])
+
+    def testInterpolate(self):
+        feed = build_feed()
+        surface_ = build_surface(feed)
+        feed.dispatch()
+        self.assertAlmostEqual(surface_.interpolate(100, NEAR_EXPIRY), 0.25, places=6)
+        # Flat extrapolation.
+        self.assertAlmostEqual(surface_.interpolate(80, NEAR_EXPIRY), 0.3, places=6)
+        self.assertAlmostEqual(surface_.interpolate(100, BEGIN + datetime.timedelta(days=10)), 0.25, places=6)
+        self.assertAlmostEqual(surface_.interpolate(100, FAR_EXPIRY), 0.4, places=6)
+        # Total variance is interpolated across expiries.
+        midExpiry = datetime.datetime(2011, 8, 3)
+        nearT = greeks.time_to_expiry(BEGIN, NEAR_EXPIRY)
+        farT = greeks.time_to_expiry(BEGIN, FAR_EXPIRY)
+        midT = greeks.time_to_expiry(BEGIN, midExpiry)
+        weight = (midT - nearT) / (farT - nearT)
+        variance = (1 - weight) * 0.25 ** 2 * nearT + weight * 0.4 ** 2 * farT
+        self.assertAlmostEqual(surface_.interpolate(100, midExpiry), (variance / midT) ** 0.5, places=6)
+
+
+class Strategy(optstrategy.OptionBacktestingStrategy):
+    def onBars(self, bars):
+        pass
+
+
+class BrokerSurfaceTestCase(common.TestCase):
+    def testSharedWithStrategy(self):
+        feed = build_feed()
+        brk = optbacktesting.OptionBroker(1000000, feed)
+        strat = Strategy(feed, brk)
+        self.assertTrue(strat.getVolatilitySurface("orcl") is brk.getVolatilitySurface("orcl"))
+        strat.getVolatilitySurface("orcl").setRate(0.01)
+
+        brk.setUnderlying("orcl-c90", "orcl")
+        brk.setUnderlying("orcl-c110", "orcl")
+        strat.optionMarketOrder("orcl-c90", 1, CALL, 90, NEAR_EXPIRY)
+        feed.dispatch()
+        self.assertEqual(brk.getVolatilitySurface("orcl").getContracts(), ["orcl-c90"])
+        self.assertAlmostEqual(strat.getVolatilitySurface("orcl").getImpliedVolatility("orcl-c90"), 0.3, places=6)
+
+        # Contracts registered before the surface gets created are included too.
+        brk.setUnderlying("orcl-p90", "other")
+        strat.optionMarketOrder("orcl-p90", 1, PUT, 90, NEAR_EXPIRY)
+        self.assertEqual(brk.getVolatilitySurface("other").getContracts(), ["orcl-p90"])
@@ -0,0 +1,144 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import random
+
+import numpy
+
+import common
+import equitycurve_analyzer_test
+import strategy_test
+
+from pyalgotrade.barfeed import yahoofeed
+from pyalgotrade.stratanalyzer import drawdown
+from pyalgotrade.stratanalyzer import returns
+from pyalgotrade.stratanalyzer import rolling
+from pyalgotrade.stratanalyzer import sharpe
+
+
+class HelpersTestCase(common.TestCase):
+    def testRunningMoments(self):
+        values = [random.uniform(-1, 1) for i in range(100)]
+        moments = rolling.RunningMoments()
+        self.assertEqual(moments.getMean(), None)
+        self.assertEqual(moments.getStdDev(), None)
+        for i, value in enumerate(values):
+            moments.add(value)
+            self.assertEqual(moments.getCount(), i + 1)
+            self.assertAlmostEqual(moments.getMean(), numpy.mean(values[:i+1]), places=12)
+            self.assertAlmostEqual(moments.getStdDev(0), numpy.std(values[:i+1]), places=12)
+            if i > 0:
+                self.assertAlmostEqual(moments.getStdDev(), numpy.std(values[:i+1], ddof=1), places=12)
+
+    def testRollingMoments(self):
+        values = [random.uniform(-1, 1) for i in range(500)]
+        windowSize = 20
+        moments = rolling.RollingMoments(windowSize)
+        for i, value in enumerate(values):
+            moments.add(value)
+            window = values[max(0, i + 1 - windowSize):i+1]
+            self.assertEqual(moments.getCount(), len(window))
+            self.assertAlmostEqual(moments.getMean(), numpy.mean(window), places=10)
+            if i > 0:
+                self.assertAlmostEqual(moments.getStdDev(), numpy.std(window, ddof=1), places=10)
+
+    def testRollingMax(self):
+        values = [random.randint(0, 50) for i in range(500)]
+        for windowSize in [1, 2, 7]:
+            rollingMax = rolling.RollingMax(windowSize)
+            self.assertEqual(rollingMax.getMax(), None)
+            for i, value in enumerate(values):
+                rollingMax.add(value)
+                self.assertEqual(rollingMax.getMax(), max(values[max(0, i + 1 - windowSize):i+1]))
+
+
+class RollingMetricsTestCase(common.TestCase):
+    def __run(self, strat, windowSize):
+        rollingMetrics = rolling.RollingMetrics(windowSize)
+        retAnalyzer = returns.Returns(maxLen=100000)
+        drawDownAnalyzer = drawdown.DrawDown()
+        strat.attachAnalyzer(retAnalyzer)
+        strat.attachAnalyzer(drawDownAnalyzer)
+        strat.attachAnalyzer(rollingMetrics)
+
+        # Check the rolling figures after every bar against the ones calculated from scratch.
+        history = {"returns": [], "equity": []}
+
+        def onBars(bars):
+            rets = history["returns"]
+            rets.append(retAnalyzer.getReturns()[-1])
+            history["equity"].append(strat.getBroker().getEquity())
+            window = rets[-windowSize:]
+
+            self.assertEqual(rollingMetrics.getCount(), len(rets))
+            self.assertAlmostEqual(rollingMetrics.getRollingMeanReturn(), numpy.mean(window), places=12)
+            if len(window) > 1:
+                self.assertAlmostEqual(
+                    rollingMetrics.getRollingVolatility(False), numpy.std(window, ddof=1), places=12
+                )
+                self.assertAlmostEqual(
+                    rollingMetrics.getRollingSharpeRatio(0.04), sharpe.sharpe_ratio(window, 0.04, 252), places=8
+                )
+            hits = len([ret for ret in window if ret > 0])
+            misses = len([ret for ret in window if ret < 0])
+            if hits + misses:
+                self.assertEqual(rollingMetrics.getRollingHitRate(), hits / float(hits + misses))
+            else:
+                self.assertEqual(rollingMetrics.getRollingHitRate(), None)
+            highWatermark = max(history["equity"][-windowSize:])
+            self.assertAlmostEqual(
+                rollingMetrics.getRollingDrawDown(),
+                (highWatermark - history["equity"][-1]) / highWatermark, places=12
+            )
+            self.assertEqual(rollingMetrics.getMaxDrawDown(), drawDownAnalyzer.getMaxDrawDown())
+
+        strat.getBarsProcessedEvent().subscribe(lambda strat, bars: onBars(bars))
+        strat.run()
+
+        rets = history["returns"]
+        self.assertAlmostEqual(rollingMetrics.getMeanReturn(), numpy.mean(rets), places=12)
+        for annualized in [True, False]:
+            self.assertAlmostEqual(
+                rollingMetrics.getSharpeRatio(0.04, annualized), sharpe.sharpe_ratio(rets, 0.04, 252, annualized),
+                places=10
+            )
+        self.assertAlmostEqual(rollingMetrics.getVolatility(), numpy.std(rets, ddof=1) * numpy.sqrt(252), places=12)
+        self.assertEqual(rollingMetrics.getMaxDrawDown(), drawDownAnalyzer.getMaxDrawDown())
+        return rollingMetrics
+
+    def testInAndOut(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        strat = equitycurve_analyzer_test.InAndOutStrategy(barFeed, "orcl", 20)
+        rollingMetrics = self.__run(strat, 30)
+        self.assertEqual(rollingMetrics.getWindowSize(), 30)
+        self.assertEqual(rollingMetrics.getCount(), 252)
+        self.assertGreater(rollingMetrics.getMaxDrawDown(), 0)
+
+    def testNoTrades(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("ige", common.get_data_file_path("sharpe-ratio-test-ige.csv"))
+        strat = strategy_test.TestStrategy(barFeed, 1000)
+        rollingMetrics = self.__run(strat, 10)
+        self.assertEqual(rollingMetrics.getSharpeRatio(0.04), 0)
+        self.assertEqual(rollingMetrics.getRollingSharpeRatio(0.04), 0)
+        self.assertEqual(rollingMetrics.getRollingHitRate(), None)
+        self.assertEqual(rollingMetrics.getMaxDrawDown(), 0)
+        self.assertEqual(rollingMetrics.getCurrentDrawDown(), 0)
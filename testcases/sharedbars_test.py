@@ -0,0 +1,118 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import datetime
+import pickle
+
+import pytz
+
+import common
+import checkpoint_test
+
+from pyalgotrade import bar
+from pyalgotrade import barfeed
+from pyalgotrade import checkpoint
+from pyalgotrade.barfeed import sharedbars
+
+
+def load_bars():
+    ret = []
+    for dateTime, currentBars in checkpoint_test.build_feed():
+        ret.append(currentBars)
+    return ret
+
+
+class SharedBarsTestCase(common.TestCase):
+    def assertBarsEqual(self, bars1, bars2):
+        self.assertEqual(bars1.getDateTime(), bars2.getDateTime())
+        self.assertEqual(sorted(bars1.getInstruments()), sorted(bars2.getInstruments()))
+        for instrument in bars1.getInstruments():
+            bar1 = bars1[instrument]
+            bar2 = bars2[instrument]
+            self.assertEqual(bar1.getDateTime(), bar2.getDateTime())
+            self.assertEqual(bar1.getOpen(), bar2.getOpen())
+            self.assertEqual(bar1.getHigh(), bar2.getHigh())
+            self.assertEqual(bar1.getLow(), bar2.getLow())
+            self.assertEqual(bar1.getClose(), bar2.getClose())
+            self.assertEqual(bar1.getVolume(), bar2.getVolume())
+            self.assertEqual(bar1.getAdjClose(), bar2.getAdjClose())
+            self.assertEqual(bar1.getFrequency(), bar2.getFrequency())
+            self.assertEqual(bar1.getExtraColumns(), bar2.getExtraColumns())
+
+    def testRoundTrip(self):
+        bars = load_bars()
+        with common.TmpDir() as tmpPath:
+            sharedbars.write(tmpPath, ["orcl"], bars)
+            sharedBars = sharedbars.SharedBars(tmpPath)
+            self.assertEqual(sharedBars.getInstruments(), ["orcl"])
+            self.assertEqual(len(sharedBars), len(bars))
+            for expected, actual in zip(bars, sharedBars):
+                self.assertBarsEqual(expected, actual)
+            self.assertBarsEqual(sharedBars[-1], bars[-1])
+            self.assertEqual(sharedBars.getDateTime(10), bars[10].getDateTime())
+            with self.assertRaises(IndexError):
+                sharedBars[len(bars)]
+
+            # Pickling doesn't copy the bars.
+            self.assertLess(len(pickle.dumps(sharedBars)), 1000)
+            self.assertBarsEqual(pickle.loads(pickle.dumps(sharedBars))[5], bars[5])
+
+    def testMissingValues(self):
+        begin = datetime.datetime(2011, 1, 3, tzinfo=pytz.utc)
+        bars = [
+            bar.Bars({
+                "a": bar.BasicBar(begin, 1, 2, 1, 2, 100, None, bar.Frequency.DAY, {"oi": 5}),
+                "b": bar.BasicBar(begin, 3, 4, 3, 4, 200, 3.5, bar.Frequency.DAY),
+            }),
+            bar.Bars({
+                "b": bar.BasicBar(begin + datetime.timedelta(days=1), 3, 4, 3, 4, 200, 3.5, bar.Frequency.DAY),
+            }),
+        ]
+        with common.TmpDir() as tmpPath:
+            sharedbars.write(tmpPath, ["a", "b"], bars)
+            sharedBars = sharedbars.SharedBars(tmpPath)
+            for expected, actual in zip(bars, sharedBars):
+                self.assertBarsEqual(expected, actual)
+            self.assertEqual(sharedBars[0].getDateTime().tzinfo, pytz.utc)
+
+    def testOptimizerBarFeed(self):
+        bars = load_bars()
+        expected = checkpoint_test.SMAStrategy(barfeed.OptimizerBarFeed(bar.Frequency.DAY, ["orcl"], bars), 10)
+        expected.run()
+
+        with common.TmpDir() as tmpPath:
+            sharedbars.write(tmpPath, ["orcl"], bars)
+
+            def build_feed():
+                return barfeed.OptimizerBarFeed(bar.Frequency.DAY, ["orcl"], sharedbars.SharedBars(tmpPath))
+
+            strat = checkpoint_test.SMAStrategy(build_feed(), 10)
+            strat.run()
+            self.assertEqual(checkpoint_test.get_results(strat), checkpoint_test.get_results(expected))
+
+            # Checkpoints work too.
+            feed = build_feed()
+            strat = checkpoint_test.SMAStrategy(feed, 10)
+            strat.stopAt = datetime.datetime(2000, 6, 30)
+            strat.run()
+            resumed = checkpoint.loads(checkpoint.dumps(strat, feed), build_feed())
+            resumed.stopAt = None
+            resumed.run()
+            self.assertEqual(checkpoint_test.get_results(resumed), checkpoint_test.get_results(expected))
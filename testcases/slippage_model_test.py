@@ -54,6 +54,14 @@ class NoSlippageTestCase(BaseTestCase):
         )
         self.assertEqual(slippedPrice, price)
 
+    def test_batch(self):
+        order = backtesting.MarketOrder(
+            broker.Order.Action.BUY, BaseTestCase.TestInstrument, 5, False, broker.IntegerTraits()
+        )
+        bar_ = self.barsBuilder.nextBar(10, 11, 9, 10, volume=100)
+        slippedPrices = self.slippage.calculatePriceBatch([order, order], [10, 11], [5, 5], [bar_, bar_], [0, 5])
+        self.assertEqual(slippedPrices.tolist(), [10, 11])
+
     def test_buy_market_order(self):
         self.__test_impl(broker.Order.Action.BUY)
 
@@ -124,3 +132,36 @@ class VolumeShareSlippageTestCase(BaseTestCase):
             volumeUsed
         )
         self.assertEqual(slippedPrice, price*1.1)
+
+    def test_batch(self):
+        buyOrder = backtesting.MarketOrder(
+            broker.Order.Action.BUY, BaseTestCase.TestInstrument, 25, False, broker.IntegerTraits()
+        )
+        sellOrder = backtesting.MarketOrder(
+            broker.Order.Action.SELL, BaseTestCase.TestInstrument, 50, False, broker.IntegerTraits()
+        )
+        orders = [buyOrder, sellOrder]
+        prices = [10, 12]
+        quantities = [25, 50]
+        bars = [
+            self.barsBuilder.nextBar(10, 11, 9, 10, volume=100),
+            self.barsBuilder.nextBar(12, 13, 11, 12, volume=200),
+        ]
+        volumesUsed = [0, 25]
+
+        slippedPrices = self.slippage.calculatePriceBatch(orders, prices, quantities, bars, volumesUsed)
+        self.assertEqual(len(slippedPrices), 2)
+        for i in range(len(orders)):
+            self.assertAlmostEqual(
+                slippedPrices[i],
+                self.slippage.calculatePrice(orders[i], prices[i], quantities[i], bars[i], volumesUsed[i])
+            )
+
+        # Fills in the opposite direction of the order.
+        actions = [broker.Order.Action.SELL, broker.Order.Action.BUY]
+        slippedPrices = self.slippage.calculatePriceBatch(orders, prices, quantities, bars, volumesUsed, actions)
+        for i in range(len(orders)):
+            self.assertAlmostEqual(
+                slippedPrices[i],
+                self.slippage.calculatePrice(orders[1 - i], prices[i], quantities[i], bars[i], volumesUsed[i])
+            )
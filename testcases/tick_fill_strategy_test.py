@@ -0,0 +1,205 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import os
+import datetime
+
+import common
+import broker_backtesting_test
+
+from pyalgotrade import broker
+from pyalgotrade.broker import backtesting
+from pyalgotrade.broker import tickfillstrategy
+from pyalgotrade.utils import dt
+from pyalgotrade import bar
+
+
+class BaseTestCase(common.TestCase):
+    TestInstrument = "orcl"
+
+    def setUp(self):
+        common.TestCase.setUp(self)
+        self.barFeed = broker_backtesting_test.BarFeed(BaseTestCase.TestInstrument, bar.Frequency.MINUTE)
+        self.broker = backtesting.Broker(1000000, self.barFeed)
+
+    def buildOrder(self, orderType, action, quantity, *args):
+        if orderType == "market":
+            ret = self.broker.createMarketOrder(action, BaseTestCase.TestInstrument, quantity, *args)
+        elif orderType == "limit":
+            ret = self.broker.createLimitOrder(action, BaseTestCase.TestInstrument, args[0], quantity)
+        elif orderType == "stop":
+            ret = self.broker.createStopOrder(action, BaseTestCase.TestInstrument, args[0], quantity)
+        else:
+            ret = self.broker.createStopLimitOrder(action, BaseTestCase.TestInstrument, args[0], args[1], quantity)
+        ret.setGoodTillCanceled(True)
+        self.broker.submitOrder(ret)
+        return ret
+
+
+class FreeFunctionsTestCase(common.TestCase):
+    def testLimitPriceCross(self):
+        # Continuous path.
+        self.assertEqual(tickfillstrategy.get_limit_price_cross(broker.Order.Action.BUY, 10, None, 9, True), 9)
+        self.assertEqual(tickfillstrategy.get_limit_price_cross(broker.Order.Action.BUY, 10, 12, 9, True), 10)
+        self.assertEqual(tickfillstrategy.get_limit_price_cross(broker.Order.Action.BUY, 10, 12, 11, True), None)
+        self.assertEqual(tickfillstrategy.get_limit_price_cross(broker.Order.Action.SELL, 10, 8, 11, True), 10)
+        # Discrete path.
+        self.assertEqual(tickfillstrategy.get_limit_price_cross(broker.Order.Action.BUY, 10, 12, 9, False), 9)
+        self.assertEqual(tickfillstrategy.get_limit_price_cross(broker.Order.Action.SELL, 10, 8, 11, False), 11)
+        self.assertEqual(tickfillstrategy.get_limit_price_cross(broker.Order.Action.SELL, 10, 8, 9, False), None)
+
+    def testStopPriceCross(self):
+        # Continuous path.
+        self.assertEqual(tickfillstrategy.get_stop_price_cross(broker.Order.Action.BUY, 10, None, 11, True), 11)
+        self.assertEqual(tickfillstrategy.get_stop_price_cross(broker.Order.Action.BUY, 10, 8, 11, True), 10)
+        self.assertEqual(tickfillstrategy.get_stop_price_cross(broker.Order.Action.SELL, 10, 12, 9, True), 10)
+        self.assertEqual(tickfillstrategy.get_stop_price_cross(broker.Order.Action.SELL, 10, 12, 11, True), None)
+        # Discrete path.
+        self.assertEqual(tickfillstrategy.get_stop_price_cross(broker.Order.Action.BUY, 10, 8, 11, False), 11)
+        self.assertEqual(tickfillstrategy.get_stop_price_cross(broker.Order.Action.SELL, 10, 12, 9, False), 9)
+
+
+class OHLCPathTestCase(BaseTestCase):
+    def setUp(self):
+        BaseTestCase.setUp(self)
+        self.broker.setFillStrategy(tickfillstrategy.TickReplayStrategy(volumeLimit=None))
+
+    def testPath(self):
+        barsBuilder = broker_backtesting_test.BarsBuilder(BaseTestCase.TestInstrument, bar.Frequency.MINUTE)
+        source = tickfillstrategy.OHLCPathSource()
+        ticks = source.getTicks(BaseTestCase.TestInstrument, barsBuilder.nextBar(10, 12, 8, 11, volume=100), False)
+        self.assertEqual([tick[1] for tick in ticks], [10, 8, 12, 11])
+        self.assertEqual([tick[2] for tick in ticks], [25, 25, 25, 25])
+        ticks = source.getTicks(BaseTestCase.TestInstrument, barsBuilder.nextBar(10, 12, 8, 9), False)
+        self.assertEqual([tick[1] for tick in ticks], [10, 12, 8, 9])
+
+        source = tickfillstrategy.OHLCPathSource(highFirst=True)
+        ticks = source.getTicks(BaseTestCase.TestInstrument, barsBuilder.nextBar(10, 12, 8, 11), False)
+        self.assertEqual([tick[1] for tick in ticks], [10, 12, 8, 11])
+
+    def testMarketOrders(self):
+        # Market-on-close orders are only supported with daily bars.
+        self.barFeed = broker_backtesting_test.BarFeed(BaseTestCase.TestInstrument, bar.Frequency.DAY)
+        self.broker = backtesting.Broker(1000000, self.barFeed)
+        self.broker.setFillStrategy(tickfillstrategy.TickReplayStrategy(volumeLimit=None))
+
+        order = self.buildOrder("market", broker.Order.Action.BUY, 10, False)
+        onCloseOrder = self.buildOrder("market", broker.Order.Action.BUY, 10, True)
+        self.barFeed.dispatchBars(10, 12, 8, 11, volume=100)
+        self.assertTrue(order.isFilled())
+        self.assertEqual(order.getAvgFillPrice(), 10)
+        self.assertTrue(onCloseOrder.isFilled())
+        self.assertEqual(onCloseOrder.getAvgFillPrice(), 11)
+
+    def testLimitAndStopOrders(self):
+        buyStop = self.buildOrder("stop", broker.Order.Action.BUY, 10, 11.5)
+        buyLimit = self.buildOrder("limit", broker.Order.Action.BUY, 10, 9)
+        sellLimit = self.buildOrder("limit", broker.Order.Action.SELL, 10, 13)
+        self.barFeed.dispatchBars(10, 12, 8, 11, volume=100)
+        self.assertTrue(buyStop.isFilled())
+        self.assertEqual(buyStop.getAvgFillPrice(), 11.5)
+        self.assertTrue(buyLimit.isFilled())
+        self.assertEqual(buyLimit.getAvgFillPrice(), 9)
+        self.assertTrue(sellLimit.isAccepted())
+
+    def testStopLimitOrder(self):
+        # The stop price is hit on the way up, after the low, so the limit price can't be hit in this bar.
+        order = self.buildOrder("stoplimit", broker.Order.Action.BUY, 10, 11.5, 9)
+        self.barFeed.dispatchBars(10, 12, 8, 11, volume=100)
+        self.assertTrue(order.getStopHit())
+        self.assertTrue(order.isAccepted())
+        # Open is above the limit price, but the low is below it.
+        self.barFeed.dispatchBars(10, 12, 8, 11, volume=100)
+        self.assertTrue(order.isFilled())
+        self.assertEqual(order.getAvgFillPrice(), 9)
+
+    def testStopLimitHitInSameBar(self):
+        # On a bearish bar the path goes up first, so the limit is checked on the way down.
+        order = self.buildOrder("stoplimit", broker.Order.Action.BUY, 10, 11.5, 9)
+        self.barFeed.dispatchBars(10, 12, 8, 8.5, volume=100)
+        self.assertTrue(order.isFilled())
+        self.assertEqual(order.getAvgFillPrice(), 9)
+
+    def testVolumeTakenInChronologicalOrder(self):
+        self.broker.getFillStrategy().setVolumeLimit(0.1)
+        # Both orders want all the volume available. The limit order gets triggered first, when the price goes down.
+        buyStop = self.buildOrder("stop", broker.Order.Action.BUY, 10, 11.5)
+        buyLimit = self.buildOrder("limit", broker.Order.Action.BUY, 10, 9)
+        self.barFeed.dispatchBars(10, 12, 8, 11, volume=100)
+        self.assertTrue(buyLimit.isFilled())
+        self.assertTrue(buyStop.isAccepted())
+        self.assertEqual(buyStop.getFilled(), 0)
+
+    def testExpiredOrdersTakeNoVolume(self):
+        self.broker.getFillStrategy().setVolumeLimit(0.1)
+        dayLimit = self.broker.createLimitOrder(broker.Order.Action.BUY, BaseTestCase.TestInstrument, 9, 10)
+        self.broker.submitOrder(dayLimit)
+        self.barFeed.dispatchBars(10, 12, 10, 11, volume=100, sessionClose=True)
+        self.assertTrue(dayLimit.isAccepted())
+
+        # The day order would be triggered first, but it gets canceled by the broker.
+        buyStop = self.buildOrder("stop", broker.Order.Action.BUY, 10, 11.5)
+        self.barFeed.dispatchBars(10, 12, 8, 11, volume=100)
+        self.assertTrue(dayLimit.isCanceled())
+        self.assertTrue(buyStop.isFilled())
+        self.assertEqual(buyStop.getAvgFillPrice(), 11.5)
+
+
+class CSVTicksTestCase(BaseTestCase):
+    def writeTicks(self, path, ticks):
+        begin = dt.datetime_to_timestamp(datetime.datetime(2011, 1, 1))
+        with open(path, "w") as f:
+            f.write("unixtime,price,amount\n")
+            for seconds, price, amount in ticks:
+                f.write("%d,%s,%s\n" % (begin + seconds, price, amount))
+
+    def testDiscreteTicks(self):
+        with common.TmpDir() as tmpPath:
+            path = os.path.join(tmpPath, "ticks.csv")
+            self.writeTicks(path, [
+                # First bar.
+                (1, 10, 1), (20, 12, 1), (40, 8.5, 1), (59, 11, 1),
+                # Second bar.
+                (61, 11, 1), (62, 7, 1),
+                # Third bar has no ticks.
+            ])
+            source = tickfillstrategy.CSVTickSource()
+            source.addTicksFromCSV(BaseTestCase.TestInstrument, path)
+            self.broker.setFillStrategy(tickfillstrategy.TickReplayStrategy(source, volumeLimit=None))
+
+            buyLimit = self.buildOrder("limit", broker.Order.Action.BUY, 10, 9)
+            sellStop = self.buildOrder("stop", broker.Order.Action.SELL, 10, 9)
+            self.barFeed.dispatchBars(10, 12, 8.5, 11, volume=100)
+            # The price jumped from 12 to 8.5.
+            self.assertTrue(buyLimit.isFilled())
+            self.assertEqual(buyLimit.getAvgFillPrice(), 8.5)
+            self.assertTrue(sellStop.isFilled())
+            self.assertEqual(sellStop.getAvgFillPrice(), 8.5)
+
+            buyLimit = self.buildOrder("limit", broker.Order.Action.BUY, 10, 8)
+            self.barFeed.dispatchBars(11, 11, 7, 7, volume=100)
+            self.assertTrue(buyLimit.isFilled())
+            self.assertEqual(buyLimit.getAvgFillPrice(), 7)
+
+            # No ticks for this bar, so the OHLC path is used.
+            buyLimit = self.buildOrder("limit", broker.Order.Action.BUY, 10, 8)
+            self.barFeed.dispatchBars(10, 12, 6, 11, volume=100)
+            self.assertTrue(buyLimit.isFilled())
+            self.assertEqual(buyLimit.getAvgFillPrice(), 8)
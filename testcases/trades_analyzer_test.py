@@ -33,6 +33,7 @@ from pyalgotrade.barfeed import csvfeed
 from pyalgotrade.stratanalyzer import trades
 from pyalgotrade import broker
 from pyalgotrade.broker import backtesting
+from pyalgotrade.utils import dt
 
 
 def buildUTCDateTime(year, month, day, hour, minute):
@@ -416,3 +417,53 @@ class TradesAnalyzerTestCase(common.TestCase):
         self.assertTrue(round(stratAnalyzer.getLosses().mean(), 2) == -0.08)
 
         self.assertTrue(stratAnalyzer.getProfitableCount() == 0)
+
+    def testLedger(self):
+        strat = self.__createStrategy()
+        stratAnalyzer = trades.Trades()
+        strat.attachAnalyzer(stratAnalyzer)
+
+        # Enter long
+        strat.addOrder(buildUTCDateTime(2011, 1, 3, 15, 0), strat.getBroker().createMarketOrder, broker.Order.Action.BUY, TradesAnalyzerTestCase.TestInstrument, 1)  # 127.14
+        # Extend long position
+        strat.addOrder(buildUTCDateTime(2011, 1, 3, 15, 16), strat.getBroker().createMarketOrder, broker.Order.Action.BUY, TradesAnalyzerTestCase.TestInstrument, 1)  # 127.16
+        # Exit long and enter short
+        strat.addOrder(buildUTCDateTime(2011, 1, 3, 15, 30), strat.getBroker().createMarketOrder, broker.Order.Action.SELL, TradesAnalyzerTestCase.TestInstrument, 3)  # 127.2
+        # Exit short
+        strat.addOrder(buildUTCDateTime(2011, 1, 3, 15, 31), strat.getBroker().createMarketOrder, broker.Order.Action.BUY_TO_COVER, TradesAnalyzerTestCase.TestInstrument, 1)
+        strat.run()
+
+        ledger = stratAnalyzer.getLedger()
+        self.assertEqual(ledger.getCount(), 2)
+        self.assertEqual(list(ledger.getInstruments()), [TradesAnalyzerTestCase.TestInstrument] * 2)
+        self.assertEqual(list(ledger.getInstrumentIds()), [0, 0])
+        self.assertEqual(list(ledger.getQuantities()), [2, -1])
+        self.assertEqual(
+            list(ledger.getEntryTimestamps()),
+            [dt.datetime_to_timestamp(buildUTCDateTime(2011, 1, 3, 15, 1)), dt.datetime_to_timestamp(buildUTCDateTime(2011, 1, 3, 15, 31))]
+        )
+        self.assertEqual(
+            list(ledger.getExitTimestamps()),
+            [dt.datetime_to_timestamp(buildUTCDateTime(2011, 1, 3, 15, 31)), dt.datetime_to_timestamp(buildUTCDateTime(2011, 1, 3, 15, 32))]
+        )
+        self.assertEqual(list(ledger.getPnLs()), list(stratAnalyzer.getAll()))
+        self.assertEqual(list(ledger.getReturns()), list(stratAnalyzer.getAllReturns()))
+
+        # Derived arrays are cached and read-only.
+        self.assertTrue(stratAnalyzer.getProfits() is stratAnalyzer.getProfits())
+        with self.assertRaises(ValueError):
+            stratAnalyzer.getProfits()[0] = 0
+        with self.assertRaises(ValueError):
+            stratAnalyzer.getAll()[0] = 0
+
+    def testLedgerGrowth(self):
+        ledger = trades.TradeLedger(1)
+        dateTime = buildUTCDateTime(2011, 1, 3, 15, 0)
+        for i in range(100):
+            ledger.addTrade(dateTime, dateTime, "inst-%d" % (i % 3), i, i * 10, i / 100.0, 0.5)
+        self.assertEqual(ledger.getCount(), 100)
+        self.assertEqual(list(ledger.getQuantities()), range(100))
+        self.assertEqual(list(ledger.getPnLs()), [i * 10 for i in range(100)])
+        self.assertEqual(ledger.getInstrumentNames(), ["inst-0", "inst-1", "inst-2"])
+        self.assertEqual(list(ledger.getInstruments()[:4]), ["inst-0", "inst-1", "inst-2", "inst-0"])
+        self.assertEqual(ledger.getCommissions().sum(), 50)
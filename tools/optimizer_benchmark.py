@@ -0,0 +1,85 @@
+# PyAlgoTrade
+#
+# Copyright 2011-2015 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+# Compares fixed size jobs with adaptive job batching in optimizer.local, using a synthetic strategy whose run time
+# grows towards the end of the parameter space.
+# Usage: python tools/optimizer_benchmark.py [--workers 4] [--parameters 400]
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from pyalgotrade import bar
+from pyalgotrade import barfeed
+from pyalgotrade import strategy
+from pyalgotrade.optimizer import coordinator
+from pyalgotrade.optimizer import local
+
+
+class SkewedStrategy(strategy.BacktestingStrategy):
+    def __init__(self, feed, instrument, runTime):
+        super(SkewedStrategy, self).__init__(feed)
+        self.__runTime = runTime
+
+    def onStart(self):
+        time.sleep(self.__runTime)
+
+    def onBars(self, bars):
+        pass
+
+
+def parameters_generator(count):
+    for i in range(count):
+        # Most runs take a couple of milliseconds, but the last ones take up to 100 times longer.
+        yield ("orcl", 0.002 * (1 + 99 * (i / float(count)) ** 8))
+
+
+def run(workerCount, parameterCount, adaptiveBatching):
+    coordinator.Coordinator.adaptiveBatching = adaptiveBatching
+    # Just a few bars, so run times are dominated by the ones set for each parameter.
+    bars = []
+    for i in range(20):
+        dateTime = datetime.datetime(2000, 1, 1) + datetime.timedelta(days=i)
+        bars.append(bar.Bars({"orcl": bar.BasicBar(dateTime, 10, 10, 10, 10, 1000, None, bar.Frequency.DAY)}))
+    feed = barfeed.OptimizerBarFeed(bar.Frequency.DAY, ["orcl"], bars)
+    begin = time.time()
+    local.run(SkewedStrategy, feed, parameters_generator(parameterCount), workerCount)
+    return time.time() - begin
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks job batching in the optimizer")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--parameters", type=int, default=400)
+    args = parser.parse_args()
+
+    expected = sum(runTime for instrument, runTime in parameters_generator(args.parameters)) / args.workers
+    print "Ideal: %.2f seconds" % (expected)
+    for adaptiveBatching in [False, True]:
+        elapsed = run(args.workers, args.parameters, adaptiveBatching)
+        print "%s batches: %.2f seconds" % ("Adaptive" if adaptiveBatching else "Fixed", elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ from django.conf import settings
 PYALGOTRADE_BASE = os.path.abspath(os.path.join(settings.BASE_DIR, ".."))
 PYALGOTRADE_DATA_FOLDER = os.path.join(PYALGOTRADE_BASE, "data/")
 PYALGOTRADE_SAMPLES_FOLDER = os.path.join(PYALGOTRADE_BASE, "samples/")
-PYALGOTRADE_TEMP_DUMP_JSON_FILE = os.path.join(PYALGOTRADE_DATA_FOLDER, "temp/jsondump.json")
+PYALGOTRADE_TEMP_RUNS_FOLDER = os.path.join(PYALGOTRADE_DATA_FOLDER, "temp/runs/")
 
 
 class DataSourceHelper:
@@ -34,5 +34,10 @@ class DataSourceHelper:
                 return ''
 
     @staticmethod
-    def getTempDumpJsonFilePath():
-        return PYALGOTRADE_TEMP_DUMP_JSON_FILE
+    def getRunFilePath(runId):
+        """
+        Builds the path to the file where the results of a backtest run are written.
+        :param runId: str
+        :return: Full path to the file.
+        """
+        return os.path.join(PYALGOTRADE_TEMP_RUNS_FOLDER, runId + ".ndjson")
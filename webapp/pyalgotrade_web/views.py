@@ -11,10 +11,13 @@ from os.path import abspath, dirname
 sys.path.append(abspath(dirname(__file__) + '/' + '../..'))
 from pyalgotrade.barfeed import ibfeed
 from pyalgotrade.tools import filename as filenametool
+from pyalgotrade.strategy.optstrategy import strategytransferobject
 from .util.sandbox import RestrictedExecutionEnv
 import util.datasourcehelper as dsh
 import datetime
 
+BUY_SELL_HISTORY_PAGE_SIZE = 1000
+
 # Create your views here.
 
 def index(request):
@@ -44,12 +47,26 @@ def beginBacktest(request):
 
         code = request.POST.get('strategy')
 
+        # Every run gets its own results file, so concurrent runs don't clobber each other.
+        runId = os.path.splitext(os.path.basename(strategytransferobject.new_output_path()))[0]
+        runPath = dsh.DataSourceHelper.getRunFilePath(runId)
+
         env = RestrictedExecutionEnv()
-        success, messages = env.executeUnstrustedCode(code)
+        with strategytransferobject.output_path(runPath):
+            success, messages = env.executeUnstrustedCode(code)
+
+        if not os.path.isfile(runPath):
+            data = {'message': None, 'statusmessages': messages, 'results': ''}
+            return HttpResponse(json.dumps(data), content_type='application/json')
 
-        execResult = ''
-        with open(dsh.PYALGOTRADE_TEMP_DUMP_JSON_FILE, 'r') as strat_exec_json_dump:
-            execResult = json.load(strat_exec_json_dump)
+        reader = strategytransferobject.Reader(runPath)
+        execResult = {
+            "runId": runId,
+            "initialEquity": reader.getInitialEquity(),
+            "finalEquity": reader.getFinalEquity(),
+            "count": reader.getCount(),
+            "buySellHistory": reader.getBuySellHistory(0, BUY_SELL_HISTORY_PAGE_SIZE),
+        }
 
         startportfolio = float(execResult["initialEquity"])
         endportfolio = float(execResult["finalEquity"])
@@ -63,6 +80,24 @@ def beginBacktest(request):
         raise Http404
 
 
+def requestBuySellHistory(request):
+    if request.is_ajax() and request.method == 'GET':
+
+        runId = str(request.GET.get('runId'))
+        runPath = dsh.DataSourceHelper.getRunFilePath(runId)
+        if re.match(r'^[0-9a-z\-]+$', runId, re.IGNORECASE) is None or not os.path.isfile(runPath):
+            raise Http404
+
+        offset = int(request.GET.get('offset', 0))
+        limit = min(int(request.GET.get('limit', BUY_SELL_HISTORY_PAGE_SIZE)), BUY_SELL_HISTORY_PAGE_SIZE)
+        reader = strategytransferobject.Reader(runPath)
+        data = {'count': reader.getCount(), 'offset': offset, 'buySellHistory': reader.getBuySellHistory(offset, limit)}
+
+        return HttpResponse(json.dumps(data), content_type='application/json')
+    else:
+        raise Http404
+
+
 def loadChartDataCsv(request):
 
     if request.is_ajax() and request.method == 'GET':